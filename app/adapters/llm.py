@@ -5,13 +5,16 @@ import importlib.util
 import inspect
 import json
 import logging
-import re
-from typing import Any, Dict, Iterable, List, Optional, Type
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Type
 import litellm
 from crewai.llms.base_llm import BaseLLM
 from pydantic import BaseModel
 from app.api_rotation import get_rotation_manager
 from app.config.settings import settings
+from app.json_extraction import extract_json_text
+from app.llm_cache import LLMResponseCache, cache_key, get_llm_cache
+from app.llm_hedging import get_request_hedger
 from app.llm_logging import record_llm_interaction
 _LOGGER = logging.getLogger(__name__)
 _ALLOWED_GEN_ARGS = {
@@ -23,7 +26,6 @@ _ALLOWED_GEN_ARGS = {
     "stop_sequences",
     "safety_settings",
 }
-_CODE_FENCE_PATTERN = re.compile(r"```(?:json)?\s*(.+?)```", re.IGNORECASE | re.DOTALL)
 def _normalize_model(model: Optional[str]) -> str:
     candidate = model or settings.llm_model
     if not candidate:
@@ -69,59 +71,28 @@ def _extract_message_text(response: Any) -> str:
     except Exception as exc:
         _LOGGER.debug("Failed to parse LiteLLM response: %s", exc)
         return str(response)
-def _find_json_bounds(text: str) -> Optional[str]:
-    """Return the first balanced JSON object or array in *text*."""
-    length = len(text)
-    for index in range(length):
-        start_char = text[index]
-        if start_char not in "{[":
-            continue
-        stack: List[str] = ["}" if start_char == "{" else "]"]
-        in_string = False
-        escape = False
-        for cursor in range(index + 1, length):
-            char = text[cursor]
-            if in_string:
-                if escape:
-                    escape = False
-                elif char == "\\":
-                    escape = True
-                elif char == '"':
-                    in_string = False
-                continue
-            if char == '"':
-                in_string = True
-                continue
-            if char in "{[":
-                stack.append("}" if char == "{" else "]")
-                continue
-            if char in "}]":
-                if not stack:
-                    break
-                expected = stack.pop()
-                if char != expected:
-                    break
-                if not stack:
-                    return text[index : cursor + 1].strip()
-    return None
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Conservative prompt size for TPM scheduling (Japanese text is close to one token per character)."""
+    return sum(len(str(message.get("content", ""))) for message in messages if isinstance(message, dict))
+def _has_content(response: Any) -> bool:
+    """Whether a response carries message text (hedged requests only accept these)."""
+    return bool(_extract_message_text(response))
+def _serialize_response(response: Any) -> Dict[str, Any]:
+    """Convert a LiteLLM response into a JSON-compatible cache payload."""
+    if hasattr(response, "model_dump"):
+        return {"type": "model_response", "data": response.model_dump()}
+    return {"type": "raw", "data": response}
+def _restore_response(payload: Dict[str, Any]) -> Any:
+    if payload.get("type") == "model_response":
+        return litellm.ModelResponse(**payload["data"])
+    return payload.get("data")
 def extract_structured_json(text: str) -> Optional[str]:
     """Extract a JSON object/array from LLM text output.
     Gemini responses sometimes wrap valid JSON with Markdown fences or
-    explanatory prose. This helper strips common wrappers and returns the
-    first balanced JSON payload when possible.
+    explanatory prose. This helper returns the first decodable JSON payload
+    found by :mod:`app.json_extraction` (fenced blocks first).
     """
-    if not text:
-        return None
-    candidates: List[str] = []
-    fence_match = _CODE_FENCE_PATTERN.search(text)
-    if fence_match:
-        candidates.append(fence_match.group(1))
-    candidates.append(text)
-    for candidate in candidates:
-        snippet = _find_json_bounds(candidate.strip())
-        if snippet:
-            return snippet
-    return None
+    return extract_json_text(text)
 def _resolve_original_completion() -> Optional[Any]:
     module_name = "app.crew.flows"
     if importlib.util.find_spec(module_name) is None:
@@ -185,7 +156,7 @@ class CrewAIGeminiLLM(BaseLLM):
         if temperature is not None:
             generation_defaults.setdefault("temperature", temperature)
         passthrough: Dict[str, Any] = {
-            key: kwargs[key] for key in ("api_key", "max_attempts") if key in kwargs and kwargs[key] is not None
+            key: kwargs[key] for key in ("api_key", "max_attempts", "cache") if key in kwargs and kwargs[key] is not None
         }
         passthrough.update(generation_defaults)
         self._client = LLMClient(model=target_model, **passthrough)
@@ -253,11 +224,45 @@ class LLMClient:
         self.api_key = api_key or settings.gemini_api_key
         self.model = _normalize_model(model)
         self.max_attempts = int(kwargs.pop("max_attempts", 3))
+        self.cache_enabled = bool(kwargs.pop("cache", True))
+        self.call_site: Optional[str] = kwargs.pop("call_site", None)
+        self.hedge: Optional[bool] = kwargs.pop("hedge", None)
         self.default_generation_config: Dict[str, Any] = {
             key: value for key, value in kwargs.items() if key in _ALLOWED_GEN_ARGS and value is not None
         }
         self._rotation_manager = get_rotation_manager()
-    def completion(self, messages: List[Dict[str, Any]], **generation_args: Any) -> Any:
+    def completion(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        cache: Optional[bool] = None,
+        **generation_args: Any,
+    ) -> Any:
+        """Run a chat completion, reusing a cached response for identical requests.
+        Args:
+            messages: Chat messages
+            tools: Tool schema forwarded to the provider (part of the cache key)
+            cache: Override the client-level cache setting for this call
+                (``False`` always hits the provider and does not store the result)
+            **generation_args: Generation config overrides
+        """
+        base_kwargs, cfg = self._build_request(messages, tools, generation_args)
+        response_cache = self._response_cache(cache)
+        if response_cache is None:
+            return self._call_provider(base_kwargs)
+        return response_cache.get_or_compute(
+            cache_key(self.model, messages, cfg, tools),
+            self.model,
+            lambda: self._call_provider(base_kwargs),
+            serialize=_serialize_response,
+            restore=_restore_response,
+        )
+    def _build_request(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]],
+        generation_args: Dict[str, Any],
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         cfg = _merge_generation_config(self.default_generation_config, generation_args)
         base_kwargs: Dict[str, Any] = {
             "model": self.model,
@@ -265,6 +270,52 @@ class LLMClient:
         }
         if cfg:
             base_kwargs["extra_body"] = {"generationConfig": cfg}
+        if tools:
+            base_kwargs["tools"] = tools
+        return base_kwargs, cfg
+    def _response_cache(self, cache: Optional[bool]) -> Optional[LLMResponseCache]:
+        use_cache = self.cache_enabled if cache is None else cache
+        return get_llm_cache() if use_cache else None
+    def _hedge_request(self) -> Optional[Dict[str, Any]]:
+        """Overrides for a duplicate request, or ``None`` when this call should not be hedged.
+        Hedging is opt-in: ``LLMClient(hedge=True)`` or a ``call_site`` listed in
+        ``llm_hedging.call_sites`` while ``llm_hedging.enabled`` is set. The duplicate
+        goes to ``llm_hedging.hedge_model`` when configured, otherwise to a different
+        rotation key; with neither available there is nothing to hedge against.
+        """
+        config = settings.llm_hedging
+        enabled = self.hedge if self.hedge is not None else config.enabled and self.call_site in config.call_sites
+        if not enabled:
+            return None
+        hedge_model = _normalize_model(config.hedge_model) if config.hedge_model else None
+        if hedge_model and hedge_model != self.model:
+            return {"model": hedge_model}
+        if not self.api_key and len(self._rotation_manager.key_pools.get("gemini", [])) > 1:
+            return {}
+        return None
+    def _call_provider(self, base_kwargs: Dict[str, Any]) -> Any:
+        """Dispatch, hedging slow requests and recording latency per call site."""
+        hedger = get_request_hedger()
+        site = self.call_site or self.model
+        overrides = self._hedge_request()
+        if overrides is None:
+            started = time.perf_counter()
+            response = self._dispatch(base_kwargs)
+            hedger.observe(site, time.perf_counter() - started)
+            return response
+        primary_keys: Set[str] = set()
+        return hedger.run(
+            site,
+            lambda: self._dispatch(base_kwargs, used_keys=primary_keys),
+            lambda: self._dispatch({**base_kwargs, **overrides}, exclude_keys=primary_keys),
+            validate=_has_content,
+        )
+    def _dispatch(
+        self,
+        base_kwargs: Dict[str, Any],
+        used_keys: Optional[Set[str]] = None,
+        exclude_keys: Optional[Set[str]] = None,
+    ) -> Any:
         completion_fn = litellm.completion
         is_patched = getattr(completion_fn, "__name__", "") == "patched_completion"
         original_completion = _resolve_original_completion() if is_patched else None
@@ -284,11 +335,15 @@ class LLMClient:
         if has_rotation_keys:
             _LOGGER.debug("LLMClient invoking rotation manager directly")
             def _invoke(key: str) -> Any:
+                if used_keys is not None:
+                    used_keys.add(key)
                 return _call(completion_fn, api_key=key)
             return self._rotation_manager.execute_with_rotation(
                 provider="gemini",
                 api_call=_invoke,
                 max_attempts=self.max_attempts,
+                estimated_tokens=_estimate_tokens(base_kwargs["messages"]),
+                exclude_keys=exclude_keys,
             )
         fallback_key = settings.gemini_api_key
         if fallback_key:
@@ -315,6 +370,9 @@ class LLMClient:
         agent review cycle and other legacy callers remain functional.
         """
         raw = self.generate(prompt, generation_config=generation_config)
+        return self._coerce_structured(raw, schema)
+    @staticmethod
+    def _coerce_structured(raw: Any, schema: Optional[Type[BaseModel]]) -> Any:
         if schema is not None:
             try:
                 if isinstance(raw, BaseModel):
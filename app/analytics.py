@@ -1,10 +1,10 @@
 """フィードバックループ分析モジュール.
-JSONL実行ログから統計を分析し、継続的改善のためのインサイトを提供します。
+セグメント化された実行ログを集計ストアへ差分同期し、継続的改善のためのインサイトを提供します。
 """
-import json
 import logging
-from pathlib import Path
 from typing import Dict, List, Optional
+from app.analytics_store import ExecutionAnalyticsStore
+from app.execution_log import open_execution_log
 from app.metadata_storage import metadata_storage
 from app.models.workflow import WorkflowResult
 logger = logging.getLogger(__name__)
@@ -12,24 +12,23 @@ class FeedbackAnalyzer:
     """フィードバックデータ分析クラス."""
     def __init__(self, jsonl_path: Optional[str] = None):
         self.jsonl_path = jsonl_path or metadata_storage.jsonl_path
+        self.execution_log = open_execution_log(jsonl_path) if jsonl_path else metadata_storage.execution_log
+        self.store = (
+            ExecutionAnalyticsStore(str(self.execution_log.directory / "analytics.db"))
+            if jsonl_path
+            else metadata_storage.analytics_store
+        )
+    def _synced_store(self) -> ExecutionAnalyticsStore:
+        """未集計の実行だけを取り込んでから集計ストアを返す."""
+        try:
+            self.store.sync(self.execution_log)
+        except Exception as e:
+            logger.error(f"Failed to sync analytics store: {e}")
+        return self.store
     def load_executions(self, limit: int = 100) -> List[WorkflowResult]:
-        """JSONL from execution log を読み込み."""
-        executions = []
+        """実行ログを記録順（古い順）に先頭からlimit件読み込み."""
         try:
-            if not Path(self.jsonl_path).exists():
-                logger.warning(f"Execution log not found: {self.jsonl_path}")
-                return []
-            with open(self.jsonl_path, "r", encoding="utf-8") as f:
-                for line in f:
-                    try:
-                        data = json.loads(line)
-                        result = WorkflowResult(**data)
-                        executions.append(result)
-                    except Exception as e:
-                        logger.debug(f"Failed to parse line: {e}")
-                        continue
-                    if len(executions) >= limit:
-                        break
+            executions = self.execution_log.head(limit)
             logger.info(f"Loaded {len(executions)} execution records")
             return executions
         except Exception as e:
@@ -37,38 +36,20 @@ class FeedbackAnalyzer:
             return []
     def analyze_hook_performance(self, limit: Optional[int] = None) -> Dict[str, Dict[str, float]]:
         """フック戦略ごとのパフォーマンスを分析."""
-        executions = self.load_executions(limit=limit or 100)
-        if not executions:
-            return {}
-        hook_stats = {}
-        for ex in executions:
-            hook = ex.hook_type or "その他"
-            if hook not in hook_stats:
-                hook_stats[hook] = {"count": 0, "total_wow": 0.0, "total_retention": 0.0}
-            hook_stats[hook]["count"] += 1
-            if ex.wow_score:
-                hook_stats[hook]["total_wow"] += ex.wow_score
-            if ex.retention_prediction:
-                hook_stats[hook]["total_retention"] += ex.retention_prediction
-        for hook, stats in hook_stats.items():
+        hook_stats = self._synced_store().hook_stats(limit=limit or 100)
+        for stats in hook_stats.values():
             count = stats["count"]
             stats["avg_wow"] = stats["total_wow"] / count if count > 0 else 0
             stats["avg_retention"] = stats["total_retention"] / count if count > 0 else 0
         return hook_stats
     def analyze_topic_distribution(self, limit: Optional[int] = None) -> Dict[str, int]:
         """トピック別の動画数を分析."""
-        executions = self.load_executions(limit=limit or 100)
-        topic_count = {}
-        for ex in executions:
-            topic = ex.topic or "一般"
-            topic_count[topic] = topic_count.get(topic, 0) + 1
-        return dict(sorted(topic_count.items(), key=lambda x: x[1], reverse=True))
-    def get_best_performing_videos(self, limit: int = 10) -> List[WorkflowResult]:
-        """WOWスコアでトップの動画を取得."""
-        executions = self.load_executions()
-        with_wow = [ex for ex in executions if ex.wow_score is not None]
-        sorted_execs = sorted(with_wow, key=lambda x: x.wow_score, reverse=True)
-        return sorted_execs[:limit]
+        return self._synced_store().topic_counts(limit=limit or 100)
+    def get_best_performing_videos(self, limit: int = 10, window: int = 100) -> List[WorkflowResult]:
+        """直近window件からWOWスコアでトップの動画を取得（上位limit件のみ読み込み）."""
+        sequences = self._synced_store().top_sequences_by_wow(window=window, limit=limit)
+        entries = [self.execution_log.get(sequence) for sequence in sequences]
+        return [entry.result for entry in entries if entry]
     def calculate_success_rate(self) -> float:
         """成功率を計算（%）."""
         executions = self.load_executions()
@@ -78,9 +59,8 @@ class FeedbackAnalyzer:
         return (successful / len(executions)) * 100
     def generate_weekly_report(self, limit: Optional[int] = None) -> str:
         """週次レポートを生成."""
-        executions = self.load_executions(limit=limit or 50)
-        recent = executions[:7]
-        if not recent:
+        recent = self._synced_store().recent_summary(limit=min(7, limit or 50))
+        if not recent["count"]:
             return """
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 📊 週次パフォーマンスレポート
@@ -90,18 +70,16 @@ class FeedbackAnalyzer:
   uv run python3 -m app.main daily
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
-        wow_scores = [ex.wow_score for ex in recent if ex.wow_score]
-        avg_wow = sum(wow_scores) / len(wow_scores) if wow_scores else 0.0
+        avg_wow = recent["avg_wow"]
         success_rate = self.calculate_success_rate()
         hook_performance = self.analyze_hook_performance()
-        has_metrics = any(ex.wow_score is not None for ex in recent)
-        metrics_note = "" if has_metrics else "\n⚠️  品質メトリクスが未記録（CrewAI未使用またはデータ抽出エラー）\n"
+        metrics_note = "" if recent["has_metrics"] else "\n⚠️  品質メトリクスが未記録（CrewAI未使用またはデータ抽出エラー）\n"
         report = f"""
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 📊 週次パフォーマンスレポート
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 📈 全体統計
-  • 実行回数: {len(recent)} 回
+  • 実行回数: {recent['count']} 回
   • 成功率: {success_rate:.1f}%
   • 平均WOWスコア: {avg_wow:.2f}/10.0{metrics_note}
 🎯 フック戦略パフォーマンス
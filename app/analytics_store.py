@@ -0,0 +1,126 @@
+"""実行ログの集計ストア.
+セグメント化された実行ログを列単位のSQLiteテーブルへ差分同期します。フック別・トピック別の
+集計などのレポートはWorkflowResultを生成せず、このテーブルへの集計クエリから作成します。
+"""
+import logging
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from app.execution_log import SegmentedExecutionLog
+logger = logging.getLogger(__name__)
+DEFAULT_HOOK = "その他"
+DEFAULT_TOPIC = "一般"
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    seq INTEGER PRIMARY KEY,
+    run_id TEXT,
+    logged_at REAL,
+    success INTEGER NOT NULL,
+    hook TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    wow_score REAL,
+    retention REAL,
+    title TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_executions_logged ON executions (logged_at);
+DROP TABLE IF EXISTS hook_totals;
+DROP TABLE IF EXISTS topic_totals;
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+WINDOW = "(SELECT * FROM executions ORDER BY seq DESC LIMIT :limit)"
+def _source(limit: Optional[int]) -> str:
+    """集計対象（limit指定時は直近limit件、Noneは全期間）"""
+    return "executions" if limit is None else WINDOW
+class ExecutionAnalyticsStore:
+    """実行ログの列指向プロジェクション"""
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    def synced_sequence(self) -> int:
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'next_seq'").fetchone()
+        return row[0] if row else 0
+    def sync(self, log: SegmentedExecutionLog) -> int:
+        """実行ログの未同期分だけを取り込む
+        Returns:
+            取り込んだ件数
+        """
+        if log.count() <= self.synced_sequence():
+            return 0
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT value FROM sync_state WHERE key = 'next_seq'").fetchone()
+            next_seq = row[0] if row else 0
+            rows: List[Tuple] = []
+            for seq, logged_at, record in log.iter_raw(next_seq):
+                rows.append((
+                    seq,
+                    record.get("run_id"),
+                    logged_at,
+                    1 if record.get("success") else 0,
+                    record.get("hook_type") or DEFAULT_HOOK,
+                    record.get("topic") or DEFAULT_TOPIC,
+                    record.get("wow_score"),
+                    record.get("retention_prediction"),
+                    record.get("title"),
+                ))
+                next_seq = seq + 1
+            conn.executemany("INSERT OR REPLACE INTO executions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES ('next_seq', ?)", (next_seq,))
+        if rows:
+            logger.debug(f"Synced {len(rows)} executions into {self.db_path}")
+        return len(rows)
+    def hook_stats(self, limit: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """フック別の件数・WOW/リテンション合計（limit指定時は直近limit件、Noneは全期間）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT hook, COUNT(*) AS count, SUM(COALESCE(wow_score, 0)) AS total_wow, "
+                f"SUM(COALESCE(retention, 0)) AS total_retention FROM {_source(limit)} GROUP BY hook ORDER BY MAX(seq) DESC",
+                {"limit": limit},
+            ).fetchall()
+        return {
+            row["hook"]: {"count": row["count"], "total_wow": row["total_wow"], "total_retention": row["total_retention"]}
+            for row in rows
+        }
+    def topic_counts(self, limit: Optional[int] = None) -> Dict[str, int]:
+        """トピック別の件数（件数の多い順）"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT topic, COUNT(*) AS count FROM {_source(limit)} GROUP BY topic ORDER BY count DESC, MAX(seq) DESC",
+                {"limit": limit},
+            ).fetchall()
+        return {row["topic"]: row["count"] for row in rows}
+    def recent_summary(self, limit: int) -> Dict[str, float]:
+        """直近limit件の件数・平均WOW（0/未記録を除く）・WOW記録有無"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT COUNT(*) AS count, AVG(CASE WHEN wow_score THEN wow_score END) AS avg_wow, "
+                f"SUM(wow_score IS NOT NULL) AS with_metrics FROM {WINDOW}",
+                {"limit": limit},
+            ).fetchone()
+        return {"count": row["count"], "avg_wow": row["avg_wow"] or 0.0, "has_metrics": bool(row["with_metrics"])}
+    def top_sequences_by_wow(self, window: int, limit: int) -> List[int]:
+        """直近window件のうちWOWスコア上位limit件の通し番号"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT seq FROM {WINDOW} WHERE wow_score IS NOT NULL ORDER BY wow_score DESC, seq DESC LIMIT :top",
+                {"limit": window, "top": limit},
+            ).fetchall()
+        return [row["seq"] for row in rows]
@@ -1,15 +1,58 @@
 """API Key Rotation Manager
 複数のAPIキー（Gemini, Perplexity等）をプール管理し、
 障害時の自動切替とRate limit対策を実現します。
+キーごとのRPM/TPM/日次上限をトークンバケットとしてモデル化し、容量のあるキーにだけ
+リクエストを割り当てます（容量が無ければ最も早く空くキーの空きを待つ）。
+use_shared_state()を設定すると、これらの状態と日次クォータを同一ホストの全プロセスで共有します。
 """
+import hashlib
 import logging
 import os
+import math
 import random
+import threading
 import time
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from app.config.paths import ProjectPaths
+from app.rotation_state import SharedRotationState
 logger = logging.getLogger(__name__)
+SECONDS_PER_DAY = 86400.0
+class RateLimitExhausted(Exception):
+    """どのキーも許容待ち時間内に容量を確保できない"""
+@dataclass
+class RateLimits:
+    """キー1本あたりの上限（0は無制限）"""
+    rpm: int = 0
+    tpm: int = 0
+    rpd: int = 0
+@dataclass
+class TokenBucket:
+    """一定速度で補充されるトークンバケット（予約で残量が負になり得る）"""
+    capacity: float
+    refill_per_second: float
+    tokens: float = math.nan
+    updated_at: float = 0.0
+    def __post_init__(self):
+        if math.isnan(self.tokens):
+            self.tokens = self.capacity
+    def _refill(self, now: float) -> None:
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+            self.updated_at = now
+    def wait_time(self, amount: float, now: float) -> float:
+        """amount分の容量が確保できるまでの秒数（容量を超える要求は満杯になるまで）"""
+        self._refill(now)
+        deficit = min(amount, self.capacity) - self.tokens
+        return max(0.0, deficit / self.refill_per_second)
+    def consume(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= amount
+    def adjust(self, amount: float) -> None:
+        """実際の消費量との差分を反映（正で返却、負で追加消費）"""
+        self.tokens = min(self.capacity, self.tokens + amount)
 @dataclass
 class APIKey:
     """APIキー情報"""
@@ -22,6 +65,67 @@ class APIKey:
     rate_limit_until: Optional[datetime] = None
     total_calls: int = 0
     total_successes: int = 0
+    buckets: Dict[str, TokenBucket] = field(default_factory=dict, repr=False)
+    last_used_at: float = 0.0
+    def configure_limits(self, limits: RateLimits, now: float) -> None:
+        """RPM/TPM/日次上限からバケットを作成（0の項目はバケットを持たない）"""
+        windows = {"rpm": (limits.rpm, 60.0), "tpm": (limits.tpm, 60.0), "rpd": (limits.rpd, SECONDS_PER_DAY)}
+        self.buckets = {
+            name: TokenBucket(capacity=float(limit), refill_per_second=limit / window, updated_at=now)
+            for name, (limit, window) in windows.items()
+            if limit > 0
+        }
+    def capacity_wait(self, estimated_tokens: int, now: float) -> float:
+        """リクエスト1件（推定トークン数）を受け付けられるまでの秒数"""
+        return max((bucket.wait_time(self._demand(name, estimated_tokens), now) for name, bucket in self.buckets.items()), default=0.0)
+    def reserve(self, estimated_tokens: int, now: float) -> None:
+        for name, bucket in self.buckets.items():
+            bucket.consume(self._demand(name, estimated_tokens), now)
+    @staticmethod
+    def _demand(bucket_name: str, estimated_tokens: int) -> float:
+        return float(estimated_tokens) if bucket_name == "tpm" else 1.0
+    def cooldown_seconds(self) -> float:
+        """429やエラー連続による一時停止の残り秒数"""
+        now = datetime.now()
+        remaining = 0.0
+        if self.rate_limit_until and now < self.rate_limit_until:
+            remaining = (self.rate_limit_until - now).total_seconds()
+        if self.failure_count >= 5 and self.last_failure and now - self.last_failure < timedelta(minutes=10):
+            remaining = max(remaining, (self.last_failure + timedelta(minutes=10) - now).total_seconds())
+        return remaining
+    @property
+    def key_id(self) -> str:
+        """共有状態で使う識別子（キー本体は保存しない）"""
+        return hashlib.sha256(self.key.encode("utf-8")).hexdigest()[:16]
+    def to_state(self) -> Dict[str, Any]:
+        def _timestamp(value: Optional[datetime]) -> Optional[float]:
+            return value.timestamp() if value else None
+        return {
+            "failure_count": self.failure_count,
+            "last_failure": _timestamp(self.last_failure),
+            "last_success": _timestamp(self.last_success),
+            "rate_limit_until": _timestamp(self.rate_limit_until),
+            "total_calls": self.total_calls,
+            "total_successes": self.total_successes,
+            "last_used_at": self.last_used_at,
+            "buckets": {name: [bucket.tokens, bucket.updated_at] for name, bucket in self.buckets.items()},
+        }
+    def apply_state(self, state: Dict[str, Any]) -> None:
+        """他プロセスが保存した状態を反映（上限設定が無いバケットは無視）"""
+        def _datetime(value: Optional[float]) -> Optional[datetime]:
+            return datetime.fromtimestamp(value) if value else None
+        self.failure_count = state["failure_count"]
+        self.last_failure = _datetime(state["last_failure"])
+        self.last_success = _datetime(state["last_success"])
+        self.rate_limit_until = _datetime(state["rate_limit_until"])
+        self.total_calls = state["total_calls"]
+        self.total_successes = state["total_successes"]
+        self.last_used_at = state["last_used_at"]
+        for name, (tokens, updated_at) in state["buckets"].items():
+            bucket = self.buckets.get(name)
+            if bucket is not None:
+                bucket.tokens = min(bucket.capacity, tokens)
+                bucket.updated_at = updated_at
     @property
     def is_available(self) -> bool:
         """キーが使用可能か判定"""
@@ -53,6 +157,13 @@ class APIKey:
             self.rate_limit_until = datetime.now() + timedelta(minutes=5)
             key_identifier = self.key_name if self.key_name else self.provider
             logger.warning(f"{key_identifier} key rate limited until {self.rate_limit_until}")
+def _usage_tokens(result: Any) -> Optional[int]:
+    """LiteLLM形式の応答からusage.total_tokensを取り出す（無ければNone）"""
+    usage = result.get("usage") if isinstance(result, dict) else getattr(result, "usage", None)
+    if usage is None:
+        return None
+    total = usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+    return int(total) if isinstance(total, (int, float)) else None
 class APIKeyRotationManager:
     """APIキーローテーション管理クラス"""
     def __init__(self):
@@ -62,6 +173,41 @@ class APIKeyRotationManager:
         self.gemini_daily_calls: int = 0
         self.last_quota_reset_date: Optional[datetime] = None
         self._gemini_current_key_index: int = 0
+        self.rate_limits: Dict[str, RateLimits] = {}
+        self.max_queue_seconds: float = 60.0
+        self.queue_stats: Dict[str, Dict[str, float]] = {}
+        self.shared_state: Optional[SharedRotationState] = None
+        self._lock = threading.RLock()
+        self._clock: Callable[[], float] = time.time
+    def use_shared_state(self, shared_state: Optional[SharedRotationState]):
+        """キーの健全性・バケット残量・日次クォータをプロセス間で共有する（Noneで無効化）"""
+        self.shared_state = shared_state
+        if shared_state is not None:
+            logger.info(f"Sharing API key rotation state via {shared_state.db_path}")
+    @contextmanager
+    def _synchronized(self, provider: str) -> Iterator[None]:
+        """状態の読み込み→更新→書き戻しを排他的に行う
+        共有状態が無ければスレッドロックのみ。共有状態があればSQLiteの書き込みトランザクション内で
+        他プロセスの最新状態を反映してからブロックを実行し、正常終了時に書き戻します。
+        """
+        with self._lock:
+            if self.shared_state is None:
+                yield
+                return
+            keys = self.key_pools.get(provider, [])
+            with self.shared_state.transaction() as conn:
+                states = self.shared_state.load_keys(conn, provider)
+                for key in keys:
+                    if key.key_id in states:
+                        key.apply_state(states[key.key_id])
+                day = datetime.now().date().isoformat()
+                if provider == "gemini":
+                    self.gemini_daily_calls = self.shared_state.load_quota(conn, provider, day)
+                    self.last_quota_reset_date = datetime.now()
+                yield
+                self.shared_state.save_keys(conn, provider, {key.key_id: key.to_state() for key in keys})
+                if provider == "gemini":
+                    self.shared_state.save_quota(conn, provider, day, self.gemini_daily_calls)
     def _check_and_reset_daily_quota(self):
         """日次クォータをチェックし、必要であればリセットする"""
         now = datetime.now()
@@ -73,6 +219,20 @@ class APIKeyRotationManager:
         """Gemini APIの日次クォータ制限を設定する"""
         self.gemini_daily_quota_limit = limit
         logger.info(f"Gemini daily quota limit set to {limit}")
+    def set_rate_limits(self, provider: str, limits: RateLimits, max_queue_seconds: Optional[float] = None):
+        """キー1本あたりの上限を設定（登録済み・今後登録するキーの両方に適用）
+        Args:
+            provider: プロバイダー名
+            limits: RPM/TPM/日次上限
+            max_queue_seconds: 容量待ちの上限秒数（超える場合はRateLimitExhausted）
+        """
+        with self._lock:
+            self.rate_limits[provider] = limits
+            if max_queue_seconds is not None:
+                self.max_queue_seconds = max_queue_seconds
+            for key in self.key_pools.get(provider, []):
+                key.configure_limits(limits, self._clock())
+        logger.info(f"{provider} rate limits per key: rpm={limits.rpm} tpm={limits.tpm} rpd={limits.rpd}")
     def register_keys(self, provider: str, keys_with_names: List[tuple[str, str]]):
         """APIキーを登録
         Args:
@@ -87,6 +247,9 @@ class APIKeyRotationManager:
             if key_value:
                 self.key_pools[provider].append(APIKey(key=key_value, provider=provider, key_name=key_name))
         self.current_indices[provider] = 0
+        if provider in self.rate_limits:
+            for key in self.key_pools[provider]:
+                key.configure_limits(self.rate_limits[provider], self._clock())
         logger.info(f"Registered {len(self.key_pools[provider])} keys for {provider}")
         if provider == "gemini":
             self._gemini_current_key_index = 0
@@ -154,26 +317,51 @@ class APIKeyRotationManager:
         provider: str,
         api_call: Callable[[str], Any],
         max_attempts: int = None,
+        estimated_tokens: int = 0,
+        exclude_keys: Optional[Iterable[str]] = None,
     ) -> Any:
         """キーローテーションを使用してAPI呼び出しを実行
         Args:
             provider: プロバイダー名
             api_call: API呼び出し関数 (引数: api_key, 戻り値: Any)
             max_attempts: 最大試行回数（Noneの場合はキー数と同じ）
+            estimated_tokens: TPM上限の判定に使う推定トークン数
+            exclude_keys: 使用中のため避けたいキー（他に候補が無くなった場合は使う）
         Returns:
             API呼び出しの結果
         Raises:
+            RateLimitExhausted: どのキーも許容待ち時間内に容量が空かない場合
             Exception: すべてのキーで失敗した場合
         """
+        max_attempts = self._begin_rotation(provider, max_attempts)
+        last_exception = None
+        attempted_keys = set(exclude_keys or ())
+        for attempt in range(max_attempts):
+            key_obj, queue_delay = self._reserve_key(provider, attempted_keys, estimated_tokens)
+            if queue_delay:
+                time.sleep(queue_delay)
+            key_identifier = key_obj.key_name if key_obj.key_name else provider
+            try:
+                logger.info(f"Attempting API call with {key_identifier} (attempt {attempt + 1}/{max_attempts})")
+                result = api_call(key_obj.key)
+                self._record_success(provider, key_obj, estimated_tokens, result)
+                return result
+            except Exception as e:
+                last_exception = e
+                wait_time = self._record_failure(key_obj, e, attempt, max_attempts)
+                if wait_time:
+                    time.sleep(wait_time)
+        logger.error(f"All {provider} API attempts failed")
+        raise last_exception or Exception(f"All {provider} keys exhausted")
+    def _begin_rotation(self, provider: str, max_attempts: Optional[int]) -> int:
+        """登録キーと日次クォータを確認し、試行回数を決定"""
         if provider not in self.key_pools or not self.key_pools[provider]:
             raise ValueError(f"No keys registered for {provider}")
-        if max_attempts is None:
-            max_attempts = len(self.key_pools[provider])
-        last_exception = None
-        attempted_keys = set()
         if provider == "gemini":
-            self._check_and_reset_daily_quota()
-            if self.gemini_daily_quota_limit > 0 and self.gemini_daily_calls >= self.gemini_daily_quota_limit:
+            with self._synchronized(provider):
+                self._check_and_reset_daily_quota()
+                daily_calls = self.gemini_daily_calls
+            if self.gemini_daily_quota_limit > 0 and daily_calls >= self.gemini_daily_quota_limit:
                 error_msg = (
                     f"Gemini daily quota ({self.gemini_daily_quota_limit}) exceeded. "
                     f"Current calls: {self.gemini_daily_calls}. "
@@ -181,39 +369,77 @@ class APIKeyRotationManager:
                 )
                 logger.error(error_msg)
                 raise Exception(error_msg)
-        for attempt in range(max_attempts):
-            key_obj = self.get_best_key(provider)
-            if not key_obj or key_obj.key in attempted_keys:
+        if max_attempts is None:
+            max_attempts = len(self.key_pools[provider])
+        return max_attempts
+    def _reserve_key(self, provider: str, attempted_keys: set, estimated_tokens: int = 0) -> Tuple[APIKey, float]:
+        """最も早く容量が空く未試行キーを選び、その容量を予約する
+        バケットの予約は即時に行うため、並行するリクエストは後続ほど長く待つ形で順番に割り当てられます。
+        429/連続失敗による一時停止中のキーは、最大でもmax_queue_seconds待ってから試します。
+        Returns:
+            (選択したキー, 呼び出し前に待つ秒数)
+        """
+        with self._synchronized(provider):
+            keys = [k for k in self.key_pools[provider] if k.key not in attempted_keys]
+            if not keys:
                 logger.warning(f"All {provider} keys attempted, retrying from start")
                 attempted_keys.clear()
-                key_obj = self.get_best_key(provider)
-            if not key_obj:
-                raise Exception(f"No available keys for {provider}")
+                keys = list(self.key_pools[provider])
+            now = self._clock()
+            schedule = []
+            for index, key in enumerate(keys):
+                capacity_wait = key.capacity_wait(estimated_tokens, now)
+                ready_in = max(capacity_wait, min(key.cooldown_seconds(), self.max_queue_seconds))
+                schedule.append((ready_in, -key.success_rate, key.last_used_at, index, capacity_wait, key))
+            ready_in, _, _, _, capacity_wait, key_obj = min(schedule)
+            if capacity_wait > self.max_queue_seconds:
+                raise RateLimitExhausted(
+                    f"No {provider} key has capacity within {self.max_queue_seconds:.0f}s "
+                    f"(earliest in {capacity_wait:.0f}s)"
+                )
+            key_obj.reserve(estimated_tokens, now)
+            key_obj.last_used_at = now + ready_in
             attempted_keys.add(key_obj.key)
+            stats = self.queue_stats.setdefault(
+                provider, {"requests": 0, "queued": 0, "total_wait_seconds": 0.0, "max_wait_seconds": 0.0, "last_wait_seconds": 0.0}
+            )
+            stats["requests"] += 1
+            stats["last_wait_seconds"] = ready_in
+            if ready_in > 0:
+                stats["queued"] += 1
+                stats["total_wait_seconds"] += ready_in
+                stats["max_wait_seconds"] = max(stats["max_wait_seconds"], ready_in)
+        if ready_in > 0:
             key_identifier = key_obj.key_name if key_obj.key_name else provider
-            try:
-                logger.info(f"Attempting API call with {key_identifier} (attempt {attempt + 1}/{max_attempts})")
-                result = api_call(key_obj.key)
-                key_obj.mark_success()
-                logger.info(f"API call succeeded with {key_identifier}")
-                if provider == "gemini":
-                    self.gemini_daily_calls += 1
-                    logger.debug(f"Gemini daily calls: {self.gemini_daily_calls}/{self.gemini_daily_quota_limit}")
-                return result
-            except Exception as e:
-                error_str = str(e).lower()
-                is_rate_limit = any(
-                    keyword in error_str for keyword in ["429", "rate limit", "quota", "too many requests"]
-                )
-                key_obj.mark_failure(is_rate_limit=is_rate_limit)
-                last_exception = e
-                logger.warning(f"{key_identifier} API call failed (attempt {attempt + 1}/{max_attempts}): {e}")
-                if not is_rate_limit and attempt < max_attempts - 1:
-                    wait_time = min(2**attempt, 10)
-                    logger.info(f"Waiting {wait_time}s before next attempt...")
-                    time.sleep(wait_time)
-        logger.error(f"All {provider} API attempts failed")
-        raise last_exception or Exception(f"All {provider} keys exhausted")
+            logger.info(f"Queueing {provider} request for {ready_in:.1f}s until {key_identifier} has capacity")
+        return key_obj, ready_in
+    def _record_success(self, provider: str, key_obj: APIKey, estimated_tokens: int = 0, result: Any = None) -> None:
+        actual_tokens = _usage_tokens(result)
+        with self._synchronized(provider):
+            key_obj.mark_success()
+            tpm_bucket = key_obj.buckets.get("tpm")
+            if tpm_bucket is not None and actual_tokens is not None:
+                tpm_bucket.adjust(estimated_tokens - actual_tokens)
+            if provider == "gemini":
+                self._check_and_reset_daily_quota()
+                self.gemini_daily_calls += 1
+        key_identifier = key_obj.key_name if key_obj.key_name else provider
+        logger.info(f"API call succeeded with {key_identifier}")
+        if provider == "gemini":
+            logger.debug(f"Gemini daily calls: {self.gemini_daily_calls}/{self.gemini_daily_quota_limit}")
+    def _record_failure(self, key_obj: APIKey, error: Exception, attempt: int, max_attempts: int) -> float:
+        """失敗を記録し、次の試行までの待機秒数を返す（レート制限時はキーを切り替えるので待たない）"""
+        error_str = str(error).lower()
+        is_rate_limit = any(keyword in error_str for keyword in ["429", "rate limit", "quota", "too many requests"])
+        with self._synchronized(key_obj.provider):
+            key_obj.mark_failure(is_rate_limit=is_rate_limit)
+        key_identifier = key_obj.key_name if key_obj.key_name else key_obj.provider
+        logger.warning(f"{key_identifier} API call failed (attempt {attempt + 1}/{max_attempts}): {error}")
+        if is_rate_limit or attempt >= max_attempts - 1:
+            return 0
+        wait_time = min(2**attempt, 10)
+        logger.info(f"Waiting {wait_time}s before next attempt...")
+        return wait_time
     def get_stats(self, provider: str = None) -> Dict[str, Any]:
         """統計情報を取得
         Args:
@@ -225,6 +451,7 @@ class APIKeyRotationManager:
             if provider not in self.key_pools:
                 return {}
             keys = self.key_pools[provider]
+            now = self._clock()
             return {
                 "provider": provider,
                 "total_keys": len(keys),
@@ -232,12 +459,15 @@ class APIKeyRotationManager:
                 "total_calls": sum(k.total_calls for k in keys),
                 "total_successes": sum(k.total_successes for k in keys),
                 "average_success_rate": sum(k.success_rate for k in keys) / len(keys) if keys else 0,
+                "queue": dict(self.queue_stats.get(provider, {})),
                 "keys": [
                     {
                         "success_rate": k.success_rate,
                         "total_calls": k.total_calls,
                         "failure_count": k.failure_count,
                         "is_available": k.is_available,
+                        "ready_in_seconds": max(k.capacity_wait(0, now), k.cooldown_seconds()),
+                        "remaining": {name: round(bucket.tokens, 2) for name, bucket in k.buckets.items()},
                     }
                     for k in keys
                 ],
@@ -286,6 +516,11 @@ def initialize_api_infrastructure() -> APIKeyRotationManager:
         logger.warning("No Gemini API keys found in environment")
     if settings.gemini_daily_quota_limit > 0:
         manager.set_gemini_daily_quota_limit(settings.gemini_daily_quota_limit)
+    if settings.api_shared_state_path:
+        # 作業ディレクトリの異なるサブプロセスやスクリプトとも同じDBを共有するためプロジェクト基準で解決
+        manager.use_shared_state(SharedRotationState(str(ProjectPaths.resolve_relative(settings.api_shared_state_path))))
+    for provider, limits in settings.api_rate_limits.items():
+        manager.set_rate_limits(provider, RateLimits(**limits), max_queue_seconds=settings.api_max_queue_seconds)
     perplexity_keys_with_names = []
     for i in range(1, 10):
         key_name = f"PERPLEXITY_API_KEY_{i}" if i > 1 else "PERPLEXITY_API_KEY"
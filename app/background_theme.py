@@ -12,6 +12,8 @@ from dataclasses import asdict, dataclass
 from datetime import datetime
 from typing import Dict, List, Optional, Tuple
 
+from .write_behind import WriteBehindStore
+
 logger = logging.getLogger(__name__)
 
 
@@ -66,6 +68,7 @@ class BackgroundThemeManager:
         self.themes_file = themes_file
         self.themes: Dict[str, BackgroundTheme] = {}
         self.analytics_file = "data/background_analytics.json"
+        self._analytics_store: Optional[WriteBehindStore] = None
         self._load_themes()
         self._load_analytics()
 
@@ -223,46 +226,48 @@ class BackgroundThemeManager:
             logger.error(f"Failed to save themes: {e}")
 
     def _load_analytics(self):
-        """アナリティクスデータを読み込み"""
-        if os.path.exists(self.analytics_file):
-            try:
-                with open(self.analytics_file, "r", encoding="utf-8") as f:
-                    analytics = json.load(f)
-                    for name, stats in analytics.items():
-                        if name in self.themes:
-                            theme = self.themes[name]
-                            theme.usage_count = stats.get("usage_count", 0)
-                            theme.positive_feedback = stats.get("positive_feedback", 0)
-                            theme.negative_feedback = stats.get("negative_feedback", 0)
-                            theme.avg_view_duration = stats.get("avg_view_duration", 0.0)
-                            theme.avg_retention_rate = stats.get("avg_retention_rate", 0.0)
-                            theme.last_used = stats.get("last_used")
-                logger.info(f"Loaded analytics for {len(analytics)} themes")
-            except Exception as e:
-                logger.error(f"Failed to load analytics: {e}")
+        """アナリティクスデータを読み込み（スナップショット + 未反映のジャーナル）"""
+        try:
+            self._analytics_store = WriteBehindStore(self.analytics_file)
+            analytics = self._analytics_store.snapshot()
+            for name, stats in analytics.items():
+                if name in self.themes:
+                    theme = self.themes[name]
+                    theme.usage_count = stats.get("usage_count", 0)
+                    theme.positive_feedback = stats.get("positive_feedback", 0)
+                    theme.negative_feedback = stats.get("negative_feedback", 0)
+                    theme.avg_view_duration = stats.get("avg_view_duration", 0.0)
+                    theme.avg_retention_rate = stats.get("avg_retention_rate", 0.0)
+                    theme.last_used = stats.get("last_used")
+            logger.info(f"Loaded analytics for {len(analytics)} themes")
+        except Exception as e:
+            logger.error(f"Failed to load analytics: {e}")
 
-    def _save_analytics(self):
-        """アナリティクスデータを保存"""
-        os.makedirs(
-            os.path.dirname(self.analytics_file) if os.path.dirname(self.analytics_file) else ".", exist_ok=True
-        )
+    def _save_analytics(self, theme_name: str):
+        """変更したテーマのアナリティクスをジャーナルに記録（スナップショットは後でまとめて保存）"""
+        if self._analytics_store is None:
+            return
+        theme = self.themes[theme_name]
         try:
-            analytics = {}
-            for name, theme in self.themes.items():
-                analytics[name] = {
+            self._analytics_store.put(
+                theme_name,
+                {
                     "usage_count": theme.usage_count,
                     "positive_feedback": theme.positive_feedback,
                     "negative_feedback": theme.negative_feedback,
                     "avg_view_duration": theme.avg_view_duration,
                     "avg_retention_rate": theme.avg_retention_rate,
                     "last_used": theme.last_used,
-                }
-
-            with open(self.analytics_file, "w", encoding="utf-8") as f:
-                json.dump(analytics, f, indent=2, ensure_ascii=False)
+                },
+            )
         except Exception as e:
             logger.error(f"Failed to save analytics: {e}")
 
+    def flush_analytics(self):
+        """未保存のアナリティクスを即座にファイルへ書き出す"""
+        if self._analytics_store is not None:
+            self._analytics_store.flush()
+
     def get_theme(self, name: str) -> Optional[BackgroundTheme]:
         """テーマを取得"""
         return self.themes.get(name)
@@ -309,7 +314,7 @@ class BackgroundThemeManager:
             theme = self.themes[theme_name]
             theme.usage_count += 1
             theme.last_used = datetime.now().isoformat()
-            self._save_analytics()
+            self._save_analytics(theme_name)
             logger.info(f"Recorded usage for theme: {theme_name} (total: {theme.usage_count})")
 
     def record_feedback(self, theme_name: str, positive: bool):
@@ -320,7 +325,7 @@ class BackgroundThemeManager:
                 theme.positive_feedback += 1
             else:
                 theme.negative_feedback += 1
-            self._save_analytics()
+            self._save_analytics(theme_name)
             logger.info(f"Recorded {'positive' if positive else 'negative'} feedback for: {theme_name}")
 
     def update_performance_metrics(self, theme_name: str, view_duration: float, retention_rate: float):
@@ -337,7 +342,7 @@ class BackgroundThemeManager:
                 theme.avg_view_duration = view_duration
                 theme.avg_retention_rate = retention_rate
 
-            self._save_analytics()
+            self._save_analytics(theme_name)
             logger.info(
                 f"Updated metrics for {theme_name}: duration={view_duration:.1f}s, retention={retention_rate:.1f}%"
             )
@@ -46,6 +46,11 @@ class VideoReviewConfig(BaseModel):
     enabled: bool = True
     screenshot_interval_seconds: int = 60
     max_screenshots: int = 15
+    screenshot_max_width: int = 768
+    screenshot_workers: int = 4
+    screenshot_keyframe_only: bool = True
+    dedup_enabled: bool = True
+    dedup_max_distance: int = 6
     output_dir: str = "output/video_reviews"
     model: str = "gemini-2.5-flash-preview-09-2025"
     temperature: float = 0.4
@@ -66,6 +71,42 @@ class CrewConfig(BaseModel):
 class ScriptGenerationConfig(BaseModel):
     """Script generation feature flags."""
     quality_gate_llm_enabled: bool = True
+class UploadConfig(BaseModel):
+    """Drive/YouTubeへのレジューム可能アップロード設定"""
+    chunk_size_mb: int = 8
+    max_parallel: int = 4
+    max_retries: int = 5
+    session_store: str = "data/upload_sessions.json"
+class LLMCacheConfig(BaseModel):
+    """LLM応答キャッシュ設定"""
+    enabled: bool = True
+    path: str = "data/llm_cache.sqlite3"
+    ttl_hours: float = 24.0
+    max_entries: int = 5000
+    max_size_mb: float = 256.0
+class LLMLoggingConfig(BaseModel):
+    """LLMプロンプト/応答ログの書き込み設定"""
+    queue_size: int = 1000
+    batch_size: int = 50
+    flush_interval_seconds: float = 1.0
+    max_segment_mb: float = 32.0
+    max_segment_hours: float = 24.0
+    compression: str = "gzip"
+    overflow: str = "drop"
+    block_timeout_seconds: float = 5.0
+    retention_segments: int = 30
+class LLMHedgingConfig(BaseModel):
+    """遅いLLM呼び出しの複製（ヘッジ）設定"""
+    enabled: bool = False
+    call_sites: List[str] = Field(default_factory=lambda: ["script_generation"])
+    percentile: float = 95.0
+    min_samples: int = 20
+    window: int = 200
+    initial_delay_seconds: float = 45.0
+    min_delay_seconds: float = 2.0
+    max_extra_ratio: float = 0.1
+    burst: int = 2
+    hedge_model: Optional[str] = None
 class MediaQAGatingConfig(BaseModel):
     """QAゲートの挙動設定"""
     enforce: bool = True
@@ -73,6 +114,8 @@ class MediaQAGatingConfig(BaseModel):
     fail_on_missing_inputs: bool = True
     retry_attempts: int = 1
     retry_start_step: str = "script_generation"
+    audio_retry_start_step: str = "audio_synthesis"
+    subtitle_retry_start_step: str = "audio_transcription"
 class AudioQAConfig(BaseModel):
     """音声品質チェック設定"""
     enabled: bool = True
@@ -87,6 +130,15 @@ class VideoQAConfig(BaseModel):
     min_fps: float = 24.0
     max_fps: float = 61.0
     min_bitrate_kbps: int = 3200
+    content_analysis: bool = True
+    max_black_seconds: float = 2.0
+    freeze_min_seconds: float = 5.0
+    max_freeze_seconds: float = 15.0
+    max_av_drift_seconds: float = 0.5
+    sampled_analysis_min_seconds: float = 1800.0
+    sample_windows: int = 6
+    sample_window_seconds: float = 20.0
+    content_analysis_timeout_seconds: float = 900.0
 class SubtitleQAConfig(BaseModel):
     """字幕品質チェック設定"""
     enabled: bool = True
@@ -135,6 +187,10 @@ class AppSettings(BaseModel):
     ffmpeg_path: str = "ffmpeg"
     enable_stock_footage: bool = False
     stock_footage_clips_per_video: int = 5
+    stock_footage_parallel_preprocess: bool = False
+    stock_footage_preprocess_workers: int = 0
+    stock_footage_prefetch: bool = True
+    stock_footage_prefetch_deadline_seconds: float = 30.0
     tts_voice_configs: Dict[str, SpeakerConfig] = Field(default_factory=dict)
     use_crewai_script_generation: bool = True
     use_three_stage_quality_check: bool = True
@@ -143,11 +199,18 @@ class AppSettings(BaseModel):
     media_quality: MediaQAConfig = Field(default_factory=MediaQAConfig)
     gemini_models: GeminiModelConfig = Field(default_factory=GeminiModelConfig)
     script_generation: ScriptGenerationConfig = Field(default_factory=ScriptGenerationConfig)
+    upload: UploadConfig = Field(default_factory=UploadConfig)
+    llm_cache: LLMCacheConfig = Field(default_factory=LLMCacheConfig)
+    llm_logging: LLMLoggingConfig = Field(default_factory=LLMLoggingConfig)
+    llm_hedging: LLMHedgingConfig = Field(default_factory=LLMHedgingConfig)
     google_sheet_id: Optional[str] = None
     google_credentials_json: Optional[Dict[str, Any]] = None
     google_drive_folder_id: Optional[str] = None
     discord_webhook_url: Optional[str] = None
     gemini_daily_quota_limit: int = 0
+    api_rate_limits: Dict[str, Dict[str, int]] = Field(default_factory=dict)
+    api_max_queue_seconds: float = 60.0
+    api_shared_state_path: Optional[str] = "data/api_rotation.sqlite3"
     newsapi_key: Optional[str] = None
     save_local_backup: bool = False
     @property
@@ -231,6 +294,22 @@ class AppSettings(BaseModel):
             config["script_generation"] = ScriptGenerationConfig(**config["script_generation"])
         else:
             config["script_generation"] = ScriptGenerationConfig()
+        if "upload" in config:
+            config["upload"] = UploadConfig(**config["upload"])
+        else:
+            config["upload"] = UploadConfig()
+        if "llm_cache" in config:
+            config["llm_cache"] = LLMCacheConfig(**config["llm_cache"])
+        else:
+            config["llm_cache"] = LLMCacheConfig()
+        if "llm_logging" in config:
+            config["llm_logging"] = LLMLoggingConfig(**config["llm_logging"])
+        else:
+            config["llm_logging"] = LLMLoggingConfig()
+        if "llm_hedging" in config:
+            config["llm_hedging"] = LLMHedgingConfig(**config["llm_hedging"])
+        else:
+            config["llm_hedging"] = LLMHedgingConfig()
         if "quality_thresholds" in config:
             config["quality"] = QualityThresholds(**config.pop("quality_thresholds"))
         else:
@@ -248,6 +327,10 @@ class AppSettings(BaseModel):
             config["enable_stock_footage"] = config["stock_footage"].get("enabled", False)
             config["stock_footage_clips_per_video"] = config["stock_footage"].get("clips_per_video", 5)
             config["ffmpeg_path"] = config["stock_footage"].get("ffmpeg_path", "ffmpeg")
+            config["stock_footage_parallel_preprocess"] = config["stock_footage"].get("parallel_preprocess", False)
+            config["stock_footage_preprocess_workers"] = config["stock_footage"].get("preprocess_workers", 0)
+            config["stock_footage_prefetch"] = config["stock_footage"].get("prefetch", True)
+            config["stock_footage_prefetch_deadline_seconds"] = config["stock_footage"].get("prefetch_deadline_seconds", 30.0)
         ffmpeg_candidate = config.get("ffmpeg_path", "ffmpeg")
         if not shutil.which(ffmpeg_candidate):
             module_name = "imageio_ffmpeg"
@@ -285,6 +368,9 @@ class AppSettings(BaseModel):
         config["newsapi_key"] = os.getenv("NEWSAPI_API_KEY")
         if "api" in config:
             config["gemini_daily_quota_limit"] = config["api"].get("gemini_daily_quota_limit", 0)
+            config["api_rate_limits"] = config["api"].get("rate_limits") or {}
+            config["api_max_queue_seconds"] = config["api"].get("max_queue_seconds", 60.0)
+            config["api_shared_state_path"] = config["api"].get("shared_state", "data/api_rotation.sqlite3")
         if "gemini_models" not in config:
             config["gemini_models"] = {}
         if "backup" in config:
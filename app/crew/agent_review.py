@@ -12,15 +12,16 @@ import logging
 import os
 import re
 from datetime import datetime
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from pydantic import BaseModel, Field
 
 from app.config.settings import settings
-from app.adapters.llm import extract_structured_json
+from app.json_extraction import extract_json
 from app.crew.tools.ai_clients import GeminiClient
 from app.logging_config import WorkflowLogger
 from app.prompt_cache import get_prompt_manager
+from app.write_behind import WriteBehindStore
 
 logger = logging.getLogger(__name__)
 workflow_logger = WorkflowLogger(__name__)
@@ -56,46 +57,43 @@ class AgentReviewResult(BaseModel):
 
 
 class AgentReviewStorage:
-    """Persistence layer for agent reviews."""
+    """Persistence layer for agent reviews.
+
+    Each appended review journals only the touched agent bucket; the full JSON
+    snapshot is written behind on a timer and at interpreter exit.
+    """
 
     def __init__(self, storage_path: str = "data/agent_reviews.json") -> None:
         self.storage_path = storage_path
-        self._data: Dict[str, Dict[str, object]] = self._load()
-
-    def _load(self) -> Dict[str, Dict[str, object]]:
-        if not os.path.exists(self.storage_path):
-            return {}
-        try:
-            with open(self.storage_path, "r", encoding="utf-8") as handle:
-                data = json.load(handle)
-                if isinstance(data, dict):
-                    return data
-        except (OSError, ValueError) as exc:
-            logger.warning("Failed to load agent review storage: %s", exc)
-        return {}
+        self._store = WriteBehindStore(storage_path)
+        self._data: Dict[str, Dict[str, object]] = self._store.snapshot()
 
     def save(self) -> None:
-        os.makedirs(os.path.dirname(self.storage_path) or ".", exist_ok=True)
-        with open(self.storage_path, "w", encoding="utf-8") as handle:
-            json.dump(self._data, handle, ensure_ascii=False, indent=2)
+        self._store.flush()
 
     def append(self, result: AgentReviewResult) -> None:
         payload = result.model_dump(mode="json")
-        agent_bucket = self._data.setdefault(result.agent_key, {"history": []})
-        history: List[dict] = agent_bucket.setdefault("history", [])  # type: ignore[assignment]
-        history.append(payload)
-        # Keep the history bounded to avoid unbounded file growth.
-        if len(history) > 100:
-            del history[:-100]
-
-        recent_scores = [entry.get("score", 0) for entry in history[-5:]]
-        avg_score = round(sum(recent_scores) / len(recent_scores), 2) if recent_scores else 0.0
-        agent_bucket["rolling_average"] = avg_score
-        focus = self._collect_focus_from_history(history)
-        if focus:
-            agent_bucket["latest_focus"] = focus
-        agent_bucket["last_verdict"] = result.verdict
-        agent_bucket["last_updated"] = result.created_at.isoformat()
+
+        def merge(agent_bucket: Optional[Dict[str, object]]) -> Dict[str, object]:
+            # Merge into the latest stored bucket so concurrent writers keep each other's entries.
+            agent_bucket = agent_bucket or {"history": []}
+            history: List[dict] = agent_bucket.setdefault("history", [])  # type: ignore[assignment]
+            history.append(payload)
+            # Keep the history bounded to avoid unbounded file growth.
+            if len(history) > 100:
+                del history[:-100]
+
+            recent_scores = [entry.get("score", 0) for entry in history[-5:]]
+            avg_score = round(sum(recent_scores) / len(recent_scores), 2) if recent_scores else 0.0
+            agent_bucket["rolling_average"] = avg_score
+            focus = self._collect_focus_from_history(history)
+            if focus:
+                agent_bucket["latest_focus"] = focus
+            agent_bucket["last_verdict"] = result.verdict
+            agent_bucket["last_updated"] = result.created_at.isoformat()
+            return agent_bucket
+
+        self._data[result.agent_key] = self._store.update(result.agent_key, merge)
 
     def get_focus_notes(self, agent_key: str, max_items: int = 3) -> Optional[str]:
         agent_bucket = self._data.get(agent_key)
@@ -187,13 +185,23 @@ class AgentReviewCycle:
 
     def run(self, tasks: Dict[str, "Task"]) -> Dict[str, AgentReviewResult]:
         """Execute post-run reviews for the provided tasks."""
+        results: Dict[str, AgentReviewResult] = {}
+        for agent_key, task_name, task, task_output, agent_config in self._reviewable(tasks):
+            try:
+                review = self._evaluate_single(agent_key, task_name, task, task_output, agent_config)
+            except Exception as exc:  # pragma: no cover - logged for visibility
+                logger.warning("Agent review failed for %s (%s): %s", agent_key, task_name, exc)
+                continue
+            if review:
+                results[agent_key] = review
+        return self._store_results(results)
+
+    def _reviewable(self, tasks: Dict[str, "Task"]) -> Iterator[Tuple[str, str, "Task", str, Dict[str, object]]]:
         if not self.enabled:
             logger.debug("Agent review cycle disabled or Gemini key missing; skipping.")
-            return {}
+            return
         if not self._client:
-            return {}
-
-        results: Dict[str, AgentReviewResult] = {}
+            return
         for task_name, task in tasks.items():
             agent_key = self._resolve_agent_key(task)
             if not agent_key:
@@ -206,17 +214,11 @@ class AgentReviewCycle:
             if not task_output:
                 logger.debug("Task %s output is empty; skipping review", task_name)
                 continue
-            agent_config = self._agents_config.get(agent_key, {})
-            try:
-                review = self._evaluate_single(agent_key, task_name, task, str(task_output), agent_config)
-            except Exception as exc:  # pragma: no cover - logged for visibility
-                logger.warning("Agent review failed for %s (%s): %s", agent_key, task_name, exc)
-                continue
-            if review:
-                self.storage.append(review)
-                results[agent_key] = review
-        if results:
-            self.storage.save()
+            yield agent_key, task_name, task, str(task_output), self._agents_config.get(agent_key, {})
+
+    def _store_results(self, results: Dict[str, AgentReviewResult]) -> Dict[str, AgentReviewResult]:
+        for review in results.values():
+            self.storage.append(review)
         return results
 
     def _resolve_agent_key(self, task: "Task") -> Optional[str]:
@@ -245,7 +247,16 @@ class AgentReviewCycle:
         # Geminiへ評価リクエスト
         prompt = self._build_prompt(agent_key, task_name, task, task_output, agent_config)
         response_text = self._client.generate_structured(prompt)
+        return self._build_result(agent_key, task_name, task, agent_config, response_text)
 
+    def _build_result(
+        self,
+        agent_key: str,
+        task_name: str,
+        task: "Task",
+        agent_config: Dict[str, object],
+        response_text: object,
+    ) -> AgentReviewResult:
         # GeminiClientがdictを返す場合とstrを返す場合を吸収
         if isinstance(response_text, dict):
             response = response_text
@@ -382,32 +393,17 @@ def parse_json_from_gemini(response_text: str, agent_key: str) -> dict:
     # RAW出力を許可するエージェント
     RAW_OUTPUT_AGENTS = ["script_writer", "japanese_purity_polisher"]
 
+    parsed = extract_json(response_text)
+    if parsed is not None:
+        return parsed
+
     # RAW出力許可エージェントの場合、JSONパース失敗を許容
     if agent_key in RAW_OUTPUT_AGENTS:
-        # プレーンテキストとして返す
-        text = response_text.strip()
-        if text.startswith("{") or text.startswith("["):
-            # Defer to structured parsing below.
-            pass
-        else:
-            candidate = extract_structured_json(response_text)
-            if candidate is None:
-                logger.info(f"{agent_key}: RAW text output detected")
-                return {"raw_output": text, "success": True}
-            response_text = candidate
-
-    # JSON パース試行
-    try:
-        candidate = extract_structured_json(response_text)
-        if candidate is None:
-            raise json.JSONDecodeError("No JSON object found", response_text, 0)
-        return json.loads(candidate)
-    except json.JSONDecodeError as e:
-        if agent_key in RAW_OUTPUT_AGENTS:
-            # RAW出力として許容
-            return {"raw_output": response_text, "success": True}
-        logger.error(f"Failed to parse JSON from {agent_key}: {e}")
-        raise
+        logger.info(f"{agent_key}: RAW text output detected")
+        return {"raw_output": response_text.strip(), "success": True}
+    error = json.JSONDecodeError("No JSON object found", response_text, 0)
+    logger.error(f"Failed to parse JSON from {agent_key}: {error}")
+    raise error
 
 
 try:  # Optional import for type checking without creating a hard runtime dependency
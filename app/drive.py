@@ -3,22 +3,40 @@ import logging
 import os
 import shutil
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
 from app.config.paths import ProjectPaths
+from app.resumable_upload import ResumableUploader, ResumableUploadError, get_upload_session_store
 from .config import cfg
 logger = logging.getLogger(__name__)
+DRIVE_UPLOAD_URL = 'https://www.googleapis.com/upload/drive/v3/files'
+UPLOAD_FIELDS = 'id,name,size,webViewLink,webContentLink'
+PackageProgressCallback = Callable[[str, int, int], None]
 class DriveManager:
-    def __init__(self):
-        self.service = None
+    def __init__(self, service=None, http_session=None, upload_url: str=DRIVE_UPLOAD_URL):
+        """初期化.
+        Args:
+            service: Drive APIサービス（テスト用の差し替え。Noneなら認証情報から構築）
+            http_session: アップロード用HTTPセッション（Noneなら認証情報からAuthorizedSessionを作成）
+            upload_url: レジューム可能アップロードの開始エンドポイント
+        """
+        self.service = service
         self.folder_id = cfg.google_drive_folder_id
         self.credentials = cfg.google_credentials_json
-        self._setup_service()
+        self._google_credentials = None
+        if service is None:
+            self._setup_service()
+        upload_config = cfg.upload
+        self.max_parallel_uploads = max(1, upload_config.max_parallel)
+        self.uploader = ResumableUploader(http_session if http_session is not None else self._authorized_session(), upload_url, get_upload_session_store(), chunk_size=upload_config.chunk_size_mb * 1024 * 1024, max_retries=upload_config.max_retries)
+    def _authorized_session(self):
+        from google.auth.transport.requests import AuthorizedSession
+        return AuthorizedSession(self._google_credentials)
     def _setup_service(self):
         try:
             if not self.credentials:
@@ -32,6 +50,7 @@ class DriveManager:
                 credentials = Credentials.from_service_account_file(str(cred_path), scopes=['https://www.googleapis.com/auth/drive'])
             else:
                 raise ValueError(f'Invalid credentials format or path: {self.credentials}')
+            self._google_credentials = credentials
             self.service = build('drive', 'v3', credentials=credentials)
             if self.folder_id:
                 self._verify_folder_access()
@@ -47,21 +66,26 @@ class DriveManager:
             logger.info(f"Verified access to folder: {folder_info.get('name')}")
         except Exception as e:
             logger.warning(f'Could not verify folder access: {e}')
-    def upload_file(self, file_path: str, folder_id: str=None, custom_name: str=None, make_public: bool=True) -> Dict[str, Any]:
+    def upload_file(self, file_path: str, folder_id: str=None, custom_name: str=None, make_public: bool=True, progress: Optional[Callable[[int, int], None]]=None) -> Dict[str, Any]:
+        """ファイルをレジューム可能アップロードで送信.
+        設定したチャンクサイズ単位で送り、中断時はセッションURIから続きを再開します。
+        Args:
+            progress: (送信済みバイト, 総バイト)を受け取るコールバック
+        """
+        file_name = custom_name or os.path.basename(file_path)
+        file_size = 0
         try:
             file_path_obj = ProjectPaths.resolve_relative(file_path)
             if not file_path_obj.exists():
                 raise FileNotFoundError(f'File not found: {file_path}')
             file_size = file_path_obj.stat().st_size
-            file_name = custom_name or file_path_obj.name
             logger.info(f'Uploading file: {file_name} ({file_size} bytes)')
             target_folder_id = folder_id or self.folder_id
             file_metadata = {'name': file_name}
             if target_folder_id:
                 file_metadata['parents'] = [target_folder_id]
             mime_type = self._get_mime_type(str(file_path_obj))
-            media = MediaFileUpload(str(file_path_obj), mimetype=mime_type, resumable=True if file_size > 5 * 1024 * 1024 else False)
-            file_result = self.service.files().create(body=file_metadata, media_body=media, fields='id,name,size,webViewLink,webContentLink', supportsAllDrives=True).execute()
+            file_result = self.uploader.upload(str(file_path_obj), file_metadata, mime_type, params={'supportsAllDrives': 'true', 'fields': UPLOAD_FIELDS}, progress=progress)
             if make_public:
                 self._make_file_public(file_result.get('id'))
             upload_info = {'file_id': file_result.get('id'), 'name': file_result.get('name'), 'size': int(file_result.get('size', 0)), 'web_view_link': file_result.get('webViewLink'), 'web_content_link': file_result.get('webContentLink'), 'folder_id': target_folder_id, 'uploaded_at': datetime.now().isoformat(), 'public': make_public}
@@ -71,7 +95,7 @@ class DriveManager:
             error_str = str(e)
             logger.error(f'File upload failed: {error_str}')
             analysis = self._analyze_drive_error(e)
-            if 'storageQuotaExceeded' in error_str or 'Service Accounts do not have storage quota' in error_str:
+            if analysis.get('classification') == 'storage_quota':
                 reason = analysis.get('message', error_str)
                 logger.warning('Skipping Drive upload due to storage quota limitation (file: %s): %s', file_name, reason)
                 return {'skipped': True, 'reason': 'storage_quota_exceeded', 'file_path': file_path, 'file_name': file_name, 'file_size': file_size, 'message': 'File not uploaded to Drive due to service account storage limitation. Use shared drive or local backup.', 'analysis': analysis}
@@ -79,8 +103,8 @@ class DriveManager:
     @staticmethod
     def _analyze_drive_error(error: Exception) -> Dict[str, Any]:
         analysis: Dict[str, Any] = {'status': None, 'reason': None, 'message': str(error), 'classification': None, 'suggestions': []}
-        if isinstance(error, HttpError):
-            analysis['status'] = getattr(error.resp, 'status', None)
+        if isinstance(error, (HttpError, ResumableUploadError)):
+            analysis['status'] = error.status if isinstance(error, ResumableUploadError) else getattr(error.resp, 'status', None)
             raw_content = getattr(error, 'content', b'')
             payload: Dict[str, Any] = {}
             if isinstance(raw_content, bytes) and raw_content:
@@ -100,7 +124,7 @@ class DriveManager:
                         analysis['reason'] = first.get('reason') or analysis['reason']
         message_lower = analysis['message'].lower() if analysis['message'] else ''
         reason_lower = analysis['reason'].lower() if analysis['reason'] else ''
-        if 'storagequotaexceeded' in reason_lower or 'storage quota' in message_lower:
+        if 'storagequotaexceeded' in reason_lower or 'storagequotaexceeded' in message_lower or 'storage quota' in message_lower:
             analysis['classification'] = 'storage_quota'
             analysis.setdefault('suggestions', [])
             analysis['suggestions'].append('Service accounts do not have personal Drive storage. Upload to a shared drive or enable domain-wide delegation.')
@@ -124,43 +148,56 @@ class DriveManager:
             logger.debug(f'Made file public: {file_id}')
         except Exception as e:
             logger.warning(f'Failed to make file public: {e}')
-    def upload_video_package(self, video_path: str, thumbnail_path: str=None, subtitle_path: str=None, metadata: Dict[str, Any]=None) -> Dict[str, Any]:
+    def upload_video_package(self, video_path: str, thumbnail_path: str=None, subtitle_path: str=None, metadata: Dict[str, Any]=None, progress: Optional[PackageProgressCallback]=None) -> Dict[str, Any]:
+        """動画・サムネイル・字幕・メタデータをパッケージフォルダへアップロード.
+        動画のチャンク送信と並行して小さな成果物を送ります。動画の中断セッションが残っていれば
+        そのフォルダとファイル名を再利用し、続きから再開します。
+        Args:
+            progress: (種別, 送信済みバイト, 総バイト)を受け取るコールバック
+        """
         try:
-            package_folder_id = self._create_package_folder(metadata)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            video_name = f'video_{timestamp}.mp4'
+            pending_video = self.uploader.pending(video_path) if video_path and os.path.exists(video_path) else None
+            if pending_video and pending_video.get('metadata', {}).get('parents'):
+                package_folder_id = pending_video['metadata']['parents'][0]
+                video_name = pending_video['metadata'].get('name', video_name)
+                logger.info(f'Resuming interrupted package upload into folder: {package_folder_id}')
+            else:
+                package_folder_id = self._create_package_folder(metadata)
             upload_results = {'package_folder_id': package_folder_id, 'uploaded_files': [], 'errors': []}
             local_dir = None
             if cfg.save_local_backup:
                 local_dir = self._create_local_backup_folder(metadata)
+            artifacts = []
             if video_path and os.path.exists(video_path):
-                video_result = self.upload_file(video_path, folder_id=package_folder_id, custom_name=f"video_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp4")
-                upload_results['uploaded_files'].append({'type': 'video', 'result': video_result})
-                upload_results['video_file_id'] = video_result.get('file_id')
-                upload_results['video_link'] = video_result.get('web_view_link')
-                if local_dir and (video_result.get('error') or video_result.get('skipped')):
-                    self._save_local_copy(video_path, local_dir, 'video.mp4')
+                artifacts.append(('video', video_path, video_name, 'video.mp4'))
             if thumbnail_path and os.path.exists(thumbnail_path):
-                thumbnail_result = self.upload_file(thumbnail_path, folder_id=package_folder_id, custom_name=f"thumbnail_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png")
-                upload_results['uploaded_files'].append({'type': 'thumbnail', 'result': thumbnail_result})
-                upload_results['thumbnail_file_id'] = thumbnail_result.get('file_id')
-                if local_dir and (thumbnail_result.get('error') or thumbnail_result.get('skipped')):
-                    self._save_local_copy(thumbnail_path, local_dir, 'thumbnail.png')
+                artifacts.append(('thumbnail', thumbnail_path, f'thumbnail_{timestamp}.png', 'thumbnail.png'))
             if subtitle_path and os.path.exists(subtitle_path):
-                subtitle_result = self.upload_file(subtitle_path, folder_id=package_folder_id, custom_name=f"subtitles_{datetime.now().strftime('%Y%m%d_%H%M%S')}.srt")
-                upload_results['uploaded_files'].append({'type': 'subtitle', 'result': subtitle_result})
-                upload_results['subtitle_file_id'] = subtitle_result.get('file_id')
-                if local_dir and (subtitle_result.get('error') or subtitle_result.get('skipped')):
-                    self._save_local_copy(subtitle_path, local_dir, 'subtitles.srt')
-            if metadata:
-                metadata_path = self._create_metadata_file(metadata, package_folder_id)
-                if metadata_path:
-                    metadata_result = self.upload_file(metadata_path, folder_id=package_folder_id, custom_name='metadata.json')
-                    upload_results['uploaded_files'].append({'type': 'metadata', 'result': metadata_result})
-                    if local_dir and (metadata_result.get('error') or metadata_result.get('skipped')):
-                        self._save_local_copy(metadata_path, local_dir, 'metadata.json')
-                    try:
-                        os.remove(metadata_path)
-                    except (OSError, FileNotFoundError) as e:
-                        logger.debug(f'Could not remove metadata file {metadata_path}: {e}')
+                artifacts.append(('subtitle', subtitle_path, f'subtitles_{timestamp}.srt', 'subtitles.srt'))
+            metadata_path = self._create_metadata_file(metadata, package_folder_id) if metadata else None
+            if metadata_path:
+                artifacts.append(('metadata', metadata_path, 'metadata.json', 'metadata.json'))
+            results = self._upload_concurrently(artifacts, package_folder_id, progress)
+            for (artifact_type, path, _, backup_name), result in zip(artifacts, results):
+                if result.get('file_id'):
+                    self._make_file_public(result['file_id'])
+                    result['public'] = True
+                upload_results['uploaded_files'].append({'type': artifact_type, 'result': result})
+                if artifact_type != 'metadata':
+                    upload_results[f'{artifact_type}_file_id'] = result.get('file_id')
+                if artifact_type == 'video':
+                    upload_results['video_link'] = result.get('web_view_link')
+                if result.get('error'):
+                    upload_results['errors'].append({'type': artifact_type, 'error': result['error']})
+                if local_dir and (result.get('error') or result.get('skipped')):
+                    self._save_local_copy(path, local_dir, backup_name)
+            if metadata_path:
+                try:
+                    os.remove(metadata_path)
+                except (OSError, FileNotFoundError) as e:
+                    logger.debug(f'Could not remove metadata file {metadata_path}: {e}')
             upload_results['package_folder_link'] = self._get_folder_link(package_folder_id)
             upload_results['upload_completed_at'] = datetime.now().isoformat()
             if local_dir:
@@ -171,6 +208,16 @@ class DriveManager:
         except Exception as e:
             logger.error(f'Video package upload failed: {e}')
             return {'error': str(e), 'uploaded_files': [], 'upload_failed_at': datetime.now().isoformat()}
+    def _upload_concurrently(self, artifacts: List[tuple], folder_id: str, progress: Optional[PackageProgressCallback]) -> List[Dict[str, Any]]:
+        """成果物を並列にアップロード（公開設定はAPIクライアントがスレッド非安全なため呼び出し側で行う）"""
+        if not artifacts:
+            return []
+        def _upload(artifact):
+            artifact_type, path, name, _ = artifact
+            callback = (lambda sent, total: progress(artifact_type, sent, total)) if progress else None
+            return self.upload_file(path, folder_id=folder_id, custom_name=name, make_public=False, progress=callback)
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_uploads, len(artifacts)), thread_name_prefix='drive-upload') as executor:
+            return list(executor.map(_upload, artifacts))
     def _create_package_folder(self, metadata: Dict[str, Any]=None) -> str:
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -0,0 +1,348 @@
+"""Segmented, indexed execution log for WorkflowResult history.
+
+WorkflowResultを追記専用のセグメントファイル（JSONL）に保存し、セグメントごとの
+オフセット索引（.idx）とサマリー（manifest.json）で件数・末尾N件・期間検索を
+ファイル全体を読み直さずに行います。旧 execution_log.jsonl は一度だけ取り込みます。
+"""
+
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from .models.workflow import WorkflowResult
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_ENTRY = struct.Struct("<Qd")
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = ".lock"
+DEFAULT_SEGMENT_RECORDS = 1000
+
+
+@dataclass
+class LogEntry:
+    """索引付きの実行ログ1件."""
+
+    sequence: int
+    logged_at: datetime
+    result: WorkflowResult
+
+
+def execution_log_dir(jsonl_path: str) -> Path:
+    """旧JSONLパスに対応するセグメントディレクトリ（拡張子なしの同名ディレクトリ）."""
+    return Path(jsonl_path).with_suffix("")
+
+
+def _infer_timestamp(run_id: str) -> Optional[float]:
+    for fmt in ("%Y%m%d_%H%M%S", "%Y%m%d-%H%M%S"):
+        for candidate in (run_id[-15:], run_id):
+            try:
+                return datetime.strptime(candidate, fmt).timestamp()
+            except ValueError:
+                continue
+    return None
+
+
+class SegmentedExecutionLog:
+    """追記専用のセグメント化された実行ログ.
+
+    レイアウト::
+
+        execution_log/
+            manifest.json          # セグメント一覧と件数・期間・成功数のサマリー
+            segment-000001.jsonl   # WorkflowResult 1件1行
+            segment-000001.idx     # (offset: uint64, logged_at: float64) の固定長エントリ
+    """
+
+    def __init__(self, directory: str, segment_max_records: int = DEFAULT_SEGMENT_RECORDS):
+        """初期化.
+
+        Args:
+            directory: セグメントを保存するディレクトリ
+            segment_max_records: 1セグメントあたりの最大件数
+        """
+        self.directory = Path(directory)
+        self.segment_max_records = max(1, segment_max_records)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.directory / LOCK_NAME, "a") as handle:
+            if fcntl:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self.directory / MANIFEST_NAME, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"total": 0, "segments": [], "imported": []}
+        except json.JSONDecodeError:
+            logger.warning(f"Execution log manifest is corrupt, rebuilding: {self.directory}")
+            return self._rebuild_manifest()
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".manifest-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.directory / MANIFEST_NAME)
+
+    def _rebuild_manifest(self) -> Dict[str, Any]:
+        """索引ファイルからサマリーを再構築（manifest破損時）."""
+        segments = []
+        start = 0
+        for idx_path in sorted(self.directory.glob("segment-*.idx")):
+            entries = self._read_index(idx_path.with_suffix(".jsonl").name)
+            if not entries:
+                continue
+            successes = sum(1 for _, _, result in self._iter_segment(idx_path.with_suffix(".jsonl").name, entries) if result.success)
+            segments.append(
+                {
+                    "name": idx_path.with_suffix(".jsonl").name,
+                    "start": start,
+                    "count": len(entries),
+                    "first_ts": min(ts for _, ts in entries),
+                    "last_ts": max(ts for _, ts in entries),
+                    "successes": successes,
+                }
+            )
+            start += len(entries)
+        return {"total": start, "segments": segments, "imported": []}
+
+    def _read_index(self, segment_name: str, first: int = 0, count: Optional[int] = None) -> List[Tuple[int, float]]:
+        idx_path = self.directory / Path(segment_name).with_suffix(".idx")
+        try:
+            with open(idx_path, "rb") as f:
+                f.seek(first * INDEX_ENTRY.size)
+                data = f.read(-1 if count is None else count * INDEX_ENTRY.size)
+        except FileNotFoundError:
+            return []
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+    def _iter_segment(self, segment_name: str, entries: List[Tuple[int, float]]) -> Iterator[Tuple[int, float, WorkflowResult]]:
+        """索引エントリが指すレコードを読み出す（位置, 記録時刻, 結果）."""
+        with open(self.directory / segment_name, "rb") as f:
+            for position, (offset, logged_at) in enumerate(entries):
+                f.seek(offset)
+                line = f.readline()
+                try:
+                    yield position, logged_at, WorkflowResult.model_validate_json(line)
+                except ValidationError as exc:
+                    logger.debug(f"Skipping unreadable execution record in {segment_name}: {exc}")
+
+    def append(self, result: WorkflowResult, logged_at: Optional[float] = None) -> int:
+        """結果を追記.
+
+        Args:
+            result: 保存するWorkflowResult
+            logged_at: 記録時刻（UNIX秒、省略時は現在時刻）
+
+        Returns:
+            追記したレコードの通し番号（0始まり）
+        """
+        with self._exclusive():
+            manifest = self._read_manifest()
+            sequence = self._append_locked(manifest, [(result.model_dump_json(), result.success, logged_at or time.time())])
+            self._write_manifest(manifest)
+        return sequence
+
+    def _append_locked(self, manifest: Dict[str, Any], records: List[Tuple[str, bool, float]]) -> int:
+        segments = manifest["segments"]
+        if segments:
+            # 索引追記後・manifest更新前に中断された場合は索引の件数を正とする
+            current = segments[-1]
+            idx_path = self.directory / Path(current["name"]).with_suffix(".idx")
+            indexed = os.path.getsize(idx_path) // INDEX_ENTRY.size if idx_path.exists() else 0
+            manifest["total"] += indexed - current["count"]
+            current["count"] = indexed
+        first_sequence = manifest["total"]
+        for line, success, logged_at in records:
+            if not segments or segments[-1]["count"] >= self.segment_max_records:
+                segments.append(
+                    {
+                        "name": f"segment-{len(segments) + 1:06d}.jsonl",
+                        "start": manifest["total"],
+                        "count": 0,
+                        "first_ts": logged_at,
+                        "last_ts": logged_at,
+                        "successes": 0,
+                    }
+                )
+            current = segments[-1]
+            segment_path = self.directory / current["name"]
+            with open(segment_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line.encode("utf-8") + b"\n")
+                f.flush()
+            with open(segment_path.with_suffix(".idx"), "ab") as f:
+                f.write(INDEX_ENTRY.pack(offset, logged_at))
+            current["count"] += 1
+            current["first_ts"] = min(current["first_ts"], logged_at)
+            current["last_ts"] = max(current["last_ts"], logged_at)
+            current["successes"] += 1 if success else 0
+            manifest["total"] += 1
+        return first_sequence
+
+    def count(self) -> int:
+        """総件数（manifestのみ参照）."""
+        return self._read_manifest()["total"]
+
+    def success_count(self) -> int:
+        """成功した実行の件数."""
+        return sum(segment["successes"] for segment in self._read_manifest()["segments"])
+
+    def head(self, limit: int) -> List[WorkflowResult]:
+        """先頭（最古）からlimit件のWorkflowResultを記録順に取得."""
+        collected: List[WorkflowResult] = []
+        for segment in self._read_manifest()["segments"]:
+            needed = limit - len(collected)
+            if needed <= 0:
+                break
+            entries = self._read_index(segment["name"], 0, min(needed, segment["count"]))
+            collected.extend(result for _, _, result in self._iter_segment(segment["name"], entries))
+        return collected
+
+    def tail_entries(self, limit: int) -> List[LogEntry]:
+        """直近limit件を古い順に取得."""
+        if limit <= 0:
+            return []
+        collected: List[LogEntry] = []
+        for segment in reversed(self._read_manifest()["segments"]):
+            needed = limit - len(collected)
+            if needed <= 0:
+                break
+            first = max(0, segment["count"] - needed)
+            entries = self._read_index(segment["name"], first, segment["count"] - first)
+            chunk = [
+                LogEntry(segment["start"] + first + position, datetime.fromtimestamp(logged_at), result)
+                for position, logged_at, result in self._iter_segment(segment["name"], entries)
+            ]
+            collected = chunk + collected
+        return collected
+
+    def tail(self, limit: int) -> List[WorkflowResult]:
+        """直近limit件のWorkflowResultを古い順に取得."""
+        return [entry.result for entry in self.tail_entries(limit)]
+
+    def get(self, sequence: int) -> Optional[LogEntry]:
+        """通し番号で1件取得（manifestでセグメントを特定し索引から直接シーク）."""
+        for segment in self._read_manifest()["segments"]:
+            position = sequence - segment["start"]
+            if 0 <= position < segment["count"]:
+                entries = self._read_index(segment["name"], position, 1)
+                for _, logged_at, result in self._iter_segment(segment["name"], entries):
+                    return LogEntry(sequence, datetime.fromtimestamp(logged_at), result)
+                return None
+        return None
+
+    def iter_raw(self, start_sequence: int = 0) -> Iterator[Tuple[int, float, Dict[str, Any]]]:
+        """start_sequence以降のレコードを (通し番号, 記録時刻, dict) で順に返す.
+
+        pydanticモデルを生成せずに集計用の列だけを取り出したい場合に使います。
+        """
+        for segment in self._read_manifest()["segments"]:
+            end = segment["start"] + segment["count"]
+            if end <= start_sequence:
+                continue
+            first = max(0, start_sequence - segment["start"])
+            entries = self._read_index(segment["name"], first, segment["count"] - first)
+            with open(self.directory / segment["name"], "rb") as f:
+                for position, (offset, logged_at) in enumerate(entries):
+                    f.seek(offset)
+                    try:
+                        record = json.loads(f.readline())
+                    except ValueError:
+                        continue
+                    yield segment["start"] + first + position, logged_at, record
+
+    def between(self, start: datetime, end: datetime) -> List[LogEntry]:
+        """記録時刻が [start, end) に入るレコードを取得.
+
+        サマリーの期間で対象セグメントを絞り込み、索引の時刻で行を選んでから読み出します。
+        """
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        matched: List[LogEntry] = []
+        for segment in self._read_manifest()["segments"]:
+            if segment["last_ts"] < start_ts or segment["first_ts"] >= end_ts:
+                continue
+            entries = self._read_index(segment["name"], 0, segment["count"])
+            selected = [(position, entry) for position, entry in enumerate(entries) if start_ts <= entry[1] < end_ts]
+            if not selected:
+                continue
+            # 読めないレコードは_iter_segmentが飛ばすため、返された位置でselectedを引き直す
+            records = self._iter_segment(segment["name"], [entry for _, entry in selected])
+            for index, logged_at, result in records:
+                matched.append(LogEntry(segment["start"] + selected[index][0], datetime.fromtimestamp(logged_at), result))
+        return matched
+
+    def import_jsonl(self, jsonl_path: str, force: bool = False) -> int:
+        """旧 execution_log.jsonl を取り込む（同じファイルは一度だけ）.
+
+        Args:
+            jsonl_path: 旧JSONLファイルのパス
+            force: 取り込み済みでも再実行する場合True
+
+        Returns:
+            取り込んだ件数
+        """
+        source = Path(jsonl_path)
+        if not source.exists():
+            return 0
+        key = str(source.resolve())
+        if not force and key in self._read_manifest().get("imported", []):
+            return 0
+        with self._exclusive():
+            manifest = self._read_manifest()
+            manifest.setdefault("imported", [])
+            if key in manifest["imported"] and not force:
+                return 0
+            fallback = source.stat().st_mtime
+            records = []
+            with open(source, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        result = WorkflowResult.model_validate_json(line)
+                    except ValidationError:
+                        continue
+                    records.append((result.model_dump_json(), result.success, _infer_timestamp(result.run_id) or fallback))
+            if records:
+                self._append_locked(manifest, records)
+            if key not in manifest["imported"]:
+                manifest["imported"].append(key)
+            self._write_manifest(manifest)
+        if records:
+            logger.info(f"Imported {len(records)} executions from {source} into {self.directory}")
+        return len(records)
+
+
+def open_execution_log(jsonl_path: str) -> SegmentedExecutionLog:
+    """旧JSONLパスに対応するセグメントログを開き、未取り込みなら旧ログを取り込む."""
+    log = SegmentedExecutionLog(str(execution_log_dir(jsonl_path)))
+    log.import_jsonl(jsonl_path)
+    return log
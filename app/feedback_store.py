@@ -0,0 +1,267 @@
+"""動画フィードバックのSQLiteストア
+動画ごとのメタデータ・Analytics・手動フィードバック・AIレビューを行単位で保存し、
+履歴全体を読み書きせずに更新・集計できるようにします（WALモードで複数実行に対応）。
+"""
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
+logger = logging.getLogger(__name__)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    theme_name TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    analytics TEXT NOT NULL DEFAULT '{}',
+    has_analytics INTEGER NOT NULL DEFAULT 0,
+    views INTEGER NOT NULL DEFAULT 0,
+    likes INTEGER NOT NULL DEFAULT 0,
+    retention_rate REAL NOT NULL DEFAULT 0,
+    avg_view_duration REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_videos_theme ON videos (theme_name);
+CREATE INDEX IF NOT EXISTS idx_videos_activity ON videos (COALESCE(updated_at, created_at));
+CREATE TABLE IF NOT EXISTS manual_feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL,
+    positive INTEGER NOT NULL,
+    comment TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_manual_feedback_video ON manual_feedback (video_id);
+CREATE TABLE IF NOT EXISTS ai_reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_id TEXT NOT NULL,
+    stored_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ai_reviews_video ON ai_reviews (video_id, id);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+LEGACY_IMPORT_KEY = "legacy_json_import"
+def _analytics_columns(analytics: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "analytics": json.dumps(analytics, ensure_ascii=False),
+        "has_analytics": 1 if analytics else 0,
+        "views": analytics.get("views", 0) or 0,
+        "likes": analytics.get("likes", 0) or 0,
+        "retention_rate": analytics.get("retention_rate", 0) or 0,
+        "avg_view_duration": analytics.get("avg_view_duration", 0) or 0,
+    }
+class FeedbackStore:
+    """動画フィードバックのSQLiteストア
+    各操作は1トランザクションで対象動画の行だけを更新するため、同時実行でも更新が失われません。
+    """
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    def _ensure_video(self, conn: sqlite3.Connection, video_id: str) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO videos (video_id, theme_name, created_at) VALUES (?, 'unknown', ?)",
+            (video_id, datetime.now().isoformat()),
+        )
+    def upsert_video(self, video_id: str, theme_name: str, metadata: Dict[str, Any]) -> None:
+        """動画のテーマとメタデータを記録（既存のフィードバック・レビューは保持）"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO videos (video_id, theme_name, created_at, metadata) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET theme_name = excluded.theme_name, "
+                "created_at = excluded.created_at, metadata = excluded.metadata",
+                (video_id, theme_name, datetime.now().isoformat(), json.dumps(metadata, ensure_ascii=False)),
+            )
+    def update_analytics(self, video_id: str, analytics: Dict[str, Any]) -> Optional[str]:
+        """Analyticsを更新
+        Returns:
+            更新した動画のテーマ名（動画が未登録の場合None）
+        """
+        columns = _analytics_columns(analytics)
+        columns["updated_at"] = datetime.now().isoformat()
+        assignments = ", ".join(f"{name} = :{name}" for name in columns)
+        with self._connect() as conn:
+            row = conn.execute(
+                f"UPDATE videos SET {assignments} WHERE video_id = :video_id RETURNING theme_name",
+                {**columns, "video_id": video_id},
+            ).fetchone()
+        return row["theme_name"] if row else None
+    def add_manual_feedback(self, video_id: str, positive: bool, comment: Optional[str] = None) -> Tuple[str, bool]:
+        """手動フィードバックを追加
+        Returns:
+            (テーマ名, 動画を新規作成したか)
+        """
+        with self._connect() as conn:
+            created = conn.execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone() is None
+            self._ensure_video(conn, video_id)
+            conn.execute(
+                "INSERT INTO manual_feedback (video_id, positive, comment, timestamp) VALUES (?, ?, ?, ?)",
+                (video_id, 1 if positive else 0, comment, datetime.now().isoformat()),
+            )
+            theme_name = conn.execute("SELECT theme_name FROM videos WHERE video_id = ?", (video_id,)).fetchone()[0]
+        return theme_name, created
+    def add_ai_review(self, video_id: str, entry: Dict[str, Any]) -> None:
+        """AIレビュー結果を履歴に追加"""
+        with self._connect() as conn:
+            self._ensure_video(conn, video_id)
+            conn.execute(
+                "INSERT INTO ai_reviews (video_id, stored_at, payload) VALUES (?, ?, ?)",
+                (video_id, entry.get("stored_at") or datetime.now().isoformat(), json.dumps(entry, ensure_ascii=False)),
+            )
+    def get(self, video_id: str, include_review_history: bool = True) -> Optional[Dict[str, Any]]:
+        """動画1件のフィードバックを旧JSONと同じ形で取得"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None:
+                return None
+            return self._assemble(conn, row, include_review_history)
+    def latest(self) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """最終更新（updated_at、なければcreated_at）が最も新しい動画を取得"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM videos ORDER BY COALESCE(updated_at, created_at) DESC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            return row["video_id"], self._assemble(conn, row, include_review_history=False)
+    def _assemble(self, conn: sqlite3.Connection, row: sqlite3.Row, include_review_history: bool) -> Dict[str, Any]:
+        entry: Dict[str, Any] = {
+            "theme_name": row["theme_name"],
+            "created_at": row["created_at"],
+            "metadata": json.loads(row["metadata"]),
+            "analytics": json.loads(row["analytics"]),
+        }
+        if row["updated_at"]:
+            entry["updated_at"] = row["updated_at"]
+        feedback = conn.execute(
+            "SELECT positive, comment, timestamp FROM manual_feedback WHERE video_id = ? ORDER BY id",
+            (row["video_id"],),
+        ).fetchall()
+        if feedback:
+            entry["manual_feedback"] = [
+                {"positive": bool(fb["positive"]), "comment": fb["comment"], "timestamp": fb["timestamp"]} for fb in feedback
+            ]
+        if include_review_history:
+            reviews = [
+                json.loads(review["payload"])
+                for review in conn.execute("SELECT payload FROM ai_reviews WHERE video_id = ? ORDER BY id", (row["video_id"],))
+            ]
+            if reviews:
+                entry["ai_review_history"] = reviews
+                entry["ai_review"] = reviews[-1]
+        else:
+            latest_review = conn.execute(
+                "SELECT payload FROM ai_reviews WHERE video_id = ? ORDER BY id DESC LIMIT 1", (row["video_id"],)
+            ).fetchone()
+            if latest_review:
+                entry["ai_review"] = json.loads(latest_review["payload"])
+        return entry
+    def theme_summary(self, theme_name: str) -> Dict[str, Any]:
+        """テーマ別の集計（インデックス付きの集約クエリ）"""
+        with self._connect() as conn:
+            totals = conn.execute(
+                "SELECT COUNT(*) AS video_count, COALESCE(SUM(views), 0) AS total_views, "
+                "COALESCE(SUM(likes), 0) AS total_likes, "
+                "AVG(CASE WHEN has_analytics THEN retention_rate END) AS avg_retention_rate, "
+                "AVG(CASE WHEN has_analytics THEN avg_view_duration END) AS avg_view_duration "
+                "FROM videos WHERE theme_name = ?",
+                (theme_name,),
+            ).fetchone()
+            feedback = conn.execute(
+                "SELECT COALESCE(SUM(fb.positive), 0) AS positive, COUNT(fb.id) - COALESCE(SUM(fb.positive), 0) AS negative "
+                "FROM videos v JOIN manual_feedback fb ON fb.video_id = v.video_id WHERE v.theme_name = ?",
+                (theme_name,),
+            ).fetchone()
+        return {
+            "theme_name": theme_name,
+            "video_count": totals["video_count"],
+            "total_views": totals["total_views"],
+            "total_likes": totals["total_likes"],
+            "avg_retention_rate": totals["avg_retention_rate"] or 0.0,
+            "avg_view_duration": totals["avg_view_duration"] or 0.0,
+            "positive_feedback_count": feedback["positive"],
+            "negative_feedback_count": feedback["negative"],
+        }
+    def import_legacy_json(self, json_path: str, force: bool = False) -> int:
+        """旧 video_feedback.json を一度だけ取り込む
+        Returns:
+            取り込んだ動画数
+        """
+        source = Path(json_path)
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute("SELECT value FROM store_meta WHERE key = ?", (LEGACY_IMPORT_KEY,)).fetchone()
+            if done and not force:
+                return 0
+            imported = 0
+            data: Dict[str, Any] = {}
+            if source.exists():
+                try:
+                    with open(source, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skipping unreadable legacy feedback file {source}: {e}")
+            for video_id, entry in (data.items() if isinstance(data, dict) else []):
+                if not isinstance(entry, dict):
+                    continue
+                columns = _analytics_columns(entry.get("analytics") or {})
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, theme_name, created_at, updated_at, metadata, analytics, "
+                    "has_analytics, views, likes, retention_rate, avg_view_duration) "
+                    "VALUES (:video_id, :theme_name, :created_at, :updated_at, :metadata, :analytics, "
+                    ":has_analytics, :views, :likes, :retention_rate, :avg_view_duration)",
+                    {
+                        **columns,
+                        "video_id": video_id,
+                        "theme_name": entry.get("theme_name") or "unknown",
+                        "created_at": entry.get("created_at") or datetime.now().isoformat(),
+                        "updated_at": entry.get("updated_at"),
+                        "metadata": json.dumps(entry.get("metadata") or {}, ensure_ascii=False),
+                    },
+                )
+                conn.execute("DELETE FROM manual_feedback WHERE video_id = ?", (video_id,))
+                conn.executemany(
+                    "INSERT INTO manual_feedback (video_id, positive, comment, timestamp) VALUES (?, ?, ?, ?)",
+                    [
+                        (video_id, 1 if fb.get("positive") else 0, fb.get("comment"), fb.get("timestamp") or "")
+                        for fb in entry.get("manual_feedback", [])
+                        if isinstance(fb, dict)
+                    ],
+                )
+                reviews = entry.get("ai_review_history") or ([entry["ai_review"]] if entry.get("ai_review") else [])
+                conn.execute("DELETE FROM ai_reviews WHERE video_id = ?", (video_id,))
+                conn.executemany(
+                    "INSERT INTO ai_reviews (video_id, stored_at, payload) VALUES (?, ?, ?)",
+                    [
+                        (video_id, review.get("stored_at") or "", json.dumps(review, ensure_ascii=False))
+                        for review in reviews
+                        if isinstance(review, dict)
+                    ],
+                )
+                imported += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                (LEGACY_IMPORT_KEY, datetime.now().isoformat()),
+            )
+        if imported:
+            logger.info(f"Imported {imported} videos from {source} into {self.db_path}")
+        return imported
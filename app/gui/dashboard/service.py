@@ -6,7 +6,8 @@ from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Iterable, Iterator, List, Optional
-from pydantic import ValidationError
+from app.execution_log import execution_log_dir, open_execution_log
+from app.metadata_db import MetadataDatabase
 from app.models.workflow import WorkflowResult
 from .models import (
     ArtifactKind,
@@ -56,22 +57,13 @@ class DashboardService:
         summary = self._compute_summary(runs)
         return DashboardMetrics(summary=summary, runs=runs)
     def _load_results(self, limit: int) -> List[WorkflowResult]:
-        if not self._execution_log_path.exists():
+        if not execution_log_dir(str(self._execution_log_path)).is_dir() and not self._execution_log_path.exists():
             return []
-        buffer: deque[str] = deque(maxlen=limit)
-        with self._execution_log_path.open("r", encoding="utf-8") as handle:
-            for line in handle:
-                line = line.strip()
-                if line:
-                    buffer.append(line)
-        results: List[WorkflowResult] = []
-        for entry in reversed(buffer):
-            try:
-                results.append(WorkflowResult.model_validate_json(entry))
-            except ValidationError:
-                continue
-        return results
+        return list(reversed(open_execution_log(str(self._execution_log_path)).tail(limit)))
     def _load_metadata(self, *, limit: int) -> List[MetadataSnapshot]:
+        db_path = self._metadata_history_path.with_suffix(".db")
+        if db_path.exists():
+            return self._load_metadata_from_db(db_path, limit=limit)
         if not self._metadata_history_path.exists():
             return []
         rows: deque[dict[str, str]] = deque(maxlen=limit)
@@ -97,6 +89,24 @@ class DashboardService:
                 )
             )
         return snapshots
+    def _load_metadata_from_db(self, db_path: Path, *, limit: int) -> List[MetadataSnapshot]:
+        rows = MetadataDatabase(str(db_path)).query(limit=limit, descending=True)
+        return [
+            MetadataSnapshot(
+                run_id=row["run_id"],
+                timestamp=_parse_timestamp(row.get("created_at")),
+                mode=row.get("mode"),
+                title=row.get("title"),
+                description=row.get("description"),
+                video_url=row.get("video_url"),
+                view_count=row.get("view_count"),
+                like_count=row.get("like_count"),
+                comment_count=row.get("comment_count"),
+                ctr=row.get("ctr"),
+                avg_view_duration=row.get("avg_view_duration"),
+            )
+            for row in reversed(rows)
+        ]
     def _build_run_artifacts(self, result: WorkflowResult, metadata: MetadataSnapshot | None) -> RunArtifacts:
         created_at = metadata.timestamp if metadata else _infer_timestamp_from_run_id(result.run_id)
         title = result.title or (metadata.title if metadata else None)
@@ -0,0 +1,138 @@
+"""LLM出力テキストからのJSON抽出.
+前置き・後書き・Markdownフェンス・説明用の波括弧が混ざった応答から、JSONのオブジェクト/配列を取り出します。
+テキストは1回だけ走査し（文字列リテラルとエスケープを追跡する状態機械）、括弧の対応が取れた区間を
+出現順に候補とします。デコードに失敗した候補はその内側の候補へ降りるため、説明文の「{注記 {...} }」の
+ような入れ子でも中のJSONを見つけられます。JSONとして読めない場合はYAMLとして読むフォールバックも使えます。
+"""
+import json
+import re
+from typing import Any, Iterator, List, Optional, Tuple, Type, Union
+import yaml
+_SIGNIFICANT = re.compile(r'[{}\[\]"\\\n]')
+_CLOSERS = {"{": "}", "[": "]"}
+_FENCE_LANGUAGE = re.compile(r"[A-Za-z0-9_+-]*")
+Span = Tuple[int, int, List[Any]]
+Expected = Union[Type, Tuple[Type, ...]]
+def _abandon(frames: List[List[Any]]) -> Iterator[Span]:
+    """閉じられなかった候補の内側で完結していた区間を出現順に返す"""
+    for frame in frames:
+        yield from frame[2]
+    frames.clear()
+def _scan(text: str) -> Iterator[Span]:
+    """括弧の対応が取れた最も外側の区間を (開始, 終了, 内側の区間) として出現順に返す.
+    区間の外では引用符を無視し、区間の中では文字列リテラル内の括弧を数えません。
+    対応しない閉じ括弧、または文字列内の改行（JSONでは不正）で候補を打ち切り、それまでに内側で
+    完結していた区間を返してから走査を続けます。各文字は1回しか調べません。
+    """
+    frames: List[List[Any]] = []
+    in_string = False
+    escaped_until = -1
+    for match in _SIGNIFICANT.finditer(text):
+        index = match.start()
+        if index < escaped_until:
+            continue
+        char = match.group()
+        if not frames:
+            if char in _CLOSERS:
+                frames.append([index, _CLOSERS[char], []])
+            continue
+        if in_string:
+            if char == "\\":
+                escaped_until = index + 2
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                in_string = False
+                yield from _abandon(frames)
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            frames.append([index, _CLOSERS[char], []])
+        elif char in "}]":
+            if char != frames[-1][1]:
+                yield from _abandon(frames)
+                continue
+            start, _, children = frames.pop()
+            span = (start, index + 1, children)
+            if frames:
+                frames[-1][2].append(span)
+            else:
+                yield span
+    yield from _abandon(frames)
+def iter_json_spans(text: str) -> Iterator[Tuple[int, int]]:
+    """括弧の対応が取れた区間 (開始, 終了) を、外側→内側・出現順に返す（JSONとして妥当かは問わない）"""
+    for span in _scan(text):
+        pending = [span]
+        while pending:
+            start, end, children = pending.pop()
+            yield start, end
+            pending.extend(reversed(children))
+def _drop_language(segment: str) -> str:
+    first_line, newline, rest = segment.partition("\n")
+    if newline and _FENCE_LANGUAGE.fullmatch(first_line.strip()):
+        return rest
+    return segment
+def _fenced_blocks(text: str) -> List[str]:
+    """```で囲まれたブロックの中身（先頭行の言語名は除く）。閉じられていない最後のフェンスも含める"""
+    if "```" not in text:
+        return []
+    return [_drop_language(segment) for segment in text.split("```")[1::2]]
+def _strip_fences(text: str) -> str:
+    """フェンス記号と言語名を取り除き、中身と地の文をつなげたテキスト"""
+    if "```" not in text:
+        return text
+    return "".join(_drop_language(segment) if index % 2 else segment for index, segment in enumerate(text.split("```")))
+def iter_json_candidates(text: str, *, yaml_fallback: bool = False) -> Iterator[Tuple[str, Any]]:
+    """テキスト中のJSON候補を (元の文字列, デコード結果) として出現順に返す.
+    フェンス内のブロックを先に、続いてテキスト全体を調べます。デコードできた区間の内側は候補にせず、
+    再帰上限を超える深さの入れ子は内側も含めて候補から外します。外側のデコードが失敗した位置を含む
+    内側の区間は読み直さないため、深い入れ子でも各文字のデコードはほぼ1回で済みます。
+    Args:
+        text: LLMの応答テキスト
+        yaml_fallback: JSON候補を出し尽くした後、フェンス内ブロックとテキスト全体をYAMLとして読む
+    """
+    if not text:
+        return
+    sources = _fenced_blocks(text) + [text]
+    for source in sources:
+        for span in _scan(source):
+            pending: List[Tuple[Span, int]] = [(span, -1)]
+            while pending:
+                (start, end, children), failed_at = pending.pop()
+                if start < failed_at < end:
+                    # 外側のデコードがこの区間の内側で失敗した＝この区間は値として読まれて同じ位置で失敗する
+                    error = failed_at
+                else:
+                    snippet = source[start:end]
+                    try:
+                        value = json.loads(snippet)
+                    except json.JSONDecodeError as exc:
+                        error = start + exc.pos
+                    except RecursionError:
+                        continue
+                    else:
+                        yield snippet, value
+                        continue
+                pending.extend((child, error) for child in reversed(children))
+    if not yaml_fallback:
+        return
+    for source in sources[:-1] + [_strip_fences(text)]:
+        try:
+            value = yaml.safe_load(source)
+        except yaml.YAMLError:
+            continue
+        if isinstance(value, (dict, list)):
+            yield source, value
+def extract_json(text: str, expect: Expected = (dict, list), *, yaml_fallback: bool = False) -> Any:
+    """最初に見つかった、expectの型にデコードできる候補の値（無ければNone）"""
+    for _, value in iter_json_candidates(text, yaml_fallback=yaml_fallback):
+        if isinstance(value, expect):
+            return value
+    return None
+def extract_json_text(text: str, expect: Expected = (dict, list)) -> Optional[str]:
+    """最初に見つかった、expectの型にデコードできるJSON候補の元の文字列（無ければNone）"""
+    for snippet, value in iter_json_candidates(text):
+        if isinstance(value, expect):
+            return snippet.strip()
+    return None
@@ -0,0 +1,243 @@
+"""LLM応答のコンテンツアドレス型キャッシュ.
+(model, messages, 生成設定, ツールスキーマ)の正規化JSONのSHA-256をキーに、プロバイダー応答を
+SQLiteへ保存します。QAリトライ・エージェントレビュー・開発時の再実行で同一リクエストが
+繰り返された場合はプロバイダーを呼ばずに保存済み応答を返し、同時に発行された同一リクエストは
+1回のプロバイダー呼び出しを共有します（in-flight coalescing）。
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from app.config.paths import ProjectPaths
+logger = logging.getLogger(__name__)
+_refreshing: ContextVar[bool] = ContextVar("llm_cache_refreshing", default=False)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    latency REAL NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at);
+"""
+def cache_key(model: str, messages: Any, generation_config: Optional[Dict[str, Any]] = None, tools: Any = None) -> str:
+    """リクエスト内容から決定的なキャッシュキーを生成（dictのキー順には依存しない）"""
+    canonical = json.dumps(
+        {"model": model, "messages": messages, "generation_config": generation_config or {}, "tools": tools or []},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+@contextmanager
+def refresh_responses() -> Iterator[None]:
+    """このブロック内の呼び出しは保存済み応答を使わずプロバイダーを呼び、結果で上書きする.
+    QAで不合格になった出力を再生成するリトライでは、同じ応答が返るのを避けるために使います。
+    """
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+class LLMResponseCache:
+    """SQLiteに保存するLLM応答キャッシュ（TTL・件数/容量上限・同一リクエストの合流）"""
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float = 86400.0,
+        max_entries: int = 5000,
+        max_bytes: int = 256 * 1024 * 1024,
+        busy_timeout: float = 30.0,
+    ):
+        self.db_path = str(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.busy_timeout = busy_timeout
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "stores": 0, "evictions": 0, "saved_latency_seconds": 0.0}
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    def _count(self, name: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """保存済み応答と、その応答の取得に要した元のレイテンシ（秒）を返す（期限切れ・未登録はNone）"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload, latency, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds and now - row["created_at"] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        return json.loads(row["payload"]), row["latency"]
+    def put(self, key: str, model: str, payload: Any, latency: float) -> None:
+        """応答を保存し、上限を超えた分を最終アクセスの古い順に削除"""
+        text = json.dumps(payload, ensure_ascii=False, default=str)
+        size = len(text.encode("utf-8"))
+        if self.max_bytes and size > self.max_bytes:
+            logger.debug(f"LLM response too large to cache ({size} bytes)")
+            return
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, 0)", (key, model, text, size, latency, now, now))
+            evicted = self._evict(conn, now)
+        self._count("stores")
+        if evicted:
+            self._count("evictions", evicted)
+    def _evict(self, conn: sqlite3.Connection, now: float) -> int:
+        evicted = 0
+        if self.ttl_seconds:
+            evicted += conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if (not self.max_entries or count <= self.max_entries) and (not self.max_bytes or total <= self.max_bytes):
+            return evicted
+        victims: List[str] = []
+        for row in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            if (not self.max_entries or count <= self.max_entries) and (not self.max_bytes or total <= self.max_bytes):
+                break
+            victims.append(row["key"])
+            count -= 1
+            total -= row["size"]
+        conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in victims])
+        return evicted + len(victims)
+    def invalidate(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+    def get_or_compute(
+        self,
+        key: str,
+        model: str,
+        compute: Callable[[], Any],
+        serialize: Callable[[Any], Any] = lambda value: value,
+        restore: Callable[[Any], Any] = lambda payload: payload,
+    ) -> Any:
+        """キャッシュにあれば復元して返し、無ければcomputeを1回だけ実行して保存.
+        同じキーの計算が進行中の場合は、その結果（例外を含む）を待って共有します。
+        refresh_responses()の内側では保存済み応答・進行中の計算を使わず、常にcomputeを実行します。
+        Args:
+            key: cache_key()で生成したキー
+            model: 保存時に記録するモデル名
+            compute: プロバイダー呼び出し
+            serialize: 応答をJSON化可能な値へ変換
+            restore: 保存値を呼び出し元が期待する応答型へ復元
+        """
+        if _refreshing.get():
+            started = time.perf_counter()
+            value = compute()
+            self._store(key, model, serialize(value), started)
+            return value
+        cached = self._lookup(key)
+        if cached is not None:
+            return restore(cached)
+        future, leader = self._claim(key)
+        if not leader:
+            self._count("coalesced")
+            return restore(future.result())
+        try:
+            cached = self._lookup(key)
+            if cached is not None:
+                future.set_result(cached)
+                return restore(cached)
+            started = time.perf_counter()
+            value = compute()
+            future.set_result(self._store(key, model, serialize(value), started))
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._release(key)
+    def _claim(self, key: str) -> Tuple[Future, bool]:
+        """進行中の計算を取得、無ければ自分が計算役として登録（戻り値の2番目が計算役か）"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+    def _release(self, key: str) -> None:
+        with self._lock:
+            self._inflight.pop(key, None)
+    def _store(self, key: str, model: str, payload: Any, started: float) -> Any:
+        self._count("misses")
+        try:
+            self.put(key, model, payload, time.perf_counter() - started)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Failed to store LLM response in cache: {e}")
+        return payload
+    def _lookup(self, key: str) -> Optional[Any]:
+        try:
+            entry = self.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            return None
+        if entry is None:
+            return None
+        payload, latency = entry
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["saved_latency_seconds"] += latency
+        return payload
+    def stats(self) -> Dict[str, float]:
+        """このプロセスでのヒット・ミス・合流件数、ヒット率、節約したレイテンシ"""
+        return self.stats_since(None)
+    def stats_since(self, baseline: Optional[Dict[str, float]]) -> Dict[str, float]:
+        """baseline（以前のstats()）以降の差分"""
+        with self._lock:
+            stats = {name: value - (baseline or {}).get(name, 0) for name, value in self._stats.items()}
+        requests = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["requests"] = requests
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / requests if requests else 0.0
+        return stats
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """設定に基づく共有キャッシュ（llm_cache.enabled=falseならNone）"""
+    global _cache
+    from app.config.settings import settings
+    config = settings.llm_cache
+    if not config.enabled:
+        return None
+    # 作業ディレクトリの異なるサブプロセスとも同じDBを共有するためプロジェクト基準で解決
+    db_path = str(ProjectPaths.resolve_relative(config.path))
+    with _cache_lock:
+        if _cache is None or _cache.db_path != db_path:
+            _cache = LLMResponseCache(
+                db_path,
+                ttl_seconds=config.ttl_hours * 3600,
+                max_entries=config.max_entries,
+                max_bytes=int(config.max_size_mb * 1024 * 1024),
+            )
+        return _cache
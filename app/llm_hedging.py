@@ -0,0 +1,201 @@
+"""LLMリクエストのヘッジング（テールレイテンシ対策）.
+呼び出し箇所（call site）ごとに直近の応答時間を記録し、p95/p99を求めます。ヘッジを有効にした呼び出しが
+学習済みのパーセンタイル（サンプル不足の間は初期値）を超えても返らない場合、別のキーまたは別モデルへ
+同じリクエストを複製して送り、先に返った有効な応答を採用して残りを取り消します。複製による追加消費は
+「全リクエストに対する割合＋バースト」の予算で上限を設けます。
+"""
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Callable, Deque, Dict, List, Optional
+logger = logging.getLogger(__name__)
+class LatencyTracker:
+    """呼び出し箇所ごとの直近の応答時間（秒）"""
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+    def record(self, site: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(site, deque(maxlen=self.window)).append(seconds)
+    def count(self, site: str) -> int:
+        with self._lock:
+            return len(self._samples.get(site, ()))
+    def percentile(self, site: str, percentile: float) -> Optional[float]:
+        """最近傍順位法のパーセンタイル（サンプルが無ければNone）"""
+        with self._lock:
+            samples = sorted(self._samples.get(site, ()))
+        if not samples:
+            return None
+        rank = max(1, math.ceil(percentile / 100 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            sites = list(self._samples)
+        return {
+            site: {
+                "count": self.count(site),
+                "p50": self.percentile(site, 50),
+                "p95": self.percentile(site, 95),
+                "p99": self.percentile(site, 99),
+            }
+            for site in sites
+        }
+class HedgeBudget:
+    """複製リクエスト数を「リクエスト数×max_ratio＋burst」以下に抑える"""
+    def __init__(self, max_ratio: float = 0.1, burst: int = 2):
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.requests = 0
+        self.hedges = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    def note_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.hedges + 1 > self.requests * self.max_ratio + self.burst:
+                self.denied += 1
+                return False
+            self.hedges += 1
+            return True
+class RequestHedger:
+    """遅い呼び出しを複製し、先に返った有効な応答を採用する"""
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = 20,
+        window: int = 200,
+        initial_delay: float = 45.0,
+        min_delay: float = 2.0,
+        max_ratio: float = 0.1,
+        burst: int = 2,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.latencies = LatencyTracker(window)
+        self.budget = HedgeBudget(max_ratio, burst)
+        self._stats = {"hedged": 0, "hedge_wins": 0}
+        self._lock = threading.Lock()
+    def observe(self, site: str, seconds: float) -> None:
+        """ヘッジしない呼び出しの応答時間も記録し、しきい値の学習に使う"""
+        self.latencies.record(site, seconds)
+    def delay(self, site: str) -> float:
+        """複製を送るまでの待ち時間（サンプルがmin_samples未満の間はinitial_delay）"""
+        if self.latencies.count(site) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.latencies.percentile(site, self.percentile))
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+    def run(
+        self,
+        site: str,
+        primary: Callable[[], Any],
+        backup: Callable[[], Any],
+        validate: Callable[[Any], bool] = lambda response: response is not None,
+    ) -> Any:
+        """primaryを実行し、delay(site)を過ぎても返らなければbackupを並行して実行.
+        同期版の呼び出しは途中で止められないため、負けた側はスレッド上で完了させて結果を破棄します。
+        Args:
+            site: 応答時間を集計する呼び出し箇所
+            primary: 元の呼び出し
+            backup: 別キー/別モデルへの複製
+            validate: 採用してよい応答か
+        """
+        self.budget.note_request()
+        primary_future = _spawn(primary)
+        self._track(site, primary_future)
+        wait([primary_future], timeout=self.delay(site))
+        if primary_future.done() or not self._begin_hedge(site):
+            return primary_future.result()
+        futures = [primary_future, _spawn(backup)]
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in futures if future in done and _accepted(future, validate)), None)
+            if winner is not None:
+                return self._finish(site, winner is not primary_future, winner.result(), pending)
+        return _fallback_result(futures)
+    def _track(self, site: str, future: Any) -> None:
+        """元の呼び出しの応答時間を記録（取り消された場合は取り消しまでの経過時間を下限値として記録）"""
+        started = time.perf_counter()
+        def _done(finished: Any) -> None:
+            if finished.cancelled() or finished.exception() is None:
+                self.latencies.record(site, time.perf_counter() - started)
+        future.add_done_callback(_done)
+    def _begin_hedge(self, site: str) -> bool:
+        if not self.budget.try_acquire():
+            logger.debug(f"Hedge budget exhausted; waiting for slow {site} request")
+            return False
+        self._count("hedged")
+        logger.info(f"Hedging {site} request after {self.delay(site):.1f}s")
+        return True
+    def _finish(self, site: str, hedge_won: bool, response: Any, losers: set) -> Any:
+        if hedge_won:
+            self._count("hedge_wins")
+            logger.info(f"Hedged {site} request returned first")
+        for loser in losers:
+            loser.cancel()
+        return response
+    def stats(self) -> Dict[str, Any]:
+        """呼び出し箇所ごとのp50/p95/p99と現在のしきい値、ヘッジ件数・勝利数・予算超過で見送った件数"""
+        sites = self.latencies.snapshot()
+        for site, values in sites.items():
+            values["threshold"] = self.delay(site)
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats.update(requests=self.budget.requests, budget_denied=self.budget.denied, sites=sites)
+        return stats
+def _spawn(call: Callable[[], Any]) -> Future:
+    """呼び出し元のcontextvarsを引き継いだデーモンスレッドでcallを実行"""
+    future: Future = Future()
+    context = contextvars.copy_context()
+    def _runner() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(call))
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=_runner, name="llm-hedge", daemon=True).start()
+    return future
+def _accepted(future: Any, validate: Callable[[Any], bool]) -> bool:
+    if future.cancelled() or future.exception() is not None:
+        return False
+    try:
+        return bool(validate(future.result()))
+    except Exception:
+        return False
+def _fallback_result(futures: List[Any]) -> Any:
+    """どちらも有効な応答を返さなかった場合、成功した応答を優先し、無ければ元の呼び出しの例外を送出"""
+    for future in futures:
+        if not future.cancelled() and future.exception() is None:
+            return future.result()
+    raise futures[0].exception()
+_hedger: Optional[RequestHedger] = None
+_hedger_lock = threading.Lock()
+def get_request_hedger() -> RequestHedger:
+    """設定（llm_hedging）に基づく共有インスタンス"""
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            from app.config.settings import settings
+            config = settings.llm_hedging
+            _hedger = RequestHedger(
+                percentile=config.percentile,
+                min_samples=config.min_samples,
+                window=config.window,
+                initial_delay=config.initial_delay_seconds,
+                min_delay=config.min_delay_seconds,
+                max_ratio=config.max_extra_ratio,
+                burst=config.burst,
+            )
+        return _hedger
@@ -1,14 +1,25 @@
 """Structured logging utilities for LLM prompt/response tracking."""
 from __future__ import annotations
+import atexit
+import gzip
+import io
 import json
 import logging
+import os
+import queue
+import shutil
 import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Generator, Optional
+from typing import IO, Any, Dict, Generator, Iterator, List, Optional
 from app.config.paths import ProjectPaths
 from app.logging_config import get_log_session
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
 _LOGGER = logging.getLogger(__name__)
 def _make_serializable(value: Any) -> Any:
     """Convert *value* into JSON-serializable data."""
@@ -31,6 +42,13 @@ def _make_serializable(value: Any) -> Any:
     return str(value)
 def _current_timestamp() -> str:
     return datetime.now(timezone.utc).isoformat()
+def _parse_timestamp(value: Any) -> datetime:
+    """Parse a stored timestamp as an aware datetime (naive values are UTC, unreadable ones sort first)."""
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except (TypeError, ValueError):
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 class _ContextStore:
     """Thread-local LLM logging context."""
     def __init__(self) -> None:
@@ -53,12 +71,91 @@ class _ContextStore:
         finally:
             self.set(previous)
 _CONTEXT = _ContextStore()
+_SEGMENT_SUFFIXES = {"gzip": ".jsonl.gz", "zstd": ".jsonl.zst", "none": ".jsonl"}
+_FLUSH = object()
+_STOP = object()
+def _open_segment(path: Path) -> IO[str]:
+    """Open a (possibly compressed) log segment for text reading."""
+    if path.name.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.name.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path.name}")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(path.open("rb")), encoding="utf-8")
+    return path.open("r", encoding="utf-8")
+def _compress_file(source: Path, target: Path, compression: str) -> None:
+    staging = target.with_name(target.name + ".tmp")
+    with source.open("rb") as src:
+        if compression == "zstd":
+            with staging.open("wb") as raw, zstandard.ZstdCompressor().stream_writer(raw) as dst:
+                shutil.copyfileobj(src, dst)
+        elif compression == "gzip":
+            with gzip.open(staging, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        else:
+            with staging.open("wb") as dst:
+                shutil.copyfileobj(src, dst)
+    os.replace(staging, target)
 class LLMInteractionLogger:
-    """Persist structured records of LLM prompts and responses."""
-    def __init__(self, log_path: Optional[Path] = None) -> None:
+    """Persist structured records of LLM prompts and responses.
+    Callers only capture the record and enqueue it; a background writer thread
+    serializes records in batches, appends them to the active JSONL file and rotates
+    it into compressed segments by size or age. Rotated segments and the active file
+    are read back in order through :meth:`iter_records`.
+    """
+    def __init__(
+        self,
+        log_path: Optional[Path] = None,
+        *,
+        queue_size: int = 1000,
+        batch_size: int = 50,
+        flush_interval: float = 1.0,
+        max_segment_bytes: int = 32 * 1024 * 1024,
+        max_segment_age: float = 86400.0,
+        compression: str = "gzip",
+        overflow: str = "drop",
+        block_timeout: float = 5.0,
+        retention_segments: int = 30,
+    ) -> None:
+        """Initialize the logger.
+        Args:
+            log_path: Active JSONL file; rotated segments are written next to it
+            queue_size: Records buffered before the overflow policy applies
+            batch_size: Maximum records serialized and written per batch
+            flush_interval: Seconds the writer waits for more records before writing a partial batch
+            max_segment_bytes: Rotate the active file once it reaches this size (0 disables)
+            max_segment_age: Rotate the active file once its first record is this old in seconds (0 disables)
+            compression: "gzip", "zstd" (requires zstandard) or "none"
+            overflow: "drop" discards new records when the queue is full, "block" waits up to block_timeout
+            block_timeout: Seconds a caller waits for queue space with overflow="block" before dropping
+            retention_segments: Rotated segments kept on disk (0 keeps all)
+        """
         self.log_path = (log_path or ProjectPaths.logs_path("llm_interactions.jsonl")).resolve()
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
-        self._write_lock = threading.Lock()
+        if compression == "zstd" and zstandard is None:
+            _LOGGER.warning("zstandard is not installed; compressing LLM interaction logs with gzip")
+            compression = "gzip"
+        if compression not in _SEGMENT_SUFFIXES:
+            raise ValueError(f"Unsupported compression: {compression}")
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"Unsupported overflow policy: {overflow}")
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.compression = compression
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.retention_segments = retention_segments
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._handle: Optional[IO[str]] = None
+        self._segment_started = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        atexit.register(self.close)
     def log_interaction(
         self,
         *,
@@ -68,29 +165,197 @@ class LLMInteractionLogger:
         response: Any,
         metadata: Optional[Dict[str, Any]] = None,
     ) -> None:
-        """Write a JSON line with prompt, response, and context information."""
+        """Queue a record with prompt, response, and context information.
+        Serialization and file I/O happen on the writer thread; only the logging
+        context and session identifiers are captured on the caller's thread.
+        """
         session = get_log_session()
-        context = _CONTEXT.get()
-        payload: Dict[str, Any] = {
+        record: Dict[str, Any] = {
             "timestamp": _current_timestamp(),
             "provider": provider,
             "model": model,
-            "prompt": _make_serializable(prompt),
-            "response": _make_serializable(response),
-            "context": context or None,
-            "metadata": _make_serializable(metadata) if metadata else None,
+            "prompt": prompt,
+            "response": response,
+            "context": _CONTEXT.get() or None,
+            "metadata": metadata or None,
         }
         if session is not None:
-            payload["session_id"] = session.session_id
-            payload["run_id"] = getattr(session._filter, "run_id", None) if getattr(session, "_filter", None) else None
-        payload = {key: value for key, value in payload.items() if value is not None}
-        line = json.dumps(payload, ensure_ascii=False)
+            record["session_id"] = session.session_id
+            record["run_id"] = getattr(session._filter, "run_id", None) if getattr(session, "_filter", None) else None
+        self._ensure_writer()
+        try:
+            if self.overflow == "block":
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 100 == 0:
+                _LOGGER.warning("LLM interaction log queue is full; dropped %s records so far", dropped)
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every record queued so far has been written.
+        Returns:
+            False if the writer did not catch up within *timeout*
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return self._queue.empty()
+        done = threading.Event()
         try:
-            with self._write_lock:
-                with self.log_path.open("a", encoding="utf-8") as handle:
-                    handle.write(line + "\n")
+            self._queue.put((_FLUSH, done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+    def close(self, timeout: float = 10.0) -> None:
+        """Write outstanding records and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            _LOGGER.warning("LLM interaction logger did not stop cleanly; queue is full")
+            return
+        thread.join(timeout)
+    def stats(self) -> Dict[str, int]:
+        """Records written, dropped on overflow, and still waiting in the queue."""
+        return {"written": self.written, "dropped": self.dropped, "queued": self._queue.qsize()}
+    def segments(self) -> List[Path]:
+        """Rotated segments, oldest first."""
+        stem = self.log_path.name[: -len(".jsonl")] if self.log_path.name.endswith(".jsonl") else self.log_path.name
+        found = [
+            path
+            for suffix in _SEGMENT_SUFFIXES.values()
+            for path in self.log_path.parent.glob(f"{stem}-*{suffix}")
+            if path != self.log_path and not path.name.endswith(".tmp")
+        ]
+        return sorted(set(found), key=lambda path: path.name)
+    def iter_records(self, since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate logged records across compressed segments and the active file.
+        Args:
+            since: Skip records logged before this time (naive values are taken as local time)
+        """
+        files = self.segments()
+        if self.log_path.exists():
+            files.append(self.log_path)
+        threshold = since.astimezone(timezone.utc) if since else None
+        for path in files:
+            try:
+                handle = _open_segment(path)
+            except FileNotFoundError:
+                continue
+            with handle:
+                for line in handle:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        _LOGGER.debug("Skipping malformed LLM interaction line in %s", path.name)
+                        continue
+                    if threshold and _parse_timestamp(record.get("timestamp")) < threshold:
+                        continue
+                    yield record
+    def _ensure_writer(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="llm-interaction-log", daemon=True)
+                self._thread.start()
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._maybe_rotate()
+                continue
+            batch: List[Dict[str, Any]] = []
+            waiters: List[threading.Event] = []
+            while True:
+                if item is _STOP:
+                    stopping = True
+                elif isinstance(item, tuple) and item and item[0] is _FLUSH:
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+                if stopping or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(batch)
+            for waiter in waiters:
+                waiter.set()
+        self._close_handle()
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        lines = []
+        for record in batch:
+            payload = {key: _make_serializable(value) for key, value in record.items() if value is not None}
+            lines.append(json.dumps(payload, ensure_ascii=False) + "\n")
+        try:
+            handle = self._active_handle()
+            handle.write("".join(lines))
+            handle.flush()
+            self.written += len(lines)
+            self._maybe_rotate()
         except Exception as exc:
             _LOGGER.debug("Failed to write LLM interaction log: %s", exc)
+    def _active_handle(self) -> IO[str]:
+        handle = self._handle
+        if handle is not None:
+            try:
+                if os.stat(self.log_path).st_ino == os.fstat(handle.fileno()).st_ino:
+                    return handle
+            except FileNotFoundError:
+                pass
+            self._close_handle()
+        handle = self.log_path.open("a", encoding="utf-8")
+        stat = os.fstat(handle.fileno())
+        self._segment_started = stat.st_mtime if stat.st_size else time.time()
+        self._handle = handle
+        return handle
+    def _close_handle(self) -> None:
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            finally:
+                self._handle = None
+    def _maybe_rotate(self) -> None:
+        if self._handle is None:
+            return
+        try:
+            size = os.fstat(self._handle.fileno()).st_size
+        except (OSError, ValueError):
+            return
+        if not size:
+            return
+        too_large = self.max_segment_bytes and size >= self.max_segment_bytes
+        too_old = self.max_segment_age and time.time() - self._segment_started >= self.max_segment_age
+        if too_large or too_old:
+            self._rotate()
+    def _rotate(self) -> None:
+        """Move the active file aside and compress it into a timestamped segment."""
+        self._close_handle()
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        stem = self.log_path.name[: -len(".jsonl")] if self.log_path.name.endswith(".jsonl") else self.log_path.name
+        target = self.log_path.with_name(f"{stem}-{stamp}-{os.getpid()}{_SEGMENT_SUFFIXES[self.compression]}")
+        rotating = self.log_path.with_name(f".{target.name}.rotating")
+        try:
+            os.replace(self.log_path, rotating)
+            _compress_file(rotating, target, self.compression)
+            rotating.unlink()
+        except OSError as exc:
+            _LOGGER.warning("Failed to rotate LLM interaction log: %s", exc)
+            return
+        if self.retention_segments:
+            for stale in self.segments()[: -self.retention_segments]:
+                stale.unlink(missing_ok=True)
 _LOGGER_INSTANCE: Optional[LLMInteractionLogger] = None
 _LOGGER_LOCK = threading.Lock()
 def get_llm_logger() -> LLMInteractionLogger:
@@ -98,8 +363,23 @@ def get_llm_logger() -> LLMInteractionLogger:
     if _LOGGER_INSTANCE is None:
         with _LOGGER_LOCK:
             if _LOGGER_INSTANCE is None:
-                _LOGGER_INSTANCE = LLMInteractionLogger()
+                from app.config.settings import settings
+                config = settings.llm_logging
+                _LOGGER_INSTANCE = LLMInteractionLogger(
+                    queue_size=config.queue_size,
+                    batch_size=config.batch_size,
+                    flush_interval=config.flush_interval_seconds,
+                    max_segment_bytes=int(config.max_segment_mb * 1024 * 1024),
+                    max_segment_age=config.max_segment_hours * 3600,
+                    compression=config.compression,
+                    overflow=config.overflow,
+                    block_timeout=config.block_timeout_seconds,
+                    retention_segments=config.retention_segments,
+                )
     return _LOGGER_INSTANCE
+def iter_llm_interactions(since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """Iterate recorded interactions (compressed segments included), oldest first."""
+    return get_llm_logger().iter_records(since=since)
 @contextmanager
 def llm_logging_context(**kwargs: Any) -> Generator[None, None, None]:
     """Temporarily enrich interaction logs with contextual metadata."""
@@ -3,6 +3,7 @@ import logging
 import os
 import re
 import time
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Any, Dict, Iterable, List, Optional, Sequence
 from app.logging_config import get_log_session, setup_logging
@@ -10,12 +11,15 @@ from app.notifications.interfaces import Notifier
 from .api_rotation import initialize_api_infrastructure
 from .config import cfg
 from .discord import discord_notifier
+from .llm_cache import get_llm_cache, refresh_responses
 from .metadata_storage import metadata_storage
 from .models.workflow import WorkflowResult
+from .services.keyword_automaton import get_keyword_automaton
 from .services.media import ensure_ffmpeg_tooling
 from .sheets import sheets_manager
 from .workflow import (
     AlignSubtitlesStep,
+    AudioQualityGateStep,
     CollectNewsStep,
     FailureBus,
     GenerateMetadataStep,
@@ -23,8 +27,11 @@ from .workflow import (
     GenerateThumbnailStep,
     GenerateVideoStep,
     GenerateVisualDesignStep,
+    PrefetchBRollStep,
     QualityAssuranceStep,
+    QualityGateStep,
     ReviewVideoStep,
+    SubtitleQualityGateStep,
     SynthesizeAudioStep,
     TranscribeAudioStep,
     UploadToDriveStep,
@@ -52,14 +59,36 @@ def _bootstrap_runtime() -> str:
     _BOOTSTRAP_COMPLETED = True
     logger.info("FFmpeg binary validated: %s", _BOOTSTRAP_FFMPEG_PATH)
     return _BOOTSTRAP_FFMPEG_PATH
+HOOK_KEYWORDS: Dict[str, Sequence[str]] = {
+    "衝撃的事実": ("驚き", "衝撃", "まさか", "信じられない"),
+    "疑問提起": ("なぜ", "どうして", "理由", "原因"),
+    "隠された真実": ("知らない", "隠された", "裏側", "真実"),
+}
+TOPIC_KEYWORDS: Dict[str, Sequence[str]] = {
+    "株式市場": ("株", "日経"),
+    "金融政策": ("金利", "利上げ", "日銀"),
+    "為替": ("円安", "円高", "為替"),
+    "経済指標": ("GDP", "景気"),
+}
+_NUMERIC_HOOK_PATTERN = re.compile(r"\d+[%％]|\d+億|\d+倍")
+def _first_matching_label(text: str, groups: Dict[str, Sequence[str]]) -> Optional[str]:
+    """Return the first label (in ``groups`` order) whose keywords appear in ``text``."""
+    found = get_keyword_automaton(keyword for keywords in groups.values() for keyword in keywords).found(text)
+    for label, keywords in groups.items():
+        if found.intersection(keywords):
+            return label
+    return None
 RETRY_CLEANUP_MAP: Dict[str, Sequence[str]] = {
     "script_generation": ("script_content", "script_path"),
+    "broll_prefetch": ("broll_prefetch", "broll_prefetch_stats"),
     "visual_design_generation": ("visual_design", "visual_design_dict"),
     "metadata_generation": ("metadata",),
     "thumbnail_generation": ("thumbnail_path",),
     "audio_synthesis": ("audio_path",),
+    "audio_quality_gate": ("qa_audio_report",),
     "audio_transcription": ("stt_words",),
     "subtitle_alignment": ("subtitle_path", "aligned_subtitles"),
+    "subtitle_quality_gate": ("qa_subtitles_report",),
     "video_generation": (
         "video_path",
         "archived_audio_path",
@@ -73,6 +102,7 @@ RETRY_CLEANUP_MAP: Dict[str, Sequence[str]] = {
         "archived_broll_path",
     ),
     "media_quality_assurance": (
+        "qa_video_report",
         "qa_report",
         "qa_report_path",
         "qa_passed",
@@ -86,12 +116,15 @@ def _default_workflow_steps() -> List[WorkflowStep]:
     return [
         CollectNewsStep(),
         GenerateScriptStep(),
+        PrefetchBRollStep(),
         GenerateVisualDesignStep(),
         GenerateMetadataStep(),
         GenerateThumbnailStep(),
         SynthesizeAudioStep(),
+        AudioQualityGateStep(),
         TranscribeAudioStep(),
         AlignSubtitlesStep(),
+        SubtitleQualityGateStep(),
         GenerateVideoStep(),
         QualityAssuranceStep(),
         UploadToDriveStep(),
@@ -109,6 +142,7 @@ class YouTubeWorkflow:
         self.run_id: Optional[str] = None
         self.mode = "daily"
         self.context: Optional[WorkflowContext] = None
+        self._llm_cache_baseline: Optional[Dict[str, float]] = None
         self._log_session = get_log_session()
         self.steps: List[WorkflowStep] = list(steps) if steps else _default_workflow_steps()
         self.notifier: Notifier = notifier or discord_notifier
@@ -189,6 +223,8 @@ class YouTubeWorkflow:
         self.mode = mode
         self.run_id = self._initialize_run(mode)
         self.context = WorkflowContext(run_id=self.run_id, mode=mode)
+        llm_cache = get_llm_cache()
+        self._llm_cache_baseline = llm_cache.stats() if llm_cache else None
         qa_gating = getattr(getattr(cfg, "media_quality", None), "gating", None)
         max_attempts = 1 + max(0, getattr(qa_gating, "retry_attempts", 0))
         run_state = WorkflowRunState(
@@ -206,8 +242,11 @@ class YouTubeWorkflow:
         for index in range(run_state.start_index, len(self.steps)):
             step = self.steps[index]
             logger.info("Executing: %s", step.step_name)
+            # A QA retry restarts here because the previous output was rejected, so skip cached LLM responses.
+            regenerate = run_state.attempt > 1 and index == run_state.start_index
             try:
-                result = await step.execute(run_state.context)
+                with refresh_responses() if regenerate else nullcontext():
+                    result = await step.execute(run_state.context)
             except Exception as exc:
                 logger.exception("Step '%s' raised an exception", step.step_name)
                 return AttemptOutcome(
@@ -218,7 +257,7 @@ class YouTubeWorkflow:
             run_state.register_result(index, result)
             if getattr(result, "success", False):
                 continue
-            if isinstance(step, QualityAssuranceStep):
+            if isinstance(step, QualityGateStep):
                 retry_directive = self._evaluate_retry_request(run_state, max_attempts)
                 if retry_directive is not None:
                     retry_directive.failure_step = step.step_name
@@ -275,6 +314,9 @@ class YouTubeWorkflow:
     async def _handle_failure_event(self, event: WorkflowFailureEvent) -> None:
         event.response = await self._handle_workflow_failure(event.step_name, event.result, event.error)
     async def _cleanup_after_failure(self, _: WorkflowFailureEvent) -> None:
+        prefetcher = self.context.get("broll_prefetch") if self.context else None
+        if prefetcher is not None:
+            prefetcher.cancel()
         self._cleanup_temp_files()
     def _initialize_run(self, mode: str) -> str:
         if sheets_manager:
@@ -345,6 +387,12 @@ class YouTubeWorkflow:
         self._update_run_status("completed", result)
         self._cleanup_temp_files()
         return result
+    def _llm_cache_stats(self) -> Optional[Dict[str, float]]:
+        """LLM response cache hits and saved latency for this run."""
+        llm_cache = get_llm_cache()
+        if llm_cache is None:
+            return None
+        return llm_cache.stats_since(self._llm_cache_baseline)
     def _get_step_result(
         self, results: List[Optional[Any]], target_step: str
     ) -> Optional[Any]:
@@ -399,6 +447,8 @@ class YouTubeWorkflow:
             generated_files=context.generated_files,
             video_review_summary=video_review_summary,
             video_review_actions=video_review_actions,
+            prompt_freshness=context.get("prompt_freshness"),
+            llm_cache=self._llm_cache_stats(),
         )
         metadata_storage.log_execution(workflow_result)
         serialized_steps = {}
@@ -422,6 +472,7 @@ class YouTubeWorkflow:
             "video_url": video_url,
             "drive_folder": context.get("folder_id"),
             "video_review": video_review_data,
+            "llm_cache": workflow_result.llm_cache,
             "script_insights": {
                 "wow_score": insights.wow_score,
                 "surprise_points": insights.surprise_points,
@@ -479,15 +530,12 @@ class YouTubeWorkflow:
         if not script_content:
             return "その他"
         first_segment = script_content[:200]
-        if re.search(r"(驚き|衝撃|まさか|信じられない)", first_segment):
-            return "衝撃的事実"
-        if re.search(r"(なぜ|どうして|理由|原因)", first_segment):
-            return "疑問提起"
-        if re.search(r"\d+[%％]|\d+億|\d+倍", first_segment):
+        label = _first_matching_label(first_segment, HOOK_KEYWORDS)
+        if label in ("衝撃的事実", "疑問提起"):
+            return label
+        if _NUMERIC_HOOK_PATTERN.search(first_segment):
             return "意外な数字"
-        if re.search(r"(知らない|隠された|裏側|真実)", first_segment):
-            return "隠された真実"
-        return "その他"
+        return label or "その他"
     def _extract_topic(self, news_step: Any) -> str:
         if not news_step or not hasattr(news_step, "data"):
             return "一般"
@@ -495,15 +543,7 @@ class YouTubeWorkflow:
         if not news_items:
             return "一般"
         first_title = news_items[0].get("title", "") if news_items else ""
-        if "株" in first_title or "日経" in first_title:
-            return "株式市場"
-        if "金利" in first_title or "利上げ" in first_title or "日銀" in first_title:
-            return "金融政策"
-        if "円安" in first_title or "円高" in first_title or "為替" in first_title:
-            return "為替"
-        if "GDP" in first_title or "景気" in first_title:
-            return "経済指標"
-        return "一般"
+        return _first_matching_label(first_title, TOPIC_KEYWORDS) or "一般"
     async def _notify_workflow_start(self, mode: str):
         message = f"YouTube動画生成ワークフローを開始しました\nモード: {mode}\nRun ID: {self.run_id}"
         await self.notifier.notify(message, level="info", title="ワークフロー開始")
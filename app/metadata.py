@@ -1,4 +1,3 @@
-import json
 import logging
 import re
 from datetime import datetime
@@ -6,9 +5,14 @@ from typing import Any, Dict, List
 import google.generativeai as genai
 from .api_rotation import get_rotation_manager
 from .config import cfg
+from .json_extraction import extract_json
 from .llm_logging import llm_logging_context, record_llm_interaction
+from .services.keyword_automaton import get_keyword_automaton
 from app.constants.prompts import DEFAULT_VIDEO_MODE_CONTEXT, METADATA_MODE_CONTEXT, METADATA_OTHER_POLICIES_LINES, METADATA_REQUIREMENTS_LINES, METADATA_TITLE_AVOID_EXAMPLES, METADATA_TITLE_POLICY_LINES, METADATA_TITLE_SUCCESS_EXAMPLES, indent_lines, join_lines
 logger = logging.getLogger(__name__)
+TREND_PATTERNS = ('急騰', '暴落', '急落', '高騰', '急上昇', '急降下', '史上最高', '最安値', '年初来高値', '年初来安値')
+URGENT_PATTERNS = ('速報', '緊急', '衝撃', '警告', '注目', '重大')
+ECONOMIC_PATTERNS = ('日経平均', 'TOPIX', 'ダウ', 'ナスダック', '金利', 'インフレ', 'GDP', '失業率', '中央銀行', '日銀', 'FRB', 'ECB', '株価', '為替', '円安', '円高', '企業決算', '業績', '売上', '利益', '新規上場', 'IPO', 'M&A', '買収')
 
 class MetadataGenerator:
 
@@ -92,26 +96,12 @@ class MetadataGenerator:
             raise Exception('Gemini API failed with all keys for metadata generation')
 
     def _parse_metadata_response(self, response: str) -> Dict[str, Any]:
-        try:
-            match = re.search('```json\\n(.*?)\\n```', response, re.DOTALL)
-            if match:
-                json_str = match.group(1)
-            else:
-                start = response.find('{')
-                end = response.rfind('}')
-                if start != -1 and end != -1:
-                    json_str = response[start:end + 1]
-                else:
-                    raise ValueError('No JSON structure found')
-            metadata = json.loads(json_str)
-            return metadata
-        except json.JSONDecodeError as e:
-            logger.error(f'Failed to parse metadata JSON: {e}')
+        metadata = extract_json(response, expect=dict)
+        if metadata is None:
+            logger.error('Failed to parse metadata JSON: no JSON object found')
             logger.debug(f'Raw response: {response[:500]}...')
             return {}
-        except Exception as e:
-            logger.error(f'Error parsing metadata response: {e}')
-            return {}
+        return metadata
 
     def _validate_metadata(self, metadata: Dict[str, Any], news_items: List[Dict[str, Any]]) -> Dict[str, Any]:
         validated = {}
@@ -167,16 +157,11 @@ class MetadataGenerator:
         bai_match = re.search('(\\d+\\.?\\d*倍)', text)
         if bai_match:
             wow_elements.append(bai_match.group(1))
-        trend_patterns = ['急騰', '暴落', '急落', '高騰', '急上昇', '急降下', '史上最高', '最安値', '年初来高値', '年初来安値']
-        for pattern in trend_patterns:
-            if pattern in text:
-                wow_elements.append(pattern)
-                break
-        urgent_patterns = ['速報', '緊急', '衝撃', '警告', '注目', '重大']
-        for pattern in urgent_patterns:
-            if pattern in text:
-                wow_elements.append(pattern)
-                break
+        found = get_keyword_automaton(TREND_PATTERNS + URGENT_PATTERNS).found(text)
+        for patterns in (TREND_PATTERNS, URGENT_PATTERNS):
+            match = next((pattern for pattern in patterns if pattern in found), None)
+            if match:
+                wow_elements.append(match)
         return wow_elements[:2]
 
     def _enhance_description(self, description: str, news_items: List[Dict[str, Any]]) -> str:
@@ -209,12 +194,7 @@ class MetadataGenerator:
         return unique_tags[:15]
 
     def _extract_keywords(self, text: str) -> List[str]:
-        economic_patterns = ['日経平均', 'TOPIX', 'ダウ', 'ナスダック', '金利', 'インフレ', 'GDP', '失業率', '中央銀行', '日銀', 'FRB', 'ECB', '株価', '為替', '円安', '円高', '企業決算', '業績', '売上', '利益', '新規上場', 'IPO', 'M&A', '買収']
-        keywords = []
-        for pattern in economic_patterns:
-            if re.search(pattern, text):
-                keywords.append(pattern.replace('\\b', '').replace('\\\\', ''))
-        return keywords[:5]
+        return get_keyword_automaton(ECONOMIC_PATTERNS).matches(text)[:5]
 
     def _get_fallback_metadata(self, news_items: List[Dict[str, Any]], mode: str) -> Dict[str, Any]:
         current_date = datetime.now().strftime('%Y年%m月%d日')
@@ -0,0 +1,338 @@
+"""SQLite-backed metadata history store.
+
+メタデータ履歴をSQLite（WALモード）に保存し、run_id/mode/created_at/view_count の
+インデックスで検索・更新を行います。旧CSV/JSONLからの一回限りのインポートも提供します。
+"""
+
+import csv
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "run_id",
+    "created_at",
+    "mode",
+    "title",
+    "description",
+    "tags",
+    "category",
+    "thumbnail_text",
+    "seo_keywords",
+    "target_audience",
+    "estimated_watch_time",
+    "news_count",
+    "news_topics",
+    "video_url",
+    "view_count",
+    "like_count",
+    "comment_count",
+    "ctr",
+    "avg_view_duration",
+)
+METADATA_COLUMNS = COLUMNS[2:13]
+STATS_COLUMNS = COLUMNS[13:]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata_history (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    mode TEXT,
+    title TEXT,
+    description TEXT,
+    tags TEXT,
+    category TEXT,
+    thumbnail_text TEXT,
+    seo_keywords TEXT,
+    target_audience TEXT,
+    estimated_watch_time TEXT,
+    news_count INTEGER,
+    news_topics TEXT,
+    video_url TEXT,
+    view_count INTEGER,
+    like_count INTEGER,
+    comment_count INTEGER,
+    ctr REAL,
+    avg_view_duration REAL
+);
+CREATE INDEX IF NOT EXISTS idx_metadata_mode_created ON metadata_history (mode, created_at);
+CREATE INDEX IF NOT EXISTS idx_metadata_created ON metadata_history (created_at);
+CREATE INDEX IF NOT EXISTS idx_metadata_views ON metadata_history (view_count);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+LEGACY_IMPORT_KEY = "legacy_import"
+
+
+def _parse_int(value: Any) -> Optional[int]:
+    if value in (None, ""):
+        return None
+    try:
+        return int(float(str(value).replace(",", "")))
+    except ValueError:
+        return None
+
+
+def _parse_float(value: Any, suffix: str = "") -> Optional[float]:
+    """Parse numbers written by the CSV backend ("4.20%", "95.0s")."""
+    if value in (None, ""):
+        return None
+    text = str(value).strip()
+    if suffix and text.endswith(suffix):
+        text = text[: -len(suffix)]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _infer_created_at(run_id: str) -> Optional[str]:
+    for fmt in ("%Y%m%d_%H%M%S", "%Y%m%d-%H%M%S"):
+        for candidate in (run_id[-15:], run_id):
+            try:
+                return datetime.strptime(candidate, fmt).isoformat()
+            except ValueError:
+                continue
+    return None
+
+
+class MetadataDatabase:
+    """メタデータ履歴のSQLiteストア.
+
+    接続は操作ごとに開き、WALモードとbusy_timeoutにより複数プロセス・スレッドからの
+    同時書き込みを直列化します。
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        """初期化.
+
+        Args:
+            db_path: SQLiteファイルのパス
+            busy_timeout: ロック待ちの最大秒数
+        """
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert_metadata(self, row: Dict[str, Any]) -> None:
+        """メタデータを保存（同じrun_idは統計値を保持したまま上書き）.
+
+        Args:
+            row: COLUMNSのキーを持つ辞書（run_id, created_at必須）
+        """
+        values = {column: row.get(column) for column in COLUMNS}
+        placeholders = ", ".join(f":{column}" for column in COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in METADATA_COLUMNS)
+        with self._connect() as conn:
+            conn.execute(
+                f"INSERT INTO metadata_history ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(run_id) DO UPDATE SET {updates}",
+                values,
+            )
+
+    def update_stats(self, run_id: str, **stats: Any) -> bool:
+        """統計列のみを更新.
+
+        Args:
+            run_id: 更新対象のrun_id
+            **stats: STATS_COLUMNSに含まれる列と値（Noneは無視）
+
+        Returns:
+            該当行が存在し更新した場合True
+        """
+        changes = {key: value for key, value in stats.items() if key in STATS_COLUMNS and value is not None}
+        if not changes:
+            return False
+        assignments = ", ".join(f"{column} = :{column}" for column in changes)
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE metadata_history SET {assignments} WHERE run_id = :run_id",
+                {**changes, "run_id": run_id},
+            )
+            return cursor.rowcount > 0
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """run_idで1件取得."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM metadata_history WHERE run_id = ?", (run_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def query(
+        self,
+        limit: int = 100,
+        mode: str = None,
+        min_views: int = None,
+        order_by: str = "created_at",
+        descending: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """条件に合う履歴を取得.
+
+        Args:
+            limit: 取得件数上限
+            mode: フィルタするモード（None=全て）
+            min_views: 最小視聴回数（None=フィルタなし）
+            order_by: "created_at" または "view_count"
+            descending: 降順で取得する場合True
+
+        Returns:
+            履歴レコードのリスト
+        """
+        if order_by not in ("created_at", "view_count"):
+            raise ValueError(f"Unsupported order column: {order_by}")
+        clauses: List[str] = []
+        params: List[Any] = []
+        if mode:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if min_views is not None:
+            clauses.append("view_count >= ?")
+            params.append(min_views)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        direction = "DESC" if descending else "ASC"
+        sql = f"SELECT * FROM metadata_history {where} ORDER BY {order_by} {direction}, run_id {direction} LIMIT ?"
+        with self._connect() as conn:
+            rows = conn.execute(sql, (*params, limit)).fetchall()
+        return [self._decode(row) for row in rows]
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        """最新の1件を取得."""
+        rows = self.query(limit=1, descending=True)
+        return rows[0] if rows else None
+
+    def count(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM metadata_history").fetchone()[0]
+
+    def _decode(self, row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        for column in ("tags", "seo_keywords"):
+            try:
+                record[column] = json.loads(record.get(column) or "[]")
+            except json.JSONDecodeError:
+                record[column] = []
+        return record
+
+    def import_legacy(self, csv_path: str = None, jsonl_path: str = None, force: bool = False) -> int:
+        """旧CSV/JSONL履歴を一度だけ取り込む.
+
+        CSVの行をそのまま移行し、JSONL（WorkflowResult）にしか無い実行は
+        タイトル・URL・YouTube統計を補完して追加します。
+
+        Args:
+            csv_path: 旧metadata_history.csvのパス
+            jsonl_path: 旧execution_log.jsonlのパス
+            force: 取り込み済みでも再実行する場合True
+
+        Returns:
+            取り込んだ行数
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            done = conn.execute("SELECT value FROM store_meta WHERE key = ?", (LEGACY_IMPORT_KEY,)).fetchone()
+            if done and not force:
+                return 0
+            imported = 0
+            if csv_path and Path(csv_path).exists():
+                imported += self._import_csv(conn, csv_path)
+            if jsonl_path and Path(jsonl_path).exists():
+                imported += self._import_jsonl(conn, jsonl_path)
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                (LEGACY_IMPORT_KEY, datetime.now().isoformat()),
+            )
+        if imported:
+            logger.info(f"Imported {imported} legacy metadata records into {self.db_path}")
+        return imported
+
+    def _import_csv(self, conn: sqlite3.Connection, csv_path: str) -> int:
+        rows = []
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            for raw in csv.DictReader(f):
+                run_id = raw.get("run_id")
+                if not run_id:
+                    continue
+                row = {column: raw.get(column) or None for column in COLUMNS}
+                row["created_at"] = raw.get("timestamp") or _infer_created_at(run_id) or ""
+                row["news_count"] = _parse_int(raw.get("news_count"))
+                row["view_count"] = _parse_int(raw.get("view_count"))
+                row["like_count"] = _parse_int(raw.get("like_count"))
+                row["comment_count"] = _parse_int(raw.get("comment_count"))
+                row["ctr"] = _parse_float(raw.get("ctr"), "%")
+                row["avg_view_duration"] = _parse_float(raw.get("avg_view_duration"), "s")
+                rows.append(row)
+        # 再取り込み（force=True）でもupdate_statsで更新済みの統計値は残し、CSV由来の列のみ上書きする
+        placeholders = ", ".join(f":{column}" for column in COLUMNS)
+        updates = ", ".join(
+            [f"{column} = excluded.{column}" for column in ("created_at", *METADATA_COLUMNS)]
+            + [f"{column} = COALESCE({column}, excluded.{column})" for column in STATS_COLUMNS]
+        )
+        conn.executemany(
+            f"INSERT INTO metadata_history ({', '.join(COLUMNS)}) VALUES ({placeholders}) "
+            f"ON CONFLICT(run_id) DO UPDATE SET {updates}",
+            rows,
+        )
+        return len(rows)
+
+    def _import_jsonl(self, conn: sqlite3.Connection, jsonl_path: str) -> int:
+        imported = 0
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                run_id = record.get("run_id") if isinstance(record, dict) else None
+                if not run_id:
+                    continue
+                feedback = record.get("youtube_feedback") or {}
+                cursor = conn.execute(
+                    "INSERT INTO metadata_history (run_id, created_at, mode, title, news_count, video_url, "
+                    "view_count, like_count, comment_count, ctr, avg_view_duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(run_id) DO UPDATE SET "
+                    "title = COALESCE(title, excluded.title), "
+                    "video_url = COALESCE(video_url, excluded.video_url), "
+                    "view_count = COALESCE(view_count, excluded.view_count), "
+                    "like_count = COALESCE(like_count, excluded.like_count), "
+                    "comment_count = COALESCE(comment_count, excluded.comment_count), "
+                    "ctr = COALESCE(ctr, excluded.ctr), "
+                    "avg_view_duration = COALESCE(avg_view_duration, excluded.avg_view_duration)",
+                    (
+                        run_id,
+                        _infer_created_at(run_id) or feedback.get("fetched_at") or "",
+                        record.get("mode"),
+                        record.get("title"),
+                        record.get("news_count"),
+                        record.get("video_url"),
+                        feedback.get("views"),
+                        feedback.get("likes"),
+                        feedback.get("comments_count"),
+                        feedback.get("ctr"),
+                        feedback.get("avg_view_duration"),
+                    ),
+                )
+                imported += cursor.rowcount
+        return imported
@@ -1,25 +1,44 @@
 """メタデータ記録・管理モジュール + フィードバックループ統合.
 
-生成されたメタデータをローカルJSONL + Google Sheetsに記録し、
+生成されたメタデータをローカルSQLite/JSONL + Google Sheetsに記録し、
 YouTube統計と組み合わせて継続的改善のためのフィードバックループを提供します。
 """
 
-import csv
 import importlib
 import importlib.util
 import json
 import logging
-import os
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List
 
+from app.analytics_store import ExecutionAnalyticsStore
 from app.config.paths import ProjectPaths
+from app.execution_log import open_execution_log
+from app.metadata_db import MetadataDatabase
+from app.services.keyword_automaton import get_keyword_automaton
 
 from .models.workflow import WorkflowResult
 
 logger = logging.getLogger(__name__)
 
+TITLE_KEYWORDS = (
+    "日経平均",
+    "株価",
+    "円安",
+    "円高",
+    "金利",
+    "利上げ",
+    "GDP",
+    "インフレ",
+    "日銀",
+    "FRB",
+    "暴落",
+    "急騰",
+    "速報",
+    "緊急",
+)
+
 
 def _load_sheets_manager():
     module_name = "app.sheets"
@@ -32,18 +51,24 @@ def _load_sheets_manager():
 class MetadataStorage:
     """メタデータ記録・管理クラス."""
 
-    def __init__(self, csv_path: str = None, jsonl_path: str = None):
+    def __init__(self, csv_path: str = None, jsonl_path: str = None, db_path: str = None):
         """初期化.
 
         Args:
-            csv_path: CSVファイルのパス（デフォルト: data/metadata_history.csv）
-            jsonl_path: JSONLファイルのパス（デフォルト: output/execution_log.jsonl）
+            csv_path: 旧CSVファイルのパス（デフォルト: data/metadata_history.csv、初回インポート元）
+            jsonl_path: 旧JSONLファイルのパス（デフォルト: output/execution_log.jsonl、
+                セグメントログは拡張子を除いた同名ディレクトリに保存）
+            db_path: SQLiteファイルのパス（デフォルト: CSVと同じ場所の.db）
         """
         self.csv_path = csv_path or self._get_default_csv_path()
         self.jsonl_path = jsonl_path or self._get_default_jsonl_path()
+        self.db_path = db_path or str(Path(self.csv_path).with_suffix(".db"))
         self.sheets_manager = None
-        self._ensure_csv_exists()
         self._ensure_jsonl_dir()
+        self.db = MetadataDatabase(self.db_path)
+        self.db.import_legacy(self.csv_path, self.jsonl_path)
+        self.execution_log = open_execution_log(self.jsonl_path)
+        self.analytics_store = ExecutionAnalyticsStore(str(self.execution_log.directory / "analytics.db"))
         self._initialize_sheets()
 
     def _get_default_jsonl_path(self) -> str:
@@ -58,37 +83,6 @@ class MetadataStorage:
         data_dir.mkdir(exist_ok=True)
         return str(data_dir / "metadata_history.csv")
 
-    def _ensure_csv_exists(self):
-        """CSVファイルが存在しない場合は作成."""
-        if not os.path.exists(self.csv_path):
-            headers = [
-                "timestamp",
-                "run_id",
-                "mode",
-                "title",
-                "description",
-                "tags",
-                "category",
-                "thumbnail_text",
-                "seo_keywords",
-                "target_audience",
-                "estimated_watch_time",
-                "news_count",
-                "news_topics",
-                "video_url",
-                "view_count",
-                "like_count",
-                "comment_count",
-                "ctr",
-                "avg_view_duration",
-            ]
-
-            with open(self.csv_path, "w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=headers)
-                writer.writeheader()
-
-            logger.info(f"Created metadata CSV: {self.csv_path}")
-
     def _ensure_jsonl_dir(self):
         """JSONLディレクトリが存在することを確認."""
         Path(self.jsonl_path).parent.mkdir(parents=True, exist_ok=True)
@@ -100,7 +94,7 @@ class MetadataStorage:
         if manager and getattr(manager, "service", None):
             logger.info("Google Sheets connection available for metadata storage")
         else:
-            logger.warning("Google Sheets not available, using CSV only")
+            logger.warning("Google Sheets not available, using local store only")
 
     def save_metadata(
         self,
@@ -109,7 +103,7 @@ class MetadataStorage:
         mode: str = "daily",
         news_items: List[Dict] = None,
     ) -> bool:
-        """メタデータをCSVとGoogle Sheetsに保存.
+        """メタデータをSQLiteとGoogle Sheetsに保存.
 
         Args:
             metadata: 保存するメタデータ
@@ -126,9 +120,8 @@ class MetadataStorage:
         # ニューストピックを抽出
         news_topics = self._extract_news_topics(news_items) if news_items else ""
 
-        # CSV用データ
-        csv_row = {
-            "timestamp": timestamp,
+        row = {
+            "created_at": timestamp,
             "run_id": run_id,
             "mode": mode,
             "title": metadata.get("title", ""),
@@ -141,16 +134,10 @@ class MetadataStorage:
             "estimated_watch_time": metadata.get("estimated_watch_time", ""),
             "news_count": metadata.get("news_count", 0),
             "news_topics": news_topics,
-            "video_url": "",  # 後で更新
-            "view_count": "",
-            "like_count": "",
-            "comment_count": "",
-            "ctr": "",
-            "avg_view_duration": "",
         }
 
-        # ローカルCSVに保存
-        self._save_to_csv(csv_row)
+        # ローカルSQLiteに保存（統計列は update_video_stats で後から更新）
+        self.db.upsert_metadata(row)
 
         # Google Sheetsに保存
         if self.sheets_manager:
@@ -159,16 +146,6 @@ class MetadataStorage:
         logger.info(f"Saved metadata for run {run_id}")
         return True
 
-    def _save_to_csv(self, row: Dict[str, Any]):
-        """CSVに行を追加."""
-        headers = list(row.keys())
-
-        with open(self.csv_path, "a", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=headers)
-            writer.writerow(row)
-
-        logger.debug(f"Saved metadata to CSV: {self.csv_path}")
-
     def _save_to_sheets(self, metadata: Dict[str, Any], run_id: str, mode: str, news_topics: str):
         """Google Sheetsのmetadataシートに保存."""
         if not self.sheets_manager or not self.sheets_manager.service:
@@ -230,41 +207,9 @@ class MetadataStorage:
         Returns:
             メタデータ履歴のリスト
         """
-        try:
-            history = []
-
-            with open(self.csv_path, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-
-                for row in reader:
-                    # モードフィルタ
-                    if mode and row.get("mode") != mode:
-                        continue
-
-                    # 視聴回数フィルタ
-                    if min_views is not None:
-                        try:
-                            views = int(row.get("view_count", 0) or 0)
-                            if views < min_views:
-                                continue
-                        except ValueError:
-                            continue
-
-                    # JSONフィールドをパース
-                    row["tags"] = json.loads(row.get("tags", "[]"))
-                    row["seo_keywords"] = json.loads(row.get("seo_keywords", "[]"))
-
-                    history.append(row)
-
-                    if len(history) >= limit:
-                        break
-
-            logger.info(f"Loaded {len(history)} metadata records from history")
-            return history
-
-        except FileNotFoundError:
-            logger.warning(f"Metadata history file not found: {self.csv_path}")
-            return []
+        history = self.db.query(limit=limit, mode=mode, min_views=min_views)
+        logger.info(f"Loaded {len(history)} metadata records from history")
+        return history
 
     def get_successful_titles(self, min_views: int = 1000, limit: int = 50) -> List[str]:
         """成功したタイトルを取得（視聴回数ベース）.
@@ -276,12 +221,9 @@ class MetadataStorage:
         Returns:
             成功したタイトルのリスト
         """
-        history = self.load_history(limit=limit * 2, min_views=min_views)
-
-        # 視聴回数でソート
-        sorted_history = sorted(history, key=lambda x: int(x.get("view_count", 0) or 0), reverse=True)
+        history = self.db.query(limit=limit, min_views=min_views, order_by="view_count", descending=True)
 
-        titles = [record["title"] for record in sorted_history[:limit] if record.get("title")]
+        titles = [record["title"] for record in history if record.get("title")]
 
         logger.info(f"Retrieved {len(titles)} successful titles (min {min_views} views)")
         return titles
@@ -295,14 +237,11 @@ class MetadataStorage:
         Returns:
             キーワードと出現回数の辞書
         """
-        history = self.load_history(limit=limit * 2)
-
-        # 視聴回数でソート
-        sorted_history = sorted(history, key=lambda x: int(x.get("view_count", 0) or 0), reverse=True)
+        history = self.db.query(limit=limit, order_by="view_count", descending=True)
 
         keyword_count = {}
 
-        for record in sorted_history[:limit]:
+        for record in history:
             # タイトルからキーワードを抽出
             title = record.get("title", "")
             keywords = self._extract_title_keywords(title)
@@ -325,29 +264,8 @@ class MetadataStorage:
         """タイトルからキーワードを抽出."""
         import re
 
-        keywords = []
-
         # 経済関連キーワード
-        patterns = [
-            r"日経平均",
-            r"株価",
-            r"円安",
-            r"円高",
-            r"金利",
-            r"利上げ",
-            r"GDP",
-            r"インフレ",
-            r"日銀",
-            r"FRB",
-            r"暴落",
-            r"急騰",
-            r"速報",
-            r"緊急",
-        ]
-
-        for pattern in patterns:
-            if re.search(pattern, title):
-                keywords.append(pattern)
+        keywords = get_keyword_automaton(TITLE_KEYWORDS).matches(title)
 
         # パーセンテージや数字
         percent_match = re.search(r"\d+[%％]", title)
@@ -357,7 +275,7 @@ class MetadataStorage:
         return keywords
 
     def log_execution(self, workflow_result: "WorkflowResult") -> bool:
-        """ワークフロー実行結果をJSONL + Sheets に記録.
+        """ワークフロー実行結果をセグメントログ + Sheets に記録.
 
         Args:
             workflow_result: WorkflowResultインスタンス
@@ -365,8 +283,12 @@ class MetadataStorage:
         Returns:
             成功時True
         """
-        # 1. JSONLに完全データを保存（分析用）
-        self._save_to_jsonl(workflow_result)
+        # 1. セグメントログに完全データを保存（分析用）
+        self.execution_log.append(workflow_result)
+        try:
+            self.analytics_store.sync(self.execution_log)
+        except Exception as e:
+            logger.warning(f"Failed to update analytics aggregates: {e}")
 
         # 2. Google Sheetsに人間向けフォーマットで保存
         if self.sheets_manager and self.sheets_manager.service:
@@ -375,12 +297,6 @@ class MetadataStorage:
         logger.info(f"Logged execution for run {workflow_result.run_id}")
         return True
 
-    def _save_to_jsonl(self, result: "WorkflowResult"):
-        """JSONLに追加（append-only log）."""
-        with open(self.jsonl_path, "a", encoding="utf-8") as f:
-            f.write(result.model_dump_json() + "\n")
-        logger.debug(f"Saved to JSONL: {self.jsonl_path}")
-
     def _sync_to_sheets(self, result: "WorkflowResult"):
         """Google Sheetsの3タブに同期."""
         if not self.sheets_manager or not self.sheets_manager.service:
@@ -473,12 +389,9 @@ class MetadataStorage:
 
     def _extract_video_number(self, run_id: str) -> int:
         """run_idから動画番号を抽出（sequential）."""
-        # Simple approach: count JSONL lines
+        # manifestの件数を参照（O(1)）
         try:
-            if os.path.exists(self.jsonl_path):
-                with open(self.jsonl_path, "r") as f:
-                    return sum(1 for _ in f) + 1
-            return 1
+            return self.execution_log.count() + 1
         except Exception:
             return 1
 
@@ -532,42 +445,22 @@ class MetadataStorage:
             comment_count: コメント数
             ctr: クリック率
             avg_view_duration: 平均視聴時間
-        """
-        # CSVを読み込み
-        rows = []
-        updated = False
-
-        with open(self.csv_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            headers = reader.fieldnames
-
-            for row in reader:
-                if row["run_id"] == run_id:
-                    # 更新
-                    if video_url is not None:
-                        row["video_url"] = video_url
-                    if view_count is not None:
-                        row["view_count"] = str(view_count)
-                    if like_count is not None:
-                        row["like_count"] = str(like_count)
-                    if comment_count is not None:
-                        row["comment_count"] = str(comment_count)
-                    if ctr is not None:
-                        row["ctr"] = f"{ctr:.2f}%"
-                    if avg_view_duration is not None:
-                        row["avg_view_duration"] = f"{avg_view_duration:.1f}s"
-
-                    updated = True
-                    logger.info(f"Updated stats for run {run_id}")
-
-                rows.append(row)
 
+        Returns:
+            該当するrun_idが存在し更新した場合True
+        """
+        updated = self.db.update_stats(
+            run_id,
+            video_url=video_url,
+            view_count=view_count,
+            like_count=like_count,
+            comment_count=comment_count,
+            ctr=ctr,
+            avg_view_duration=avg_view_duration,
+        )
         if updated:
-            # CSVに書き戻し
-            with open(self.csv_path, "w", encoding="utf-8", newline="") as f:
-                writer = csv.DictWriter(f, fieldnames=headers)
-                writer.writeheader()
-                writer.writerows(rows)
+            logger.info(f"Updated stats for run {run_id}")
+        return updated
 
 
 # グローバルインスタンス
@@ -22,11 +22,20 @@ class QualityGateReport(BaseModel):
     """Aggregated QA report persisted for traceability."""
     run_id: str
     mode: str
+    gate: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     checks: List[MediaCheckResult] = Field(default_factory=list)
     report_path: Optional[str] = None
     def add_check(self, check: MediaCheckResult) -> None:
         self.checks.append(check)
+    @classmethod
+    def combine(cls, run_id: str, mode: str, payloads: List[Dict]) -> "QualityGateReport":
+        """Merge persisted per-gate payloads (``dict()`` output) into one report."""
+        report = cls(run_id=run_id, mode=mode)
+        for payload in payloads:
+            for check in payload.get("checks", []):
+                report.add_check(MediaCheckResult(**check))
+        return report
     @property
     def passed(self) -> bool:
         return all(check.status != CheckStatus.FAILED or not check.blocking for check in self.checks)
@@ -7,6 +7,8 @@ class ScreenshotEvidence(BaseModel):
     index: int = Field(ge=0)
     path: str
     timestamp_seconds: float = Field(ge=0)
+    cluster_size: int = Field(default=1, ge=1)
+    cluster_timestamps: List[float] = Field(default_factory=list)
     @property
     def timestamp_label(self) -> str:
         """人間が読みやすい形式のタイムスタンプ"""
@@ -26,7 +28,11 @@ class VideoReviewResult(BaseModel):
     model_name: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
     screenshots: List[ScreenshotEvidence] = Field(default_factory=list)
+    captured_paths: List[str] = Field(default_factory=list)
     feedback: Optional[VideoReviewFeedback] = None
+    frames_total: int = 0
+    frames_kept: int = 0
+    payload_bytes_saved: int = 0
     def to_dict(self) -> dict:
         """JSONシリアライズしやすい辞書形式に変換"""
         return {
@@ -35,5 +41,9 @@ class VideoReviewResult(BaseModel):
             "model_name": self.model_name,
             "created_at": self.created_at.isoformat(),
             "screenshots": [shot.model_dump() for shot in self.screenshots],
+            "captured_paths": self.captured_paths,
             "feedback": self.feedback.model_dump() if self.feedback else None,
+            "frames_total": self.frames_total,
+            "frames_kept": self.frames_kept,
+            "payload_bytes_saved": self.payload_bytes_saved,
         }
@@ -133,6 +133,8 @@ class WorkflowResult(BaseModel):
     generated_files: List[str] = Field(default_factory=list, description="生成されたファイル")
     video_review_summary: Optional[str] = Field(default=None, description="AIレビューの要約")
     video_review_actions: List[str] = Field(default_factory=list, description="AIレビューで提案された次のアクション")
+    prompt_freshness: Optional[Dict[str, Any]] = Field(default=None, description="使用したプロンプトの取得元と鮮度")
+    llm_cache: Optional[Dict[str, float]] = Field(default=None, description="LLM応答キャッシュのヒット率と節約したレイテンシ")
     error: Optional[str] = Field(default=None, description="エラーメッセージ")
     failed_step: Optional[str] = Field(default=None, description="失敗したステップ")
     youtube_feedback: Optional["YouTubeFeedback"] = Field(default=None, description="YouTube統計")
@@ -1,4 +1,11 @@
+import hashlib
+import json
 import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
 import yaml
 class PromptManager:
     def __init__(self, prompts_dir="app/config_prompts/prompts"):
@@ -33,3 +40,79 @@ class PromptManager:
             yaml.safe_dump(prompts, f, allow_unicode=True)
 def get_prompt_manager():
     return PromptManager()
+@dataclass
+class CachedPrompts:
+    """キャッシュ済みのSheetsプロンプト"""
+    prompts: Dict[str, str]
+    fingerprint: str
+    fetched_at: float
+    def age(self) -> float:
+        return max(0.0, time.time() - self.fetched_at)
+class SheetPromptCache:
+    """Sheetsから取得したプロンプトのTTL付きキャッシュ（メモリ＋モード別JSONファイル）.
+    fingerprintは取得したシート範囲全体のハッシュで、再検証時に内容が変わっていなければ
+    プロンプトを組み立て直さずfetched_atだけを更新します。
+    """
+    def __init__(self, cache_dir: str, ttl_seconds: float = 900.0):
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, CachedPrompts] = {}
+        self._lock = threading.Lock()
+    @staticmethod
+    def fingerprint(rows: Any) -> str:
+        payload = json.dumps(rows, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    def _path(self, mode: str) -> str:
+        return os.path.join(self.cache_dir, f"{mode}.json")
+    def get(self, mode: str) -> Optional[CachedPrompts]:
+        with self._lock:
+            entry = self._entries.get(mode)
+            if entry is None:
+                entry = self._read(mode)
+                if entry is not None:
+                    self._entries[mode] = entry
+            return entry
+    def _read(self, mode: str) -> Optional[CachedPrompts]:
+        try:
+            with open(self._path(mode), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return CachedPrompts(prompts=dict(data["prompts"]), fingerprint=data["fingerprint"], fetched_at=float(data["fetched_at"]))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    def put(self, mode: str, prompts: Dict[str, str], fingerprint: str) -> CachedPrompts:
+        entry = CachedPrompts(prompts=dict(prompts), fingerprint=fingerprint, fetched_at=time.time())
+        with self._lock:
+            self._entries[mode] = entry
+            self._write(mode, entry)
+        return entry
+    def touch(self, mode: str) -> Optional[CachedPrompts]:
+        """内容が変わっていないことを確認できたエントリの取得時刻を更新"""
+        entry = self.get(mode)
+        if entry is None:
+            return None
+        return self.put(mode, entry.prompts, entry.fingerprint)
+    def invalidate(self, mode: str) -> None:
+        with self._lock:
+            self._entries.pop(mode, None)
+            try:
+                os.remove(self._path(mode))
+            except FileNotFoundError:
+                pass
+    def _write(self, mode: str, entry: CachedPrompts) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{self._path(mode)}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(entry), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self._path(mode))
+    def is_stale(self, entry: CachedPrompts) -> bool:
+        return entry.age() > self.ttl_seconds
+    def freshness(self, entry: CachedPrompts, source: str) -> Dict[str, Any]:
+        """実行メタデータに記録するプロンプトの鮮度情報"""
+        return {
+            "source": source,
+            "stale": self.is_stale(entry),
+            "age_seconds": round(entry.age(), 1),
+            "ttl_seconds": self.ttl_seconds,
+            "fingerprint": entry.fingerprint[:12],
+            "fetched_at": datetime.fromtimestamp(entry.fetched_at).isoformat(),
+        }
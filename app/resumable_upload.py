@@ -0,0 +1,169 @@
+"""Google resumable upload protocol client with persisted sessions.
+
+Drive/YouTube共通のレジューム可能アップロード（uploadType=resumable）を、HTTPセッション
+（requests互換）に対して直接実装します。開始時に得たセッションURIはファイルの同一性
+（パス・サイズ・mtime）をキーに保存し、再起動後は未確定分の問い合わせ
+（``Content-Range: bytes */<size>``）から最後に受理されたバイトの次へ続けます。
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from app.config.paths import ProjectPaths
+from app.write_behind import WriteBehindStore
+logger = logging.getLogger(__name__)
+CHUNK_ALIGNMENT = 256 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+RESUME_INCOMPLETE = 308
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+EXPIRED_STATUSES = {404, 410}
+ProgressCallback = Callable[[int, int], None]
+class ResumableUploadError(Exception):
+    """アップロードAPIがエラー応答を返した"""
+    def __init__(self, message: str, status: Optional[int]=None, content: bytes=b''):
+        super().__init__(message)
+        self.status = status
+        self.content = content
+def align_chunk_size(chunk_size: int) -> int:
+    """チャンクサイズをプロトコルが要求する256KiBの倍数に丸める"""
+    return max(CHUNK_ALIGNMENT, chunk_size // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+def _acknowledged_bytes(response) -> int:
+    """308応答のRangeヘッダ（bytes=0-N）からサーバーが受理したバイト数を得る"""
+    range_header = response.headers.get('Range')
+    if not range_header:
+        return 0
+    return int(range_header.rsplit('-', 1)[-1]) + 1
+class ResumableUploader:
+    def __init__(self, session, upload_url: str, sessions: WriteBehindStore, chunk_size: int=DEFAULT_CHUNK_SIZE, max_retries: int=5, timeout: float=120.0, sleep: Callable[[float], None]=time.sleep):
+        """初期化.
+        Args:
+            session: 認証済みHTTPセッション（requests.Session互換、スレッド間で共有可）
+            upload_url: アップロード開始エンドポイント（uploadType=resumableは自動付与）
+            sessions: セッションURIの永続化先
+            chunk_size: 1リクエストで送るバイト数（256KiBの倍数に丸める）
+            max_retries: 5xx/接続エラー時の再試行回数
+            timeout: 1リクエストのタイムアウト秒数
+            sleep: 再試行待ち（テスト用に差し替え可能）
+        """
+        self.session = session
+        self.upload_url = upload_url
+        self.sessions = sessions
+        self.chunk_size = align_chunk_size(chunk_size)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._sleep = sleep
+    @staticmethod
+    def session_key(file_path: str) -> str:
+        stat = os.stat(file_path)
+        return f'{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}'
+    def pending(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """中断中のセッション記録（無ければNone）"""
+        if not os.path.exists(file_path):
+            return None
+        return self.sessions.get(self.session_key(file_path))
+    def upload(self, file_path: str, metadata: Dict[str, Any], mime_type: str, params: Optional[Dict[str, Any]]=None, progress: Optional[ProgressCallback]=None) -> Dict[str, Any]:
+        """ファイルをチャンク単位で送信し、完了時のリソースJSONを返す.
+        保存済みセッションがあれば同じURIへ続きから送信し、期限切れなら新規に開始します。
+        Raises:
+            ResumableUploadError: 再試行できないエラー応答、または再試行回数超過
+        """
+        total = os.path.getsize(file_path)
+        key = self.session_key(file_path)
+        record = self.sessions.get(key)
+        offset = 0
+        if record:
+            status = self._query(record['uri'], total)
+            if isinstance(status, dict):
+                self.sessions.delete(key)
+                return status
+            if status is None:
+                logger.warning(f'Upload session expired, restarting: {file_path}')
+                self.sessions.delete(key)
+                record = None
+            else:
+                offset = status
+                logger.info(f'Resuming upload of {os.path.basename(file_path)} at {offset}/{total} bytes')
+        if not record:
+            record = {'uri': self._start(metadata, mime_type, total, params), 'file': os.path.abspath(file_path), 'size': total, 'metadata': metadata, 'started_at': datetime.now().isoformat()}
+            self.sessions.put(key, record)
+        uri = record['uri']
+        failures = 0
+        with open(file_path, 'rb') as handle:
+            while True:
+                handle.seek(offset)
+                chunk = handle.read(self.chunk_size)
+                content_range = f'bytes {offset}-{offset + len(chunk) - 1}/{total}' if chunk else f'bytes */{total}'
+                try:
+                    response = self.session.put(uri, data=chunk, headers={'Content-Range': content_range}, timeout=self.timeout)
+                    status_code = response.status_code
+                except OSError as e:
+                    response, status_code = None, None
+                    logger.warning(f'Upload chunk failed ({e})')
+                if status_code in (200, 201):
+                    self.sessions.delete(key)
+                    if progress:
+                        progress(total, total)
+                    return response.json()
+                if status_code == RESUME_INCOMPLETE:
+                    offset = _acknowledged_bytes(response)
+                    failures = 0
+                    if progress:
+                        progress(offset, total)
+                    continue
+                if status_code in EXPIRED_STATUSES:
+                    self.sessions.delete(key)
+                    raise ResumableUploadError(f'Upload session expired ({status_code})', status_code, response.content)
+                if status_code is not None and status_code not in RETRYABLE_STATUSES:
+                    raise ResumableUploadError(f'Upload failed with status {status_code}', status_code, response.content)
+                failures += 1
+                if failures > self.max_retries:
+                    raise ResumableUploadError(f'Upload failed after {self.max_retries} retries', status_code, response.content if response is not None else b'')
+                self._sleep(min(2 ** failures, 60))
+                try:
+                    status = self._query(uri, total)
+                except ResumableUploadError as e:
+                    if e.status is not None and e.status not in RETRYABLE_STATUSES:
+                        raise
+                    continue
+                if isinstance(status, dict):
+                    self.sessions.delete(key)
+                    return status
+                if status is None:
+                    self.sessions.delete(key)
+                    raise ResumableUploadError('Upload session expired', status_code)
+                offset = status
+    def _start(self, metadata: Dict[str, Any], mime_type: str, total: int, params: Optional[Dict[str, Any]]) -> str:
+        query = {'uploadType': 'resumable', **(params or {})}
+        headers = {'X-Upload-Content-Type': mime_type, 'X-Upload-Content-Length': str(total)}
+        response = self.session.post(self.upload_url, params=query, json=metadata, headers=headers, timeout=self.timeout)
+        if response.status_code != 200 or not response.headers.get('Location'):
+            raise ResumableUploadError(f'Failed to start upload session ({response.status_code})', response.status_code, response.content)
+        return response.headers['Location']
+    def _query(self, uri: str, total: int):
+        """セッションの状態を問い合わせ、受理済みバイト数・完了時のJSON・期限切れ(None)のいずれかを返す"""
+        try:
+            response = self.session.put(uri, data=b'', headers={'Content-Range': f'bytes */{total}'}, timeout=self.timeout)
+        except OSError as e:
+            raise ResumableUploadError(f'Failed to query upload session: {e}') from e
+        if response.status_code == RESUME_INCOMPLETE:
+            return _acknowledged_bytes(response)
+        if response.status_code in (200, 201):
+            return response.json()
+        if response.status_code in EXPIRED_STATUSES:
+            return None
+        raise ResumableUploadError(f'Failed to query upload session ({response.status_code})', response.status_code, response.content)
+_session_stores: Dict[str, WriteBehindStore] = {}
+_session_stores_lock = threading.Lock()
+def get_upload_session_store() -> WriteBehindStore:
+    """設定（upload.session_store）のセッション記録.
+    Drive/YouTubeが同じファイルへ書くため、同じパスにはプロセス内で1つのインスタンスを共有します。
+    """
+    from app.config.settings import settings
+    path = os.path.abspath(str(ProjectPaths.resolve_relative(settings.upload.session_store)))
+    with _session_stores_lock:
+        store = _session_stores.get(path)
+        if store is None:
+            store = _session_stores[path] = WriteBehindStore(path, indent=None)
+        return store
@@ -0,0 +1,82 @@
+"""APIキーローテーションのプロセス間共有状態.
+キーごとの健全性（失敗回数・クールダウン）、レート制限バケットの残量、最終使用時刻、日次クォータの
+消費量をSQLite（WAL）に保存します。同一ホスト上のワークフロー実行・GUIのジョブ・scripts/tasks.pyは
+BEGIN IMMEDIATEのトランザクション内で状態を読み込み→更新→書き戻すため、同じキー・同じ日次予算を
+協調して使います。キー本体は保存せず、SHA-256の先頭をIDとして使います。
+"""
+import json
+import logging
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator
+logger = logging.getLogger(__name__)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS key_state (
+    provider TEXT NOT NULL,
+    key_id TEXT NOT NULL,
+    failure_count INTEGER NOT NULL,
+    last_failure REAL,
+    last_success REAL,
+    rate_limit_until REAL,
+    total_calls INTEGER NOT NULL,
+    total_successes INTEGER NOT NULL,
+    last_used_at REAL NOT NULL,
+    buckets TEXT NOT NULL,
+    PRIMARY KEY (provider, key_id)
+);
+CREATE TABLE IF NOT EXISTS quota_usage (
+    provider TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (provider, day)
+);
+"""
+KEY_COLUMNS = ("failure_count", "last_failure", "last_success", "rate_limit_until", "total_calls", "total_successes", "last_used_at")
+class SharedRotationState:
+    """キーローテーション状態のSQLiteバックエンド"""
+    def __init__(self, db_path: str, busy_timeout: float = 30.0):
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """他プロセスの更新を排他する書き込みトランザクション（例外時はロールバック）"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+    @staticmethod
+    def load_keys(conn: sqlite3.Connection, provider: str) -> Dict[str, Dict[str, Any]]:
+        """key_id -> 状態（bucketsは{name: [tokens, updated_at]}）"""
+        rows = conn.execute("SELECT * FROM key_state WHERE provider = ?", (provider,)).fetchall()
+        return {row["key_id"]: {**{column: row[column] for column in KEY_COLUMNS}, "buckets": json.loads(row["buckets"])} for row in rows}
+    @staticmethod
+    def save_keys(conn: sqlite3.Connection, provider: str, states: Dict[str, Dict[str, Any]]) -> None:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO key_state (provider, key_id, {', '.join(KEY_COLUMNS)}, buckets) "
+            f"VALUES (?, ?, {', '.join('?' for _ in KEY_COLUMNS)}, ?)",
+            [(provider, key_id, *(state[column] for column in KEY_COLUMNS), json.dumps(state["buckets"])) for key_id, state in states.items()],
+        )
+    @staticmethod
+    def load_quota(conn: sqlite3.Connection, provider: str, day: str) -> int:
+        row = conn.execute("SELECT calls FROM quota_usage WHERE provider = ? AND day = ?", (provider, day)).fetchone()
+        return row["calls"] if row else 0
+    @staticmethod
+    def save_quota(conn: sqlite3.Connection, provider: str, day: str, calls: int) -> None:
+        conn.execute("INSERT OR REPLACE INTO quota_usage (provider, day, calls) VALUES (?, ?, ?)", (provider, day, calls))
+        conn.execute("DELETE FROM quota_usage WHERE provider = ? AND day < ?", (provider, day))
+    def quota_calls(self, provider: str, day: str) -> int:
+        with self._connect() as conn:
+            return self.load_quota(conn, provider, day)
@@ -1,15 +1,14 @@
 """ニュース収集モジュール
 Perplexity AIを使用して最新の経済ニュースを収集・要約します。
 """
-import json
 import logging
 import os
-import re
 from datetime import datetime
 from typing import Any, Dict, List, Optional, Protocol, Tuple
 import httpx
 from .api_rotation import get_rotation_manager
 from .config import cfg
+from .json_extraction import extract_json
 from .llm_logging import llm_logging_context, record_llm_interaction
 from app.prompts import build_news_collection_prompt, get_news_collection_system_message
 logger = logging.getLogger(__name__)
@@ -156,25 +155,16 @@ class NewsCollector:
             raise
     def _parse_news_response(self, response: str) -> List[Dict[str, Any]]:
         """Perplexity応答からニュースデータを抽出"""
-        try:
-            match = re.search(r"```json\n(.*?)\n```", response, re.DOTALL)
-            if match:
-                json_str = match.group(1)
-            else:
-                start = response.find("[")
-                end = response.rfind("]") + 1
-                if start != -1 and end != 0:
-                    json_str = response[start:end]
-                else:
-                    raise ValueError("No JSON block found in response")
-            news_data = json.loads(json_str)
-            if isinstance(news_data, dict):
-                news_data = [news_data]
-            return news_data
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from Perplexity response: {e}")
+        news_data = extract_json(response, expect=list)
+        if news_data is None:
+            news_data = extract_json(response, expect=dict)
+        if news_data is None:
+            logger.error("Failed to parse JSON from Perplexity response: no JSON array or object found")
             logger.debug(f"Raw response: {response[:500]}...")
             return []
+        if isinstance(news_data, dict):
+            news_data = [news_data]
+        return news_data
     def _validate_news_items(self, news_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """ニュース項目の検証とクリーニング"""
         validated = []
@@ -1,19 +1,101 @@
 """File archival and organization system for workflow outputs.
 Manages structured storage of generated videos, audio, thumbnails, and scripts.
 Ensures files persist after workflow completion with predictable organization.
+Files are placed with the cheapest strategy the filesystem allows: an atomic rename
+for temporary artifacts, then a hardlink, then a reflink (FICLONE), and only across
+filesystems a streamed copy with fsync.
 """
+import errno
 import json
 import logging
 import os
 import re
 import shutil
+import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import TYPE_CHECKING, Dict, List
+from typing import TYPE_CHECKING, Collection, Dict, List
 from app.config.paths import ProjectPaths
 if TYPE_CHECKING:
     from app.workflow.base import WorkflowContext
 logger = logging.getLogger(__name__)
+STRATEGY_RENAME = "rename"
+STRATEGY_HARDLINK = "hardlink"
+STRATEGY_REFLINK = "reflink"
+STRATEGY_COPY = "copy"
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+_LINK_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOSYS}
+_CLONE_UNSUPPORTED = _LINK_UNSUPPORTED | {errno.EINVAL, errno.ENOTTY, errno.EBADF}
+def _staging_path(target: Path) -> Path:
+    return target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.tmp")
+def _fsync_directory(directory: Path) -> None:
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+def _reflink(source: Path, staging: Path) -> None:
+    """Clone ``source`` into ``staging`` sharing extents (btrfs/xfs); raises OSError when unsupported."""
+    import fcntl
+    with open(source, "rb") as src, open(staging, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, staging)
+def _streamed_copy(source: Path, staging: Path) -> None:
+    shutil.copyfile(source, staging)
+    shutil.copystat(source, staging)
+    with open(staging, "rb+") as handle:
+        os.fsync(handle.fileno())
+def place_file(source: str | Path, target: str | Path, allow_rename: bool = False) -> str:
+    """Place ``source`` at ``target`` without copying data when the filesystem allows it.
+    Args:
+        source: Existing file to archive
+        target: Destination path (replaced atomically if it already exists)
+        allow_rename: Move the source instead of linking it (for temporary artifacts nobody reads afterwards)
+    Returns:
+        Strategy used: "rename", "hardlink", "reflink" or "copy"
+    """
+    source = Path(source)
+    target = Path(target)
+    if source.resolve() == target.resolve():
+        return STRATEGY_RENAME
+    if allow_rename:
+        try:
+            os.replace(source, target)
+            return STRATEGY_RENAME
+        except OSError as exc:
+            if exc.errno != errno.EXDEV:
+                raise
+    attempts = ((STRATEGY_HARDLINK, os.link, _LINK_UNSUPPORTED), (STRATEGY_REFLINK, _reflink, _CLONE_UNSUPPORTED))
+    for strategy, place, unsupported in attempts:
+        staging = _staging_path(target)
+        try:
+            place(source, staging)
+        except OSError as exc:
+            if staging.exists():
+                staging.unlink()
+            if exc.errno not in unsupported:
+                raise
+            continue
+        os.replace(staging, target)
+        return strategy
+    staging = _staging_path(target)
+    try:
+        _streamed_copy(source, staging)
+        os.replace(staging, target)
+    except BaseException:
+        if staging.exists():
+            staging.unlink()
+        raise
+    _fsync_directory(target.parent)
+    if allow_rename:
+        source.unlink()
+    return STRATEGY_COPY
 class FileArchivalManager:
     """Manages archival and organization of workflow-generated files.
     Directory structure:
@@ -35,6 +117,7 @@ class FileArchivalManager:
         else:
             self.base_output_dir = ProjectPaths.resolve_relative(str(base_output_dir))
         self.retention_days = retention_days
+        self.last_archive_strategies: Dict[str, str] = {}
         self._ensure_base_directory()
     def _ensure_base_directory(self):
         """Ensure base output directory exists."""
@@ -132,19 +215,30 @@ class FileArchivalManager:
         """Get output path for script file."""
         dir_name = self._get_directory_name(run_id, timestamp, title)
         return str(self.base_output_dir / dir_name / "script.txt")
-    def archive_workflow_files(self, run_id: str, timestamp: str, title: str, files: Dict[str, str]) -> Dict[str, str]:
+    def archive_workflow_files(
+        self,
+        run_id: str,
+        timestamp: str,
+        title: str,
+        files: Dict[str, str],
+        temporary: Collection[str] = (),
+    ) -> Dict[str, str]:
         """Archive workflow files to organized directory.
+        The strategy used for each file type is recorded in ``last_archive_strategies``.
         Args:
             run_id: Workflow run ID
             timestamp: Timestamp string
             title: Video title
             files: Dict mapping file type to source path
                    e.g., {"video": "/tmp/video.mp4", "audio": "/tmp/audio.wav"}
+            temporary: File types whose source is a temporary artifact that may be moved
+                       instead of linked (nothing reads the source path afterwards)
         Returns:
             Dict mapping file type to archived path
         """
         output_dir = Path(self.create_output_directory(run_id, timestamp, title))
         archived = {}
+        self.last_archive_strategies = {}
         for file_type, source_path in files.items():
             if not source_path or not os.path.exists(source_path):
                 logger.warning(f"Source file not found: {source_path}")
@@ -162,9 +256,10 @@ class FileArchivalManager:
             else:
                 target_name = f"{file_type}{Path(source_path).suffix}"
             target_path = output_dir / target_name
-            shutil.copy2(source_path, target_path)
+            strategy = place_file(source_path, target_path, allow_rename=file_type in temporary)
             archived[file_type] = str(target_path)
-            logger.info(f"Archived {file_type}: {target_path}")
+            self.last_archive_strategies[file_type] = strategy
+            logger.info(f"Archived {file_type} ({strategy}): {target_path}")
         return archived
     def get_or_create_workflow_directory(self, context: "WorkflowContext") -> str:
         """Get or create output directory from workflow context.
@@ -0,0 +1,137 @@
+"""Shared multi-pattern keyword matching built on Aho-Corasick.
+Visual keyword extraction, sentiment scoring, topic/hook classification and
+metadata keyword extraction all scan the same texts for dozens of fixed terms.
+``KeywordAutomaton`` compiles those terms once and reports every hit with its
+position in a single pass over the text. The optional ``pyahocorasick`` C
+extension is used when installed; otherwise a pure Python automaton is built.
+"""
+import importlib.util
+import logging
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+_AHOCORASICK_SPEC = importlib.util.find_spec("ahocorasick")
+if _AHOCORASICK_SPEC:
+    import ahocorasick
+else:
+    ahocorasick = None
+logger = logging.getLogger(__name__)
+@dataclass(frozen=True)
+class KeywordHit:
+    """A single keyword occurrence; ``end`` is exclusive like slice indices."""
+    keyword: str
+    start: int
+    end: int
+class _PurePythonBackend:
+    """Classic goto/fail/output Aho-Corasick automaton."""
+    name = "python"
+    def __init__(self, keywords: List[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        for index, keyword in enumerate(keywords):
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                    self._goto[state][char] = next_state
+                state = next_state
+            self._output[state] = self._output[state] + (index,)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+    def iter(self, text: str) -> Iterable[Tuple[int, int]]:
+        """Yield ``(keyword index, exclusive end)`` for every occurrence."""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield index, position + 1
+class _PyAhoCorasickBackend:
+    """Adapter over the ``pyahocorasick`` C extension."""
+    name = "pyahocorasick"
+    def __init__(self, keywords: List[str]):
+        self._automaton = ahocorasick.Automaton()
+        for index, keyword in enumerate(keywords):
+            self._automaton.add_word(keyword, index)
+        self._automaton.make_automaton()
+    def iter(self, text: str) -> Iterable[Tuple[int, int]]:
+        for end_index, index in self._automaton.iter(text):
+            yield index, end_index + 1
+class KeywordAutomaton:
+    """Precompiled matcher for a fixed set of keywords.
+    Keywords keep their registration order, which ``matches`` uses so callers
+    that previously looped over a keyword list see results in the same order.
+    """
+    def __init__(self, keywords: Iterable[str], backend: Optional[str] = None):
+        """Compile the automaton.
+        Args:
+            keywords: Terms to match (empty strings and duplicates are dropped)
+            backend: "python" or "pyahocorasick"; defaults to the C backend when installed
+        """
+        self.keywords: List[str] = list(dict.fromkeys(k for k in keywords if k))
+        self._positions = {keyword: index for index, keyword in enumerate(self.keywords)}
+        if backend is None:
+            backend = "pyahocorasick" if ahocorasick is not None else "python"
+        if backend == "pyahocorasick":
+            if ahocorasick is None:
+                raise ImportError("pyahocorasick is not installed")
+            self._backend = _PyAhoCorasickBackend(self.keywords) if self.keywords else _PurePythonBackend([])
+        elif backend == "python":
+            self._backend = _PurePythonBackend(self.keywords)
+        else:
+            raise ValueError(f"Unknown keyword automaton backend: {backend}")
+        self.backend = backend
+    def __len__(self) -> int:
+        return len(self.keywords)
+    def find_all(self, text: str) -> List[KeywordHit]:
+        """Return every (possibly overlapping) occurrence ordered by position."""
+        if not text or not self.keywords:
+            return []
+        keywords = self.keywords
+        hits = [
+            KeywordHit(keywords[index], end - len(keywords[index]), end) for index, end in self._backend.iter(text)
+        ]
+        hits.sort(key=lambda hit: (hit.end, hit.start))
+        return hits
+    def matches(self, text: str) -> List[str]:
+        """Return the distinct keywords present in ``text`` in registration order."""
+        found = {hit.keyword for hit in self.find_all(text)}
+        return sorted(found, key=self._positions.__getitem__)
+    def found(self, text: str) -> Set[str]:
+        """Return the set of keywords present in ``text``."""
+        return {hit.keyword for hit in self.find_all(text)}
+    def counts(self, text: str) -> Dict[str, int]:
+        """Count occurrences per keyword with ``str.count`` (non-overlapping) semantics."""
+        counts: Dict[str, int] = {}
+        last_end: Dict[str, int] = {}
+        for hit in sorted(self.find_all(text), key=lambda hit: hit.start):
+            if hit.start < last_end.get(hit.keyword, 0):
+                continue
+            last_end[hit.keyword] = hit.end
+            counts[hit.keyword] = counts.get(hit.keyword, 0) + 1
+        return counts
+@lru_cache(maxsize=64)
+def _cached_automaton(keywords: Tuple[str, ...]) -> KeywordAutomaton:
+    return KeywordAutomaton(keywords)
+def get_keyword_automaton(keywords: Iterable[str]) -> KeywordAutomaton:
+    """Return a shared automaton for ``keywords``, compiling it on first use."""
+    return _cached_automaton(tuple(keywords))
@@ -1,5 +1,6 @@
 """Media services for video generation and enhancement."""
 from .broll_generator import BRollGenerator
+from .broll_prefetch import BRollPrefetcher, BRollPrefetchResult
 from .ffmpeg_support import FFmpegConfigurationError, ensure_ffmpeg_tooling
 from .stock_footage_manager import StockFootageManager
 from .visual_matcher import VisualMatcher
@@ -7,6 +8,8 @@ __all__ = [
     "StockFootageManager",
     "VisualMatcher",
     "BRollGenerator",
+    "BRollPrefetcher",
+    "BRollPrefetchResult",
     "ensure_ffmpeg_tooling",
     "FFmpegConfigurationError",
 ]
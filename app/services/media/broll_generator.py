@@ -4,20 +4,137 @@
 """
 import logging
 import os
+import shutil
 import subprocess
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from app.services.media.ffmpeg_support import ensure_ffmpeg_tooling
 logger = logging.getLogger(__name__)
+BROLL_FPS = 25
+def frames_for(seconds: float, fps: int = BROLL_FPS) -> int:
+    """Quantize a duration to a whole number of frames (at least one)."""
+    return max(1, int(round(seconds * fps)))
+def transition_frames(clip_duration: float, transition_duration: float, fps: int = BROLL_FPS) -> int:
+    """Quantize the crossfade length, keeping it shorter than a clip."""
+    clip_frames = frames_for(clip_duration, fps)
+    if clip_frames <= 1:
+        return 0
+    return min(frames_for(transition_duration, fps), clip_frames - 1)
+def xfade_offsets(
+    clip_count: int,
+    clip_duration: float,
+    transition_duration: float,
+    fps: int = BROLL_FPS,
+) -> List[float]:
+    """Return the xfade offset of every transition on the accumulated timeline.
+    Offsets are measured from the start of the chained stream and snapped to
+    frame boundaries, so the single-graph and pre-rendered modes cut on the
+    same frames. Transition ``i`` blends clip ``i`` into clip ``i + 1``.
+    """
+    step = frames_for(clip_duration, fps) - transition_frames(clip_duration, transition_duration, fps)
+    return [(index + 1) * step / fps for index in range(max(0, clip_count - 1))]
+def clip_effect_filters(index: int, clip_duration: float, enable_effects: bool, fps: int = BROLL_FPS) -> List[str]:
+    """Build the per-clip scale/zoompan/eq/fade filter chain."""
+    filters = [
+        f"trim=duration={clip_duration}",
+        "scale=1920:1080:force_original_aspect_ratio=increase",
+        "crop=1920:1080",
+        f"fps={fps}",
+    ]
+    if enable_effects:
+        if index % 2 == 0:
+            filters.append(f"zoompan=z='min(zoom+0.0015,1.3)':d={int(clip_duration * fps)}:s=1920x1080:fps={fps}")
+        else:
+            filters.append(
+                f"zoompan=z='if(lte(zoom,1.0),1.3,max(1.0,zoom-0.0015))':d={int(clip_duration * fps)}:s=1920x1080:fps={fps}"
+            )
+    filters.append("eq=contrast=1.1:brightness=0.02:saturation=1.15")
+    filters.append("fade=t=in:st=0:d=0.5")
+    filters.append(f"fade=t=out:st={clip_duration - 0.5}:d=0.5")
+    filters.append(f"trim=end_frame={frames_for(clip_duration, fps)}")
+    filters.append("setpts=PTS-STARTPTS")
+    filters.append(f"fps={fps}")
+    return filters
+def xfade_graph(
+    input_labels: List[str],
+    clip_duration: float,
+    transition_duration: float,
+    fps: int = BROLL_FPS,
+) -> tuple[List[str], str]:
+    """Chain ``input_labels`` with fade transitions.
+    Returns:
+        Tuple of (filter graph parts, label of the final output stream)
+    """
+    offsets = xfade_offsets(len(input_labels), clip_duration, transition_duration, fps)
+    transition = transition_frames(clip_duration, transition_duration, fps) / fps
+    parts: List[str] = []
+    current_label = input_labels[0]
+    for i, offset in enumerate(offsets, start=1):
+        next_label = f"vf{i}"
+        parts.append(
+            f"[{current_label}][{input_labels[i]}]"
+            f"xfade=transition=fade:duration={transition}:offset={offset}"
+            f"[{next_label}]"
+        )
+        current_label = next_label
+    return parts, current_label
+def _render_clip_job(job: Dict[str, Any]) -> Optional[str]:
+    """Render one clip's effect chain to an exact-length intermediate file.
+    Runs inside a worker process, so it only takes picklable arguments.
+    """
+    cmd = [
+        job["ffmpeg_path"],
+        "-i",
+        job["clip_path"],
+        "-vf",
+        ",".join(job["filters"]),
+        "-r",
+        str(job["fps"]),
+        "-frames:v",
+        str(job["frames"]),
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "18",
+        "-pix_fmt",
+        "yuv420p",
+        "-threads",
+        str(job["threads"]),
+        "-an",
+        "-y",
+        job["output_path"],
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True, timeout=300)
+    except subprocess.TimeoutExpired:
+        logger.error(f"FFmpeg clip pre-render timeout: {job['clip_path']}")
+        return None
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg clip pre-render error: {e.stderr.decode(errors='ignore') if e.stderr else e}")
+        return None
+    return job["output_path"] if os.path.exists(job["output_path"]) else None
 class BRollGenerator:
     """Generate professional B-roll sequences from stock footage clips."""
-    def __init__(self, ffmpeg_path: str = "ffmpeg"):
+    def __init__(
+        self,
+        ffmpeg_path: str = "ffmpeg",
+        parallel_preprocess: bool = False,
+        max_workers: Optional[int] = None,
+    ):
         """Initialize B-roll generator.
         Args:
             ffmpeg_path: Path to ffmpeg executable
+            parallel_preprocess: Render each clip's effects in a process pool and
+                only cross-fade the pre-rendered clips in the final pass
+            max_workers: Pool size for parallel preprocessing (defaults to CPU count)
         """
         self.ffmpeg_path = ensure_ffmpeg_tooling(ffmpeg_path)
+        self.parallel_preprocess = parallel_preprocess
+        self.max_workers = max_workers
     def create_broll_sequence(
         self,
         clip_paths: List[str],
@@ -25,6 +142,7 @@ class BRollGenerator:
         output_path: Optional[str] = None,
         transition_duration: float = 1.0,
         enable_effects: bool = True,
+        parallel_preprocess: Optional[bool] = None,
     ) -> Optional[str]:
         """Create B-roll sequence from multiple clips.
         Args:
@@ -33,6 +151,7 @@ class BRollGenerator:
             output_path: Output file path (temp file if not specified)
             transition_duration: Crossfade transition duration in seconds
             enable_effects: Enable zoom/pan effects (Ken Burns)
+            parallel_preprocess: Override the generator's preprocessing mode
         Returns:
             Path to generated B-roll video, or None if failed
         """
@@ -52,14 +171,26 @@ class BRollGenerator:
         try:
             if len(valid_clips) == 1:
                 return self._process_single_clip(valid_clips[0], target_duration, output_path, enable_effects)
-            else:
-                return self._concatenate_clips(
+            if parallel_preprocess is None:
+                parallel_preprocess = self.parallel_preprocess
+            if parallel_preprocess:
+                result = self._concatenate_prerendered(
                     valid_clips,
                     clip_duration,
                     output_path,
                     transition_duration,
                     enable_effects,
                 )
+                if result:
+                    return result
+                logger.warning("Parallel B-roll preprocessing failed, falling back to single filter graph")
+            return self._concatenate_clips(
+                valid_clips,
+                clip_duration,
+                output_path,
+                transition_duration,
+                enable_effects,
+            )
         except Exception as e:
             logger.error(f"Failed to create B-roll sequence: {e}")
             return None
@@ -141,42 +272,14 @@ class BRollGenerator:
             for clip in clip_paths:
                 input_args.extend(["-i", clip])
             filter_parts = []
-            current_label = None
-            for i, clip in enumerate(clip_paths):
-                base_filters = [
-                    f"[{i}:v]",
-                    f"trim=duration={clip_duration}",
-                    "scale=1920:1080:force_original_aspect_ratio=increase",
-                    "crop=1920:1080",
-                ]
-                if enable_effects:
-                    if i % 2 == 0:
-                        base_filters.append(
-                            f"zoompan=z='min(zoom+0.0015,1.3)':d={int(clip_duration * 25)}:s=1920x1080:fps=25"
-                        )
-                    else:
-                        base_filters.append(
-                            f"zoompan=z='if(lte(zoom,1.0),1.3,max(1.0,zoom-0.0015))':d={int(clip_duration * 25)}:s=1920x1080:fps=25"
-                        )
-                base_filters.append("eq=contrast=1.1:brightness=0.02:saturation=1.15")
-                base_filters.append("fade=t=in:st=0:d=0.5")
-                base_filters.append(f"fade=t=out:st={clip_duration - 0.5}:d=0.5")
+            clip_labels = []
+            for i in range(len(clip_paths)):
                 clip_label = f"v{i}"
-                base_filters.append(f"[{clip_label}]")
-                filter_parts.append("".join(base_filters))
-                if i > 0:
-                    prev_label = current_label
-                    next_label = f"vf{i}"
-                    offset = clip_duration - transition_duration
-                    crossfade = (
-                        f"[{prev_label}][{clip_label}]"
-                        f"xfade=transition=fade:duration={transition_duration}:offset={offset}"
-                        f"[{next_label}]"
-                    )
-                    filter_parts.append(crossfade)
-                    current_label = next_label
-                else:
-                    current_label = clip_label
+                filters = ",".join(clip_effect_filters(i, clip_duration, enable_effects))
+                filter_parts.append(f"[{i}:v]{filters}[{clip_label}]")
+                clip_labels.append(clip_label)
+            crossfades, current_label = xfade_graph(clip_labels, clip_duration, transition_duration)
+            filter_parts.extend(crossfades)
             filter_complex = ";".join(filter_parts)
             cmd = [
                 self.ffmpeg_path,
@@ -216,6 +319,109 @@ class BRollGenerator:
         except Exception as e:
             logger.error(f"Error concatenating clips: {e}")
         return None
+    def _resolve_workers(self, clip_count: int) -> int:
+        """Size the preprocessing pool to the host, capped by the clip count."""
+        workers = self.max_workers or os.cpu_count() or 1
+        return max(1, min(workers, clip_count))
+    def _concatenate_prerendered(
+        self,
+        clip_paths: List[str],
+        clip_duration: float,
+        output_path: str,
+        transition_duration: float,
+        enable_effects: bool,
+    ) -> Optional[str]:
+        """Render clip effects in a process pool, then cross-fade the results.
+        Each clip is rendered to exactly ``frames_for(clip_duration)`` frames so
+        the final xfade pass lands on the same frames as ``_concatenate_clips``.
+        Args:
+            clip_paths: List of input clip paths
+            clip_duration: Duration per clip
+            output_path: Output path
+            transition_duration: Crossfade duration
+            enable_effects: Enable zoom/pan effects
+        Returns:
+            Output path or None if failed
+        """
+        workers = self._resolve_workers(len(clip_paths))
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        work_dir = tempfile.mkdtemp(prefix=f"broll_parts_{os.getpid()}_")
+        jobs = [
+            {
+                "ffmpeg_path": self.ffmpeg_path,
+                "clip_path": clip,
+                "filters": clip_effect_filters(i, clip_duration, enable_effects),
+                "fps": BROLL_FPS,
+                "frames": frames_for(clip_duration),
+                "threads": threads,
+                "output_path": os.path.join(work_dir, f"part_{i:03d}.mp4"),
+            }
+            for i, clip in enumerate(clip_paths)
+        ]
+        logger.info(f"Pre-rendering {len(jobs)} B-roll clips with {workers} worker processes")
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(_render_clip_job, jobs))
+            if not all(rendered):
+                failed = sum(1 for path in rendered if not path)
+                logger.error(f"{failed}/{len(jobs)} B-roll clips failed to pre-render")
+                return None
+            return self._crossfade_prerendered(rendered, clip_duration, output_path, transition_duration)
+        except Exception as e:
+            logger.error(f"Error during parallel B-roll preprocessing: {e}")
+            return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    def _crossfade_prerendered(
+        self,
+        part_paths: List[str],
+        clip_duration: float,
+        output_path: str,
+        transition_duration: float,
+    ) -> Optional[str]:
+        """Join pre-rendered clips with xfade transitions only."""
+        input_args = []
+        for part in part_paths:
+            input_args.extend(["-i", part])
+        crossfades, final_label = xfade_graph(
+            [f"{i}:v" for i in range(len(part_paths))],
+            clip_duration,
+            transition_duration,
+        )
+        cmd = [
+            self.ffmpeg_path,
+            *input_args,
+            "-filter_complex",
+            ";".join(crossfades),
+            "-map",
+            f"[{final_label}]",
+            "-c:v",
+            "libx264",
+            "-preset",
+            "medium",
+            "-crf",
+            "23",
+            "-pix_fmt",
+            "yuv420p",
+            "-movflags",
+            "+faststart",
+            "-y",
+            output_path,
+        ]
+        logger.debug(f"FFmpeg crossfade command: {' '.join(cmd)}")
+        try:
+            subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+        except subprocess.TimeoutExpired:
+            logger.error("FFmpeg crossfade timeout (>10 minutes)")
+            return None
+        except subprocess.CalledProcessError as e:
+            logger.error(f"FFmpeg crossfade error: {e.stderr.decode() if e.stderr else e}")
+            return None
+        if os.path.exists(output_path):
+            file_size_mb = os.path.getsize(output_path) / (1024 * 1024)
+            logger.info(f"Created B-roll sequence from pre-rendered clips: {output_path} ({file_size_mb:.1f} MB)")
+            return output_path
+        return None
     def create_simple_sequence(
         self,
         clip_paths: List[str],
@@ -0,0 +1,134 @@
+"""Speculative B-roll prefetching.
+台本生成直後にストック映像の検索とダウンロードをバックグラウンドで開始し、
+音声合成・STT・字幕アライメントと並行してネットワークI/Oを進めます。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app.services.media.stock_footage_manager import StockFootageManager
+from app.services.media.visual_matcher import VisualMatcher
+logger = logging.getLogger(__name__)
+@dataclass
+class BRollPrefetchResult:
+    """Snapshot of what the prefetcher has produced so far."""
+    keywords: List[str] = field(default_factory=list)
+    footage_results: List[Dict] = field(default_factory=list)
+    clip_paths: List[str] = field(default_factory=list)
+    completed: bool = False
+    cancelled: bool = False
+    elapsed_seconds: float = 0.0
+    @property
+    def has_clips(self) -> bool:
+        return bool(self.clip_paths)
+class BRollPrefetcher:
+    """Search and download stock footage in the background with cancellation."""
+    def __init__(
+        self,
+        stock_manager: StockFootageManager,
+        visual_matcher: VisualMatcher,
+        max_clips: int = 5,
+        max_parallel_downloads: int = 3,
+    ):
+        """Initialize prefetcher.
+        Args:
+            stock_manager: Stock footage search/download backend
+            visual_matcher: Keyword extractor for the script
+            max_clips: Maximum number of clips to fetch
+            max_parallel_downloads: Concurrent clip downloads
+        """
+        self.stock_manager = stock_manager
+        self.visual_matcher = visual_matcher
+        self.max_clips = max_clips
+        self.max_parallel_downloads = max(1, max_parallel_downloads)
+        self._cancel_event = threading.Event()
+        self._done_event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = BRollPrefetchResult()
+        self._downloaded: Dict[int, str] = {}
+        self._started_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+    def start(self, script_content: str, news_items: Optional[List[Dict]] = None) -> List[str]:
+        """Extract keywords synchronously and start search/download in the background.
+        Returns:
+            Extracted keywords (empty when nothing will be fetched)
+        """
+        keywords = self.visual_matcher.extract_keywords(
+            script_content=script_content,
+            news_items=news_items or [],
+            max_keywords=self.max_clips,
+        )
+        self._started_at = time.monotonic()
+        with self._lock:
+            self._result.keywords = list(keywords)
+        if not keywords:
+            logger.info("B-roll prefetch skipped: no visual keywords")
+            self._finish()
+            return []
+        self._thread = threading.Thread(target=self._run, args=(list(keywords),), name="broll-prefetch", daemon=True)
+        self._thread.start()
+        logger.info(f"B-roll prefetch started for keywords: {keywords}")
+        return list(keywords)
+    def _run(self, keywords: List[str]) -> None:
+        try:
+            footage_results = self.stock_manager.search_footage(keywords=keywords, max_clips=self.max_clips)
+            with self._lock:
+                self._result.footage_results = list(footage_results)
+            if not footage_results or self._cancel_event.is_set():
+                return
+            with ThreadPoolExecutor(max_workers=self.max_parallel_downloads, thread_name_prefix="broll-dl") as executor:
+                futures = [executor.submit(self._download, index, video) for index, video in enumerate(footage_results)]
+                for future in futures:
+                    future.result()
+        except Exception as e:
+            logger.warning(f"B-roll prefetch failed: {e}")
+        finally:
+            self._finish()
+    def _download(self, index: int, video: Dict) -> None:
+        if self._cancel_event.is_set():
+            return
+        path = self.stock_manager.download_clip(video, cancel_event=self._cancel_event)
+        if path:
+            with self._lock:
+                self._downloaded[index] = path
+    def _finish(self) -> None:
+        with self._lock:
+            self._result.completed = not self._cancel_event.is_set()
+        self._done_event.set()
+    def cancel(self) -> None:
+        """Stop scheduling downloads and abort in-flight transfers."""
+        if not self._done_event.is_set():
+            logger.info("Cancelling B-roll prefetch")
+        self._cancel_event.set()
+        with self._lock:
+            self._result.cancelled = True
+    def is_done(self) -> bool:
+        return self._done_event.is_set()
+    def snapshot(self) -> BRollPrefetchResult:
+        """Return a copy of the current state without waiting."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+            return BRollPrefetchResult(
+                keywords=list(self._result.keywords),
+                footage_results=list(self._result.footage_results),
+                clip_paths=[self._downloaded[index] for index in sorted(self._downloaded)],
+                completed=self._result.completed,
+                cancelled=self._result.cancelled,
+                elapsed_seconds=elapsed,
+            )
+    def collect(self, deadline_seconds: float) -> BRollPrefetchResult:
+        """Wait up to ``deadline_seconds`` for the prefetch, then cancel the rest.
+        Clips that finished downloading before the deadline are returned;
+        anything still in flight is cancelled.
+        """
+        if not self._done_event.wait(timeout=max(0.0, deadline_seconds)):
+            logger.warning(f"B-roll prefetch missed its {deadline_seconds:.0f}s deadline; using clips that landed")
+            self.cancel()
+        result = self.snapshot()
+        logger.info(
+            f"B-roll prefetch collected {len(result.clip_paths)}/{len(result.footage_results)} clips "
+            f"after {result.elapsed_seconds:.1f}s"
+        )
+        return result
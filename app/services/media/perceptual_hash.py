@@ -0,0 +1,73 @@
+"""Perceptual hashing and near-duplicate clustering for screenshots.
+動きのある背景動画では似たフレームが続くため、dHash/pHashで視覚的に冗長な
+スクリーンショットをまとめ、代表フレームだけをレビューに送れるようにします。
+"""
+from __future__ import annotations
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import List, Sequence
+import numpy as np
+from PIL import Image
+logger = logging.getLogger(__name__)
+HASH_SIZE = 8
+PHASH_OVERSAMPLE = 4
+@dataclass(frozen=True)
+class FrameHash:
+    """dHash (gradient) and pHash (DCT) of one frame as 64-bit integers."""
+    dhash: int
+    phash: int
+    def distance(self, other: "FrameHash") -> int:
+        """Larger of the two Hamming distances; both hashes must agree for a match."""
+        return max(bin(self.dhash ^ other.dhash).count("1"), bin(self.phash ^ other.phash).count("1"))
+@dataclass
+class FrameCluster:
+    """Indices of visually redundant frames; the first member is the representative."""
+    representative: int
+    members: List[int] = field(default_factory=list)
+    @property
+    def size(self) -> int:
+        return len(self.members)
+def _pack_bits(bits: np.ndarray) -> int:
+    value = 0
+    for bit in bits.ravel():
+        value = (value << 1) | int(bit)
+    return value
+@lru_cache(maxsize=4)
+def _dct_matrix(size: int) -> np.ndarray:
+    """Orthonormal DCT-II basis so ``M @ x @ M.T`` is the 2-D transform."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.sqrt(2.0 / size) * np.cos(np.pi * (2 * n + 1) * k / (2 * size))
+    matrix[0, :] /= np.sqrt(2.0)
+    return matrix
+def dhash(gray: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """Horizontal gradient hash of a grayscale image."""
+    pixels = np.asarray(gray.resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.float64)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+def phash(gray: Image.Image, hash_size: int = HASH_SIZE, oversample: int = PHASH_OVERSAMPLE) -> int:
+    """DCT hash: low-frequency coefficients compared with their median (DC excluded)."""
+    size = hash_size * oversample
+    pixels = np.asarray(gray.resize((size, size), Image.BILINEAR), dtype=np.float64)
+    basis = _dct_matrix(size)
+    low = (basis @ pixels @ basis.T)[:hash_size, :hash_size]
+    median = np.median(low.ravel()[1:])
+    return _pack_bits(low > median)
+def hash_image(path: str) -> FrameHash:
+    with Image.open(path) as image:
+        gray = image.convert("L")
+    return FrameHash(dhash=dhash(gray), phash=phash(gray))
+def cluster_hashes(hashes: Sequence[FrameHash], max_distance: int) -> List[FrameCluster]:
+    """Greedy leader clustering in frame order.
+    Each frame joins the first cluster whose representative is within ``max_distance``
+    bits on both hashes, so a scene that returns later in the video is still merged.
+    """
+    clusters: List[FrameCluster] = []
+    for index, frame_hash in enumerate(hashes):
+        for cluster in clusters:
+            if hashes[cluster.representative].distance(frame_hash) <= max_distance:
+                cluster.members.append(index)
+                break
+        else:
+            clusters.append(FrameCluster(representative=index, members=[index]))
+    return clusters
@@ -5,15 +5,22 @@ import logging
 import math
 import re
 import subprocess
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-from pydub import AudioSegment
-from pydub.silence import detect_silence
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 from app.config import cfg
 from app.models.qa import CheckStatus, MediaCheckResult, QualityGateReport
+from app.services.media.audio_analysis import AudioAnalyzer
 from app.services.media.fractions import FractionParser
+from app.services.media.render_analysis import RenderAnalysisError, RenderAnalyzer
 logger = logging.getLogger(__name__)
+AUDIO_GATE = "audio"
+SUBTITLE_GATE = "subtitles"
+VIDEO_GATE = "video"
+QA_GATES = (AUDIO_GATE, SUBTITLE_GATE, VIDEO_GATE)
+QACheck = Tuple[str, Callable[[], MediaCheckResult]]
 class MediaQAError(Exception):
     """Raised when QA pipeline cannot complete."""
 class MediaQAPipeline:
@@ -23,6 +30,7 @@ class MediaQAPipeline:
         self._ffmpeg_binary = getattr(cfg, "ffmpeg_path", "ffmpeg") or "ffmpeg"
         self._ffprobe_binary = "ffprobe"
         self._fraction_parser = fraction_parser or FractionParser()
+        self._audio_analyzer = AudioAnalyzer(ffmpeg_path=self._ffmpeg_binary)
     def run(
         self,
         *,
@@ -45,21 +53,158 @@ class MediaQAPipeline:
                 )
             )
             return report
+        inputs = {
+            "script_path": script_path,
+            "script_content": script_content,
+            "audio_path": audio_path,
+            "subtitle_path": subtitle_path,
+            "video_path": video_path,
+        }
         report = QualityGateReport(run_id=run_id, mode=mode)
-        report.add_check(self._run_audio_checks(audio_path=audio_path))
-        report.add_check(
-            self._run_subtitle_checks(
-                script_path=script_path,
-                script_content=script_content,
-                subtitle_path=subtitle_path,
+        checks = [check for gate in QA_GATES for check in self._gate_checks(gate, abort=None, **inputs)]
+        for result in self._execute_checks(checks, fail_fast=False):
+            report.add_check(result)
+        self._persist(report)
+        return report
+    def run_gate(
+        self,
+        gate: str,
+        *,
+        run_id: str,
+        mode: str,
+        script_path: Optional[str] = None,
+        script_content: Optional[str] = None,
+        audio_path: Optional[str] = None,
+        subtitle_path: Optional[str] = None,
+        video_path: Optional[str] = None,
+        fail_fast: bool = True,
+    ) -> QualityGateReport:
+        """Run the checks for a single stage as soon as its inputs exist.
+        The audio and subtitle gates consist of a single check each, so only the video gate
+        (spec compliance via ffprobe and content analysis via ffmpeg) actually runs in parallel.
+        Args:
+            gate: One of ``QA_GATES`` (audio after synthesis, subtitles after alignment, video after render)
+            fail_fast: Once a check fails blockingly, kill the ffmpeg analysis still running and skip the rest
+        Returns:
+            Report containing only this gate's checks
+        """
+        if gate not in QA_GATES:
+            raise MediaQAError(f"Unknown QA gate: {gate}")
+        report = QualityGateReport(run_id=run_id, mode=mode, gate=gate)
+        if not self.config.enabled:
+            report.add_check(
+                MediaCheckResult(
+                    name="media_quality",
+                    status=CheckStatus.SKIPPED,
+                    blocking=False,
+                    message="Media QA disabled in configuration",
+                )
             )
+            return report
+        abort = threading.Event()
+        checks = self._gate_checks(
+            gate,
+            abort=abort,
+            script_path=script_path,
+            script_content=script_content,
+            audio_path=audio_path,
+            subtitle_path=subtitle_path,
+            video_path=video_path,
         )
-        report.add_check(self._run_video_checks(video_path=video_path))
+        for result in self._execute_checks(checks, fail_fast=fail_fast, abort=abort):
+            report.add_check(result)
+        self._persist(report)
+        return report
+    def _gate_checks(
+        self,
+        gate: str,
+        *,
+        abort: Optional[threading.Event],
+        script_path: Optional[str],
+        script_content: Optional[str],
+        audio_path: Optional[str],
+        subtitle_path: Optional[str],
+        video_path: Optional[str],
+    ) -> List[QACheck]:
+        if gate == AUDIO_GATE:
+            return [("audio_integrity", lambda: self._run_audio_checks(audio_path=audio_path))]
+        if gate == SUBTITLE_GATE:
+            return [
+                (
+                    "subtitle_alignment",
+                    lambda: self._run_subtitle_checks(
+                        script_path=script_path,
+                        script_content=script_content,
+                        subtitle_path=subtitle_path,
+                    ),
+                )
+            ]
+        return [
+            ("video_compliance", lambda: self._run_video_checks(video_path=video_path)),
+            ("video_content", lambda: self._run_content_checks(video_path=video_path, abort=abort)),
+        ]
+    def _execute_checks(
+        self,
+        checks: Sequence[QACheck],
+        *,
+        fail_fast: bool,
+        abort: Optional[threading.Event] = None,
+    ) -> List[MediaCheckResult]:
+        """Run checks concurrently and return results in declaration order.
+        With ``fail_fast`` the first blocking failure cancels checks that have not
+        started and sets ``abort`` so running ffmpeg analyses are killed; the call
+        still waits for those threads so no subprocess outlives the gate. Both are
+        reported as skipped.
+        """
+        if len(checks) < 2:
+            # Nothing to overlap; a thread pool would only add overhead
+            return [self._guarded_check(name, check) for name, check in checks]
+        results: Dict[int, MediaCheckResult] = {}
+        failed_check: Optional[str] = None
+        executor = ThreadPoolExecutor(max_workers=len(checks), thread_name_prefix="media-qa")
+        try:
+            pending = {executor.submit(self._guarded_check, name, check): index for index, (name, check) in enumerate(checks)}
+            while pending and failed_check is None:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    results[pending.pop(future)] = result
+                    if fail_fast and result.blocking and result.status == CheckStatus.FAILED:
+                        failed_check = result.name
+        finally:
+            if failed_check is not None and abort is not None:
+                abort.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        ordered = []
+        for index, (name, _) in enumerate(checks):
+            if index in results:
+                ordered.append(results[index])
+                continue
+            ordered.append(
+                MediaCheckResult(
+                    name=name,
+                    status=CheckStatus.SKIPPED,
+                    blocking=False,
+                    message=f"Skipped after blocking failure in {failed_check}",
+                )
+            )
+        return ordered
+    def _guarded_check(self, name: str, check: Callable[[], MediaCheckResult]) -> MediaCheckResult:
+        try:
+            return check()
+        except Exception as exc:
+            logger.warning(f"QA check {name} raised: {exc}")
+            return MediaCheckResult(
+                name=name,
+                status=CheckStatus.FAILED,
+                message="QA check raised an exception",
+                detail=str(exc),
+            )
+    def _persist(self, report: QualityGateReport) -> None:
         try:
             report.report_path = str(self._persist_report(report))
         except Exception as exc:
             logger.warning(f"Failed to persist QA report: {exc}")
-        return report
     def should_block(self, report: QualityGateReport, *, mode: str) -> bool:
         gating = self.config.gating
         if not gating.enforce:
@@ -84,7 +229,7 @@ class MediaQAPipeline:
                 message="Audio file missing",
             )
         try:
-            segment = AudioSegment.from_file(audio_path)
+            analysis = self._audio_analyzer.analyze(audio_path)
         except Exception as exc:
             return MediaCheckResult(
                 name="audio_integrity",
@@ -92,25 +237,14 @@ class MediaQAPipeline:
                 message="Failed to decode audio",
                 detail=str(exc),
             )
-        duration_seconds = max(len(segment) / 1000.0, 0.001)
-        rms_source = getattr(segment, "dBFS", -96.0)
-        peak_source = getattr(segment, "max_dBFS", -96.0)
-        rms_db = rms_source if (rms_source is not None and not math.isinf(rms_source)) else -96.0
-        peak_db = peak_source if (peak_source is not None and not math.isinf(peak_source)) else -96.0
+        duration_seconds = max(analysis.duration_seconds, 0.001)
+        rms_source = analysis.rms_dbfs
+        peak_source = analysis.peak_dbfs
+        rms_db = rms_source if not math.isinf(rms_source) else -96.0
+        peak_db = peak_source if not math.isinf(peak_source) else -96.0
         min_silence_len = max(1, int(1000 * self.config.audio.max_silence_seconds))
         silence_thresh = rms_db - 16 if not math.isinf(rms_db) else -40.0
-        try:
-            silence_ranges = detect_silence(
-                segment,
-                min_silence_len=min_silence_len,
-                silence_thresh=silence_thresh,
-            )
-        except Exception as exc:
-            logger.warning(f"detect_silence failed: {exc}")
-            silence_ranges = []
-        longest_silence = 0.0
-        if silence_ranges:
-            longest_silence = max((end - start) / 1000.0 for start, end in silence_ranges)
+        longest_silence = analysis.longest_silence_seconds(min_silence_len, silence_thresh)
         issues = []
         if peak_db > self.config.audio.peak_dbfs_max:
             issues.append(f"peak {peak_db:.2f} dBFS exceeds {self.config.audio.peak_dbfs_max:.2f}")
@@ -121,6 +255,9 @@ class MediaQAPipeline:
             )
         if longest_silence > self.config.audio.max_silence_seconds:
             issues.append(f"silence {longest_silence:.2f}s exceeds {self.config.audio.max_silence_seconds:.2f}s")
+        metrics = {"analysis_backend": analysis.backend}
+        if analysis.integrated_lufs is not None:
+            metrics["integrated_lufs"] = round(analysis.integrated_lufs, 2)
         status = CheckStatus.PASSED if not issues else CheckStatus.FAILED
         message = "Audio levels within tolerance" if not issues else "; ".join(issues)
         return MediaCheckResult(
@@ -132,6 +269,7 @@ class MediaQAPipeline:
                 "peak_dbfs": round(peak_db, 2),
                 "rms_dbfs": round(rms_db, 2),
                 "longest_silence_seconds": round(longest_silence, 3),
+                **metrics,
             },
         )
     def _run_subtitle_checks(
@@ -289,6 +427,80 @@ class MediaQAPipeline:
                 "duration_seconds": round(duration, 2),
             },
         )
+    def _run_content_checks(self, *, video_path: Optional[str], abort: Optional[threading.Event] = None) -> MediaCheckResult:
+        video_config = self.config.video
+        if not video_config.enabled or not video_config.content_analysis:
+            return MediaCheckResult(
+                name="video_content",
+                status=CheckStatus.SKIPPED,
+                blocking=False,
+                message="Video content analysis disabled",
+            )
+        if not video_path or not Path(video_path).exists():
+            status = CheckStatus.FAILED if self.config.gating.fail_on_missing_inputs else CheckStatus.SKIPPED
+            return MediaCheckResult(
+                name="video_content",
+                status=status,
+                blocking=self.config.gating.fail_on_missing_inputs,
+                message="Video file missing",
+            )
+        analyzer = RenderAnalyzer(
+            self._ffmpeg_binary,
+            freeze_min_duration=video_config.freeze_min_seconds,
+            timeout_seconds=video_config.content_analysis_timeout_seconds or None,
+            cancel_event=abort,
+        )
+        try:
+            duration = analyzer.probe_duration(video_path)
+            sampled = bool(duration and duration >= video_config.sampled_analysis_min_seconds)
+            analysis = analyzer.analyze(
+                video_path,
+                sample_windows=video_config.sample_windows if sampled else 0,
+                window_seconds=video_config.sample_window_seconds,
+                duration=duration,
+            )
+        except FileNotFoundError:
+            return MediaCheckResult(
+                name="video_content",
+                status=CheckStatus.SKIPPED,
+                blocking=False,
+                message="ffmpeg not available",
+            )
+        except RenderAnalysisError as exc:
+            return MediaCheckResult(
+                name="video_content",
+                status=CheckStatus.FAILED,
+                message="Render analysis failed",
+                detail=str(exc),
+            )
+        issues = []
+        if analysis.longest_black_seconds > video_config.max_black_seconds:
+            issues.append(f"black frames {analysis.longest_black_seconds:.2f}s exceed {video_config.max_black_seconds:.2f}s")
+        if analysis.longest_freeze_seconds > video_config.max_freeze_seconds:
+            issues.append(
+                f"frozen frames {analysis.longest_freeze_seconds:.2f}s exceed {video_config.max_freeze_seconds:.2f}s"
+            )
+        drift = analysis.av_drift_seconds
+        if drift is not None and abs(drift) > video_config.max_av_drift_seconds:
+            issues.append(f"A/V drift {drift:+.2f}s exceeds {video_config.max_av_drift_seconds:.2f}s")
+        metrics = {
+            "longest_black_seconds": round(analysis.longest_black_seconds, 3),
+            "longest_freeze_seconds": round(analysis.longest_freeze_seconds, 3),
+            "analyzed_seconds": round(analysis.analyzed_seconds, 2),
+            "sampled": str(analysis.sampled).lower(),
+        }
+        optional_metrics = {
+            "av_drift_seconds": drift,
+            "integrated_lufs": analysis.integrated_lufs,
+            "loudness_range_lu": analysis.loudness_range_lu,
+            "true_peak_dbfs": analysis.true_peak_dbfs,
+        }
+        for key, value in optional_metrics.items():
+            if value is not None and not math.isinf(value) and not math.isnan(value):
+                metrics[key] = round(value, 3)
+        status = CheckStatus.PASSED if not issues else CheckStatus.FAILED
+        message = "Video content clean" if not issues else "; ".join(issues)
+        return MediaCheckResult(name="video_content", status=status, message=message, metrics=metrics)
     def _load_subtitle_lines(self, subtitle_path: str) -> list[str]:
         lines = []
         try:
@@ -338,7 +550,8 @@ class MediaQAPipeline:
         directory.mkdir(parents=True, exist_ok=True)
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
         safe_run_id = re.sub(r"[^a-zA-Z0-9_-]+", "_", report.run_id)
-        filename = f"qa_{safe_run_id}_{timestamp}.json"
+        gate_suffix = f"_{report.gate}" if report.gate else ""
+        filename = f"qa_{safe_run_id}{gate_suffix}_{timestamp}.json"
         path = directory / filename
         payload = report.dict()
         with open(path, "w", encoding="utf-8") as handle:
@@ -0,0 +1,330 @@
+"""Single-pass ffmpeg analysis of rendered videos.
+レンダリング済み動画を1回のffmpeg実行でデコードし、blackdetect・freezedetect・ebur128・astats
+の出力を逐次パースして黒フレーム、フリーズ、ラウドネス、音声/映像の尺ずれをまとめて取得します。
+Very long renders can be analyzed in sampled mode, which decodes only evenly spaced
+windows (input-side seeks feeding a concat filter) in the same single invocation.
+"""
+from __future__ import annotations
+import logging
+import re
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Tuple
+logger = logging.getLogger(__name__)
+_BLACK_PATTERN = re.compile(r"black_start:\s*(?P<start>[-\d.]+)\s+black_end:\s*(?P<end>[-\d.]+)")
+_FREEZE_PATTERN = re.compile(r"lavfi\.freezedetect\.freeze_(?P<key>start|end):\s*(?P<value>[-\d.]+)")
+_ASTATS_PATTERN = re.compile(r"\[Parsed_astats_\d+ @ [^\]]+\]\s*(?P<key>[^:]+):\s*(?P<value>\S+)")
+_EBUR_VALUE_PATTERN = re.compile(r"^\s*(?P<key>I|LRA|Peak):\s*(?P<value>[-\d.inf]+)")
+_DURATION_PATTERN = re.compile(r"Duration:\s*(?P<h>\d+):(?P<m>\d{2}):(?P<s>\d{2}(?:\.\d+)?)")
+_AUDIO_STREAM_PATTERN = re.compile(r"Stream #0:\d+.*?: Audio: .*?(?P<rate>\d+) Hz")
+_VIDEO_STREAM_PATTERN = re.compile(r"Stream #0:\d+.*?: Video: .*?(?P<fps>[\d.]+) fps")
+_PROGRESS_FRAME_PATTERN = re.compile(r"^frame=(?P<frames>\d+)$")
+_WATCH_INTERVAL_SECONDS = 0.1
+class RenderAnalysisError(Exception):
+    """Raised when ffmpeg cannot analyze a rendered file."""
+@dataclass(frozen=True)
+class TimeRange:
+    """Detected interval on the source timeline, in seconds."""
+    start: float
+    end: float
+    @property
+    def duration(self) -> float:
+        return max(0.0, self.end - self.start)
+@dataclass
+class RenderAnalysis:
+    """Metrics gathered from one ffmpeg decode of a rendered video."""
+    black_ranges: List[TimeRange] = field(default_factory=list)
+    freeze_ranges: List[TimeRange] = field(default_factory=list)
+    integrated_lufs: Optional[float] = None
+    loudness_range_lu: Optional[float] = None
+    true_peak_dbfs: Optional[float] = None
+    audio_peak_dbfs: Optional[float] = None
+    audio_rms_dbfs: Optional[float] = None
+    video_duration: Optional[float] = None
+    audio_duration: Optional[float] = None
+    analyzed_seconds: float = 0.0
+    sampled: bool = False
+    @property
+    def longest_black_seconds(self) -> float:
+        return max((span.duration for span in self.black_ranges), default=0.0)
+    @property
+    def longest_freeze_seconds(self) -> float:
+        return max((span.duration for span in self.freeze_ranges), default=0.0)
+    @property
+    def av_drift_seconds(self) -> Optional[float]:
+        if self.video_duration is None or self.audio_duration is None:
+            return None
+        return self.audio_duration - self.video_duration
+class FFmpegAnalysisParser:
+    """Incremental parser for the stderr of the analysis invocation.
+    Lines are fed as they arrive so memory stays flat regardless of render length;
+    timestamps are on the decoded (possibly concatenated) timeline.
+    """
+    def __init__(self):
+        self.black_ranges: List[Tuple[float, float]] = []
+        self.freeze_ranges: List[Tuple[float, float]] = []
+        self.astats: Dict[str, str] = {}
+        self.ebur128: Dict[str, float] = {}
+        self.sample_rate: Optional[int] = None
+        self.fps: Optional[float] = None
+        self.frames: Optional[int] = None
+        self._open_freeze: Optional[float] = None
+        self._in_ebur_summary = False
+        self._astats_overall = False
+    def feed(self, line: str) -> None:
+        line = line.rstrip()
+        if not line:
+            return
+        if self._in_ebur_summary:
+            if line.startswith("["):
+                self._in_ebur_summary = False
+            else:
+                match = _EBUR_VALUE_PATTERN.match(line)
+                if match and match.group("key") not in self.ebur128:
+                    self.ebur128[match.group("key")] = _to_float(match.group("value"))
+                return
+        match = _BLACK_PATTERN.search(line)
+        if match:
+            self.black_ranges.append((float(match.group("start")), float(match.group("end"))))
+            return
+        match = _FREEZE_PATTERN.search(line)
+        if match:
+            value = float(match.group("value"))
+            if match.group("key") == "start":
+                self._open_freeze = value
+            elif self._open_freeze is not None:
+                self.freeze_ranges.append((self._open_freeze, value))
+                self._open_freeze = None
+            return
+        if "Parsed_ebur128" in line and line.endswith("Summary:"):
+            self._in_ebur_summary = True
+            return
+        if "Parsed_astats" in line:
+            if line.endswith("] Overall"):
+                self._astats_overall = True
+                return
+            match = _ASTATS_PATTERN.search(line)
+            if match and self._astats_overall:
+                self.astats[match.group("key").strip()] = match.group("value")
+            return
+        match = _PROGRESS_FRAME_PATTERN.match(line)
+        if match:
+            self.frames = int(match.group("frames"))
+            return
+        if self.sample_rate is None:
+            match = _AUDIO_STREAM_PATTERN.search(line)
+            if match:
+                self.sample_rate = int(match.group("rate"))
+                return
+        if self.fps is None:
+            match = _VIDEO_STREAM_PATTERN.search(line)
+            if match:
+                self.fps = float(match.group("fps"))
+    def close(self, end_time: Optional[float]) -> None:
+        """Terminate a freeze that was still open when the stream ended."""
+        if self._open_freeze is not None and end_time is not None:
+            self.freeze_ranges.append((self._open_freeze, end_time))
+        self._open_freeze = None
+    @property
+    def video_duration(self) -> Optional[float]:
+        if self.frames is None or not self.fps:
+            return None
+        return self.frames / self.fps
+    @property
+    def audio_duration(self) -> Optional[float]:
+        samples = self.astats.get("Number of samples")
+        if samples is None or not self.sample_rate:
+            return None
+        return _to_float(samples) / self.sample_rate
+def _to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return float("-inf") if value.startswith("-") else float("nan")
+def sample_window_starts(duration: float, windows: int, window_seconds: float) -> List[float]:
+    """Evenly spaced window starts covering the beginning and end of the render."""
+    if windows <= 1 or duration <= window_seconds:
+        return [0.0]
+    span = max(0.0, duration - window_seconds)
+    return [round(span * index / (windows - 1), 3) for index in range(windows)]
+class RenderAnalyzer:
+    """Run blackdetect, freezedetect, ebur128 and astats in one ffmpeg pass."""
+    def __init__(
+        self,
+        ffmpeg_path: str = "ffmpeg",
+        *,
+        black_min_duration: float = 0.5,
+        black_pixel_threshold: float = 0.10,
+        freeze_noise_db: float = -60.0,
+        freeze_min_duration: float = 5.0,
+        timeout_seconds: Optional[float] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        """Initialize analyzer.
+        Args:
+            ffmpeg_path: ffmpeg binary
+            black_min_duration: Minimum black run reported by blackdetect (seconds)
+            black_pixel_threshold: Luma ratio below which a pixel counts as black
+            freeze_noise_db: freezedetect noise tolerance
+            freeze_min_duration: Minimum frozen run reported by freezedetect (seconds)
+            timeout_seconds: Kill ffmpeg when the analysis exceeds this wall time
+            cancel_event: Kill ffmpeg as soon as this event is set (e.g. another QA check failed)
+        """
+        self.ffmpeg_path = ffmpeg_path or "ffmpeg"
+        self.black_min_duration = black_min_duration
+        self.black_pixel_threshold = black_pixel_threshold
+        self.freeze_noise_db = freeze_noise_db
+        self.freeze_min_duration = freeze_min_duration
+        self.timeout_seconds = timeout_seconds
+        self.cancel_event = cancel_event
+    def probe_duration(self, video_path: str) -> Optional[float]:
+        """Read the container duration from ffmpeg's input banner."""
+        try:
+            probe = subprocess.run(
+                [self.ffmpeg_path, "-hide_banner", "-nostdin", "-i", video_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                timeout=30,
+            )
+        except subprocess.TimeoutExpired as exc:
+            raise RenderAnalysisError(f"ffmpeg probe timed out: {exc}") from exc
+        match = _DURATION_PATTERN.search(probe.stderr)
+        if not match:
+            return None
+        return int(match.group("h")) * 3600 + int(match.group("m")) * 60 + float(match.group("s"))
+    def analyze(
+        self,
+        video_path: str,
+        *,
+        sample_windows: int = 0,
+        window_seconds: float = 20.0,
+        duration: Optional[float] = None,
+    ) -> RenderAnalysis:
+        """Analyze ``video_path``.
+        Args:
+            video_path: Rendered video with one video and one audio stream
+            sample_windows: Analyze this many evenly spaced windows instead of the whole file (0 = full pass)
+            window_seconds: Length of each sampled window
+            duration: Known container duration; probed when sampling and not supplied
+        Returns:
+            RenderAnalysis with ranges mapped back to the source timeline
+        Raises:
+            FileNotFoundError: ffmpeg binary is missing
+            RenderAnalysisError: ffmpeg failed, timed out or was cancelled
+        """
+        if not Path(video_path).exists():
+            raise RenderAnalysisError(f"Video file not found: {video_path}")
+        starts: List[float] = []
+        if sample_windows > 0:
+            duration = duration if duration is not None else self.probe_duration(video_path)
+            if duration and duration > sample_windows * window_seconds:
+                starts = sample_window_starts(duration, sample_windows, window_seconds)
+        command = self._build_command(video_path, starts, window_seconds)
+        parser = FFmpegAnalysisParser()
+        self._run(command, parser)
+        decoded_end = parser.video_duration
+        parser.close(decoded_end)
+        analysis = RenderAnalysis(
+            integrated_lufs=parser.ebur128.get("I"),
+            loudness_range_lu=parser.ebur128.get("LRA"),
+            true_peak_dbfs=parser.ebur128.get("Peak"),
+            audio_peak_dbfs=_to_float(parser.astats["Peak level dB"]) if "Peak level dB" in parser.astats else None,
+            audio_rms_dbfs=_to_float(parser.astats["RMS level dB"]) if "RMS level dB" in parser.astats else None,
+            analyzed_seconds=decoded_end or 0.0,
+            sampled=bool(starts),
+        )
+        if starts:
+            analysis.black_ranges = self._map_ranges(parser.black_ranges, starts, window_seconds)
+            analysis.freeze_ranges = self._map_ranges(parser.freeze_ranges, starts, window_seconds)
+        else:
+            analysis.black_ranges = [TimeRange(start, end) for start, end in parser.black_ranges]
+            analysis.freeze_ranges = [TimeRange(start, end) for start, end in parser.freeze_ranges]
+            analysis.video_duration = parser.video_duration
+            analysis.audio_duration = parser.audio_duration
+        return analysis
+    def _build_command(self, video_path: str, starts: List[float], window_seconds: float) -> List[str]:
+        video_filters = (
+            f"blackdetect=d={self.black_min_duration}:pix_th={self.black_pixel_threshold},"
+            f"freezedetect=n={self.freeze_noise_db}dB:d={self.freeze_min_duration}"
+        )
+        audio_filters = "ebur128=peak=true:framelog=quiet,astats=metadata=0:measure_perchannel=none"
+        command = [self.ffmpeg_path, "-hide_banner", "-nostats", "-nostdin", "-progress", "pipe:2"]
+        if starts:
+            for start in starts:
+                command += ["-ss", f"{start:.3f}", "-t", f"{window_seconds:.3f}", "-i", video_path]
+            inputs = "".join(f"[{index}:v:0][{index}:a:0]" for index in range(len(starts)))
+            graph = (
+                f"{inputs}concat=n={len(starts)}:v=1:a=1[cv][ca];"
+                f"[cv]{video_filters}[vout];[ca]{audio_filters}[aout]"
+            )
+        else:
+            command += ["-i", video_path]
+            graph = f"[0:v:0]{video_filters}[vout];[0:a:0]{audio_filters}[aout]"
+        return command + ["-filter_complex", graph, "-map", "[vout]", "-map", "[aout]", "-f", "null", "-"]
+    def _run(self, command: List[str], parser: FFmpegAnalysisParser) -> None:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        )
+        tail: List[str] = []
+        timed_out = threading.Event()
+        cancelled = threading.Event()
+        if self.timeout_seconds or self.cancel_event is not None:
+            threading.Thread(
+                target=self._watch,
+                args=(process, timed_out, cancelled),
+                name="render-analysis-watchdog",
+                daemon=True,
+            ).start()
+        try:
+            self._consume(process.stderr, parser, tail)
+            returncode = process.wait()
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        if cancelled.is_set():
+            raise RenderAnalysisError("ffmpeg analysis cancelled")
+        if timed_out.is_set():
+            raise RenderAnalysisError(f"ffmpeg analysis exceeded {self.timeout_seconds:.0f}s")
+        if returncode != 0:
+            raise RenderAnalysisError("\n".join(tail[-5:]) or f"ffmpeg exited with {returncode}")
+    def _watch(self, process: subprocess.Popen, timed_out: threading.Event, cancelled: threading.Event) -> None:
+        """Kill ffmpeg on timeout or cancellation; returns once the process has exited."""
+        deadline = time.monotonic() + self.timeout_seconds if self.timeout_seconds else None
+        while process.poll() is None:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                cancelled.set()
+                process.kill()
+                return
+            if deadline is not None and time.monotonic() >= deadline:
+                timed_out.set()
+                process.kill()
+                return
+            time.sleep(_WATCH_INTERVAL_SECONDS)
+    def _consume(self, stream: IO[str], parser: FFmpegAnalysisParser, tail: List[str]) -> None:
+        for line in stream:
+            parser.feed(line)
+            tail.append(line.rstrip())
+            if len(tail) > 20:
+                del tail[0]
+    def _map_ranges(self, ranges: List[Tuple[float, float]], starts: List[float], window_seconds: float) -> List[TimeRange]:
+        """Translate concat-timeline ranges back to source time, splitting at window seams."""
+        mapped = []
+        for start, end in ranges:
+            first = min(int(start // window_seconds), len(starts) - 1)
+            last = min(int(max(start, end - 1e-6) // window_seconds), len(starts) - 1)
+            for index in range(first, last + 1):
+                offset = starts[index] - index * window_seconds
+                window_start = index * window_seconds
+                window_end = window_start + window_seconds
+                mapped.append(TimeRange(max(start, window_start) + offset, min(end, window_end) + offset))
+        return mapped
@@ -5,6 +5,7 @@
 import logging
 import os
 import tempfile
+import threading
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -171,11 +172,19 @@ class StockFootageManager:
                 if file.get("quality") == quality and file.get("width", 0) >= 1280:
                     return file
         return video_files[0] if video_files else None
-    def download_clip(self, video_metadata: Dict, output_dir: Optional[Path] = None) -> Optional[str]:
+    def download_clip(
+        self,
+        video_metadata: Dict,
+        output_dir: Optional[Path] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Optional[str]:
         """Download stock video clip to local storage.
+        The clip is streamed to a ``.part`` file and renamed once complete, so a
+        cancelled or failed transfer never leaves a truncated file in the cache.
         Args:
             video_metadata: Video metadata dict from search_footage()
             output_dir: Output directory (uses temp cache if not specified)
+            cancel_event: Aborts the transfer between chunks when set
         Returns:
             Local file path of downloaded video, or None if failed
         """
@@ -190,21 +199,26 @@ class StockFootageManager:
         if output_path.exists():
             logger.info(f"Using cached video: {output_path}")
             return str(output_path)
+        partial_path = output_path.with_name(f"{output_path.name}.{os.getpid()}.{threading.get_ident()}.part")
         try:
             logger.info(f"Downloading stock footage: {video_metadata['keyword']} from {video_metadata['source']}")
-            response = requests.get(video_metadata["url"], stream=True, timeout=60)
-            response.raise_for_status()
-            with open(output_path, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+            with requests.get(video_metadata["url"], stream=True, timeout=60) as response:
+                response.raise_for_status()
+                with open(partial_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if cancel_event is not None and cancel_event.is_set():
+                            logger.info(f"Download cancelled: {video_id}")
+                            partial_path.unlink(missing_ok=True)
+                            return None
+                        if chunk:
+                            f.write(chunk)
+            os.replace(partial_path, output_path)
             file_size_mb = output_path.stat().st_size / (1024 * 1024)
             logger.info(f"Downloaded: {output_path} ({file_size_mb:.1f} MB)")
             return str(output_path)
         except Exception as e:
             logger.error(f"Failed to download video: {e}")
-            if output_path.exists():
-                output_path.unlink()
+            partial_path.unlink(missing_ok=True)
             return None
     def download_clips(self, video_list: List[Dict], max_parallel: int = 3) -> List[str]:
         """Download multiple clips (sequential for simplicity).
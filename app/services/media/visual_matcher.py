@@ -4,6 +4,7 @@
 """
 import logging
 from typing import Dict, List, Set
+from app.services.keyword_automaton import get_keyword_automaton
 logger = logging.getLogger(__name__)
 class VisualMatcher:
     """Extract visual keywords from Japanese script for stock footage search."""
@@ -62,6 +63,11 @@ class VisualMatcher:
         "technology": ["technology", "digital", "computer"],
         "generic": ["business", "professional", "modern office"],
     }
+    CATEGORY_TERMS = {
+        "market": ("株", "市場", "取引", "投資"),
+        "technology": ("IT", "AI", "技術", "デジタル"),
+        "business": ("企業", "会社", "ビジネス"),
+    }
     def __init__(self):
         """Initialize visual matcher."""
         self.last_extraction_stats = {}
@@ -114,11 +120,9 @@ class VisualMatcher:
             Tuple of (keyword set, matched Japanese terms list)
         """
         keywords = set()
-        matched_terms = []
-        for jp_term, en_terms in self.KEYWORD_MAP.items():
-            if jp_term in text:
-                keywords.update(en_terms[:2])
-                matched_terms.append(jp_term)
+        matched_terms = get_keyword_automaton(self.KEYWORD_MAP).matches(text)
+        for jp_term in matched_terms:
+            keywords.update(self.KEYWORD_MAP[jp_term][:2])
         return keywords, matched_terms
     def _detect_category(self, script_content: str, news_items: List[Dict] = None) -> str:
         """Detect content category when no specific keywords found.
@@ -129,14 +133,11 @@ class VisualMatcher:
         if news_items:
             for item in news_items:
                 text += " " + item.get("title", "") + " " + item.get("summary", "")
-        if any(term in text for term in ["株", "市場", "取引", "投資"]):
-            return "market"
-        elif any(term in text for term in ["IT", "AI", "技術", "デジタル"]):
-            return "technology"
-        elif any(term in text for term in ["企業", "会社", "ビジネス"]):
-            return "business"
-        else:
-            return "economy"
+        found = get_keyword_automaton(term for terms in self.CATEGORY_TERMS.values() for term in terms).found(text)
+        for category, terms in self.CATEGORY_TERMS.items():
+            if found.intersection(terms):
+                return category
+        return "economy"
     def get_extraction_stats(self) -> Dict:
         """Get statistics from last extraction.
         Returns:
@@ -159,11 +160,8 @@ class VisualMatcher:
         Returns:
             List of (japanese_term, english_keywords, count) tuples
         """
-        suggestions = []
-        for jp_term, en_terms in self.KEYWORD_MAP.items():
-            count = text.count(jp_term)
-            if count > 0:
-                suggestions.append((jp_term, en_terms, count))
+        counts = get_keyword_automaton(self.KEYWORD_MAP).counts(text)
+        suggestions = [(jp_term, en_terms, counts[jp_term]) for jp_term, en_terms in self.KEYWORD_MAP.items() if jp_term in counts]
         suggestions.sort(key=lambda x: x[2], reverse=True)
         return suggestions[:top_n]
 if __name__ == "__main__":
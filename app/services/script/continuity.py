@@ -7,6 +7,8 @@ from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
+from app.feedback_store import FeedbackStore
+from app.metadata_db import MetadataDatabase
 @dataclass
 class FeedbackSummary:
     """Parsed feedback information for a single video."""
@@ -27,7 +29,7 @@ class FeedbackSummary:
         return None
 @dataclass
 class MetadataSummary:
-    """Parsed metadata information from CSV log."""
+    """Parsed metadata information from the metadata history store."""
     title: Optional[str]
     description: Optional[str]
     news_topics: Optional[str]
@@ -65,9 +67,9 @@ class ContinuityContextBuilder:
         self.feedback_json_path = Path(feedback_json_path or data_dir / "video_feedback.json")
     def build_prompt_snippet(self) -> str:
         metadata = self._load_latest_metadata()
-        feedback_store = self._load_feedback_store()
-        feedback = self._load_latest_feedback(feedback_store)
-        ai_review = self._load_latest_ai_review(feedback_store)
+        latest_entry = self._load_latest_feedback_entry()
+        feedback = self._load_latest_feedback(latest_entry)
+        ai_review = self._load_latest_ai_review(latest_entry)
         lines: List[str] = []
         if metadata:
             snippet = metadata.short_description()
@@ -111,6 +113,19 @@ class ContinuityContextBuilder:
         )
         return "\n".join(lines)
     def _load_latest_metadata(self) -> Optional[MetadataSummary]:
+        db_path = self.metadata_csv_path.with_suffix(".db")
+        if db_path.exists():
+            try:
+                latest = MetadataDatabase(str(db_path)).latest()
+            except Exception:
+                return None
+            if not latest:
+                return None
+            return MetadataSummary(
+                title=latest.get("title"),
+                description=latest.get("description"),
+                news_topics=latest.get("news_topics"),
+            )
         if not self.metadata_csv_path.exists():
             return None
         try:
@@ -128,16 +143,22 @@ class ContinuityContextBuilder:
             )
         except Exception:
             return None
-    def _load_feedback_store(self) -> Optional[Dict[str, Any]]:
+    def _load_latest_feedback_entry(self) -> Optional[tuple[str, Dict[str, Any]]]:
+        db_path = self.feedback_json_path.with_suffix(".db")
+        if db_path.exists():
+            try:
+                return FeedbackStore(str(db_path)).latest()
+            except Exception:
+                return None
         if not self.feedback_json_path.exists():
             return None
         try:
             with self.feedback_json_path.open("r", encoding="utf-8") as f:
                 data = json.load(f)
-            if isinstance(data, dict) and data:
-                return data
         except Exception:
             return None
+        if isinstance(data, dict) and data:
+            return self._select_latest_feedback_entry(data)
         return None
     def _select_latest_feedback_entry(self, data: Dict[str, Any]) -> Optional[tuple[str, Dict[str, Any]]]:
         try:
@@ -150,10 +171,7 @@ class ContinuityContextBuilder:
         except Exception:
             return None
         return None
-    def _load_latest_feedback(self, data: Optional[Dict[str, Any]]) -> Optional[FeedbackSummary]:
-        if not data:
-            return None
-        selected = self._select_latest_feedback_entry(data)
+    def _load_latest_feedback(self, selected: Optional[tuple[str, Dict[str, Any]]]) -> Optional[FeedbackSummary]:
         if not selected:
             return None
         video_id, payload = selected
@@ -177,10 +195,7 @@ class ContinuityContextBuilder:
             positive_comments=positive_comments,
             negative_comments=negative_comments,
         )
-    def _load_latest_ai_review(self, data: Optional[Dict[str, Any]]) -> Optional[AIReviewSummary]:
-        if not data:
-            return None
-        selected = self._select_latest_feedback_entry(data)
+    def _load_latest_ai_review(self, selected: Optional[tuple[str, Dict[str, Any]]]) -> Optional[AIReviewSummary]:
         if not selected:
             return None
         _, payload = selected
@@ -1,5 +1,4 @@
 from __future__ import annotations
-import json
 import logging
 import textwrap
 from dataclasses import dataclass
@@ -11,6 +10,7 @@ from pydantic import BaseModel, Field, ValidationError
 from app.adapters.llm import LLMClient
 from app.adapters.llm import _extract_message_text as adapter_extract_message_text
 from app.config.settings import settings
+from app.json_extraction import extract_json, extract_json_text, iter_json_candidates
 from app.services.script.speakers import get_speaker_registry
 from app.services.script.validator import (
     DialogueEntry,
@@ -105,7 +105,7 @@ class StructuredScriptGenerator:
     def __init__(self, client: Optional[LLMClient]=None, max_attempts: int=3, temperature: float=0.6, allowed_speakers: Optional[Sequence[str]]=None) -> None:
         self.max_attempts = max(1, max_attempts)
         model_name = settings.gemini_models.get('script_generation')
-        self.client = client or LLMClient(model=model_name, temperature=temperature)
+        self.client = client or LLMClient(model=model_name, temperature=temperature, call_site='script_generation')
         self._speaker_roster = SpeakerRoster(allowed_speakers) if allowed_speakers is not None else SpeakerRoster.from_settings()
         self._allowed_speakers = self._speaker_roster.names
         self._allowed_speaker_set = {name for name in self._allowed_speakers if name}
@@ -121,7 +121,7 @@ class StructuredScriptGenerator:
         last_error: Optional[str] = None
         for attempt in range(1, self.max_attempts + 1):
             logger.info('Structured script generation attempt %s/%s', attempt, self.max_attempts)
-            response = self.client.completion(messages=[{'role': 'system', 'content': 'You craft finance YouTube dialogue scripts. Always return valid JSON only.'}, {'role': 'user', 'content': prompt}])
+            response = self.client.completion(messages=[{'role': 'system', 'content': 'You craft finance YouTube dialogue scripts. Always return valid JSON only.'}, {'role': 'user', 'content': prompt}], cache=attempt == 1)
             response_text = self._extract_message_text(response)
             logger.debug('LLM raw response (first 400 chars): %r', response_text[:400])
             try:
@@ -200,13 +200,9 @@ class StructuredScriptGenerator:
         return textwrap.dedent(template).strip()
 
     def _parse_payload(self, response_text: str) -> StructuredScriptPayload:
-        json_blob = self._extract_json_block(response_text)
-        if not json_blob:
+        data = extract_json(response_text, expect=dict)
+        if data is None:
             raise ValueError('No JSON object found in LLM response')
-        try:
-            data = json.loads(json_blob)
-        except json.JSONDecodeError as exc:
-            raise ValueError(f'Malformed JSON: {exc}') from exc
         try:
             return StructuredScriptPayload.model_validate(data)
         except ValidationError as exc:
@@ -214,74 +210,12 @@ class StructuredScriptGenerator:
 
     @staticmethod
     def _extract_json_block(text: str) -> Optional[str]:
-        stripped = text.strip()
-        if not stripped:
-            return None
-        if stripped.startswith('{') and StructuredScriptGenerator._is_balanced_json(stripped):
-            return stripped
-
-        search_start = 0
-        while True:
-            start = stripped.find('{', search_start)
-            if start == -1:
-                return None
-
-            slice_text = stripped[start:]
-            end_index = StructuredScriptGenerator._find_matching_brace(slice_text)
-            if end_index is None:
-                search_start = start + 1
-                if search_start >= len(stripped):
-                    return None
-                continue
-
-            candidate = slice_text[:end_index + 1]
-            if StructuredScriptGenerator._is_balanced_json(candidate):
-                return candidate
-
-            search_start = start + 1
-            if search_start >= len(stripped):
-                return None
+        return extract_json_text(text, expect=dict)
 
     @staticmethod
     def _extract_message_text(response: Dict[str, Any]) -> str:
         return adapter_extract_message_text(response)
 
-    @staticmethod
-    def _find_matching_brace(text: str) -> Optional[int]:
-        depth = 0
-        in_string = False
-        escape = False
-        for idx, char in enumerate(text):
-            if in_string:
-                if escape:
-                    escape = False
-                    continue
-                if char == '\\':
-                    escape = True
-                    continue
-                if char == '"':
-                    in_string = False
-                continue
-            if char == '"':
-                in_string = True
-                continue
-            if char == '{':
-                depth += 1
-                continue
-            if char == '}':
-                depth -= 1
-                if depth == 0:
-                    return idx
-        return None
-
-    @staticmethod
-    def _is_balanced_json(text: str) -> bool:
-        try:
-            json.loads(text)
-            return True
-        except json.JSONDecodeError:
-            return False
-
     def _build_script_from_text(self, response_text: str) -> Tuple[Script, ScriptQualityReport]:
         recovered_payload = self._recover_structured_payload(response_text)
         if recovered_payload:
@@ -314,54 +248,15 @@ class StructuredScriptGenerator:
         return (script, quality_report)
 
     def _recover_structured_payload(self, response_text: str) -> Optional[StructuredScriptPayload]:
-        candidates: List[str] = []
-        json_candidate = self._extract_json_block(response_text)
-        if json_candidate:
-            candidates.append(json_candidate)
-
-        stripped = self._strip_markdown_fences(response_text)
-        if stripped and stripped != response_text:
-            nested_candidate = self._extract_json_block(stripped)
-            if nested_candidate:
-                candidates.append(nested_candidate)
-            candidates.append(stripped)
-
-        candidates.append(response_text)
-        seen: set[str] = set()
-        for candidate in candidates:
-            normalized = candidate.strip()
-            if not normalized or normalized in seen:
+        for _, data in iter_json_candidates(response_text, yaml_fallback=True):
+            if not isinstance(data, dict):
+                continue
+            try:
+                return StructuredScriptPayload.model_validate(data)
+            except ValidationError:
                 continue
-            seen.add(normalized)
-            for loader in (json.loads, yaml.safe_load):
-                try:
-                    data = loader(normalized)
-                except Exception:
-                    continue
-                if not isinstance(data, dict):
-                    continue
-                try:
-                    return StructuredScriptPayload.model_validate(data)
-                except ValidationError:
-                    continue
         return None
 
-    @staticmethod
-    def _strip_markdown_fences(text: str) -> str:
-        if '```' not in text:
-            return text
-        segments = text.split('```')
-        rebuilt: List[str] = []
-        for index, segment in enumerate(segments):
-            if index % 2 == 1:
-                newline_index = segment.find('\n')
-                if newline_index != -1:
-                    segment = segment[newline_index + 1:]
-                else:
-                    segment = ''
-            rebuilt.append(segment)
-        return ''.join(rebuilt)
-
     def _dialogues_from_validation(self, validation: Optional[ScriptValidationResult]) -> List[DialogueEntry]:
         if not validation:
             return []
@@ -3,19 +3,21 @@
 次の動画制作に活かすフィードバックを生成する。
 """
 from __future__ import annotations
-import json
 import logging
 import math
 import os
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import ffmpeg
 import google.generativeai as genai
 from app.api_rotation import get_rotation_manager
 from app.config.settings import settings
+from app.json_extraction import extract_json
 from app.llm_logging import llm_logging_context, record_llm_interaction
+from app.services.media.perceptual_hash import cluster_hashes, hash_image
 from app.models.video_review import (
     ScreenshotEvidence,
     VideoReviewFeedback,
@@ -27,9 +29,22 @@ logger = logging.getLogger(__name__)
 class ScreenshotExtractionError(Exception):
     """スクリーンショット抽出に失敗したときの例外"""
 class VideoScreenshotExtractor:
-    """FFmpegを用いた動画スクリーンショット抽出ユーティリティ"""
-    def __init__(self, ffmpeg_path: Optional[str] = None):
+    """FFmpegを用いた動画スクリーンショット抽出ユーティリティ
+    各タイムスタンプを入力側シーク（キーフレーム単位）で個別に1枚だけデコードし、
+    並列実行するため、抽出時間は動画の長さに依存しません。
+    """
+    def __init__(
+        self,
+        ffmpeg_path: Optional[str] = None,
+        max_width: Optional[int] = None,
+        max_workers: Optional[int] = None,
+        keyframe_only: Optional[bool] = None,
+    ):
+        review_settings = settings.video_review
         self.ffmpeg_path = ffmpeg_path or settings.ffmpeg_path
+        self.max_width = max_width if max_width is not None else review_settings.screenshot_max_width
+        self.max_workers = max(1, max_workers or review_settings.screenshot_workers)
+        self.keyframe_only = review_settings.screenshot_keyframe_only if keyframe_only is None else keyframe_only
     def extract(
         self,
         video_path: str,
@@ -56,38 +71,54 @@ class VideoScreenshotExtractor:
                 output_dir,
                 expected_count,
             )
-            return self._build_metadata(existing[:expected_count], interval_seconds, duration)
+            files = existing[:expected_count]
+            return self._build_metadata(files, [idx * interval_seconds for idx in range(len(files))], duration)
         for png in existing:
             try:
                 png.unlink()
             except OSError:
                 logger.debug("Failed to remove old screenshot: %s", png)
-        output_pattern = os.path.join(output_dir, "shot_%03d.png")
+        timestamps = self.plan_timestamps(duration, interval_seconds, expected_count)
         logger.info(
-            "Extracting screenshots from %s every %ss (max %d) into %s",
+            "Extracting %d screenshots from %s every %ss (%d workers) into %s",
+            len(timestamps),
             video_path,
             interval_seconds,
-            max_screenshots,
+            self.max_workers,
             output_dir,
         )
-        try:
-            (
-                ffmpeg.input(video_path)
-                .filter_("fps", fps=f"1/{interval_seconds}")
-                .output(
-                    output_pattern,
-                    vsync="vfr",
-                    vframes=max_screenshots,
-                )
-                .overwrite_output()
-            ).run(cmd=[self.ffmpeg_path], quiet=True)
-        except ffmpeg.Error as exc:
-            logger.error("FFmpeg error during screenshot extraction: %s", exc)
-            raise ScreenshotExtractionError(str(exc)) from exc
-        generated = sorted(Path(output_dir).glob("shot_*.png"))
+        jobs = [
+            (timestamp, os.path.join(output_dir, f"shot_{idx + 1:03d}.png")) for idx, timestamp in enumerate(timestamps)
+        ]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs)), thread_name_prefix="review-shot") as executor:
+            outcomes = list(executor.map(lambda job: self._extract_frame(video_path, *job), jobs))
+        generated = [(Path(path), timestamp) for (timestamp, path), ok in zip(jobs, outcomes) if ok]
         if not generated:
             raise ScreenshotExtractionError("No screenshots were generated")
-        return self._build_metadata(generated[:expected_count], interval_seconds, duration)
+        return self._build_metadata([path for path, _ in generated], [timestamp for _, timestamp in generated], duration)
+    def plan_timestamps(self, duration: float, interval_seconds: int, count: int) -> List[float]:
+        """Capture times matching the former ``fps=1/interval`` sampling, kept inside the video."""
+        last_frame = max(0.0, duration - 0.1)
+        return [float(min(idx * interval_seconds, last_frame)) for idx in range(count)]
+    def build_frame_command(self, video_path: str, timestamp: float, output_path: str) -> List[str]:
+        command = [self.ffmpeg_path, "-v", "error", "-nostdin"]
+        if self.keyframe_only:
+            command += ["-skip_frame", "nokey", "-noaccurate_seek"]
+        command += ["-ss", f"{timestamp:.3f}", "-i", video_path, "-an", "-sn", "-frames:v", "1"]
+        if self.max_width:
+            command += ["-vf", f"scale='min({self.max_width},iw)':-2:flags=fast_bilinear"]
+        return command + ["-y", output_path]
+    def _extract_frame(self, video_path: str, timestamp: float, output_path: str) -> bool:
+        command = self.build_frame_command(video_path, timestamp, output_path)
+        try:
+            result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=60)
+        except (FileNotFoundError, subprocess.TimeoutExpired) as exc:
+            logger.error("FFmpeg error during screenshot extraction at %.1fs: %s", timestamp, exc)
+            return False
+        if result.returncode != 0 or not os.path.exists(output_path):
+            logger.warning("Screenshot at %.1fs failed: %s", timestamp, result.stderr.strip())
+            return False
+        return True
     def _get_video_duration(self, video_path: str) -> float:
         try:
             probe = ffmpeg.probe(video_path)
@@ -123,17 +154,16 @@ class VideoScreenshotExtractor:
     def _build_metadata(
         self,
         files: List[Path],
-        interval_seconds: int,
+        timestamps: List[float],
         duration: float,
     ) -> List[ScreenshotEvidence]:
         screenshots: List[ScreenshotEvidence] = []
-        for idx, path in enumerate(files):
-            timestamp = min(duration, idx * interval_seconds)
+        for idx, (path, timestamp) in enumerate(zip(files, timestamps)):
             screenshots.append(
                 ScreenshotEvidence(
                     index=idx,
                     path=str(path),
-                    timestamp_seconds=float(timestamp),
+                    timestamp_seconds=float(min(duration, timestamp)),
                 )
             )
         return screenshots
@@ -204,11 +234,10 @@ class GeminiVisionReviewer:
         except Exception as exc:
             logger.error("Gemini review failed: %s", exc)
             raise
-        try:
-            data = json.loads(raw_response)
-        except json.JSONDecodeError as exc:
+        data = extract_json(raw_response, expect=dict)
+        if data is None:
             logger.warning("Failed to parse JSON from Gemini. Raw response: %s", raw_response[:500])
-            raise ValueError("Gemini response was not valid JSON") from exc
+            raise ValueError("Gemini response was not valid JSON")
         return VideoReviewFeedback(**data)
     def _build_prompt(
         self,
@@ -221,16 +250,20 @@ class GeminiVisionReviewer:
         title = str(raw_title) if raw_title is not None else None
         duration = str(raw_duration) if raw_duration is not None else None
         screenshot_lines = [
-            f"{idx + 1}. {shot.timestamp_label} ({os.path.basename(shot.path)})" for idx, shot in enumerate(screenshots)
+            f"{idx + 1}. {shot.timestamp_label} ({os.path.basename(shot.path)}){self._cluster_note(shot)}"
+            for idx, shot in enumerate(screenshots)
         ]
-        context_block = "\n".join(
-            [
-                "あなたは金融系YouTubeチャンネルの品質管理AIです。",
-                "以下のスクリーンショットは動画を1分ごとにキャプチャしたものです。",
-                "視聴維持率、画面のバリエーション、テロップやグラフの可読性を評価し、次の動画改善に繋がるフィードバックを返してください。",
-                "視聴者は30代の投資家層で、最新ニュースを短時間で理解したいと考えています。",
-            ]
-        )
+        context_lines = [
+            "あなたは金融系YouTubeチャンネルの品質管理AIです。",
+            "以下のスクリーンショットは動画を1分ごとにキャプチャしたものです。",
+            "視聴維持率、画面のバリエーション、テロップやグラフの可読性を評価し、次の動画改善に繋がるフィードバックを返してください。",
+            "視聴者は30代の投資家層で、最新ニュースを短時間で理解したいと考えています。",
+        ]
+        if any(shot.cluster_size > 1 for shot in screenshots):
+            context_lines.append(
+                "ほぼ同じ画面が続いた区間は代表フレーム1枚にまとめ、まとめた枚数と時刻を併記しています。画面変化の少なさとして評価に反映してください。"
+            )
+        context_block = "\n".join(context_lines)
         video_info_line = f"動画タイトル: {title}" if title else "動画タイトル: 不明"
         duration_line = f"推定尺: {duration}" if duration else "推定尺: 未取得"
         screenshots_block = "\n".join(["スクリーンショット一覧:", *screenshot_lines])
@@ -257,6 +290,14 @@ class GeminiVisionReviewer:
                 instructions,
             ]
         )
+    @staticmethod
+    def _cluster_note(shot: ScreenshotEvidence) -> str:
+        if shot.cluster_size <= 1:
+            return ""
+        labels = ", ".join(
+            f"{int(ts) // 60:02d}:{int(ts) % 60:02d}" for ts in shot.cluster_timestamps
+        )
+        return f" ※類似フレーム{shot.cluster_size}枚の代表 ({labels})"
 class VideoReviewService:
     """スクリーンショット抽出とAIフィードバックを統合するサービス"""
     def __init__(
@@ -292,17 +333,22 @@ class VideoReviewService:
             max_screenshots=self.settings.max_screenshots,
             force=force_capture,
         )
+        representatives, bytes_saved = self._select_representatives(screenshots)
         feedback = self.reviewer.review(
             video_path=video_path,
-            screenshots=screenshots,
+            screenshots=representatives,
             metadata=metadata,
         )
         result = VideoReviewResult(
             video_path=video_path,
             video_id=video_id,
             model_name=self.settings.model,
-            screenshots=screenshots,
+            screenshots=representatives,
+            captured_paths=[shot.path for shot in screenshots if shot.path],
             feedback=feedback,
+            frames_total=len(screenshots),
+            frames_kept=len(representatives),
+            payload_bytes_saved=bytes_saved,
         )
         if self.feedback_collector and video_id:
             try:
@@ -310,6 +356,36 @@ class VideoReviewService:
             except Exception as exc:
                 logger.warning("Failed to record AI review for %s: %s", video_id, exc)
         return result
+    def _select_representatives(self, screenshots: List[ScreenshotEvidence]) -> Tuple[List[ScreenshotEvidence], int]:
+        """知覚ハッシュで冗長なフレームをまとめ、代表フレームと削減バイト数を返す"""
+        if not self.settings.dedup_enabled or len(screenshots) < 2:
+            return screenshots, 0
+        try:
+            hashes = [hash_image(shot.path) for shot in screenshots]
+        except Exception as exc:
+            logger.warning("Screenshot hashing failed; sending all frames: %s", exc)
+            return screenshots, 0
+        clusters = cluster_hashes(hashes, self.settings.dedup_max_distance)
+        representatives = [
+            screenshots[cluster.representative].model_copy(
+                update={
+                    "cluster_size": cluster.size,
+                    "cluster_timestamps": [screenshots[idx].timestamp_seconds for idx in cluster.members],
+                }
+            )
+            for cluster in clusters
+        ]
+        kept = {cluster.representative for cluster in clusters}
+        bytes_saved = sum(
+            os.path.getsize(shot.path) for idx, shot in enumerate(screenshots) if idx not in kept and os.path.exists(shot.path)
+        )
+        logger.info(
+            "Screenshot dedup kept %d/%d frames (%d bytes saved)",
+            len(representatives),
+            len(screenshots),
+            bytes_saved,
+        )
+        return representatives, bytes_saved
 _review_service_instance: Optional[VideoReviewService] = None
 def get_video_review_service() -> VideoReviewService:
     """サービスシングルトンを取得"""
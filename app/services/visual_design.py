@@ -7,7 +7,42 @@ from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 from app.background_theme import BackgroundTheme, get_theme_manager
 from app.config.paths import ProjectPaths
+from app.services.keyword_automaton import get_keyword_automaton
 logger = logging.getLogger(__name__)
+POSITIVE_KEYWORDS = (
+    "上昇",
+    "成長",
+    "好調",
+    "増加",
+    "利益",
+    "改善",
+    "回復",
+    "拡大",
+    "上方修正",
+    "最高",
+    "記録",
+    "達成",
+    "成功",
+    "躍進",
+    "好転",
+)
+NEGATIVE_KEYWORDS = (
+    "下落",
+    "減少",
+    "不調",
+    "懸念",
+    "リスク",
+    "低迷",
+    "悪化",
+    "縮小",
+    "下方修正",
+    "最低",
+    "損失",
+    "失敗",
+    "後退",
+    "悪化",
+    "警戒",
+)
 @dataclass
 class UnifiedVisualDesign:
     """サムネイルと動画で共有するビジュアルデザイン設定
@@ -92,47 +127,14 @@ class UnifiedVisualDesign:
         Returns:
             str: "positive", "negative", or "neutral"
         """
-        positive_keywords = [
-            "上昇",
-            "成長",
-            "好調",
-            "増加",
-            "利益",
-            "改善",
-            "回復",
-            "拡大",
-            "上方修正",
-            "最高",
-            "記録",
-            "達成",
-            "成功",
-            "躍進",
-            "好転",
-        ]
-        negative_keywords = [
-            "下落",
-            "減少",
-            "不調",
-            "懸念",
-            "リスク",
-            "低迷",
-            "悪化",
-            "縮小",
-            "下方修正",
-            "最低",
-            "損失",
-            "失敗",
-            "後退",
-            "悪化",
-            "警戒",
-        ]
         text = script_content.lower()
         for item in news_items:
             if isinstance(item, dict):
                 text += " " + item.get("title", "").lower()
                 text += " " + item.get("content", "").lower()
-        positive_count = sum(1 for kw in positive_keywords if kw in text)
-        negative_count = sum(1 for kw in negative_keywords if kw in text)
+        found = get_keyword_automaton(POSITIVE_KEYWORDS + NEGATIVE_KEYWORDS).found(text)
+        positive_count = sum(1 for kw in POSITIVE_KEYWORDS if kw in found)
+        negative_count = sum(1 for kw in NEGATIVE_KEYWORDS if kw in found)
         logger.debug(f"Sentiment analysis: positive={positive_count}, negative={negative_count}")
         if positive_count > negative_count + 1:
             return "positive"
@@ -1,19 +1,73 @@
+import atexit
 import json
 import logging
+import re
+import threading
 import uuid
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from app.config.paths import ProjectPaths
 from app.config_prompts.settings import settings
+from app.prompt_cache import SheetPromptCache
 from app.prompts import get_sheet_prompt_defaults
 logger = logging.getLogger(__name__)
+RUN_COLUMNS = ['run_id', 'status', 'started_at', 'finished_at', 'duration_sec', 'mode', 'prompt_a', 'search_results_json', 'script_text', 'audio_urls_json', 'stt_text', 'subtitle_srt', 'video_url', 'title', 'description', 'sources', 'thumbnail_url', 'first_comment', 'error_log']
+FIELD_COLUMNS = {name: index for index, name in enumerate(RUN_COLUMNS) if name not in ('run_id', 'started_at')}
+MAX_CELL_CHARS = 48000
+DEFAULT_FLUSH_INTERVAL = 2.0
+MAX_RETRY_DELAY = 300.0
+DEFAULT_PROMPT_TTL = 900.0
+_ROW_PATTERN = re.compile(r'![A-Z]+(\d+)')
+def _column_letter(index: int) -> str:
+    return chr(65 + index)
+def _format_cell(field: str, value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif value is None:
+        value = ''
+    str_value = str(value)
+    if len(str_value) > MAX_CELL_CHARS:
+        truncate_msg = f'\n\n[TRUNCATED: Original length was {len(str_value)} characters]'
+        str_value = str_value[:MAX_CELL_CHARS - len(truncate_msg)] + truncate_msg
+        logger.warning(f"Field '{field}' truncated from {len(str(value))} to {len(str_value)} characters")
+    return str_value
 class SheetsManager:
-    def __init__(self):
+    """Google Sheets連携.
+    プロンプトはTTL付きキャッシュを優先して返し、期限切れ時はバックグラウンドで再検証します。
+    runsシートへの書き込みはキューに積んで即座に返し、バックグラウンドでまとめて反映します
+    （新規行は1回のappend、更新はvalues.batchUpdate）。run_id→行番号はappend応答から
+    キャッシュし、書き込み前にA列のセルだけを読んで検証します。
+    """
+    def __init__(self, service=None, sheet_id: Optional[str]=None, flush_interval: float=DEFAULT_FLUSH_INTERVAL, prompt_cache: Optional[SheetPromptCache]=None):
+        """初期化.
+        Args:
+            service: Sheets APIサービス（テスト用の差し替え。Noneなら認証情報から接続）
+            sheet_id: スプレッドシートID（Noneなら設定値）
+            flush_interval: キュー済み書き込みをまとめるまでの秒数（0以下で自動反映しない）
+            prompt_cache: プロンプトキャッシュ（Noneならdata/prompt_cacheに保存）
+        """
         self.service = None
-        self.sheet_id = settings.google_sheet_id
-        self._connect()
+        self.sheet_id = sheet_id or settings.google_sheet_id
+        self.flush_interval = flush_interval
+        self.flush_count = 0
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._failures = 0
+        self._row_index: Dict[str, int] = {}
+        self._pending_rows: Dict[str, List[str]] = {}
+        self._pending_updates: Dict[str, Dict[int, str]] = {}
+        self.prompt_cache = prompt_cache or SheetPromptCache(str(ProjectPaths.DATA_DIR / 'prompt_cache'), ttl_seconds=DEFAULT_PROMPT_TTL)
+        self._prompt_freshness: Dict[str, Dict[str, Any]] = {}
+        self._revalidating = set()
+        if service is not None:
+            self.service = service
+        else:
+            self._connect()
+        atexit.register(self.flush)
     def _connect(self):
         try:
             creds_dict = settings.google_credentials_json
@@ -55,111 +109,207 @@ class SheetsManager:
                 raise
         return None
     def create_run(self, mode: str='daily') -> str:
+        """runsシートに新規行をキューに積み、run_idを返す（書き込みはバックグラウンド）"""
+        run_id = str(uuid.uuid4())[:8]
         if not self.service:
             logger.warning('Sheets service not available, returning dummy run_id')
-            return str(uuid.uuid4())[:8]
-        run_id = str(uuid.uuid4())[:8]
-        now = datetime.now().isoformat()
-        values = [[run_id, 'processing', now, '', '', mode, '', '', '', '', '', '', '', '', '', '', '', '', '']]
-        try:
-            self._rate_limit_retry(self.service.spreadsheets().values().append, spreadsheetId=self.sheet_id, range='runs!A:S', valueInputOption='RAW', body={'values': values}).execute()
-            logger.info(f'Created new run: {run_id} (mode: {mode})')
             return run_id
-        except Exception as e:
-            logger.error(f'Failed to create run: {e}')
-            raise
+        now = datetime.now().isoformat()
+        row = [''] * len(RUN_COLUMNS)
+        row[0], row[1], row[2], row[5] = run_id, 'processing', now, mode
+        with self._lock:
+            self._pending_rows[run_id] = row
+            self._schedule_flush()
+        logger.info(f'Created new run: {run_id} (mode: {mode})')
+        return run_id
     def update_run(self, run_id: str, **fields) -> bool:
+        """runの列更新をキューに積む.
+        同じセルへの更新は最新値に集約され、次回のflushでまとめて書き込まれます。
+        Returns:
+            キューに積んだ場合True（Sheets未接続ならFalse）
+        """
         if not self.service:
             logger.debug(f'Sheets service unavailable, skipping update for run {run_id}')
             return False
-        try:
-            result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='runs!A:S').execute()
-            rows = result.get('values', [])
-            target_row_index = None
-            for i, row in enumerate(rows):
-                if len(row) > 0 and row[0] == run_id:
-                    target_row_index = i
-                    break
-            if target_row_index is None:
-                logger.error(f'Run ID not found: {run_id}')
-                return False
-            current_row = rows[target_row_index]
-            while len(current_row) < 19:
-                current_row.append('')
-            field_mapping = {'status': 1, 'finished_at': 3, 'duration_sec': 4, 'mode': 5, 'prompt_a': 6, 'search_results_json': 7, 'script_text': 8, 'audio_urls_json': 9, 'stt_text': 10, 'subtitle_srt': 11, 'video_url': 12, 'title': 13, 'description': 14, 'sources': 15, 'thumbnail_url': 16, 'first_comment': 17, 'error_log': 18}
-            for field, value in fields.items():
-                if field in field_mapping:
-                    col_index = field_mapping[field]
-                    if isinstance(value, (dict, list)):
-                        value = json.dumps(value, ensure_ascii=False)
-                    elif value is None:
-                        value = ''
-                    str_value = str(value)
-                    max_chars = 48000
-                    if len(str_value) > max_chars:
-                        truncate_msg = f'\n\n[TRUNCATED: Original length was {len(str_value)} characters]'
-                        str_value = str_value[:max_chars - len(truncate_msg)] + truncate_msg
-                        logger.warning(f"Field '{field}' truncated from {len(str(value))} to {len(str_value)} characters")
-                    current_row[col_index] = str_value
-            if fields.get('status') == 'completed' and 'finished_at' not in fields:
-                current_row[3] = datetime.now().isoformat()
-            if not self.service:
-                logger.debug(f'Sheets service unavailable, skipping update for run {run_id}')
+        cells = {FIELD_COLUMNS[field]: _format_cell(field, value) for field, value in fields.items() if field in FIELD_COLUMNS}
+        if fields.get('status') == 'completed' and 'finished_at' not in fields:
+            cells[FIELD_COLUMNS['finished_at']] = datetime.now().isoformat()
+        with self._lock:
+            pending_row = self._pending_rows.get(run_id)
+            if pending_row is not None:
+                for col_index, value in cells.items():
+                    pending_row[col_index] = value
+            else:
+                self._pending_updates.setdefault(run_id, {}).update(cells)
+            self._schedule_flush()
+        logger.info(f'Queued update for run {run_id}: {list(fields.keys())}')
+        return True
+    def _schedule_flush(self, delay: Optional[float]=None):
+        if self._timer is not None or self.flush_interval <= 0:
+            return
+        self._timer = threading.Timer(self.flush_interval if delay is None else delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+    @property
+    def pending_writes(self) -> int:
+        with self._lock:
+            return len(self._pending_rows) + sum(len(cells) for cells in self._pending_updates.values())
+    def flush(self) -> bool:
+        """キュー済みの新規行・更新をSheetsへ反映.
+        失敗した分はキューに戻し、間隔を広げて再試行します。
+        Returns:
+            キューが空になった場合True
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                rows, self._pending_rows = self._pending_rows, {}
+                updates, self._pending_updates = self._pending_updates, {}
+            if not rows and not updates:
+                return True
+            try:
+                if rows:
+                    self._append_rows(rows)
+                    rows = {}
+                if updates:
+                    self._write_updates(updates)
+                self._failures = 0
+                self.flush_count += 1
+                return True
+            except Exception as e:
+                self._failures += 1
+                delay = min(max(self.flush_interval, 1.0) * 2 ** self._failures, MAX_RETRY_DELAY)
+                logger.error(f'Failed to flush Sheets writes (retry in {delay:.0f}s): {e}')
+                self._requeue(rows, updates, delay)
                 return False
-            range_name = f'runs!A{target_row_index + 1}:S{target_row_index + 1}'
-            self._rate_limit_retry(self.service.spreadsheets().values().update, spreadsheetId=self.sheet_id, range=range_name, valueInputOption='RAW', body={'values': [current_row]}).execute()
-            logger.info(f'Updated run {run_id}: {list(fields.keys())}')
-            return True
-        except Exception as e:
-            logger.error(f'Failed to update run {run_id}: {e}')
-            return False
+    def _requeue(self, rows: Dict[str, List[str]], updates: Dict[str, Dict[int, str]], delay: float):
+        with self._lock:
+            self._pending_rows = {**rows, **self._pending_rows}
+            for run_id, cells in updates.items():
+                self._pending_updates[run_id] = {**cells, **self._pending_updates.get(run_id, {})}
+            self._schedule_flush(delay)
+    def _append_rows(self, rows: Dict[str, List[str]]):
+        result = self._rate_limit_retry(self.service.spreadsheets().values().append, spreadsheetId=self.sheet_id, range='runs!A:S', valueInputOption='RAW', body={'values': list(rows.values())}).execute()
+        match = _ROW_PATTERN.search((result or {}).get('updates', {}).get('updatedRange', ''))
+        if match:
+            first_row = int(match.group(1))
+            with self._lock:
+                for offset, run_id in enumerate(rows):
+                    self._row_index[run_id] = first_row + offset
+        logger.info(f'Appended {len(rows)} run(s) to Sheets')
+    def _write_updates(self, updates: Dict[str, Dict[int, str]]):
+        row_numbers = self._resolve_rows(list(updates))
+        data = []
+        for run_id, cells in updates.items():
+            row_number = row_numbers.get(run_id)
+            if row_number is None:
+                logger.error(f'Run ID not found: {run_id}')
+                continue
+            columns = sorted(cells)
+            start = 0
+            for i in range(1, len(columns) + 1):
+                if i == len(columns) or columns[i] != columns[i - 1] + 1:
+                    span = columns[start:i]
+                    data.append({'range': f'runs!{_column_letter(span[0])}{row_number}:{_column_letter(span[-1])}{row_number}', 'values': [[cells[col] for col in span]]})
+                    start = i
+        if not data:
+            return
+        self._rate_limit_retry(self.service.spreadsheets().values().batchUpdate, spreadsheetId=self.sheet_id, body={'valueInputOption': 'RAW', 'data': data}).execute()
+        logger.info(f'Updated {len(updates)} run(s) in {len(data)} range(s)')
+    def _resolve_rows(self, run_ids: List[str]) -> Dict[str, int]:
+        """キャッシュ済みの行番号をA列のセル読み取りで検証し、ずれや未登録があればA列から再構築"""
+        with self._lock:
+            cached = {run_id: self._row_index[run_id] for run_id in run_ids if run_id in self._row_index}
+        valid = {}
+        if cached:
+            result = self._rate_limit_retry(self.service.spreadsheets().values().batchGet, spreadsheetId=self.sheet_id, ranges=[f'runs!A{row}' for row in cached.values()]).execute()
+            for (run_id, row_number), value_range in zip(cached.items(), result.get('valueRanges', [])):
+                values = value_range.get('values') or [[]]
+                if values[0] and values[0][0] == run_id:
+                    valid[run_id] = row_number
+        if len(valid) == len(run_ids):
+            return valid
+        self._reload_row_index()
+        with self._lock:
+            return {run_id: self._row_index[run_id] for run_id in run_ids if run_id in self._row_index}
+    def _reload_row_index(self):
+        result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='runs!A:A').execute()
+        index = {row[0]: i + 1 for i, row in enumerate(result.get('values', [])[1:], start=1) if row and row[0]}
+        with self._lock:
+            self._row_index = index
+        logger.debug(f'Rebuilt run row index ({len(index)} runs)')
     def load_prompts(self, mode: str='daily') -> Dict[str, str]:
-        prompt_manager = settings.prompt_manager
-        if not self.service:
-            logger.warning('Sheets service not available, trying cache...')
-            if hasattr(prompt_manager, 'load_prompts_from_cache'):
-                cached_prompts = prompt_manager.load_prompts_from_cache(mode)
-                if cached_prompts:
-                    logger.info(f"Using cached prompts for mode '{mode}'")
-                    return cached_prompts
-            logger.warning('No cache available, returning default prompts')
-            return self._get_default_prompts()
+        """キャッシュ優先でプロンプトを取得.
+        TTL内のキャッシュはそのまま返し、期限切れのキャッシュも即座に返したうえで
+        バックグラウンドで再検証します。Sheetsの応答を待つのはキャッシュが無い場合のみです。
+        """
+        entry = self.prompt_cache.get(mode)
+        if entry is not None:
+            stale = self.prompt_cache.is_stale(entry)
+            if stale and self.service:
+                self._revalidate_prompts_async(mode)
+            self._prompt_freshness[mode] = self.prompt_cache.freshness(entry, 'cache')
+            logger.info(f"Using cached prompts for mode '{mode}' (age {entry.age():.0f}s{', revalidating' if stale else ''})")
+            return dict(entry.prompts)
+        if self.service:
+            try:
+                prompts = self._fetch_prompts(mode)
+                if prompts:
+                    return prompts
+                logger.warning('Prompts sheet is empty or malformed')
+            except Exception as e:
+                logger.error(f'Failed to load prompts from Sheets: {e}')
+        else:
+            logger.warning('Sheets service not available')
+        logger.warning('No cache available, returning default prompts')
+        self._prompt_freshness[mode] = {'source': 'defaults'}
+        return self._get_default_prompts()
+    def prompt_freshness(self, mode: str='daily') -> Optional[Dict[str, Any]]:
+        """直近のload_promptsで使ったプロンプトの取得元と鮮度"""
+        return self._prompt_freshness.get(mode)
+    def _fetch_prompts(self, mode: str) -> Optional[Dict[str, str]]:
+        result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='prompts!A1:E10').execute()
+        rows = result.get('values', [])
+        fingerprint = self.prompt_cache.fingerprint(rows)
+        cached = self.prompt_cache.get(mode)
+        if cached is not None and cached.fingerprint == fingerprint:
+            entry = self.prompt_cache.touch(mode)
+            logger.debug(f"Prompts for mode '{mode}' unchanged ({fingerprint[:12]})")
+        else:
+            if len(rows) < 2:
+                return None
+            headers = rows[0]
+            mode_row_index = self._find_mode_row(rows, mode)
+            values = rows[mode_row_index] if mode_row_index else rows[1]
+            prompts = {}
+            for i, header in enumerate(headers):
+                if i < len(values) and values[i]:
+                    prompts[header] = values[i]
+            default_prompts = self._get_default_prompts()
+            for key in ['prompt_a', 'prompt_b', 'prompt_c', 'prompt_d']:
+                if key not in prompts or not prompts[key]:
+                    prompts[key] = default_prompts.get(key, '')
+            logger.info(f"Loaded {len(prompts)} prompts from Sheets for mode '{mode}'")
+            entry = self.prompt_cache.put(mode, prompts, fingerprint)
+        self._prompt_freshness[mode] = self.prompt_cache.freshness(entry, 'sheets')
+        return dict(entry.prompts)
+    def _revalidate_prompts_async(self, mode: str):
+        with self._lock:
+            if mode in self._revalidating:
+                return
+            self._revalidating.add(mode)
+        thread = threading.Thread(target=self._revalidate_prompts, args=(mode,), name=f'prompt-revalidate-{mode}', daemon=True)
+        thread.start()
+    def _revalidate_prompts(self, mode: str):
         try:
-            result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='prompts!A1:E10').execute()
-            rows = result.get('values', [])
-            logger.info(f"Loaded {len(rows)} rows from prompts sheet: {rows}")
-            if len(rows) >= 2:
-                headers = rows[0]
-                mode_row_index = self._find_mode_row(rows, mode)
-                values = rows[mode_row_index] if mode_row_index else rows[1]
-                prompts = {}
-                for i, header in enumerate(headers):
-                    if i < len(values) and values[i]:
-                        prompts[header] = values[i]
-                default_prompts = self._get_default_prompts()
-                for key in ['prompt_a', 'prompt_b', 'prompt_c', 'prompt_d']:
-                    if key not in prompts or not prompts[key]:
-                        prompts[key] = default_prompts.get(key, '')
-                logger.info(f"Loaded {len(prompts)} prompts from Sheets for mode '{mode}'")
-                if hasattr(prompt_manager, 'save_prompts_to_cache'):
-                    prompt_manager.save_prompts_to_cache(mode, prompts)
-                return prompts
-            else:
-                logger.warning('Prompts sheet is empty or malformed, trying cache...')
-                if hasattr(prompt_manager, 'load_prompts_from_cache'):
-                    cached_prompts = prompt_manager.load_prompts_from_cache(mode)
-                    if cached_prompts:
-                        return cached_prompts
-                return self._get_default_prompts()
+            self._fetch_prompts(mode)
         except Exception as e:
-            logger.error(f'Failed to load prompts from Sheets: {e}, trying cache...')
-            if hasattr(prompt_manager, 'load_prompts_from_cache'):
-                cached_prompts = prompt_manager.load_prompts_from_cache(mode)
-                if cached_prompts:
-                    logger.info(f"Using cached prompts as fallback for mode '{mode}'")
-                    return cached_prompts
-            logger.warning('No cache available, returning default prompts')
-            return self._get_default_prompts()
+            logger.warning(f"Background prompt revalidation failed for mode '{mode}': {e}")
+        finally:
+            with self._lock:
+                self._revalidating.discard(mode)
     def _find_mode_row(self, rows: List[List[str]], mode: str) -> Optional[int]:
         mode_column_index = 0
         for i, row in enumerate(rows[1:], start=1):
@@ -196,6 +346,7 @@ class SheetsManager:
             col_letter = chr(65 + prompt_col_index)
             range_name = f'prompts!{col_letter}{mode_row_index + 1}'
             self._rate_limit_retry(self.service.spreadsheets().values().update, spreadsheetId=self.sheet_id, range=range_name, valueInputOption='RAW', body={'values': [[prompt_content]]}).execute()
+            self.prompt_cache.invalidate(mode)
             logger.info(f"Updated {prompt_name} for mode '{mode}'")
             return True
         except Exception as e:
@@ -209,6 +360,7 @@ class SheetsManager:
             logger.warning('Sheets service not available')
             return {}
         try:
+            self.flush()
             result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='runs!A:S').execute()
             rows = result.get('values', [])
             if len(rows) <= 1:
@@ -252,6 +404,7 @@ class SheetsManager:
         return get_sheet_prompt_defaults()
     def get_recent_runs(self, limit: int=10) -> List[Dict[str, Any]]:
         try:
+            self.flush()
             result = self._rate_limit_retry(self.service.spreadsheets().values().get, spreadsheetId=self.sheet_id, range='runs!A:S').execute()
             rows = result.get('values', [])
             if len(rows) <= 1:
@@ -275,7 +428,7 @@ class SheetsManager:
         try:
             spreadsheet = self._rate_limit_retry(self.service.spreadsheets().get, spreadsheetId=self.sheet_id).execute()
             existing_sheets = [sheet['properties']['title'] for sheet in spreadsheet['sheets']]
-            required_sheets = {'runs': ['run_id', 'status', 'started_at', 'finished_at', 'duration_sec', 'mode', 'prompt_a', 'search_results_json', 'script_text', 'audio_urls_json', 'stt_text', 'subtitle_srt', 'video_url', 'title', 'description', 'sources', 'thumbnail_url', 'first_comment', 'error_log'], 'prompts': ['mode', 'prompt_a', 'prompt_b', 'prompt_c', 'prompt_d']}
+            required_sheets = {'runs': RUN_COLUMNS, 'prompts': ['mode', 'prompt_a', 'prompt_b', 'prompt_c', 'prompt_d']}
             for sheet_name, headers in required_sheets.items():
                 if sheet_name not in existing_sheets:
                     logger.info(f'Creating sheet: {sheet_name}')
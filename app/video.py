@@ -103,7 +103,16 @@ class VideoGenerator:
                     os.remove(bg_image_path)
                 except (OSError, FileNotFoundError) as e:
                     logger.debug(f'Could not remove background image {bg_image_path}: {e}')
-    def prepare_broll_assets(self, *, audio_path: str, script_content: str='', news_items: Optional[List[Dict]]=None) -> Optional[Dict[str, Any]]:
+    def start_broll_prefetch(self, *, script_content: str, news_items: Optional[List[Dict]]=None):
+        if not self._can_use_stock_footage():
+            logger.info('Stock footage disabled or missing API keys; skipping B-roll prefetch')
+            return None
+        self._ensure_stock_services()
+        from .services.media import BRollPrefetcher
+        prefetcher = BRollPrefetcher(self._stock_manager, self._visual_matcher, max_clips=settings.stock_footage_clips_per_video)
+        prefetcher.start(script_content=script_content, news_items=news_items or [])
+        return prefetcher
+    def prepare_broll_assets(self, *, audio_path: str, script_content: str='', news_items: Optional[List[Dict]]=None, prefetched=None) -> Optional[Dict[str, Any]]:
         if not audio_path or not os.path.exists(audio_path):
             logger.warning('Audio path missing for B-roll preparation')
             self.last_broll_metadata = {}
@@ -118,7 +127,7 @@ class VideoGenerator:
             logger.warning('Audio duration is zero, skipping B-roll generation')
             self.last_broll_metadata = {}
             return None
-        return self._build_broll_from_stock(audio_duration=audio_duration, script_content=script_content, news_items=news_items or [])
+        return self._build_broll_from_stock(audio_duration=audio_duration, script_content=script_content, news_items=news_items or [], prefetched=prefetched)
     def _validate_input_files(self, audio_path: str, subtitle_path: str, background_image: str=None):
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f'Audio file not found: {audio_path}')
@@ -358,7 +367,7 @@ class VideoGenerator:
             from .services.media import BRollGenerator, StockFootageManager, VisualMatcher
             self._stock_manager = StockFootageManager(pexels_api_key=settings.pexels_api_key, pixabay_api_key=settings.pixabay_api_key)
             self._visual_matcher = VisualMatcher()
-            self._broll_generator = BRollGenerator(ffmpeg_path=self.ffmpeg_path)
+            self._broll_generator = BRollGenerator(ffmpeg_path=self.ffmpeg_path, parallel_preprocess=settings.stock_footage_parallel_preprocess, max_workers=settings.stock_footage_preprocess_workers or None)
     def _generate_with_stock_footage(self, audio_path: str, subtitle_path: str, audio_duration: float, script_content: str, news_items: List[Dict], output_path: str) -> Optional[str]:
         broll_assets = self._build_broll_from_stock(audio_duration=audio_duration, script_content=script_content, news_items=news_items or [])
         if not broll_assets:
@@ -370,12 +379,15 @@ class VideoGenerator:
             self.last_generation_method = 'stock_footage'
             return rendered_path
         return None
-    def _build_broll_from_stock(self, *, audio_duration: float, script_content: str, news_items: Optional[List[Dict]]=None) -> Optional[Dict[str, Any]]:
+    def _build_broll_from_stock(self, *, audio_duration: float, script_content: str, news_items: Optional[List[Dict]]=None, prefetched=None) -> Optional[Dict[str, Any]]:
         if not self._can_use_stock_footage():
             logger.info('Stock footage disabled or missing API keys; skipping B-roll generation')
             self.last_broll_metadata = {}
             return None
         self._ensure_stock_services()
+        if prefetched is not None and prefetched.has_clips:
+            logger.info(f'Using {len(prefetched.clip_paths)} prefetched stock clips')
+            return self._compose_broll(audio_duration=audio_duration, keywords=prefetched.keywords, footage_results=prefetched.footage_results, clip_paths=prefetched.clip_paths, source='stock_footage_prefetch')
         keywords = self._visual_matcher.extract_keywords(script_content=script_content, news_items=news_items or [], max_keywords=settings.stock_footage_clips_per_video)
         if not keywords:
             logger.warning('No keywords extracted for stock footage search')
@@ -394,13 +406,15 @@ class VideoGenerator:
             self.last_broll_metadata = {}
             return None
         logger.info(f'Downloaded {len(clip_paths)} clips successfully')
+        return self._compose_broll(audio_duration=audio_duration, keywords=keywords, footage_results=footage_results, clip_paths=clip_paths, source='stock_footage')
+    def _compose_broll(self, *, audio_duration: float, keywords: List[str], footage_results: List[Dict], clip_paths: List[str], source: str) -> Optional[Dict[str, Any]]:
         broll_path = self._broll_generator.create_broll_sequence(clip_paths=clip_paths, target_duration=audio_duration, transition_duration=1.0, enable_effects=True)
         if not broll_path or not os.path.exists(broll_path):
             logger.warning('Failed to create B-roll sequence')
             self.last_broll_metadata = {}
             return None
         logger.info(f'Created B-roll sequence: {broll_path}')
-        metadata = {'broll_path': broll_path, 'clip_paths': clip_paths, 'keywords': keywords, 'footage_results': footage_results, 'audio_duration': audio_duration, 'transition_duration': 1.0, 'source': 'stock_footage'}
+        metadata = {'broll_path': broll_path, 'clip_paths': clip_paths, 'keywords': keywords, 'footage_results': footage_results, 'audio_duration': audio_duration, 'transition_duration': 1.0, 'source': source}
         self.last_broll_metadata = metadata
         return metadata
     def _render_final_video(self, *, video_source_path: str, audio_path: str, subtitle_path: str, output_path: str, source_label: str='video') -> Optional[str]:
@@ -2,12 +2,12 @@
 YouTube Analytics APIやDiscord経由で視聴者のフィードバックを収集し、
 背景テーマの継続的改善に活用します。
 """
-import json
 import logging
-import os
 from datetime import datetime
+from pathlib import Path
 from typing import Dict, Optional
 from .background_theme import get_theme_manager
+from .feedback_store import FeedbackStore
 from .models.video_review import VideoReviewResult
 logger = logging.getLogger(__name__)
 class VideoFeedbackCollector:
@@ -15,26 +15,12 @@ class VideoFeedbackCollector:
     def __init__(self, feedback_file: str = "data/video_feedback.json"):
         self.feedback_file = feedback_file
         self.theme_manager = get_theme_manager()
-        self._ensure_feedback_file()
-    def _ensure_feedback_file(self):
-        """フィードバックファイルが存在することを確認"""
-        os.makedirs(os.path.dirname(self.feedback_file) if os.path.dirname(self.feedback_file) else ".", exist_ok=True)
-        if not os.path.exists(self.feedback_file):
-            with open(self.feedback_file, "w", encoding="utf-8") as f:
-                json.dump({}, f)
+        self.store = FeedbackStore(str(Path(feedback_file).with_suffix(".db")))
+        self.store.import_legacy_json(feedback_file)
     def record_video_metadata(self, video_id: str, theme_name: str, metadata: Dict):
         """動画メタデータを記録（どのテーマを使ったか）"""
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            data[video_id] = {
-                "theme_name": theme_name,
-                "created_at": datetime.now().isoformat(),
-                "metadata": metadata,
-                "analytics": {},
-            }
-            with open(self.feedback_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            self.store.upsert_video(video_id, theme_name, metadata)
             logger.info(f"Recorded metadata for video {video_id} with theme {theme_name}")
         except Exception as e:
             logger.error(f"Failed to record video metadata: {e}")
@@ -54,16 +40,10 @@ class VideoFeedbackCollector:
             }
         """
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if video_id not in data:
+            theme_name = self.store.update_analytics(video_id, analytics)
+            if theme_name is None:
                 logger.warning(f"Video {video_id} not found in feedback data")
                 return
-            data[video_id]["analytics"] = analytics
-            data[video_id]["updated_at"] = datetime.now().isoformat()
-            with open(self.feedback_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            theme_name = data[video_id]["theme_name"]
             retention_rate = analytics.get("retention_rate", 0.0)
             avg_view_duration = analytics.get("avg_view_duration", 0.0)
             self.theme_manager.update_performance_metrics(theme_name, avg_view_duration, retention_rate)
@@ -86,28 +66,9 @@ class VideoFeedbackCollector:
             comment: コメント（オプション）
         """
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if video_id not in data:
+            theme_name, created = self.store.add_manual_feedback(video_id, positive, comment)
+            if created:
                 logger.warning(f"Video {video_id} not found, creating new entry")
-                data[video_id] = {
-                    "theme_name": "unknown",
-                    "created_at": datetime.now().isoformat(),
-                    "metadata": {},
-                    "analytics": {},
-                }
-            if "manual_feedback" not in data[video_id]:
-                data[video_id]["manual_feedback"] = []
-            data[video_id]["manual_feedback"].append(
-                {
-                    "positive": positive,
-                    "comment": comment,
-                    "timestamp": datetime.now().isoformat(),
-                }
-            )
-            with open(self.feedback_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            theme_name = data[video_id]["theme_name"]
             if theme_name != "unknown":
                 self.theme_manager.record_feedback(theme_name, positive)
             logger.info(f"Recorded manual feedback for video {video_id}: {'positive' if positive else 'negative'}")
@@ -116,77 +77,23 @@ class VideoFeedbackCollector:
     def record_ai_review(self, video_id: str, review: VideoReviewResult):
         """AIによる動画レビュー結果を保存"""
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if video_id not in data:
-                data[video_id] = {
-                    "theme_name": "unknown",
-                    "created_at": datetime.now().isoformat(),
-                    "metadata": {},
-                    "analytics": {},
-                }
             ai_review_entry = review.to_dict()
             ai_review_entry["stored_at"] = datetime.now().isoformat()
-            history = data[video_id].setdefault("ai_review_history", [])
-            history.append(ai_review_entry)
-            data[video_id]["ai_review"] = ai_review_entry
-            with open(self.feedback_file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            self.store.add_ai_review(video_id, ai_review_entry)
             logger.info("Recorded AI review feedback for video %s", video_id)
         except Exception as e:
             logger.error(f"Failed to record AI review: {e}")
     def get_video_feedback(self, video_id: str) -> Optional[Dict]:
         """特定動画のフィードバックを取得"""
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data.get(video_id)
+            return self.store.get(video_id)
         except Exception as e:
             logger.error(f"Failed to get video feedback: {e}")
             return None
     def get_theme_performance_summary(self, theme_name: str) -> Dict:
         """特定テーマのパフォーマンスサマリーを取得"""
         try:
-            with open(self.feedback_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            theme_videos = [v for v in data.values() if v.get("theme_name") == theme_name]
-            if not theme_videos:
-                return {
-                    "theme_name": theme_name,
-                    "video_count": 0,
-                    "total_views": 0,
-                    "total_likes": 0,
-                    "avg_retention_rate": 0.0,
-                    "avg_view_duration": 0.0,
-                    "positive_feedback_count": 0,
-                    "negative_feedback_count": 0,
-                }
-            total_views = sum(v.get("analytics", {}).get("views", 0) for v in theme_videos)
-            total_likes = sum(v.get("analytics", {}).get("likes", 0) for v in theme_videos)
-            retention_rates = [
-                v.get("analytics", {}).get("retention_rate", 0) for v in theme_videos if v.get("analytics")
-            ]
-            view_durations = [
-                v.get("analytics", {}).get("avg_view_duration", 0) for v in theme_videos if v.get("analytics")
-            ]
-            positive_count = 0
-            negative_count = 0
-            for v in theme_videos:
-                for fb in v.get("manual_feedback", []):
-                    if fb["positive"]:
-                        positive_count += 1
-                    else:
-                        negative_count += 1
-            return {
-                "theme_name": theme_name,
-                "video_count": len(theme_videos),
-                "total_views": total_views,
-                "total_likes": total_likes,
-                "avg_retention_rate": sum(retention_rates) / len(retention_rates) if retention_rates else 0.0,
-                "avg_view_duration": sum(view_durations) / len(view_durations) if view_durations else 0.0,
-                "positive_feedback_count": positive_count,
-                "negative_feedback_count": negative_count,
-            }
+            return self.store.theme_summary(theme_name)
         except Exception as e:
             logger.error(f"Failed to get theme performance summary: {e}")
             return {}
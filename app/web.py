@@ -1,12 +1,13 @@
 """Web dashboard and API endpoints for monitoring automated YouTube runs."""
 from __future__ import annotations
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, Iterable, List
 from flask import Flask, jsonify, render_template_string, request
 from .config import cfg
 from .discord import discord_notifier
+from .metadata_storage import metadata_storage
 from .sheets import sheets_manager
 from .workflow_runner import WorkflowRunner
 app = Flask(__name__)
@@ -75,6 +76,24 @@ def _merge_run_history(active: Iterable[Dict[str, str]], archived: Iterable[Dict
         merged.update({k: v for k, v in run.items() if v is not None})
         history[run_id] = merged
     return sorted(history.values(), key=lambda item: item.get("started_at", ""), reverse=True)
+def _execution_history(limit: int = 20) -> List[Dict[str, str]]:
+    history: List[Dict[str, str]] = []
+    for entry in metadata_storage.execution_log.tail_entries(limit):
+        result = entry.result
+        started_at = entry.logged_at - timedelta(seconds=result.execution_time_seconds)
+        history.append(
+            {
+                "run_id": result.run_id,
+                "mode": result.mode,
+                "status": "completed" if result.success else "failed",
+                "started_at": started_at.isoformat(),
+                "finished_at": entry.logged_at.isoformat(),
+                "video_url": result.video_url,
+                "title": result.title,
+                "error": result.error,
+            }
+        )
+    return history
 def _tail_logs(limit: int = 100) -> str:
     if not _LOG_PATH.exists():
         return "No log file found"
@@ -246,13 +265,13 @@ def api_run():
 @app.route("/api/runs")
 def api_runs():
     active_runs = [execution.to_dict() for execution in _runner.list_recent(limit=20)]
-    sheet_runs: Iterable[Dict[str, str]] = []
+    archived_runs: List[Dict[str, str]] = list(_execution_history(limit=20))
     if sheets_manager:
         try:
-            sheet_runs = sheets_manager.get_recent_runs(limit=20)
+            archived_runs.extend(sheets_manager.get_recent_runs(limit=20))
         except Exception as error:
             discord_notifier.notify_blocking(f"Sheets run history error: {error}", level="error")
-    return jsonify(_merge_run_history(active_runs, sheet_runs))
+    return jsonify(_merge_run_history(active_runs, archived_runs))
 @app.route("/api/logs")
 def api_logs():
     try:
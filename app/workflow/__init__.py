@@ -4,14 +4,18 @@ from .failure import FailureBus, WorkflowFailureEvent
 from .ports import NewsCollectionPort, SyncNewsCollectionAdapter
 from .steps import (
     AlignSubtitlesStep,
+    AudioQualityGateStep,
     CollectNewsStep,
     GenerateMetadataStep,
     GenerateScriptStep,
     GenerateThumbnailStep,
     GenerateVideoStep,
     GenerateVisualDesignStep,
+    PrefetchBRollStep,
     QualityAssuranceStep,
+    QualityGateStep,
     ReviewVideoStep,
+    SubtitleQualityGateStep,
     SynthesizeAudioStep,
     TranscribeAudioStep,
     UploadToDriveStep,
@@ -27,11 +31,15 @@ __all__ = [
     "SyncNewsCollectionAdapter",
     "CollectNewsStep",
     "GenerateScriptStep",
+    "PrefetchBRollStep",
     "GenerateVisualDesignStep",
     "SynthesizeAudioStep",
+    "AudioQualityGateStep",
     "TranscribeAudioStep",
     "AlignSubtitlesStep",
+    "SubtitleQualityGateStep",
     "GenerateVideoStep",
+    "QualityGateStep",
     "QualityAssuranceStep",
     "GenerateMetadataStep",
     "GenerateThumbnailStep",
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 from collections.abc import Callable, Mapping
@@ -10,11 +11,12 @@ from app.config.settings import settings
 from app.drive import upload_video_package
 from app.metadata import generate_youtube_metadata
 from app.metadata_storage import metadata_storage
+from app.models.qa import QualityGateReport
 from app.prompts import get_default_news_collection_prompt, get_default_script_generation_prompt
 from app.search_news import collect_news as collect_news_sync
 from app.script_gen import ScriptGenerator, generate_dialogue
 from app.services.file_archival import FileArchivalManager
-from app.services.media.qa_pipeline import MediaQAPipeline
+from app.services.media.qa_pipeline import AUDIO_GATE, QA_GATES, SUBTITLE_GATE, VIDEO_GATE, MediaQAPipeline
 from app.services.script import ScriptFormatError, ensure_dialogue_structure
 from app.services.script.validator import Script
 from app.services.video_review import get_video_review_service
@@ -26,7 +28,7 @@ from app.thumbnail import generate_thumbnail
 from app.tts import synthesize_script
 from app.utils import FileUtils
 from app.video import generate_video, video_generator
-from app.youtube import upload_video as youtube_upload
+from app.youtube import upload_video_async as youtube_upload
 from .base import StepResult, WorkflowContext, WorkflowStep
 from .ports import NewsCollectionPort, SyncNewsCollectionAdapter
 logger = logging.getLogger(__name__)
@@ -40,6 +42,8 @@ class CollectNewsStep(WorkflowStep):
         logger.info(f'Step 1: Starting {self.step_name}...')
         try:
             prompt_a = self._get_prompt(context.mode)
+            if sheets_manager:
+                context.set('prompt_freshness', sheets_manager.prompt_freshness(context.mode))
             if sheets_manager and context.run_id:
                 sheets_manager.record_prompt_used(context.run_id, 'prompt_a', prompt_a)
             news_items = await self._news_port.collect_news(prompt_a, context.mode)
@@ -135,7 +139,8 @@ class GenerateScriptStep(WorkflowStep):
             return self._failure(str(e))
     async def _generate_with_crewai(self, news_items: List[Dict[str, Any]]) -> Dict[str, Any]:
         logger.info('🚀 Using CrewAI WOW Script Creation Crew...')
-        payload = self._get_script_generator().generate_crewai_payload(
+        payload = await asyncio.to_thread(
+            self._get_script_generator().generate_crewai_payload,
             news_items,
             target_duration_minutes=cfg.max_video_duration_minutes,
         )
@@ -146,7 +151,8 @@ class GenerateScriptStep(WorkflowStep):
         prompt_b = self._get_prompt(context.mode)
         if sheets_manager and context.run_id:
             sheets_manager.record_prompt_used(context.run_id, 'prompt_b', prompt_b)
-        return self._legacy_generator(
+        return await asyncio.to_thread(
+            self._legacy_generator,
             news_items,
             prompt_b,
             target_duration_minutes=cfg.max_video_duration_minutes,
@@ -166,6 +172,29 @@ class GenerateScriptStep(WorkflowStep):
         if self._script_generator is None:
             self._script_generator = ScriptGenerator(api_key=settings.api_keys.get('gemini'))
         return self._script_generator
+class PrefetchBRollStep(WorkflowStep):
+    @property
+    def step_name(self) -> str:
+        return 'broll_prefetch'
+    async def execute(self, context: WorkflowContext) -> StepResult:
+        logger.info(f'Step 2.1: Starting {self.step_name}...')
+        if not settings.enable_stock_footage or not settings.stock_footage_prefetch or context.get('use_stock_footage') is False:
+            return self._success(data={'prefetch_started': False, 'skipped': True})
+        script_content = context.get('script_content')
+        if not script_content:
+            return self._success(data={'prefetch_started': False, 'skipped': True, 'reason': 'missing_script'})
+        previous = context.get('broll_prefetch')
+        if previous is not None:
+            previous.cancel()
+        try:
+            prefetcher = video_generator.start_broll_prefetch(script_content=script_content, news_items=context.get('news_items', []))
+        except Exception as exc:
+            logger.warning('B-roll prefetch could not start; video step will fetch synchronously: %s', exc)
+            return self._success(data={'prefetch_started': False, 'error': str(exc)})
+        if prefetcher is None:
+            return self._success(data={'prefetch_started': False, 'skipped': True})
+        context.set('broll_prefetch', prefetcher)
+        return self._success(data={'prefetch_started': True, 'keywords': prefetcher.snapshot().keywords})
 class GenerateVisualDesignStep(WorkflowStep):
     @property
     def step_name(self) -> str:
@@ -296,12 +325,22 @@ class GenerateVideoStep(WorkflowStep):
         metadata = context.get('metadata', {})
         broll_path = context.get('broll_path')
         use_stock_override = context.get('use_stock_footage')
+        prefetcher = context.get('broll_prefetch')
         if not audio_path or not subtitle_path:
             return self._failure('Missing audio_path or subtitle_path in context')
         try:
             broll_metadata = None
+            prefetched = None
+            prefetch_stats = None
             generated_files: List[str] = []
             should_attempt_broll = settings.enable_stock_footage and use_stock_override is not False and (not broll_path)
+            if prefetcher is not None:
+                if should_attempt_broll:
+                    prefetched = await asyncio.to_thread(prefetcher.collect, settings.stock_footage_prefetch_deadline_seconds)
+                    prefetch_stats = {'clips_ready': len(prefetched.clip_paths), 'clips_found': len(prefetched.footage_results), 'completed': prefetched.completed, 'waited_until_seconds': round(prefetched.elapsed_seconds, 2)}
+                    context.set('broll_prefetch_stats', prefetch_stats)
+                else:
+                    prefetcher.cancel()
             if should_attempt_broll:
                 if not (settings.pexels_api_key or settings.pixabay_api_key):
                     logger.info('No stock footage API keys configured; continuing without B-roll')
@@ -309,7 +348,7 @@ class GenerateVideoStep(WorkflowStep):
                     use_stock_override = False
                 else:
                     try:
-                        broll_result = video_generator.prepare_broll_assets(audio_path=audio_path, script_content=script_content, news_items=news_items)
+                        broll_result = video_generator.prepare_broll_assets(audio_path=audio_path, script_content=script_content, news_items=news_items, prefetched=prefetched)
                     except Exception as exc:
                         logger.warning('B-roll preparation failed but workflow will continue: %s', exc)
                         context.set('use_stock_footage', False)
@@ -348,7 +387,7 @@ class GenerateVideoStep(WorkflowStep):
                 files_to_archive['thumbnail'] = thumbnail_path
             if broll_path and os.path.exists(broll_path):
                 files_to_archive['broll'] = broll_path
-            archived_files = archival_manager.archive_workflow_files(run_id=context.run_id, timestamp=timestamp, title=title, files=files_to_archive)
+            archived_files = archival_manager.archive_workflow_files(run_id=context.run_id, timestamp=timestamp, title=title, files=files_to_archive, temporary=('video',))
             archived_video = archived_files.get('video', video_path)
             context.set('video_path', archived_video)
             context.set('archived_audio_path', archived_files.get('audio'))
@@ -364,29 +403,35 @@ class GenerateVideoStep(WorkflowStep):
             generated_files.append(video_path)
             if broll_path and os.path.exists(broll_path):
                 generated_files.append(broll_path)
-            return self._success(data={'video_path': archived_video, 'file_size': video_size, 'generation_method': generation_method, 'used_stock_footage': video_generator.last_used_stock_footage, 'archived_files': archived_files, 'archived_broll_path': archived_files.get('broll'), 'broll_metadata': broll_metadata or video_generator.last_broll_metadata, 'broll_path': broll_path}, files=generated_files)
+            return self._success(data={'video_path': archived_video, 'file_size': video_size, 'generation_method': generation_method, 'used_stock_footage': video_generator.last_used_stock_footage, 'archived_files': archived_files, 'archive_strategies': archival_manager.last_archive_strategies, 'archived_broll_path': archived_files.get('broll'), 'broll_metadata': broll_metadata or video_generator.last_broll_metadata, 'broll_path': broll_path, 'broll_prefetch': prefetch_stats}, files=generated_files)
         except Exception as e:
             logger.error(f'Step 8 failed: {e}')
             return self._failure(str(e))
-class QualityAssuranceStep(WorkflowStep):
-    @property
-    def step_name(self) -> str:
-        return 'media_quality_assurance'
+class QualityGateStep(WorkflowStep):
+    """Runs one MediaQAPipeline gate and records a retry request when it blocks."""
+    gate = VIDEO_GATE
+    retry_start_setting = 'retry_start_step'
+    step_number = 9
+    def _gate_inputs(self, context: WorkflowContext) -> Dict[str, Any]:
+        return {'video_path': context.get('video_path')}
     async def execute(self, context: WorkflowContext) -> StepResult:
-        logger.info(f'Step 9: Starting {self.step_name}...')
+        logger.info(f'Step {self.step_number}: Starting {self.step_name}...')
         qa_config = getattr(cfg, 'media_quality', None)
         if not qa_config or not qa_config.enabled:
             context.set('qa_passed', True)
             context.set('qa_retry_request', None)
-            return self._success(data={'qa_passed': True, 'qa_enabled': False, 'skipped': True})
+            return self._success(data={'qa_passed': True, 'qa_enabled': False, 'skipped': True, 'qa_gate': self.gate})
         pipeline = MediaQAPipeline(qa_config)
         attempt_count = context.get('qa_attempt', 0) + 1
         context.set('qa_attempt', attempt_count)
         context.set('qa_retry_request', None)
-        report = pipeline.run(run_id=context.run_id, mode=context.mode, script_path=context.get('script_path'), script_content=context.get('script_content'), audio_path=context.get('archived_audio_path') or context.get('audio_path'), subtitle_path=context.get('archived_subtitle_path') or context.get('subtitle_path'), video_path=context.get('video_path'))
-        context.set('qa_report', report.dict())
+        report = await asyncio.to_thread(pipeline.run_gate, self.gate, run_id=context.run_id, mode=context.mode, **self._gate_inputs(context))
+        context.set(f'qa_{self.gate}_report', report.dict())
+        combined = QualityGateReport.combine(context.run_id, context.mode, [context.get(f'qa_{gate}_report') for gate in QA_GATES if context.get(f'qa_{gate}_report')])
+        combined.report_path = report.report_path
+        context.set('qa_report', combined.dict())
         context.set('qa_report_path', report.report_path)
-        context.set('qa_passed', report.passed)
+        context.set('qa_passed', combined.passed)
         if report.warnings():
             warning_names = ', '.join((check.name for check in report.warnings()))
             logger.warning(f'Media QA warnings: {warning_names}')
@@ -397,13 +442,35 @@ class QualityAssuranceStep(WorkflowStep):
             logger.warning('Blocking QA failures detected but bypassed due to configuration: %s', failure_names)
         if blocking:
             failed_names = ', '.join((check.name for check in failures)) or 'unknown'
-            message = f'QA gate blocked publication due to: {failed_names}'
+            message = f'QA {self.gate} gate blocked publication due to: {failed_names}'
             logger.error(message)
             if qa_config.gating.retry_attempts > 0:
-                context.set('qa_retry_request', {'start_step': qa_config.gating.retry_start_step, 'reason': message, 'attempt': attempt_count})
+                context.set('qa_retry_request', {'start_step': getattr(qa_config.gating, self.retry_start_setting), 'reason': message, 'attempt': attempt_count, 'gate': self.gate})
             return self._failure(message)
         context.set('qa_retry_request', None)
-        return self._success(data={'qa_passed': report.passed, 'qa_report_path': report.report_path, 'qa_blocking': blocking})
+        return self._success(data={'qa_passed': report.passed, 'qa_gate': self.gate, 'qa_report_path': report.report_path, 'qa_blocking': blocking})
+class AudioQualityGateStep(QualityGateStep):
+    gate = AUDIO_GATE
+    retry_start_setting = 'audio_retry_start_step'
+    step_number = 5
+    @property
+    def step_name(self) -> str:
+        return 'audio_quality_gate'
+    def _gate_inputs(self, context: WorkflowContext) -> Dict[str, Any]:
+        return {'audio_path': context.get('audio_path')}
+class SubtitleQualityGateStep(QualityGateStep):
+    gate = SUBTITLE_GATE
+    retry_start_setting = 'subtitle_retry_start_step'
+    step_number = 7
+    @property
+    def step_name(self) -> str:
+        return 'subtitle_quality_gate'
+    def _gate_inputs(self, context: WorkflowContext) -> Dict[str, Any]:
+        return {'script_path': context.get('script_path'), 'script_content': context.get('script_content'), 'subtitle_path': context.get('subtitle_path')}
+class QualityAssuranceStep(QualityGateStep):
+    @property
+    def step_name(self) -> str:
+        return 'media_quality_assurance'
 class GenerateMetadataStep(WorkflowStep):
     @property
     def step_name(self) -> str:
@@ -415,7 +482,7 @@ class GenerateMetadataStep(WorkflowStep):
         if not news_items or not script_content:
             return self._failure('Missing news_items or script_content in context')
         try:
-            metadata = generate_youtube_metadata(news_items, script_content, context.mode)
+            metadata = await asyncio.to_thread(generate_youtube_metadata, news_items, script_content, context.mode)
             if not metadata:
                 return self._failure('Metadata generation failed')
             context.set('metadata', metadata)
@@ -489,7 +556,7 @@ class UploadToYouTubeStep(WorkflowStep):
         if not video_path or not metadata:
             return self._failure('Missing video_path or metadata in context')
         try:
-            youtube_result = youtube_upload(video_path=video_path, metadata=metadata, thumbnail_path=thumbnail_path, subtitle_path=subtitle_path, privacy_status='public')
+            youtube_result = await youtube_upload(video_path=video_path, metadata=metadata, thumbnail_path=thumbnail_path, subtitle_path=subtitle_path, privacy_status='public')
             if youtube_result.get('error'):
                 logger.warning(f"YouTube upload warning: {youtube_result['error']}")
                 return self._success(data={'youtube_result': youtube_result, 'warning': youtube_result['error']})
@@ -534,6 +601,7 @@ class ReviewVideoStep(WorkflowStep):
         context.set('video_review', review_dict)
         if review_result.feedback:
             context.set('video_review_summary', review_result.feedback.summary)
-        screenshot_paths = [shot.path for shot in review_result.screenshots if shot.path]
+        screenshot_paths = review_result.captured_paths
+        representative_paths = [shot.path for shot in review_result.screenshots if shot.path]
         context.set('video_review_screenshots', screenshot_paths)
-        return self._success(data={'review_enabled': True, 'skipped': False, 'review_summary': review_result.feedback.summary if review_result.feedback else None, 'screenshots_captured': len(screenshot_paths)}, files=screenshot_paths)
\ No newline at end of file
+        return self._success(data={'review_enabled': True, 'skipped': False, 'review_summary': review_result.feedback.summary if review_result.feedback else None, 'screenshots_captured': review_result.frames_total, 'frames_kept': review_result.frames_kept, 'representative_screenshots': representative_paths, 'payload_bytes_saved': review_result.payload_bytes_saved}, files=screenshot_paths)
\ No newline at end of file
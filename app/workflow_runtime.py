@@ -108,7 +108,10 @@ class WorkflowRunState:
             keys_to_remove = self.retry_cleanup_map.get(step.step_name, [])
             for key in keys_to_remove:
                 if key in self.context.state:
-                    self.context.state.pop(key, None)
+                    value = self.context.state.pop(key, None)
+                    cancel = getattr(value, "cancel", None)
+                    if callable(cancel):
+                        cancel()
     def completed_results(self) -> List[Any]:
         """Return all step results recorded so far."""
         return [result for result in self.results if result is not None]
@@ -0,0 +1,228 @@
+"""Write-behind JSON persistence with crash-safe journaling.
+
+小さな状態ファイル（テーマ分析・エージェントレビュー履歴など）をメモリ上で更新し、
+変更はキー単位のジャーナルに追記するだけにして、スナップショットの書き出しは
+一定間隔またはプロセス終了時にまとめて行います。
+
+ファイル構成::
+
+    <path>           # 最新スナップショット（tmp書き込み → fsync → os.replace で原子的に置換）
+    <path>.journal   # スナップショット以降の変更（1行1件、キーの最新値なので再適用しても安全）
+    <path>.lock      # 追記・スナップショット書き出しを直列化するflock用ファイル
+
+同じパスを複数のインスタンス（別プロセスを含む）が開いても、ジャーナルへの追記と
+スナップショットの書き出しは ``<path>.lock`` の排他ロック下で行い、書き出し時は
+ディスク上のスナップショットとジャーナルを読み直してマージするため、他の書き手の
+レコードは失われません（fcntlが無い環境ではプロセス内のみ保護）。
+"""
+
+from __future__ import annotations
+
+import atexit
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+
+_open_stores: "weakref.WeakSet[WriteBehindStore]" = weakref.WeakSet()
+
+
+def _flush_open_stores() -> None:
+    for store in list(_open_stores):
+        try:
+            store.flush()
+        except Exception as exc:  # pragma: no cover - best effort at interpreter exit
+            logger.warning("Failed to flush %s at exit: %s", store.path, exc)
+
+
+atexit.register(_flush_open_stores)
+
+
+class WriteBehindStore:
+    """Key/value state persisted as a JSON object with write-behind flushing."""
+
+    def __init__(self, path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL, indent: Optional[int] = 2) -> None:
+        self.path = path
+        self.journal_path = f"{path}.journal"
+        self.lock_path = f"{path}.lock"
+        self.flush_interval = flush_interval
+        self.indent = indent
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+        self._dirty = False
+        self.flush_count = 0
+        self._state: Dict[str, Any] = self._load()
+        _open_stores.add(self)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """プロセス内（RLock）とプロセス間（lockファイルのflock）の排他."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+            with open(self.lock_path, "a") as handle:
+                if fcntl:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Any]:
+        with self._exclusive():
+            state, replayed = self._read_disk()
+        if replayed:
+            logger.info("Replayed %d journal records into %s", replayed, self.path)
+            self._dirty = True
+            self._schedule_flush()
+        return state
+
+    def _read_disk(self) -> Tuple[Dict[str, Any], int]:
+        """ディスク上のスナップショットにジャーナルを再適用した状態と再適用件数（ロック下で呼ぶ）."""
+        state: Dict[str, Any] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as handle:
+                    data = json.load(handle)
+                if isinstance(data, dict):
+                    state = data
+            except (OSError, ValueError) as exc:
+                logger.warning("Failed to load snapshot %s: %s", self.path, exc)
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as handle:
+                for line in handle:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 書き込み途中で停止した最終行は破棄
+                        continue
+                    if record.get("op") == "delete":
+                        state.pop(record["key"], None)
+                    else:
+                        state[record["key"]] = record["value"]
+                    replayed += 1
+        return state, replayed
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            value = self._state.get(key, default)
+            return copy.deepcopy(value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return copy.deepcopy(self._state)
+
+    def put(self, key: str, value: Any) -> None:
+        """Set ``key`` and journal the new value; the snapshot is written later."""
+        self._record({"op": "set", "key": key, "value": value}, key, value)
+
+    def delete(self, key: str) -> None:
+        self._record({"op": "delete", "key": key}, key, None, delete=True)
+
+    def update(self, key: str, func: Callable[[Any], Any]) -> Any:
+        """Read-modify-write ``key`` against the latest on-disk state.
+
+        ``func`` receives a copy of the current value (None if absent) merged from the
+        snapshot and every writer's journal, so concurrent instances don't overwrite
+        each other's changes with a stale in-memory copy.
+
+        Returns:
+            The value written.
+        """
+        with self._exclusive():
+            state, _ = self._read_disk()
+            value = func(state.get(key))
+            self._append({"op": "set", "key": key, "value": value}, key, value)
+            return copy.deepcopy(value)
+
+    def _record(self, entry: Dict[str, Any], key: str, value: Any, delete: bool = False) -> None:
+        with self._exclusive():
+            self._append(entry, key, value, delete)
+
+    def _append(self, entry: Dict[str, Any], key: str, value: Any, delete: bool = False) -> None:
+        """Apply ``entry`` in memory and journal it (caller holds ``_exclusive``)."""
+        line = json.dumps(entry, ensure_ascii=False)
+        if delete:
+            self._state.pop(key, None)
+        else:
+            self._state[key] = copy.deepcopy(value)
+        # 他の書き手のflushでジャーナルが置き換わるため、追記のたびにロック下で開き直す。
+        # closeでOSのページキャッシュまで渡す（プロセスクラッシュに耐える）。fsyncはスナップショット時のみ。
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            journal.write(line + "\n")
+        self._dirty = True
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None or self.flush_interval <= 0:
+            return
+        self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timed_flush(self) -> None:
+        try:
+            self.flush()
+        except Exception as exc:
+            logger.error("Write-behind flush failed for %s: %s", self.path, exc)
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def flush(self) -> bool:
+        """Merge the on-disk journal, write the snapshot atomically and truncate the journal.
+
+        自分の変更はすべてジャーナル（または既に他の書き手が書き出したスナップショット）に
+        あるため、ディスク上の状態を読み直したものをそのまま書き出し、メモリ上の状態も
+        それで置き換えます（他の書き手の更新も取り込まれる）。
+
+        Returns:
+            True if a snapshot was written.
+        """
+        with self._exclusive():
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return False
+            state, _ = self._read_disk()
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(self.path)}-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                    json.dump(state, handle, ensure_ascii=False, indent=self.indent)
+                    handle.flush()
+                    os.fsync(handle.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            # スナップショット確定後にジャーナルを空にする（途中で落ちても再適用は冪等）
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            self._state = state
+            self._dirty = False
+            self.flush_count += 1
+            return True
+
+    def close(self) -> None:
+        self.flush()
+        _open_stores.discard(self)
@@ -1,9 +1,11 @@
+import asyncio
 import json
 import logging
 import os
 import pickle
+import random
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 import httplib2
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -12,16 +14,25 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload
 from app.config.settings import settings
+from app.resumable_upload import ResumableUploader, align_chunk_size, get_upload_session_store
 logger = logging.getLogger(__name__)
+RETRYABLE_STATUSES = (500, 502, 503, 504)
+EXPIRED_STATUSES = (404, 410)
+ProgressCallback = Callable[[int, int], None]
 
 class YouTubeManager:
     SCOPES = ['https://www.googleapis.com/auth/youtube.upload', 'https://www.googleapis.com/auth/youtube', 'https://www.googleapis.com/auth/youtube.force-ssl']
 
-    def __init__(self):
-        self.service = None
+    def __init__(self, service=None):
+        self.service = service
         self.credentials = None
         self.client_secrets = settings.api_keys.get('youtube')
-        self._setup_service()
+        upload_config = settings.upload
+        self.chunk_size = align_chunk_size(upload_config.chunk_size_mb * 1024 * 1024)
+        self.max_retries = upload_config.max_retries
+        self.upload_sessions = get_upload_session_store()
+        if service is None:
+            self._setup_service()
 
     def _setup_service(self):
         try:
@@ -83,26 +94,34 @@ class YouTubeManager:
             logger.error(f'OAuth flow failed: {e}')
             return None
 
-    def upload_video(self, video_path: str, metadata: Dict[str, Any], thumbnail_path: str=None, subtitle_path: str=None, privacy_status: str='private') -> Dict[str, Any]:
+    def upload_video(self, video_path: str, metadata: Dict[str, Any], thumbnail_path: str=None, subtitle_path: str=None, privacy_status: str='private', progress: Optional[ProgressCallback]=None) -> Dict[str, Any]:
+        """同期呼び出し用ラッパー（イベントループ内からはupload_video_asyncを使う）"""
+        return asyncio.run(self.upload_video_async(video_path, metadata, thumbnail_path, subtitle_path, privacy_status, progress))
+
+    async def upload_video_async(self, video_path: str, metadata: Dict[str, Any], thumbnail_path: str=None, subtitle_path: str=None, privacy_status: str='private', progress: Optional[ProgressCallback]=None) -> Dict[str, Any]:
+        """動画をチャンク単位でアップロードし、サムネイルと字幕を並行して設定.
+        Args:
+            progress: (送信済みバイト, 総バイト)を受け取るコールバック
+        """
         try:
             if not os.path.exists(video_path):
                 raise FileNotFoundError(f'Video file not found: {video_path}')
             upload_info = self._prepare_upload_metadata(metadata, privacy_status)
             file_size = os.path.getsize(video_path)
             logger.info(f'Uploading video: {video_path} ({file_size} bytes)')
-            media = MediaFileUpload(video_path, chunksize=-1, resumable=True)
-            insert_request = self.service.videos().insert(part=','.join(upload_info.keys()), body=upload_info, media_body=media)
-            video_response = self._execute_upload(insert_request)
+            video_response = await self._upload_in_chunks(video_path, upload_info, progress)
             if not video_response:
                 raise Exception('Video upload failed')
             video_id = video_response.get('id')
             logger.info(f'Video uploaded successfully: {video_id}')
-            thumbnail_result = None
+            post_uploads = {}
             if thumbnail_path and os.path.exists(thumbnail_path):
-                thumbnail_result = self._upload_thumbnail(video_id, thumbnail_path)
-            caption_result = None
+                post_uploads['thumbnail'] = asyncio.to_thread(self._upload_thumbnail, video_id, thumbnail_path, self._thread_http())
             if subtitle_path and os.path.exists(subtitle_path):
-                caption_result = self._upload_caption(video_id, subtitle_path)
+                post_uploads['caption'] = asyncio.to_thread(self._upload_caption, video_id, subtitle_path, 'ja', self._thread_http())
+            post_results = dict(zip(post_uploads, await asyncio.gather(*post_uploads.values())))
+            thumbnail_result = post_results.get('thumbnail')
+            caption_result = post_results.get('caption')
             result = {'video_id': video_id, 'title': upload_info['snippet']['title'], 'description': upload_info['snippet']['description'], 'video_url': f'https://www.youtube.com/watch?v={video_id}', 'privacy_status': privacy_status, 'uploaded_at': datetime.now().isoformat(), 'file_size': file_size, 'thumbnail_uploaded': thumbnail_result is not None, 'caption_uploaded': caption_result is not None}
             if thumbnail_result:
                 result['thumbnail_result'] = thumbnail_result
@@ -113,6 +132,13 @@ class YouTubeManager:
             logger.error(f'Video upload failed: {e}')
             return {'error': str(e), 'video_path': video_path, 'upload_failed_at': datetime.now().isoformat()}
 
+    def _thread_http(self):
+        """並行リクエスト用に専用のhttplib2接続を用意（httplib2.Httpはスレッド非安全）"""
+        if self.credentials is None:
+            return None
+        import google_auth_httplib2
+        return google_auth_httplib2.AuthorizedHttp(self.credentials, http=httplib2.Http())
+
     def _prepare_upload_metadata(self, metadata: Dict[str, Any], privacy_status: str) -> Dict[str, Any]:
         title = str(metadata.get('title', 'Untitled Video'))[:100]
         description = str(metadata.get('description', ''))[:5000]
@@ -132,38 +158,74 @@ class YouTubeManager:
         category_mapping = {'News & Politics': '25', 'Education': '27', 'Business': '25', 'Finance': '25', 'Economics': '25', 'Entertainment': '24', 'Technology': '28', 'Science': '28'}
         return category_mapping.get(category_name, '25')
 
-    def _execute_upload(self, insert_request) -> Dict[str, Any]:
-        import random
-        import time
-        max_retries = 3
-        retriable_exceptions = (httplib2.HttpLib2Error, IOError, HttpError)
-        for retry in range(max_retries):
+    async def _upload_in_chunks(self, video_path: str, upload_info: Dict[str, Any], progress: Optional[ProgressCallback]) -> Dict[str, Any]:
+        """next_chunk()ループで送信し、セッションURIを保存して中断後は続きから再開.
+        再試行待ちはasyncio.sleepで行い、チャンク送信はワーカースレッドで実行します。
+        """
+        key = f'youtube:{ResumableUploader.session_key(video_path)}'
+        record = self.upload_sessions.get(key)
+        request = self._insert_request(video_path, upload_info)
+        if record:
+            request.resumable_uri = record['uri']
+            # 次のnext_chunkでサーバーに受理済みバイト数を問い合わせてから送信を再開させる
+            request._in_error_state = True
+            logger.info(f'Resuming YouTube upload from saved session: {video_path}')
+        response = None
+        failures = 0
+        reported = -1
+        while response is None:
             try:
-                response = insert_request.execute()
-                return response
+                status, response = await asyncio.to_thread(request.next_chunk, num_retries=0)
             except HttpError as e:
-                if e.resp.status in [500, 502, 503, 504]:
-                    wait_time = 2 ** retry + random.uniform(0, 1)
-                    logger.warning(f'Server error {e.resp.status}, retrying in {wait_time:.2f}s...')
-                    time.sleep(wait_time)
+                if e.resp.status in EXPIRED_STATUSES and record:
+                    logger.warning('Saved YouTube upload session expired, restarting upload')
+                    self.upload_sessions.delete(key)
+                    request, record = self._insert_request(video_path, upload_info), None
                     continue
-                else:
+                if e.resp.status not in RETRYABLE_STATUSES:
                     logger.error(f'HTTP error {e.resp.status}: {e}')
                     raise
-            except retriable_exceptions as e:
-                wait_time = 2 ** retry + random.uniform(0, 1)
-                logger.warning(f'Retriable error, waiting {wait_time:.2f}s: {e}')
-                time.sleep(wait_time)
+                failures = await self._backoff(failures, f'Server error {e.resp.status}')
+                continue
+            except (httplib2.HttpLib2Error, IOError) as e:
+                if request.resumable_uri:
+                    request._in_error_state = True
+                failures = await self._backoff(failures, f'Retriable error: {e}')
                 continue
-            except Exception as e:
-                logger.error(f'Unexpected error: {e}')
-                raise
-        raise Exception('Max retries exceeded for video upload')
+            failures = 0
+            if request.resumable_uri and (record is None or record['uri'] != request.resumable_uri):
+                record = {'uri': request.resumable_uri, 'file': os.path.abspath(video_path), 'started_at': datetime.now().isoformat()}
+                self.upload_sessions.put(key, record)
+            if status is not None:
+                if progress:
+                    progress(status.resumable_progress, status.total_size)
+                percent = int(status.progress() * 10) * 10
+                if percent > reported:
+                    reported = percent
+                    logger.info(f'YouTube upload progress: {percent}% ({status.resumable_progress}/{status.total_size} bytes)')
+        self.upload_sessions.delete(key)
+        if progress:
+            total = os.path.getsize(video_path)
+            progress(total, total)
+        return response
+
+    def _insert_request(self, video_path: str, upload_info: Dict[str, Any]):
+        media = MediaFileUpload(video_path, chunksize=self.chunk_size, resumable=True)
+        return self.service.videos().insert(part=','.join(upload_info.keys()), body=upload_info, media_body=media)
 
-    def _upload_thumbnail(self, video_id: str, thumbnail_path: str) -> Dict[str, Any]:
+    async def _backoff(self, failures: int, reason: str) -> int:
+        failures += 1
+        if failures > self.max_retries:
+            raise Exception('Max retries exceeded for video upload')
+        wait_time = min(2 ** failures + random.uniform(0, 1), 60)
+        logger.warning(f'{reason}, retrying in {wait_time:.2f}s...')
+        await asyncio.sleep(wait_time)
+        return failures
+
+    def _upload_thumbnail(self, video_id: str, thumbnail_path: str, http=None) -> Dict[str, Any]:
         try:
             request = self.service.thumbnails().set(videoId=video_id, media_body=MediaFileUpload(thumbnail_path, mimetype='image/png'))
-            request.execute()
+            request.execute(http=http)
             logger.info(f'Thumbnail uploaded for video: {video_id}')
             return {'uploaded': True, 'thumbnail_path': thumbnail_path, 'uploaded_at': datetime.now().isoformat()}
         except HttpError as e:
@@ -177,12 +239,12 @@ class YouTubeManager:
             logger.error(f'Thumbnail upload failed for {video_id}: {e}')
             return {'uploaded': False, 'error': str(e), 'thumbnail_path': thumbnail_path}
 
-    def _upload_caption(self, video_id: str, subtitle_path: str, language: str='ja') -> Dict[str, Any]:
+    def _upload_caption(self, video_id: str, subtitle_path: str, language: str='ja', http=None) -> Dict[str, Any]:
         try:
             caption_body = {'snippet': {'videoId': video_id, 'language': language, 'name': 'Japanese' if language == 'ja' else language, 'isDraft': False}}
             media = MediaFileUpload(subtitle_path, mimetype='application/octet-stream', resumable=True)
             request = self.service.captions().insert(part='snippet', body=caption_body, media_body=media, sync=False)
-            response = request.execute()
+            response = request.execute(http=http)
             logger.info(f'Caption uploaded for video: {video_id} (language: {language})')
             return {'uploaded': True, 'caption_id': response.get('id'), 'language': language, 'subtitle_path': subtitle_path, 'uploaded_at': datetime.now().isoformat()}
         except HttpError as e:
@@ -273,6 +335,13 @@ def upload_video(video_path: str, metadata: Dict[str, Any], thumbnail_path: str=
         logger.warning('YouTube manager not available')
         return {'error': 'YouTube manager not configured'}
 
+async def upload_video_async(video_path: str, metadata: Dict[str, Any], thumbnail_path: str=None, subtitle_path: str=None, privacy_status: str='private') -> Dict[str, Any]:
+    if youtube_manager:
+        return await youtube_manager.upload_video_async(video_path, metadata, thumbnail_path, subtitle_path, privacy_status)
+    else:
+        logger.warning('YouTube manager not available')
+        return {'error': 'YouTube manager not configured'}
+
 def update_video(video_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
     if youtube_manager:
         return youtube_manager.update_video(video_id, updates)
@@ -406,6 +406,19 @@ def handle_video_review(args: argparse.Namespace) -> int:
             screenshot_dir = Path(result.screenshots[0].path).parent
             print(f"\nスクリーンショット保存先: {screenshot_dir}")
     return 0
+def handle_metadata_import(args: argparse.Namespace) -> int:
+    """Import legacy metadata CSV/JSONL history into the SQLite store and segmented execution log."""
+    from app.execution_log import open_execution_log
+    from app.metadata_db import MetadataDatabase
+    from app.metadata_storage import metadata_storage
+    csv_path = args.csv or metadata_storage.csv_path
+    jsonl_path = args.jsonl or metadata_storage.jsonl_path
+    database = MetadataDatabase(args.db or metadata_storage.db_path)
+    imported = database.import_legacy(csv_path, jsonl_path, force=args.force)
+    print(f"Imported {imported} records into {database.db_path} ({database.count()} total)")
+    execution_log = open_execution_log(jsonl_path)
+    print(f"Execution log {execution_log.directory}: {execution_log.count()} runs")
+    return 0
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description="Run analytics, log analysis, improvement loops, or video reviews from one CLI.",
@@ -458,6 +471,12 @@ def build_parser() -> argparse.ArgumentParser:
     review.add_argument("--force", action="store_true", help="既存スクリーンショットを再生成する")
     review.add_argument("--json", action="store_true", help="結果をJSONで出力する")
     review.set_defaults(func=handle_video_review)
+    metadata_import = subparsers.add_parser("metadata-import", help="Import legacy metadata history into SQLite")
+    metadata_import.add_argument("--csv", help="旧metadata_history.csvのパス")
+    metadata_import.add_argument("--jsonl", help="旧execution_log.jsonlのパス")
+    metadata_import.add_argument("--db", help="取り込み先SQLiteのパス")
+    metadata_import.add_argument("--force", action="store_true", help="取り込み済みでも再実行する")
+    metadata_import.set_defaults(func=handle_metadata_import)
     return parser
 def main(argv: Optional[List[str]] = None) -> int:
     parser = build_parser()
@@ -0,0 +1,64 @@
+import wave
+import numpy as np
+import pytest
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+from app.config.settings import MediaQAConfig
+from app.models.qa import CheckStatus
+from app.services.media.audio_analysis import AudioAnalyzer, integrated_loudness
+from app.services.media.qa_pipeline import MediaQAPipeline
+pytestmark = pytest.mark.unit
+def _write_wav(path, sample_rate, channels, seconds=6.0123):
+    rng = np.random.default_rng(7)
+    count = int(sample_rate * seconds)
+    tone = (0.3 * np.sin(2 * np.pi * 440 * np.arange(count) / sample_rate) * 32767).astype(np.int16)
+    tone[int(count * 0.2) : int(count * 0.2) + int(sample_rate * 2.1)] = rng.integers(-30, 30, int(sample_rate * 2.1))
+    tone[int(count * 0.7) : int(count * 0.7) + int(sample_rate * 0.9)] = 0
+    frames = np.repeat(tone[:, None], channels, axis=1)
+    with wave.open(str(path), "wb") as handle:
+        handle.setnchannels(channels)
+        handle.setsampwidth(2)
+        handle.setframerate(sample_rate)
+        handle.writeframes(frames.tobytes())
+    return path
+@pytest.mark.parametrize("sample_rate,channels", [(24000, 1), (44100, 2)])
+def test_matches_pydub_levels_and_silence(tmp_path, sample_rate, channels):
+    path = _write_wav(tmp_path / "audio.wav", sample_rate, channels)
+    segment = AudioSegment.from_file(path)
+    analysis = AudioAnalyzer().analyze(str(path))
+    assert analysis.backend == "memmap"
+    assert analysis.duration_ms == len(segment)
+    assert analysis.rms_dbfs == segment.dBFS
+    assert analysis.peak_dbfs == segment.max_dBFS
+    threshold = segment.dBFS - 16
+    expected = detect_silence(segment, min_silence_len=800, silence_thresh=threshold)
+    runs = analysis.silence_runs(800, threshold)
+    assert [[run.start_ms, run.end_ms] for run in runs] == expected
+    assert analysis.window_rms(500).tolist() == [segment[i : i + 500].rms for i in range(len(segment) - 500 + 1)]
+def test_chunk_size_does_not_change_results(tmp_path):
+    path = _write_wav(tmp_path / "audio.wav", 44100, 2)
+    whole = AudioAnalyzer(chunk_seconds=10.0).analyze(str(path))
+    chunked = AudioAnalyzer(chunk_seconds=0.37).analyze(str(path))
+    assert np.array_equal(whole.ms_energy, chunked.ms_energy)
+    assert whole.integrated_lufs == pytest.approx(chunked.integrated_lufs)
+def test_integrated_loudness_of_reference_tone(tmp_path):
+    sample_rate = 48000
+    tone = (0.5 * np.sin(2 * np.pi * 997 * np.arange(sample_rate * 3) / sample_rate) * 32767).astype(np.int16)
+    with wave.open(str(tmp_path / "tone.wav"), "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(sample_rate)
+        handle.writeframes(tone.tobytes())
+    analysis = AudioAnalyzer().analyze(str(tmp_path / "tone.wav"))
+    assert analysis.integrated_lufs == pytest.approx(-9.03, abs=0.1)
+    assert integrated_loudness(np.zeros((10, 1))) is None
+def test_pipeline_audio_check_reports_long_silence(tmp_path):
+    path = _write_wav(tmp_path / "audio.wav", 24000, 1)
+    config = MediaQAConfig()
+    config.audio.rms_dbfs_min = -40.0
+    config.audio.peak_dbfs_max = 0.0
+    result = MediaQAPipeline(config)._run_audio_checks(audio_path=str(path))
+    assert result.status == CheckStatus.FAILED
+    assert "silence" in result.message
+    assert result.metrics["longest_silence_seconds"] > config.audio.max_silence_seconds
+    assert "integrated_lufs" in result.metrics
@@ -0,0 +1,44 @@
+import threading
+import pytest
+from app.services.media.broll_prefetch import BRollPrefetcher
+class _FakeMatcher:
+    def extract_keywords(self, script_content, news_items=None, max_keywords=5):
+        return ["economy", "market"] if script_content else []
+class _FakeStockManager:
+    def __init__(self, slow_ids=()):
+        self.slow_ids = set(slow_ids)
+        self.release = threading.Event()
+        self.cancelled = []
+    def search_footage(self, keywords, max_clips=5, **_kwargs):
+        return [{"id": f"clip_{i}", "url": f"https://example.com/{i}.mp4"} for i in range(3)]
+    def download_clip(self, video, cancel_event=None):
+        if video["id"] in self.slow_ids:
+            while not cancel_event.wait(0.01):
+                if self.release.is_set():
+                    break
+            if cancel_event.is_set():
+                self.cancelled.append(video["id"])
+                return None
+        return f"/tmp/{video['id']}.mp4"
+@pytest.mark.unit
+class TestBRollPrefetcher:
+    def test_collects_all_clips_in_search_order(self) -> None:
+        prefetcher = BRollPrefetcher(_FakeStockManager(), _FakeMatcher(), max_clips=3)
+        assert prefetcher.start("田中: 株価が上昇") == ["economy", "market"]
+        result = prefetcher.collect(deadline_seconds=5)
+        assert result.completed
+        assert result.clip_paths == ["/tmp/clip_0.mp4", "/tmp/clip_1.mp4", "/tmp/clip_2.mp4"]
+    def test_deadline_returns_landed_clips_and_cancels_the_rest(self) -> None:
+        manager = _FakeStockManager(slow_ids={"clip_1"})
+        prefetcher = BRollPrefetcher(manager, _FakeMatcher(), max_clips=3)
+        prefetcher.start("田中: 円安")
+        result = prefetcher.collect(deadline_seconds=0.3)
+        assert result.cancelled
+        assert result.clip_paths == ["/tmp/clip_0.mp4", "/tmp/clip_2.mp4"]
+        assert prefetcher._done_event.wait(2)
+        assert manager.cancelled == ["clip_1"]
+    def test_no_keywords_finishes_immediately(self) -> None:
+        prefetcher = BRollPrefetcher(_FakeStockManager(), _FakeMatcher())
+        assert prefetcher.start("") == []
+        assert prefetcher.is_done()
+        assert not prefetcher.collect(deadline_seconds=0).has_clips
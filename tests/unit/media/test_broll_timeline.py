@@ -0,0 +1,22 @@
+import pytest
+from app.services.media.broll_generator import clip_effect_filters, frames_for, xfade_graph, xfade_offsets
+@pytest.mark.unit
+class TestBRollTimeline:
+    def test_offsets_accumulate_across_transitions(self) -> None:
+        offsets = xfade_offsets(4, clip_duration=3.0, transition_duration=1.0)
+        assert offsets == pytest.approx([2.0, 4.0, 6.0])
+    def test_offsets_snap_to_frame_boundaries(self) -> None:
+        offsets = xfade_offsets(3, clip_duration=10.0 / 3, transition_duration=1.0)
+        assert [round(offset * 25, 6) for offset in offsets] == [58.0, 116.0]
+    def test_single_clip_has_no_transitions(self) -> None:
+        assert xfade_offsets(1, clip_duration=5.0, transition_duration=1.0) == []
+    def test_graph_chains_labels_in_order(self) -> None:
+        parts, final_label = xfade_graph(["0:v", "1:v", "2:v"], clip_duration=3.0, transition_duration=1.0)
+        assert final_label == "vf2"
+        assert parts[0].startswith("[0:v][1:v]xfade")
+        assert parts[1].startswith("[vf1][2:v]xfade")
+        assert "offset=4.0" in parts[1]
+    def test_clip_chain_ends_on_exact_frame_count(self) -> None:
+        filters = clip_effect_filters(0, clip_duration=3.0, enable_effects=True)
+        assert f"trim=end_frame={frames_for(3.0)}" in filters
+        assert filters[-1] == "fps=25"
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from PIL import Image
+from app.models.video_review import ScreenshotEvidence, VideoReviewFeedback
+from app.services.media.perceptual_hash import cluster_hashes, hash_image
+from app.services.video_review import GeminiVisionReviewer, VideoReviewService
+pytestmark = pytest.mark.unit
+def _scene(path, noise=0, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:180, 0:320]
+    base = 128 + 60 * np.sin(x / 40.0) * np.cos(y / 25.0) + 40 * np.exp(-((x - 220) ** 2 + (y - 70) ** 2) / 800.0)
+    pixels = np.clip(base + rng.normal(0, noise, base.shape), 0, 255).astype(np.uint8)
+    Image.fromarray(pixels).convert("RGB").save(path)
+    return str(path)
+def _checker(path):
+    pixels = (np.indices((180, 320)) // 30).sum(axis=0) % 2 * 255
+    Image.fromarray(pixels.astype(np.uint8)).convert("RGB").save(path)
+    return str(path)
+def test_near_duplicates_cluster_and_distinct_frames_stay_apart(tmp_path):
+    paths = [
+        _scene(tmp_path / "a.png"),
+        _scene(tmp_path / "b.png", noise=4, seed=1),
+        _checker(tmp_path / "c.png"),
+        _scene(tmp_path / "d.png", noise=4, seed=2),
+    ]
+    clusters = cluster_hashes([hash_image(path) for path in paths], max_distance=6)
+    assert [(cluster.representative, cluster.members) for cluster in clusters] == [(0, [0, 1, 3]), (2, [2])]
+class _FakeExtractor:
+    def __init__(self, shots):
+        self.shots = shots
+    def extract(self, **kwargs):
+        return self.shots
+class _FakeReviewer:
+    def __init__(self):
+        self.received = None
+    def review(self, video_path, screenshots, metadata=None):
+        self.received = screenshots
+        return VideoReviewFeedback(summary="ok")
+def test_review_sends_only_representatives(monkeypatch, tmp_path):
+    paths = [_scene(tmp_path / "a.png"), _scene(tmp_path / "b.png", noise=4, seed=1), _checker(tmp_path / "c.png")]
+    shots = [ScreenshotEvidence(index=i, path=path, timestamp_seconds=60.0 * i) for i, path in enumerate(paths)]
+    review_settings = SimpleNamespace(
+        enabled=True,
+        output_dir=str(tmp_path),
+        screenshot_interval_seconds=60,
+        max_screenshots=10,
+        model="fake",
+        store_feedback=False,
+        dedup_enabled=True,
+        dedup_max_distance=6,
+    )
+    monkeypatch.setattr("app.services.video_review.settings", SimpleNamespace(video_review=review_settings))
+    reviewer = _FakeReviewer()
+    result = VideoReviewService(screenshot_extractor=_FakeExtractor(shots), reviewer=reviewer).review_video("v.mp4")
+    assert [shot.path for shot in reviewer.received] == [paths[0], paths[2]]
+    assert reviewer.received[0].cluster_size == 2
+    assert reviewer.received[0].cluster_timestamps == [0.0, 60.0]
+    assert (result.frames_total, result.frames_kept) == (3, 2)
+    assert result.captured_paths == paths and result.to_dict()["captured_paths"] == paths
+    assert result.payload_bytes_saved == (tmp_path / "b.png").stat().st_size
+    assert "類似フレーム2枚の代表" in GeminiVisionReviewer._cluster_note(reviewer.received[0])
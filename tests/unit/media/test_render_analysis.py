@@ -0,0 +1,113 @@
+import subprocess
+import threading
+import time
+import pytest
+from imageio_ffmpeg import get_ffmpeg_exe
+from app.services.media.render_analysis import FFmpegAnalysisParser, RenderAnalysisError, RenderAnalyzer, TimeRange, sample_window_starts
+pytestmark = pytest.mark.unit
+STDERR = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'r.mp4':
+  Duration: 00:00:08.00, start: 0.000000, bitrate: 94 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p(progressive), 320x240, 17 kb/s, 25 fps, 25 tbr, 12800 tbn (default)
+  Stream #0:1[0x2](und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, mono, fltp, 69 kb/s (default)
+[freezedetect @ 0x7f0] lavfi.freezedetect.freeze_start: 0
+[blackdetect @ 0x7f1] black_start:0 black_end:2 black_duration:2
+[freezedetect @ 0x7f0] lavfi.freezedetect.freeze_duration: 2
+[freezedetect @ 0x7f0] lavfi.freezedetect.freeze_end: 2
+[freezedetect @ 0x7f0] lavfi.freezedetect.freeze_start: 5
+[Parsed_astats_3 @ 0x7f2] Overall
+[Parsed_astats_3 @ 0x7f2] Peak level dB: -16.083210
+[Parsed_astats_3 @ 0x7f2] RMS level dB: -21.082951
+[Parsed_astats_3 @ 0x7f2] Number of samples: 384000
+[Parsed_ebur128_2 @ 0x7f3] Summary:
+
+  Integrated loudness:
+    I:         -21.8 LUFS
+    Threshold: -31.8 LUFS
+
+  Loudness range:
+    LRA:         0.0 LU
+    Threshold: -41.8 LUFS
+
+  True peak:
+    Peak:      -16.1 dBFS
+[out#0/null @ 0x110] video:86KiB audio:750KiB subtitle:0KiB
+frame=200
+progress=end
+"""
+def test_parser_collects_all_metrics_incrementally():
+    parser = FFmpegAnalysisParser()
+    for line in STDERR.splitlines():
+        parser.feed(line)
+    parser.close(parser.video_duration)
+    assert parser.black_ranges == [(0.0, 2.0)]
+    assert parser.freeze_ranges == [(0.0, 2.0), (5.0, 8.0)]
+    assert parser.ebur128 == {"I": -21.8, "LRA": 0.0, "Peak": -16.1}
+    assert parser.astats["Peak level dB"] == "-16.083210"
+    assert parser.video_duration == pytest.approx(8.0)
+    assert parser.audio_duration == pytest.approx(8.0)
+def test_sample_window_starts_cover_both_ends():
+    assert sample_window_starts(100.0, 3, 10.0) == [0.0, 45.0, 90.0]
+    assert sample_window_starts(5.0, 3, 10.0) == [0.0]
+def test_sampled_ranges_map_back_to_source_time():
+    analyzer = RenderAnalyzer()
+    mapped = analyzer._map_ranges([(1.0, 3.0), (5.0, 6.0)], [0.0, 50.0, 90.0], 2.0)
+    assert mapped == [TimeRange(1.0, 2.0), TimeRange(50.0, 51.0), TimeRange(91.0, 92.0)]
+@pytest.fixture(scope="module")
+def rendered_video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("render") / "render.mp4"
+    subprocess.run(
+        [
+            get_ffmpeg_exe(),
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "color=black:s=160x120:d=2:r=25",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc=s=160x120:d=4:r=25",
+            "-f",
+            "lavfi",
+            "-i",
+            "sine=f=440:d=6:sample_rate=48000",
+            "-filter_complex",
+            "[0:v][1:v]concat=n=2:v=1:a=0[v]",
+            "-map",
+            "[v]",
+            "-map",
+            "2:a",
+            "-c:v",
+            "mpeg4",
+            "-c:a",
+            "aac",
+            str(path),
+        ],
+        check=True,
+    )
+    return path
+def test_single_pass_analysis(rendered_video):
+    analysis = RenderAnalyzer(get_ffmpeg_exe(), freeze_min_duration=1.0).analyze(str(rendered_video))
+    assert analysis.longest_black_seconds == pytest.approx(2.0, abs=0.1)
+    assert analysis.freeze_ranges and analysis.freeze_ranges[0].start == pytest.approx(0.0)
+    assert analysis.av_drift_seconds == pytest.approx(0.0, abs=0.1)
+    assert analysis.integrated_lufs is not None
+    assert not analysis.sampled
+    assert "framelog=quiet" in " ".join(RenderAnalyzer()._build_command("render.mp4", [], 20.0))
+def test_sampled_analysis_decodes_only_windows(rendered_video):
+    analysis = RenderAnalyzer(get_ffmpeg_exe()).analyze(str(rendered_video), sample_windows=2, window_seconds=1.0)
+    assert analysis.sampled
+    assert analysis.analyzed_seconds == pytest.approx(2.0, abs=0.1)
+    assert analysis.black_ranges[0].start == pytest.approx(0.0)
+    assert analysis.longest_black_seconds == pytest.approx(1.0, abs=0.1)
+    assert analysis.av_drift_seconds is None
+def test_cancel_event_kills_running_ffmpeg():
+    cancel = threading.Event()
+    analyzer = RenderAnalyzer(get_ffmpeg_exe(), cancel_event=cancel)
+    endless = [get_ffmpeg_exe(), "-nostdin", "-f", "lavfi", "-i", "anullsrc", "-f", "null", "-"]
+    threading.Timer(0.3, cancel.set).start()
+    started = time.monotonic()
+    with pytest.raises(RenderAnalysisError, match="cancelled"):
+        analyzer._run(endless, FFmpegAnalysisParser())
+    assert time.monotonic() - started < 5
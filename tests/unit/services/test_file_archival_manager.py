@@ -26,3 +26,30 @@ def test_list_archived_workflows_parses_run_id_with_underscores(tmp_path):
     assert entries[0]["run_id"] == "run-002"
     assert entries[1]["run_id"] == "local_20250101_123456"
     assert entries[1]["title"] == manager.sanitize_title("Market News: Update")
+def test_archive_renames_temporary_artifacts_and_links_the_rest(tmp_path):
+    manager = FileArchivalManager(base_output_dir=tmp_path / "output")
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"video-bytes")
+    audio = tmp_path / "audio.wav"
+    audio.write_bytes(b"audio-bytes")
+    archived = manager.archive_workflow_files("run-1", "20240101_010101", "Title", {"video": str(video), "audio": str(audio)}, temporary=("video",))
+    assert manager.last_archive_strategies == {"video": "rename", "audio": "hardlink"}
+    assert not video.exists() and audio.exists()
+    assert Path(archived["video"]).read_bytes() == b"video-bytes"
+    assert Path(archived["audio"]).read_bytes() == b"audio-bytes"
+    assert Path(archived["audio"]).stat().st_ino == audio.stat().st_ino
+def test_archive_falls_back_to_copy_when_links_are_unsupported(tmp_path, monkeypatch):
+    import errno
+    from app.services import file_archival
+    def unsupported(source, target):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+    monkeypatch.setattr(file_archival.os, "link", unsupported)
+    monkeypatch.setattr(file_archival, "_reflink", unsupported)
+    manager = FileArchivalManager(base_output_dir=tmp_path / "output")
+    script = tmp_path / "script.txt"
+    script.write_text("原稿", encoding="utf-8")
+    archived = manager.archive_workflow_files("run-2", "20240101_010101", "Title", {"script": str(script)})
+    assert manager.last_archive_strategies == {"script": "copy"}
+    assert Path(archived["script"]).read_text(encoding="utf-8") == "原稿"
+    assert script.exists()
+    assert [path.name for path in Path(archived["script"]).parent.iterdir() if path.name.endswith(".tmp")] == []
@@ -0,0 +1,43 @@
+import importlib.util
+import random
+import pytest
+from app.services.keyword_automaton import KeywordAutomaton, KeywordHit, get_keyword_automaton
+from app.services.media.visual_matcher import VisualMatcher
+pytestmark = pytest.mark.unit
+BACKENDS = ["python"]
+if importlib.util.find_spec("ahocorasick"):
+    BACKENDS.append("pyahocorasick")
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_find_all_reports_overlapping_hits_with_positions(backend):
+    automaton = KeywordAutomaton(["円", "円安", "安値"], backend=backend)
+    hits = automaton.find_all("円安値")
+    assert hits == [
+        KeywordHit("円", 0, 1),
+        KeywordHit("円安", 0, 2),
+        KeywordHit("安値", 1, 3),
+    ]
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_matches_follow_registration_order(backend):
+    automaton = KeywordAutomaton(["金利", "日銀", "株価"], backend=backend)
+    assert automaton.matches("株価が上がり日銀が金利を据え置き") == ["金利", "日銀", "株価"]
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_counts_match_str_count(backend):
+    keywords = ["aa", "ab", "b", "円", "円高"]
+    automaton = KeywordAutomaton(keywords, backend=backend)
+    rng = random.Random(7)
+    for _ in range(200):
+        text = "".join(rng.choice("ab円高 ") for _ in range(rng.randint(0, 30)))
+        expected = {keyword: text.count(keyword) for keyword in keywords if text.count(keyword)}
+        assert automaton.counts(text) == expected
+        assert automaton.found(text) == {keyword for keyword in keywords if keyword in text}
+def test_empty_keywords_and_text():
+    assert KeywordAutomaton([]).find_all("anything") == []
+    assert KeywordAutomaton(["", "x"]).keywords == ["x"]
+    assert KeywordAutomaton(["x"]).find_all("") == []
+def test_shared_automaton_is_reused():
+    assert get_keyword_automaton(("a", "b")) is get_keyword_automaton(["a", "b"])
+def test_visual_matcher_preserves_keyword_map_order():
+    matcher = VisualMatcher()
+    _, matched = matcher._extract_from_text("日銀の政策で円安が進み株価が上昇")
+    expected = [term for term in VisualMatcher.KEYWORD_MAP if term in "日銀の政策で円安が進み株価が上昇"]
+    assert matched == expected
@@ -0,0 +1,45 @@
+import subprocess
+import pytest
+from imageio_ffmpeg import get_ffmpeg_exe
+from PIL import Image
+from app.services.video_review import VideoScreenshotExtractor
+pytestmark = pytest.mark.unit
+@pytest.fixture(scope="module")
+def sample_video(tmp_path_factory):
+    path = tmp_path_factory.mktemp("review") / "video.mp4"
+    subprocess.run(
+        [
+            get_ffmpeg_exe(),
+            "-v",
+            "error",
+            "-f",
+            "lavfi",
+            "-i",
+            "testsrc2=s=1280x720:d=12:r=25",
+            "-c:v",
+            "mpeg4",
+            "-g",
+            "25",
+            str(path),
+        ],
+        check=True,
+    )
+    return path
+def test_seek_precedes_input_and_scales_on_decode():
+    extractor = VideoScreenshotExtractor(ffmpeg_path="ffmpeg", max_width=768, max_workers=2, keyframe_only=True)
+    command = extractor.build_frame_command("in.mp4", 42.0, "out.png")
+    assert command.index("-ss") < command.index("-i")
+    assert command[command.index("-skip_frame") + 1] == "nokey"
+    assert command[command.index("-frames:v") + 1] == "1"
+    assert "min(768,iw)" in command[command.index("-vf") + 1]
+def test_plan_timestamps_stays_inside_video():
+    extractor = VideoScreenshotExtractor(ffmpeg_path="ffmpeg", max_workers=1)
+    assert extractor.plan_timestamps(12.0, 5, 3) == [0.0, 5.0, 10.0]
+    assert extractor.plan_timestamps(9.0, 5, 3)[-1] == pytest.approx(8.9)
+def test_extracts_downscaled_screenshots_in_parallel(sample_video, tmp_path):
+    extractor = VideoScreenshotExtractor(ffmpeg_path=get_ffmpeg_exe(), max_width=320, max_workers=3)
+    shots = extractor.extract(str(sample_video), str(tmp_path / "shots"), interval_seconds=4, max_screenshots=15)
+    assert [shot.timestamp_seconds for shot in shots] == [0.0, 4.0, 8.0]
+    assert [Image.open(shot.path).size for shot in shots] == [(320, 180)] * 3
+    reused = extractor.extract(str(sample_video), str(tmp_path / "shots"), interval_seconds=4, max_screenshots=15)
+    assert [shot.path for shot in reused] == [shot.path for shot in shots]
@@ -0,0 +1,53 @@
+import pytest
+from app.analytics import FeedbackAnalyzer
+from app.analytics_store import ExecutionAnalyticsStore
+from app.execution_log import execution_log_dir
+from app.models.workflow import WorkflowResult
+pytestmark = pytest.mark.unit
+HOOKS = ["衝撃", "質問", None]
+TOPICS = ["株価", "為替", None, "株価"]
+def _result(index):
+    return WorkflowResult(
+        success=index % 3 != 0,
+        run_id=f"run-{index:03d}",
+        mode="daily",
+        execution_time_seconds=1.0,
+        title=f"動画{index}",
+        hook_type=HOOKS[index % 3],
+        topic=TOPICS[index % 4],
+        wow_score=None if index % 5 == 0 else 6.0 + (index % 7) * 0.5,
+        retention_prediction=40.0 + index,
+    )
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = FeedbackAnalyzer(jsonl_path=str(tmp_path / "execution_log.jsonl"))
+    for index in range(30):
+        analyzer.execution_log.append(_result(index))
+    return analyzer
+def test_reports_match_model_based_computation(analyzer):
+    recent = [_result(index) for index in reversed(range(30))][:12]
+    hooks = analyzer.analyze_hook_performance(limit=12)
+    assert list(hooks) == ["その他", "質問", "衝撃"]
+    assert hooks["衝撃"]["count"] == sum(1 for ex in recent if ex.hook_type == "衝撃")
+    assert hooks["衝撃"]["avg_wow"] == pytest.approx(
+        sum(ex.wow_score or 0 for ex in recent if ex.hook_type == "衝撃") / hooks["衝撃"]["count"]
+    )
+    assert analyzer.analyze_topic_distribution(limit=12) == {"株価": 6, "一般": 3, "為替": 3}
+    best = analyzer.get_best_performing_videos(limit=3)
+    expected = sorted((ex for ex in reversed([_result(i) for i in range(30)]) if ex.wow_score is not None), key=lambda ex: ex.wow_score, reverse=True)[:3]
+    assert [video.run_id for video in best] == [ex.run_id for ex in expected]
+    assert analyzer.calculate_success_rate() == pytest.approx(20 / 30 * 100)
+    assert [ex.run_id for ex in analyzer.load_executions(limit=3)] == ["run-000", "run-001", "run-002"]
+    for index in range(30, 130):
+        analyzer.execution_log.append(_result(index).model_copy(update={"success": True}))
+    assert analyzer.calculate_success_rate() == pytest.approx(90.0)
+    assert "実行回数: 7 回" in analyzer.generate_weekly_report()
+def test_sync_is_incremental(analyzer, tmp_path):
+    store = ExecutionAnalyticsStore(str(execution_log_dir(str(tmp_path / "execution_log.jsonl")) / "analytics.db"))
+    assert store.sync(analyzer.execution_log) == 30
+    assert store.sync(analyzer.execution_log) == 0
+    analyzer.execution_log.append(_result(30))
+    assert store.sync(analyzer.execution_log) == 1
+    totals = store.hook_stats()
+    assert sum(stats["count"] for stats in totals.values()) == 31
+    assert store.topic_counts()["一般"] == 8
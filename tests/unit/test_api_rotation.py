@@ -0,0 +1,86 @@
+from datetime import date
+import pytest
+from app.api_rotation import APIKeyRotationManager, RateLimitExhausted, RateLimits, initialize_api_infrastructure
+from app.config.paths import ProjectPaths
+from app.config.settings import settings
+from app.rotation_state import SharedRotationState
+pytestmark = pytest.mark.unit
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    def sleep(delay):
+        now[0] += delay
+    monkeypatch.setattr("app.api_rotation.time.sleep", sleep)
+    return now
+def _manager(clock, limits, keys=2):
+    manager = APIKeyRotationManager()
+    manager._clock = lambda: clock[0]
+    manager.set_rate_limits("gemini", limits, max_queue_seconds=60)
+    manager.register_keys("gemini", [(f"GEMINI_API_KEY_{i + 1}", f"key-{i + 1}") for i in range(keys)])
+    return manager
+def test_requests_are_spread_across_keys_and_queued_for_earliest_capacity(clock):
+    manager = _manager(clock, RateLimits(rpm=2))
+    calls = []
+    for _ in range(5):
+        manager.execute_with_rotation("gemini", lambda key: calls.append((key, clock[0])))
+    assert [key for key, _ in calls[:4]] == ["key-1", "key-2", "key-1", "key-2"]
+    assert calls[4] == ("key-1", 1030.0)
+    queue = manager.get_stats("gemini")["queue"]
+    assert (queue["requests"], queue["queued"], queue["max_wait_seconds"]) == (5, 1, 30.0)
+def test_exhausted_daily_budget_fails_fast_without_calling_the_provider(clock):
+    manager = _manager(clock, RateLimits(rpd=1), keys=1)
+    manager.execute_with_rotation("gemini", lambda key: "ok")
+    with pytest.raises(RateLimitExhausted):
+        manager.execute_with_rotation("gemini", lambda key: pytest.fail("guaranteed 429 was sent"))
+def test_token_budget_is_reconciled_with_reported_usage(clock):
+    manager = _manager(clock, RateLimits(tpm=1000), keys=1)
+    manager.execute_with_rotation("gemini", lambda key: {"usage": {"total_tokens": 900}}, estimated_tokens=100)
+    assert manager.get_stats("gemini")["keys"][0]["remaining"] == {"tpm": 100.0}
+    manager.execute_with_rotation("gemini", lambda key: {"usage": {"total_tokens": 400}}, estimated_tokens=400)
+    assert clock[0] == pytest.approx(1018.0)
+def _process(clock, state_path, limits=None, keys=2):
+    manager = APIKeyRotationManager()
+    manager._clock = lambda: clock[0]
+    manager.use_shared_state(SharedRotationState(state_path))
+    if limits:
+        manager.set_rate_limits("gemini", limits, max_queue_seconds=60)
+    manager.register_keys("gemini", [(f"GEMINI_API_KEY_{i + 1}", f"key-{i + 1}") for i in range(keys)])
+    return manager
+def test_processes_share_bucket_capacity_and_daily_quota(clock, tmp_path):
+    state_path = str(tmp_path / "rotation.sqlite3")
+    first = _process(clock, state_path, RateLimits(rpm=2), keys=1)
+    second = _process(clock, state_path, RateLimits(rpm=2), keys=1)
+    for manager in (first, second):
+        manager.set_gemini_daily_quota_limit(3)
+    first.execute_with_rotation("gemini", lambda key: "ok")
+    first.execute_with_rotation("gemini", lambda key: "ok")
+    second.execute_with_rotation("gemini", lambda key: "ok")
+    assert clock[0] == 1030.0
+    assert second.get_stats("gemini")["queue"]["queued"] == 1
+    with pytest.raises(Exception, match="daily quota"):
+        first.execute_with_rotation("gemini", lambda key: pytest.fail("quota shared across processes was ignored"))
+def test_cooldown_recorded_by_one_process_steers_the_other(clock, tmp_path):
+    state_path = str(tmp_path / "rotation.sqlite3")
+    first = _process(clock, state_path)
+    second = _process(clock, state_path)
+    used = []
+    def rate_limited_first_key(key):
+        used.append(key)
+        if key == "key-1":
+            raise RuntimeError("429 Too Many Requests")
+        return key
+    assert first.execute_with_rotation("gemini", rate_limited_first_key) == "key-2"
+    assert second.execute_with_rotation("gemini", lambda key: key) == "key-2"
+    assert used == ["key-1", "key-2"]
+    assert SharedRotationState(state_path).quota_calls("gemini", date.today().isoformat()) == 2
+def test_shared_state_path_resolves_against_project_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProjectPaths, "ROOT", tmp_path / "project")
+    monkeypatch.setattr(settings, "api_shared_state_path", "data/api_rotation.sqlite3")
+    manager = APIKeyRotationManager()
+    monkeypatch.setattr("app.api_rotation.get_rotation_manager", lambda: manager)
+    job_dir = tmp_path / "job"
+    job_dir.mkdir()
+    monkeypatch.chdir(job_dir)
+    assert initialize_api_infrastructure() is manager
+    assert manager.shared_state.db_path == str(tmp_path / "project" / "data" / "api_rotation.sqlite3")
+    assert not (job_dir / "data").exists()
@@ -0,0 +1,68 @@
+import threading
+from datetime import datetime
+import pytest
+from app.execution_log import SegmentedExecutionLog, execution_log_dir, open_execution_log
+from app.models.workflow import WorkflowResult
+pytestmark = pytest.mark.unit
+def _result(index, success=True):
+    return WorkflowResult(success=success, run_id=f"run-{index:03d}", mode="daily", execution_time_seconds=1.0)
+def test_rolls_segments_and_reads_tail(tmp_path):
+    log = SegmentedExecutionLog(str(tmp_path / "log"), segment_max_records=4)
+    for index in range(10):
+        assert log.append(_result(index, success=index % 2 == 0), logged_at=1_700_000_000 + index) == index
+    assert log.count() == 10
+    assert log.success_count() == 5
+    assert len(list((tmp_path / "log").glob("segment-*.jsonl"))) == 3
+    assert [result.run_id for result in log.tail(6)] == [f"run-{index:03d}" for index in range(4, 10)]
+    assert [entry.sequence for entry in log.tail_entries(2)] == [8, 9]
+    assert log.tail(50)[0].run_id == "run-000"
+    assert [result.run_id for result in log.head(6)] == [f"run-{index:03d}" for index in range(6)]
+    assert len(log.head(50)) == 10
+def test_range_query_uses_logged_time(tmp_path):
+    log = SegmentedExecutionLog(str(tmp_path / "log"), segment_max_records=3)
+    for index in range(9):
+        log.append(_result(index), logged_at=datetime(2025, 1, 1 + index).timestamp())
+    entries = log.between(datetime(2025, 1, 3), datetime(2025, 1, 6))
+    assert [entry.result.run_id for entry in entries] == ["run-002", "run-003", "run-004"]
+    assert entries[0].logged_at == datetime(2025, 1, 3)
+def test_range_query_keeps_sequences_after_corrupt_record(tmp_path):
+    log = SegmentedExecutionLog(str(tmp_path / "log"), segment_max_records=10)
+    for index in range(5):
+        log.append(_result(index), logged_at=datetime(2025, 1, 1 + index).timestamp())
+    segment = next((tmp_path / "log").glob("segment-*.jsonl"))
+    lines = segment.read_bytes().splitlines(keepends=True)
+    lines[2] = b"{" + b"x" * (len(lines[2]) - 2) + b"\n"
+    segment.write_bytes(b"".join(lines))
+    entries = log.between(datetime(2025, 1, 2), datetime(2025, 1, 6))
+    assert [(entry.sequence, entry.result.run_id) for entry in entries] == [(1, "run-001"), (3, "run-003"), (4, "run-004")]
+    assert entries[1].logged_at == datetime(2025, 1, 4)
+def test_recovers_count_when_manifest_lags_index(tmp_path):
+    log = SegmentedExecutionLog(str(tmp_path / "log"))
+    log.append(_result(0))
+    manifest_path = tmp_path / "log" / "manifest.json"
+    stale = manifest_path.read_text(encoding="utf-8")
+    log.append(_result(1))
+    manifest_path.write_text(stale, encoding="utf-8")
+    assert log.append(_result(2)) == 2
+    assert [result.run_id for result in log.tail(3)] == ["run-000", "run-001", "run-002"]
+def test_legacy_jsonl_is_imported_once(tmp_path):
+    legacy = tmp_path / "execution_log.jsonl"
+    dated = WorkflowResult(success=True, run_id="daily_20250102_090000", mode="daily", execution_time_seconds=1.0)
+    legacy.write_text("\n".join([_result(0).model_dump_json(), "not json", dated.model_dump_json()]) + "\n", encoding="utf-8")
+    log = open_execution_log(str(legacy))
+    assert log.directory == execution_log_dir(str(legacy)) == tmp_path / "execution_log"
+    assert log.count() == 2
+    assert log.between(datetime(2025, 1, 2), datetime(2025, 1, 3))[0].result.run_id == "daily_20250102_090000"
+    assert open_execution_log(str(legacy)).count() == 2
+def test_concurrent_appends_keep_index_consistent(tmp_path):
+    log = SegmentedExecutionLog(str(tmp_path / "log"), segment_max_records=7)
+    def write(worker):
+        for index in range(20):
+            SegmentedExecutionLog(str(tmp_path / "log"), segment_max_records=7).append(_result(worker * 100 + index))
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert log.count() == 80
+    assert len({result.run_id for result in log.tail(80)}) == 80
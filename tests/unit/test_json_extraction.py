@@ -0,0 +1,79 @@
+import json
+import random
+import time
+import pytest
+from app.json_extraction import extract_json, extract_json_text, iter_json_candidates, iter_json_spans
+pytestmark = pytest.mark.unit
+_NOISE = ["説明", "note", " ", "\n", "{注記", "補足}", "[a", "b]", "}", "]", '"引用\n', "\\", ":", ","]
+_STRING_CHARS = 'ab あい{}[]"\\\n\t:,'
+def _random_string(rng):
+    return "".join(rng.choice(_STRING_CHARS) for _ in range(rng.randint(0, 8)))
+def _random_value(rng, depth=0):
+    kind = rng.randint(0, 5 if depth < 3 else 2)
+    if kind == 0:
+        return rng.randint(-1000, 1000)
+    if kind == 1:
+        return _random_string(rng)
+    if kind == 2:
+        return rng.choice([True, False, None, 1.5])
+    if kind == 3:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    return {_random_string(rng): _random_value(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+def _noise(rng):
+    return "".join(rng.choice(_NOISE) for _ in range(rng.randint(0, 12)))
+def test_prose_braces_fences_and_nesting():
+    assert extract_json_text('補足:{説明}\n\n{"title": "Valid", "dialogues": []}') == '{"title": "Valid", "dialogues": []}'
+    assert extract_json('{ 注記 {"a": 1} と [2] }') == {"a": 1}
+    assert extract_json('he said "hi {\n{"a": "q\\"}"}') == {"a": 'q"}'}
+    assert extract_json('[1, {"b": [2}] {"c": 3}', expect=dict) == {"c": 3}
+    assert extract_json('before [1, 2] ```json\n{"fenced": true}\n``` after') == {"fenced": True}
+    assert list(iter_json_spans("{a [b] {c {d}}} [e")) == [(0, 15), (3, 6), (7, 14), (10, 13)]
+    assert extract_json("no json here {at all") is None
+def test_yaml_fallback_only_after_json_candidates():
+    text = "```yaml\ntitle: 台本\ndialogues:\n  - speaker: A\n    line: こんにちは\n```"
+    assert extract_json(text) is None
+    assert extract_json(text, yaml_fallback=True) == {"title": "台本", "dialogues": [{"speaker": "A", "line": "こんにちは"}]}
+    assert [value for _, value in iter_json_candidates('{"a": 1}', yaml_fallback=True)] == [{"a": 1}, {"a": 1}]
+def test_fuzz_finds_embedded_object():
+    rng = random.Random(20240601)
+    for _ in range(500):
+        value = {_random_string(rng): _random_value(rng) for _ in range(rng.randint(1, 4))}
+        payload = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+        if rng.random() < 0.3:
+            payload = f"```json\n{payload}\n```"
+        text = _noise(rng) + payload + _noise(rng)
+        assert extract_json(text, expect=dict) == value, text
+def test_fuzz_random_text_yields_ordered_substrings():
+    rng = random.Random(20240602)
+    for _ in range(500):
+        text = "".join(rng.choice('{}[]"\\\n a1:,') for _ in range(rng.randint(0, 200)))
+        spans = list(iter_json_spans(text))
+        for start, end in spans:
+            assert text[start] in "{[" and text[end - 1] == {"{": "}", "[": "]"}[text[start]], text
+        assert [start for start, _ in spans] == sorted(start for start, _ in spans), text
+        for snippet, value in iter_json_candidates(text):
+            assert snippet in text and json.loads(snippet) == value, text
+def _best_time(text, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extract_json(text)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+@pytest.mark.parametrize("unit", ['{ "key": [1, 2, {"x": "a', "{", "[1, ", '{"a": 1, "b": [}'])
+def test_benchmark_scales_linearly_on_malformed_output(unit):
+    small = _best_time(unit * 20000)
+    large = _best_time(unit * 80000)
+    assert large < 0.5 + 8 * small
+    assert large < 2.0
+def _deep_malformed(depth, size=80000):
+    body = "1, " * ((size - 8 * depth) // 3)
+    return '{"k": ' * depth + "[" + body + "oops]" + "}" * depth
+def test_benchmark_deep_nesting_does_not_redecode_failed_ancestors():
+    shallow = _best_time(_deep_malformed(200))
+    deep = _best_time(_deep_malformed(800))
+    assert extract_json(_deep_malformed(800)) is None
+    assert deep < 0.05 + 2 * shallow
+    assert deep < 0.5
+    assert extract_json('{"k": {"ok": [1]} oops {"k": [2, x]} {"last": 3}}') == {"ok": [1]}
+    assert [value for _, value in iter_json_candidates('[{"a": [1, x]}, {"b": 2}]')] == [{"b": 2}]
@@ -0,0 +1,76 @@
+import threading
+import time
+import litellm
+import pytest
+from app.adapters.llm import LLMClient
+from app.config.paths import ProjectPaths
+from app.config.settings import settings
+from app.llm_cache import LLMResponseCache, cache_key, get_llm_cache, refresh_responses
+pytestmark = pytest.mark.unit
+def test_cache_key_ignores_dict_order_but_not_content():
+    messages = [{"role": "user", "content": "こんにちは"}]
+    first = cache_key("gemini/flash", messages, {"temperature": 0.2, "top_p": 0.9})
+    assert first == cache_key("gemini/flash", messages, {"top_p": 0.9, "temperature": 0.2})
+    assert first != cache_key("gemini/flash", messages, {"temperature": 0.3, "top_p": 0.9})
+    assert first != cache_key("gemini/flash", messages, {"temperature": 0.2, "top_p": 0.9}, tools=[{"name": "search"}])
+def test_concurrent_identical_requests_share_one_provider_call(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"))
+    calls = []
+    release = threading.Event()
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"text": "answer"}
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", "m", compute))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while len(cache._inflight) == 0 or cache.stats()["coalesced"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert results == [{"text": "answer"}] * 4
+    assert cache.get_or_compute("k", "m", compute) == {"text": "answer"}
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 3, 1)
+    assert stats["hit_rate"] == 0.8 and stats["saved_latency_seconds"] > 0
+def test_ttl_and_size_limits_evict_entries(tmp_path, monkeypatch):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=2)
+    now = [1000.0]
+    monkeypatch.setattr("app.llm_cache.time.time", lambda: now[0])
+    for key in ("a", "b"):
+        cache.put(key, "m", {"key": key}, 0.5)
+        now[0] += 1
+    assert cache.get("a") == ({"key": "a"}, 0.5)
+    cache.put("c", "m", {"key": "c"}, 0.5)
+    assert cache.get("b") is None and cache.get("a") is not None
+    now[0] += 120
+    assert cache.get("c") is None
+    assert cache.stats()["evictions"] == 1
+def test_refresh_bypasses_stored_response_and_overwrites_it(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"))
+    cache.get_or_compute("k", "m", lambda: "rejected")
+    with refresh_responses():
+        assert cache.get_or_compute("k", "m", lambda: "regenerated") == "regenerated"
+    assert cache.get_or_compute("k", "m", lambda: "unused") == "regenerated"
+def test_llm_client_reuses_cached_response_unless_opted_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.llm_cache, "path", str(tmp_path / "llm_cache.sqlite3"))
+    calls = []
+    def fake_completion(**request):
+        calls.append(request)
+        return {"model": request["model"], "choices": [{"message": {"role": "assistant", "content": f"reply {len(calls)}"}}]}
+    monkeypatch.setattr(litellm, "completion", fake_completion)
+    client = LLMClient(api_key="test-key", model="gemini-test", temperature=0.2)
+    assert client.generate("同じ質問") == "reply 1"
+    assert client.generate("同じ質問") == "reply 1"
+    assert client.generate("同じ質問", generation_config={"temperature": 0.9}) == "reply 2"
+    assert client.completion([{"role": "user", "content": "同じ質問"}], cache=False)["choices"][0]["message"]["content"] == "reply 3"
+    assert LLMClient(api_key="test-key", model="gemini-test", temperature=0.2, cache=False).generate("同じ質問") == "reply 4"
+    assert len(calls) == 4
+def test_shared_cache_path_resolves_against_project_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProjectPaths, "ROOT", tmp_path / "project")
+    monkeypatch.setattr(settings.llm_cache, "path", "data/llm_cache.sqlite3")
+    monkeypatch.chdir(tmp_path)
+    assert get_llm_cache().db_path == str(tmp_path / "project" / "data" / "llm_cache.sqlite3")
@@ -0,0 +1,67 @@
+import threading
+import time
+import litellm
+import pytest
+from app.adapters.llm import LLMClient
+from app.api_rotation import APIKeyRotationManager
+from app.llm_hedging import LatencyTracker, RequestHedger
+pytestmark = pytest.mark.unit
+def _trained(site="script", **kwargs):
+    hedger = RequestHedger(min_samples=5, min_delay=0.01, **kwargs)
+    for seconds in (0.02, 0.02, 0.03, 0.03, 0.05):
+        hedger.observe(site, seconds)
+    return hedger
+def test_threshold_adapts_to_learned_percentiles_per_call_site():
+    tracker = LatencyTracker(window=100)
+    for index in range(1, 101):
+        tracker.record("script", index / 10)
+    tracker.record("metadata", 0.5)
+    assert (tracker.percentile("script", 50), tracker.percentile("script", 95), tracker.percentile("script", 99)) == (5.0, 9.5, 9.9)
+    hedger = RequestHedger(min_samples=5, initial_delay=30.0)
+    assert hedger.delay("script") == 30.0
+    trained = _trained(percentile=99)
+    assert trained.delay("script") == 0.05 and trained.delay("other") == 45.0
+def test_slow_request_is_hedged_and_first_valid_response_wins():
+    hedger = _trained()
+    release = threading.Event()
+    def slow_primary():
+        release.wait(5)
+        return "primary"
+    started = time.perf_counter()
+    assert hedger.run("script", slow_primary, lambda: "backup") == "backup"
+    assert time.perf_counter() - started < 1
+    release.set()
+    assert hedger.run("script", lambda: "fast", lambda: pytest.fail("hedged a fast request")) == "fast"
+    stats = hedger.stats()
+    assert (stats["requests"], stats["hedged"], stats["hedge_wins"]) == (2, 1, 1)
+    assert set(stats["sites"]["script"]) == {"count", "p50", "p95", "p99", "threshold"}
+def test_invalid_hedge_response_is_ignored_and_budget_caps_hedges():
+    hedger = _trained(max_ratio=0.0, burst=1)
+    for _ in range(40):
+        hedger.observe("script", 0.02)
+    def primary():
+        time.sleep(0.2)
+        return "primary"
+    assert hedger.run("script", primary, lambda: "", validate=bool) == "primary"
+    assert hedger.run("script", primary, lambda: pytest.fail("budget exceeded")) == "primary"
+    stats = hedger.stats()
+    assert (stats["hedged"], stats["hedge_wins"], stats["budget_denied"]) == (1, 0, 1)
+def test_client_hedges_on_a_different_rotation_key(monkeypatch):
+    hedger = _trained(site="script_generation")
+    monkeypatch.setattr("app.adapters.llm.get_request_hedger", lambda: hedger)
+    manager = APIKeyRotationManager()
+    manager.register_keys("gemini", [("GEMINI_API_KEY", "slow-key"), ("GEMINI_API_KEY_2", "fast-key")])
+    release = threading.Event()
+    keys = []
+    def fake_completion(**request):
+        keys.append(request["api_key"])
+        if request["api_key"] == "slow-key":
+            release.wait(5)
+        return {"choices": [{"message": {"content": f"answer from {request['api_key']}"}}]}
+    monkeypatch.setattr(litellm, "completion", fake_completion)
+    client = LLMClient(model="gemini-test", cache=False, call_site="script_generation", hedge=True)
+    client.api_key = None
+    client._rotation_manager = manager
+    assert client.generate("台本") == "answer from fast-key"
+    release.set()
+    assert keys == ["slow-key", "fast-key"]
\ No newline at end of file
@@ -0,0 +1,65 @@
+import gzip
+import json
+import threading
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.llm_logging import LLMInteractionLogger, llm_logging_context
+pytestmark = pytest.mark.unit
+def test_records_are_written_in_background_with_captured_context(tmp_path):
+    logger = LLMInteractionLogger(tmp_path / "llm_interactions.jsonl", batch_size=10, flush_interval=0.05)
+    callers = set()
+    with llm_logging_context(component="script"):
+        for index in range(25):
+            logger.log_interaction(provider="gemini", model="flash", prompt=f"質問{index}", response={"text": index})
+            callers.add(threading.current_thread().name)
+    assert logger.flush(5)
+    records = list(logger.iter_records())
+    assert [record["prompt"] for record in records] == [f"質問{index}" for index in range(25)]
+    assert records[0]["context"] == {"component": "script"} and records[3]["response"] == {"text": 3}
+    assert logger.stats() == {"written": 25, "dropped": 0, "queued": 0}
+    assert logger._thread.name not in callers
+    logger.close()
+def test_segments_rotate_compressed_and_read_back_in_order(tmp_path):
+    log_path = tmp_path / "llm_interactions.jsonl"
+    logger = LLMInteractionLogger(log_path, batch_size=1, flush_interval=0.05, max_segment_bytes=300, retention_segments=3)
+    for index in range(20):
+        logger.log_interaction(provider="gemini", model="flash", prompt="x" * 100, response=str(index))
+        logger.flush(5)
+    logger.close()
+    segments = logger.segments()
+    assert len(segments) == 3 and all(path.name.endswith(".jsonl.gz") for path in segments)
+    with gzip.open(segments[0], "rt", encoding="utf-8") as handle:
+        assert '"provider": "gemini"' in handle.readline()
+    responses = [int(record["response"]) for record in logger.iter_records()]
+    assert responses == sorted(responses) and responses[-1] == 19
+    assert not list(tmp_path.glob("*.rotating")) and not list(tmp_path.glob("*.tmp"))
+def test_full_queue_drops_records_without_blocking_callers(tmp_path, monkeypatch):
+    logger = LLMInteractionLogger(tmp_path / "llm_interactions.jsonl", queue_size=2, batch_size=1, flush_interval=0.05)
+    release = threading.Event()
+    original = logger._write_batch
+    def stalled_write(batch):
+        release.wait(5)
+        original(batch)
+    monkeypatch.setattr(logger, "_write_batch", stalled_write)
+    for index in range(10):
+        logger.log_interaction(provider="gemini", model="flash", prompt=str(index), response="ok")
+    assert logger.dropped >= 7
+    release.set()
+    assert logger.flush(5)
+    assert logger.stats()["written"] + logger.dropped == 10
+    logger.close()
+def test_block_policy_waits_for_queue_space(tmp_path):
+    logger = LLMInteractionLogger(tmp_path / "llm_interactions.jsonl", queue_size=1, batch_size=1, flush_interval=0.05, overflow="block")
+    for index in range(20):
+        logger.log_interaction(provider="gemini", model="flash", prompt=str(index), response="ok")
+    assert logger.flush(5)
+    assert logger.stats()["written"] == 20 and logger.dropped == 0
+    logger.close()
+def test_since_filter_compares_instants_across_time_zones(tmp_path):
+    log_path = tmp_path / "llm_interactions.jsonl"
+    stamps = ["2025-01-01T00:30:00+00:00", "2025-01-01T01:30:00.250000+00:00", "2025-01-01T02:30:00+00:00"]
+    log_path.write_text("".join(json.dumps({"timestamp": stamp, "prompt": str(index)}) + "\n" for index, stamp in enumerate(stamps)), encoding="utf-8")
+    logger = LLMInteractionLogger(log_path)
+    jst = timezone(timedelta(hours=9))
+    assert [record["prompt"] for record in logger.iter_records(since=datetime(2025, 1, 1, 10, 0, tzinfo=jst))] == ["1", "2"]
+    assert [record["prompt"] for record in logger.iter_records(since=datetime(2025, 1, 1, 1, 30, 0, 250000, tzinfo=timezone.utc))] == ["1", "2"]
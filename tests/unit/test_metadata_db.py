@@ -0,0 +1,61 @@
+import csv
+import json
+import threading
+import pytest
+from app.metadata_db import MetadataDatabase
+from app.metadata_storage import MetadataStorage
+pytestmark = pytest.mark.unit
+LEGACY_HEADERS = ["timestamp", "run_id", "mode", "title", "description", "tags", "category", "thumbnail_text", "seo_keywords", "target_audience", "estimated_watch_time", "news_count", "news_topics", "video_url", "view_count", "like_count", "comment_count", "ctr", "avg_view_duration"]
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.metadata_storage._load_sheets_manager", lambda: None)
+    return MetadataStorage(csv_path=str(tmp_path / "metadata_history.csv"), jsonl_path=str(tmp_path / "execution_log.jsonl"))
+def test_save_update_and_ranked_queries(storage):
+    storage.save_metadata({"title": "【速報】日経平均が急騰", "tags": ["株価"]}, run_id="run-a")
+    storage.save_metadata({"title": "円安の行方", "tags": ["為替"]}, run_id="run-b", mode="special")
+    assert storage.update_video_stats("run-a", view_count=5000, ctr=4.2) is True
+    assert storage.update_video_stats("run-b", view_count=1500) is True
+    assert storage.update_video_stats("missing", view_count=1) is False
+    storage.save_metadata({"title": "【速報】日経平均が急騰（再生成）"}, run_id="run-a")
+    record = storage.db.get("run-a")
+    assert (record["title"], record["view_count"], record["ctr"]) == ("【速報】日経平均が急騰（再生成）", 5000, 4.2)
+    assert storage.get_successful_titles(min_views=1000, limit=1) == ["【速報】日経平均が急騰（再生成）"]
+    assert [row["run_id"] for row in storage.load_history(mode="special")] == ["run-b"]
+    assert storage.load_history(min_views=2000)[0]["tags"] == []
+    assert "株価" not in storage.analyze_top_keywords(limit=1)
+def test_legacy_import_runs_once(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.metadata_storage._load_sheets_manager", lambda: None)
+    csv_path = tmp_path / "metadata_history.csv"
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LEGACY_HEADERS)
+        writer.writeheader()
+        writer.writerow({"timestamp": "2025-01-01T09:00:00", "run_id": "old-1", "mode": "daily", "title": "旧タイトル", "tags": '["株価"]', "seo_keywords": "[]", "view_count": "1200", "ctr": "3.50%", "avg_view_duration": "95.0s"})
+    jsonl_path = tmp_path / "execution_log.jsonl"
+    jsonl_path.write_text(
+        json.dumps({"run_id": "old-1", "mode": "daily", "video_url": "https://youtu.be/x"}) + "\n"
+        + json.dumps({"run_id": "daily_20250102_090000", "mode": "daily", "title": "ログのみ", "youtube_feedback": {"video_id": "y", "views": 300}}) + "\n",
+        encoding="utf-8",
+    )
+    storage = MetadataStorage(csv_path=str(csv_path), jsonl_path=str(jsonl_path))
+    old = storage.db.get("old-1")
+    assert (old["view_count"], old["ctr"], old["avg_view_duration"], old["tags"]) == (1200, 3.5, 95.0, ["株価"])
+    assert old["video_url"] == "https://youtu.be/x"
+    assert storage.db.get("daily_20250102_090000")["created_at"] == "2025-01-02T09:00:00"
+    assert storage.db.count() == 2
+    assert storage.db.import_legacy(str(csv_path), str(jsonl_path)) == 0
+    assert storage.update_video_stats("old-1", view_count=9000, like_count=40) is True
+    assert storage.db.import_legacy(str(csv_path), str(jsonl_path), force=True) == 3
+    old = storage.db.get("old-1")
+    assert (old["title"], old["view_count"], old["like_count"], old["ctr"]) == ("旧タイトル", 9000, 40, 3.5)
+    assert old["video_url"] == "https://youtu.be/x"
+def test_concurrent_writers(tmp_path):
+    database = MetadataDatabase(str(tmp_path / "metadata.db"))
+    def write(worker):
+        for index in range(25):
+            database.upsert_metadata({"run_id": f"w{worker}-{index}", "created_at": f"2025-01-01T00:{index:02d}:00"})
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert database.count() == 100
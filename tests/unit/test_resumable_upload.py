@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.config import cfg
+from app.drive import DriveManager
+from app.resumable_upload import CHUNK_ALIGNMENT, ResumableUploader
+from app.write_behind import WriteBehindStore
+from app.youtube import YouTubeManager
+pytestmark = pytest.mark.unit
+class _UploadHandler(BaseHTTPRequestHandler):
+    """Google resumable upload protocolの最小実装"""
+    def log_message(self, *args):
+        pass
+    def _reply(self, status, headers=None, body=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    def do_POST(self):
+        state = self.server.state
+        metadata = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if state["start_error"]:
+            return self._reply(403, body=state["start_error"])
+        with state["lock"]:
+            session_id = len(state["sessions"]) + 1
+            state["sessions"][session_id] = {"metadata": metadata, "data": bytearray(), "total": int(self.headers["X-Upload-Content-Length"])}
+        self._reply(200, {"Location": f"http://127.0.0.1:{self.server.server_port}/session/{session_id}"})
+    def do_PUT(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        content_range = self.headers["Content-Range"]
+        session = state["sessions"][int(self.path.rsplit("/", 1)[-1])]
+        with state["lock"]:
+            state["puts"].append(content_range)
+            if state["fail_next"]:
+                state["fail_next"] -= 1
+                return self._reply(503)
+            spec = content_range.split(" ", 1)[1].split("/")[0]
+            if spec != "*" and int(spec.split("-")[0]) == len(session["data"]):
+                session["data"].extend(body)
+            received = len(session["data"])
+        if received == session["total"]:
+            return self._reply(200, body={"id": f"file-{session['metadata']['name']}", "name": session["metadata"]["name"], "size": str(received), "webViewLink": "https://drive.example/view"})
+        self._reply(308, {"Range": f"bytes=0-{received - 1}"} if received else {})
+@pytest.fixture
+def endpoint():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _UploadHandler)
+    server.state = {"lock": threading.Lock(), "sessions": {}, "puts": [], "fail_next": 0, "start_error": None}
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+def _payload(path, size):
+    data = os.urandom(size)
+    path.write_bytes(data)
+    return data
+class _Crash(Exception):
+    pass
+def _crash_after(limit):
+    def progress(sent, total):
+        if sent >= limit:
+            raise _Crash()
+    return progress
+def test_interrupted_upload_resumes_after_restart(tmp_path, endpoint):
+    url = f"http://127.0.0.1:{endpoint.server_port}/upload"
+    video = tmp_path / "video.mp4"
+    data = _payload(video, 4 * CHUNK_ALIGNMENT + 100)
+    sessions_path = str(tmp_path / "sessions.json")
+    uploader = ResumableUploader(requests.Session(), url, WriteBehindStore(sessions_path, flush_interval=0), chunk_size=CHUNK_ALIGNMENT)
+    with pytest.raises(_Crash):
+        uploader.upload(str(video), {"name": "video.mp4"}, "video/mp4", progress=_crash_after(2 * CHUNK_ALIGNMENT))
+    endpoint.state["puts"].clear()
+    restarted = ResumableUploader(requests.Session(), url, WriteBehindStore(sessions_path, flush_interval=0), chunk_size=CHUNK_ALIGNMENT)
+    assert restarted.pending(str(video))["metadata"] == {"name": "video.mp4"}
+    result = restarted.upload(str(video), {"name": "video.mp4"}, "video/mp4")
+    assert result["size"] == str(len(data))
+    assert len(endpoint.state["sessions"]) == 1
+    assert bytes(endpoint.state["sessions"][1]["data"]) == data
+    assert endpoint.state["puts"][:2] == [f"bytes */{len(data)}", f"bytes {2 * CHUNK_ALIGNMENT}-{3 * CHUNK_ALIGNMENT - 1}/{len(data)}"]
+    assert restarted.pending(str(video)) is None
+def test_transient_errors_are_retried_from_acknowledged_offset(tmp_path, endpoint):
+    url = f"http://127.0.0.1:{endpoint.server_port}/upload"
+    video = tmp_path / "video.mp4"
+    data = _payload(video, 3 * CHUNK_ALIGNMENT)
+    waits = []
+    uploader = ResumableUploader(requests.Session(), url, WriteBehindStore(str(tmp_path / "sessions.json"), flush_interval=0), chunk_size=CHUNK_ALIGNMENT, sleep=waits.append)
+    endpoint.state["fail_next"] = 2
+    progress = []
+    uploader.upload(str(video), {"name": "video.mp4"}, "video/mp4", progress=lambda sent, total: progress.append(sent))
+    assert bytes(endpoint.state["sessions"][1]["data"]) == data
+    assert waits == [2]
+    assert progress == [CHUNK_ALIGNMENT, 2 * CHUNK_ALIGNMENT, 3 * CHUNK_ALIGNMENT]
+class _Call:
+    def __init__(self, result):
+        self.result = result
+    def execute(self):
+        return self.result
+class FakeDriveService:
+    def __init__(self):
+        self.folders = []
+        self.public = []
+    def files(self):
+        return self
+    def permissions(self):
+        return self
+    def create(self, body=None, fields=None, supportsAllDrives=None, fileId=None):
+        if fileId is not None:
+            self.public.append(fileId)
+            return _Call({})
+        self.folders.append(body["name"])
+        return _Call({"id": f"folder-{len(self.folders)}"})
+    def get(self, fileId, fields, supportsAllDrives):
+        return _Call({"webViewLink": f"https://drive.example/{fileId}"})
+def test_package_uploads_artifacts_concurrently_and_resumes_video(tmp_path, endpoint, monkeypatch):
+    monkeypatch.setattr(cfg.upload, "session_store", str(tmp_path / "sessions.json"))
+    monkeypatch.setattr(cfg.upload, "chunk_size_mb", 0)
+    monkeypatch.setattr(cfg, "save_local_backup", False)
+    service = FakeDriveService()
+    manager = DriveManager(service=service, http_session=requests.Session(), upload_url=f"http://127.0.0.1:{endpoint.server_port}/upload")
+    video = tmp_path / "video.mp4"
+    data = _payload(video, 3 * CHUNK_ALIGNMENT)
+    thumbnail = tmp_path / "thumb.png"
+    _payload(thumbnail, 1000)
+    subtitles = tmp_path / "subs.srt"
+    subtitles.write_text("1\n00:00:00,000 --> 00:00:01,000\nこんにちは\n", encoding="utf-8")
+    threads = set()
+    def crash_video(artifact_type, sent, total):
+        threads.add(threading.current_thread().name)
+        if artifact_type == "video" and sent >= CHUNK_ALIGNMENT:
+            raise _Crash("interrupted")
+    first = manager.upload_video_package(str(video), str(thumbnail), str(subtitles), {"title": "テスト"}, progress=crash_video)
+    assert [error["type"] for error in first["errors"]] == ["video"]
+    assert first["thumbnail_file_id"] and first["subtitle_file_id"]
+    assert all(name.startswith("drive-upload") for name in threads)
+    second = manager.upload_video_package(str(video), metadata={"title": "テスト"})
+    assert service.folders == [service.folders[0]]
+    assert second["package_folder_id"] == first["package_folder_id"]
+    video_session = next(session for session in endpoint.state["sessions"].values() if session["metadata"]["name"].startswith("video_"))
+    assert bytes(video_session["data"]) == data
+    assert second["video_file_id"] in service.public
+def test_storage_quota_at_session_start_is_skipped(tmp_path, endpoint, monkeypatch):
+    monkeypatch.setattr(cfg.upload, "session_store", str(tmp_path / "sessions.json"))
+    message = "Service Accounts do not have storage quota. Leverage shared drives instead."
+    endpoint.state["start_error"] = {"error": {"code": 403, "message": message, "errors": [{"domain": "usageLimits", "reason": "storageQuotaExceeded", "message": message}]}}
+    manager = DriveManager(service=FakeDriveService(), http_session=requests.Session(), upload_url=f"http://127.0.0.1:{endpoint.server_port}/upload")
+    video = tmp_path / "video.mp4"
+    _payload(video, 1000)
+    result = manager.upload_file(str(video), folder_id="folder-1")
+    assert (result["skipped"], result["reason"], result["file_size"]) == (True, "storage_quota_exceeded", 1000)
+    assert result["analysis"]["status"] == 403 and result["analysis"]["classification"] == "storage_quota"
+    assert not endpoint.state["sessions"]
+def test_drive_and_youtube_share_one_session_store(tmp_path, endpoint, monkeypatch):
+    sessions_path = tmp_path / "sessions.json"
+    monkeypatch.setattr(cfg.upload, "session_store", str(sessions_path))
+    monkeypatch.setattr(cfg.upload, "chunk_size_mb", 0)
+    drive = DriveManager(service=FakeDriveService(), http_session=requests.Session(), upload_url=f"http://127.0.0.1:{endpoint.server_port}/upload")
+    youtube = YouTubeManager(service=FakeDriveService())
+    assert youtube.upload_sessions is drive.uploader.sessions
+    video = tmp_path / "video.mp4"
+    data = _payload(video, 3 * CHUNK_ALIGNMENT)
+    youtube_key = f"youtube:{ResumableUploader.session_key(str(video))}"
+    youtube.upload_sessions.put(youtube_key, {"uri": "https://upload.example/session/1", "file": str(video)})
+    with pytest.raises(_Crash):
+        drive.uploader.upload(str(video), {"name": "video.mp4"}, "video/mp4", progress=_crash_after(CHUNK_ALIGNMENT))
+    youtube.upload_sessions.flush()
+    assert set(json.loads(sessions_path.read_text(encoding="utf-8"))) == {youtube_key, ResumableUploader.session_key(str(video))}
+    youtube.upload_sessions.delete(youtube_key)
+    drive.uploader.sessions.flush()
+    assert drive.uploader.pending(str(video))["metadata"] == {"name": "video.mp4"}
+    assert drive.uploader.upload(str(video), {"name": "video.mp4"}, "video/mp4")["size"] == str(len(data))
+    drive.uploader.sessions.flush()
+    assert json.loads(sessions_path.read_text(encoding="utf-8")) == {}
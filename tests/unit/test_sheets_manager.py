@@ -0,0 +1,150 @@
+import re
+import time
+import pytest
+from app.prompt_cache import SheetPromptCache
+from app.sheets import RUN_COLUMNS, SheetsManager
+pytestmark = pytest.mark.unit
+CELL = re.compile(r"([A-Z]+)(\d*)")
+class _Request:
+    def __init__(self, result):
+        self.result = result
+    def execute(self):
+        return self.result
+class FakeValues:
+    """values() APIの最小実装（runs/promptsシート）"""
+    def __init__(self, grid, prompts):
+        self.grid = grid
+        self.prompts = prompts
+        self.calls = []
+    def _bounds(self, range_name):
+        start, _, end = range_name.split("!")[1].partition(":")
+        first = CELL.fullmatch(start)
+        last = CELL.fullmatch(end or start)
+        return ord(first.group(1)) - 65, int(first.group(2) or 1), ord(last.group(1)) - 65, int(last.group(2) or 1000)
+    def _read(self, range_name):
+        col_start, row_start, col_end, row_end = self._bounds(range_name)
+        grid = self.prompts if range_name.startswith("prompts!") else self.grid
+        return [list(row[col_start:col_end + 1]) for row in grid[row_start - 1:row_end]]
+    def append(self, spreadsheetId, range, valueInputOption, body):
+        self.calls.append("append")
+        first = len(self.grid) + 1
+        self.grid.extend(list(row) for row in body["values"])
+        return _Request({"updates": {"updatedRange": f"runs!A{first}:S{len(self.grid)}"}})
+    def get(self, spreadsheetId, range):
+        self.calls.append(f"get {range}")
+        return _Request({"values": self._read(range)})
+    def batchGet(self, spreadsheetId, ranges):
+        self.calls.append("batchGet")
+        return _Request({"valueRanges": [{"values": self._read(range_name)} for range_name in ranges]})
+    def batchUpdate(self, spreadsheetId, body):
+        self.calls.append("batchUpdate")
+        for item in body["data"]:
+            col_start, row_number, _, _ = self._bounds(item["range"])
+            row = self.grid[row_number - 1]
+            for offset, value in enumerate(item["values"][0]):
+                row[col_start + offset] = value
+        return _Request({})
+class FakeSheetsService:
+    def __init__(self):
+        self.grid = [list(RUN_COLUMNS)]
+        self.prompts = [["mode", "prompt_a", "prompt_b", "prompt_c", "prompt_d"], ["daily", "ニュースA", "台本B", "", ""]]
+        self.fake_values = FakeValues(self.grid, self.prompts)
+    def spreadsheets(self):
+        return self
+    def values(self):
+        return self.fake_values
+def _manager(tmp_path, ttl_seconds=900.0):
+    service = FakeSheetsService()
+    cache = SheetPromptCache(str(tmp_path / "prompt_cache"), ttl_seconds=ttl_seconds)
+    return SheetsManager(service=service, sheet_id="sheet", flush_interval=0, prompt_cache=cache), service
+def _cell(service, run_id, column):
+    row = next(row for row in service.grid if row[0] == run_id)
+    return row[RUN_COLUMNS.index(column)]
+def test_updates_are_queued_and_coalesced_into_one_batch(tmp_path):
+    manager, service = _manager(tmp_path)
+    first = manager.create_run("daily")
+    manager.update_run(first, prompt_a="prompt")
+    assert service.fake_values.calls == []
+    assert manager.flush() is True
+    assert service.fake_values.calls == ["append"]
+    assert _cell(service, first, "prompt_a") == "prompt"
+    second = manager.create_run("special")
+    manager.flush()
+    service.fake_values.calls.clear()
+    manager.update_run(first, status="processing", title="途中")
+    manager.update_run(first, status="completed", title="完成", video_url="https://example.com/v")
+    manager.update_run(second, error_log={"error": "boom"})
+    assert manager.pending_writes == 5
+    manager.flush()
+    assert service.fake_values.calls == ["batchGet", "batchUpdate"]
+    assert _cell(service, first, "status") == "completed"
+    assert _cell(service, first, "title") == "完成"
+    assert _cell(service, first, "finished_at")
+    assert _cell(service, second, "error_log") == '{"error": "boom"}'
+    assert _cell(service, second, "mode") == "special"
+def test_stale_row_index_is_rebuilt_from_run_id_column(tmp_path):
+    manager, service = _manager(tmp_path)
+    run_id = manager.create_run()
+    manager.flush()
+    service.grid.insert(1, ["other"] + [""] * (len(RUN_COLUMNS) - 1))
+    service.fake_values.calls.clear()
+    manager.update_run(run_id, status="failed")
+    manager.flush()
+    assert service.fake_values.calls == ["batchGet", "get runs!A:A", "batchUpdate"]
+    assert _cell(service, run_id, "status") == "failed"
+    assert _cell(service, "other", "status") == ""
+def test_failed_flush_keeps_writes_queued(tmp_path):
+    manager, service = _manager(tmp_path)
+    run_id = manager.create_run()
+    manager.flush()
+    manager.update_run(run_id, status="completed")
+    manager._rate_limit_retry = lambda func, *args, **kwargs: (_ for _ in ()).throw(RuntimeError("quota"))
+    assert manager.flush() is False
+    manager.update_run(run_id, title="タイトル")
+    del manager._rate_limit_retry
+    assert manager.flush() is True
+    assert _cell(service, run_id, "status") == "completed"
+    assert _cell(service, run_id, "title") == "タイトル"
+def _wait_for_revalidation(manager):
+    deadline = time.time() + 5
+    while manager._revalidating and time.time() < deadline:
+        time.sleep(0.01)
+def test_prompts_are_served_from_cache_and_revalidated_in_background(tmp_path):
+    manager, service = _manager(tmp_path, ttl_seconds=60)
+    prompts = manager.load_prompts("daily")
+    assert prompts["prompt_a"] == "ニュースA"
+    assert manager.prompt_freshness("daily")["source"] == "sheets"
+    fingerprint = manager.prompt_cache.get("daily").fingerprint
+    service.fake_values.calls.clear()
+    assert manager.load_prompts("daily") == prompts
+    assert service.fake_values.calls == []
+    assert manager.prompt_freshness("daily")["stale"] is False
+    restarted, _ = _manager(tmp_path, ttl_seconds=60)
+    restarted.service = service
+    assert restarted.load_prompts("daily") == prompts
+    assert service.fake_values.calls == []
+    manager.prompt_cache.ttl_seconds = 0
+    service.prompts[1][1] = "ニュースA改"
+    assert manager.load_prompts("daily")["prompt_a"] == "ニュースA"
+    freshness = manager.prompt_freshness("daily")
+    assert freshness["source"] == "cache" and freshness["stale"] is True
+    _wait_for_revalidation(manager)
+    assert service.fake_values.calls == ["get prompts!A1:E10"]
+    assert manager.prompt_cache.get("daily").fingerprint != fingerprint
+    manager.prompt_cache.ttl_seconds = 60
+    assert manager.load_prompts("daily")["prompt_a"] == "ニュースA改"
+def test_unchanged_sheet_only_refreshes_fetch_time(tmp_path):
+    manager, service = _manager(tmp_path, ttl_seconds=0)
+    manager.load_prompts("daily")
+    entry = manager.prompt_cache.get("daily")
+    time.sleep(0.01)
+    manager.load_prompts("daily")
+    _wait_for_revalidation(manager)
+    refreshed = manager.prompt_cache.get("daily")
+    assert refreshed.fingerprint == entry.fingerprint
+    assert refreshed.fetched_at > entry.fetched_at
+def test_defaults_are_used_without_cache_or_service(tmp_path):
+    manager, _ = _manager(tmp_path)
+    manager.service = None
+    assert manager.load_prompts("special") == manager._get_default_prompts()
+    assert manager.prompt_freshness("special") == {"source": "defaults"}
@@ -0,0 +1,78 @@
+import json
+import threading
+import pytest
+from app.feedback_store import FeedbackStore
+from app.models.video_review import VideoReviewFeedback, VideoReviewResult
+from app.services.script.continuity import ContinuityContextBuilder
+from app.video_feedback import VideoFeedbackCollector
+pytestmark = pytest.mark.unit
+class _ThemeManager:
+    def __init__(self):
+        self.feedback = []
+    def update_performance_metrics(self, theme_name, avg_view_duration, retention_rate):
+        pass
+    def record_feedback(self, theme_name, positive):
+        self.feedback.append((theme_name, positive))
+@pytest.fixture
+def collector(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.video_feedback.get_theme_manager", _ThemeManager)
+    return VideoFeedbackCollector(str(tmp_path / "video_feedback.json"))
+def test_keyed_updates_and_theme_summary(collector):
+    collector.record_video_metadata("v1", "blue", {"title": "A"})
+    collector.record_video_metadata("v2", "blue", {"title": "B"})
+    collector.update_analytics("v1", {"views": 1000, "likes": 80, "retention_rate": 60.0, "avg_view_duration": 200.0})
+    collector.update_analytics("missing", {"views": 1})
+    collector.record_manual_feedback("v1", positive=True, comment="good")
+    collector.record_manual_feedback("v2", positive=False)
+    review = VideoReviewResult(video_path="v1.mp4", model_name="m", feedback=VideoReviewFeedback(summary="ok"))
+    collector.record_ai_review("v1", review)
+    collector.record_ai_review("v1", review)
+    entry = collector.get_video_feedback("v1")
+    assert entry["analytics"]["views"] == 1000
+    assert entry["manual_feedback"][0]["comment"] == "good"
+    assert len(entry["ai_review_history"]) == 2
+    assert entry["ai_review"]["feedback"]["summary"] == "ok"
+    assert collector.theme_manager.feedback == [("blue", True), ("blue", True), ("blue", False)]
+    summary = collector.get_theme_performance_summary("blue")
+    assert (summary["video_count"], summary["total_views"], summary["avg_retention_rate"]) == (2, 1000, 60.0)
+    assert (summary["positive_feedback_count"], summary["negative_feedback_count"]) == (1, 1)
+    assert collector.get_theme_performance_summary("none")["video_count"] == 0
+def test_concurrent_collectors_do_not_lose_updates(collector, tmp_path):
+    collector.record_video_metadata("v1", "blue", {})
+    def write(worker):
+        other = VideoFeedbackCollector(str(tmp_path / "video_feedback.json"))
+        for index in range(20):
+            other.record_manual_feedback("v1", positive=True, comment=f"{worker}-{index}")
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(collector.get_video_feedback("v1")["manual_feedback"]) == 80
+def test_legacy_json_import_feeds_continuity(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.video_feedback.get_theme_manager", _ThemeManager)
+    legacy = tmp_path / "video_feedback.json"
+    legacy.write_text(
+        json.dumps(
+            {
+                "old": {"theme_name": "blue", "created_at": "2025-01-01T00:00:00", "metadata": {}, "analytics": {}},
+                "new": {
+                    "theme_name": "red",
+                    "created_at": "2025-01-02T00:00:00",
+                    "updated_at": "2025-01-03T00:00:00",
+                    "metadata": {},
+                    "analytics": {"views": 500, "likes": 40, "retention_rate": 55.0},
+                    "manual_feedback": [{"positive": False, "comment": "テロップが小さい", "timestamp": "2025-01-03T00:00:00"}],
+                    "ai_review": {"feedback": {"summary": "テンポが良い", "next_video_actions": ["グラフを増やす"]}},
+                },
+            }
+        ),
+        encoding="utf-8",
+    )
+    VideoFeedbackCollector(str(legacy))
+    assert FeedbackStore(str(tmp_path / "video_feedback.db")).import_legacy_json(str(legacy)) == 0
+    builder = ContinuityContextBuilder(metadata_csv_path=tmp_path / "metadata_history.csv", feedback_json_path=legacy)
+    entry = builder._load_latest_feedback_entry()
+    assert entry[0] == "new"
+    assert builder._load_latest_feedback(entry).negative_comments == ["テロップが小さい"]
+    assert builder._load_latest_ai_review(entry).next_video_actions == ["グラフを増やす"]
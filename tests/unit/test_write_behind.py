@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+import pytest
+from app.background_theme import BackgroundThemeManager
+from app.crew.agent_review import AgentReviewResult, AgentReviewStorage
+from app.write_behind import WriteBehindStore
+pytestmark = pytest.mark.unit
+def test_updates_are_journaled_and_flushed_once(tmp_path):
+    path = tmp_path / "state.json"
+    store = WriteBehindStore(str(path), flush_interval=0)
+    for index in range(50):
+        store.put("counter", index)
+    assert not path.exists()
+    assert len((tmp_path / "state.json.journal").read_text(encoding="utf-8").splitlines()) == 50
+    assert store.flush() is True
+    assert store.flush() is False
+    assert store.flush_count == 1
+    assert json.loads(path.read_text(encoding="utf-8")) == {"counter": 49}
+    assert not (tmp_path / "state.json.journal").exists()
+def test_journal_is_replayed_after_crash(tmp_path):
+    path = tmp_path / "state.json"
+    store = WriteBehindStore(str(path), flush_interval=0)
+    store.put("a", {"n": 1})
+    store.flush()
+    store.put("a", {"n": 2})
+    store.put("b", [1, 2])
+    store.delete("b")
+    with open(tmp_path / "state.json.journal", "a", encoding="utf-8") as handle:
+        handle.write('{"op": "set", "key": "c", "val')
+    recovered = WriteBehindStore(str(path), flush_interval=0)
+    assert recovered.snapshot() == {"a": {"n": 2}}
+    assert recovered.dirty
+    recovered.flush()
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": {"n": 2}}
+def test_second_writer_on_same_path_keeps_both_records(tmp_path):
+    path = tmp_path / "state.json"
+    first = WriteBehindStore(str(path), flush_interval=0)
+    second = WriteBehindStore(str(path), flush_interval=0)
+    first.put("a", 1)
+    second.put("b", 2)
+    first.put("shared", "first")
+    second.put("shared", "second")
+    assert first.flush() is True
+    assert json.loads(path.read_text(encoding="utf-8")) == {"a": 1, "b": 2, "shared": "second"}
+    second.put("c", 3)
+    second.delete("a")
+    second.flush()
+    assert json.loads(path.read_text(encoding="utf-8")) == {"b": 2, "shared": "second", "c": 3}
+    assert first.snapshot() == {"a": 1, "b": 2, "shared": "second"}
+def test_concurrent_writers_and_flushes_lose_nothing(tmp_path):
+    path = tmp_path / "state.json"
+    def write(worker):
+        store = WriteBehindStore(str(path), flush_interval=0)
+        for index in range(30):
+            store.put(f"w{worker}-{index}", index)
+            if index % 7 == 0:
+                store.flush()
+        store.flush()
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(json.loads(path.read_text(encoding="utf-8"))) == 120
+    assert not (tmp_path / "state.json.journal").exists()
+def test_agent_reviews_from_concurrent_instances_are_merged(tmp_path):
+    path = str(tmp_path / "agent_reviews.json")
+    first, second = AgentReviewStorage(path), AgentReviewStorage(path)
+    def review(score, item):
+        return AgentReviewResult(agent_key="writer", agent_role="Writer", task_name="script", score=score, verdict="ok", action_items=[item], raw_feedback="{}")
+    first.append(review(6, "導入を短く"))
+    second.append(review(8, "数字を入れる"))
+    assert not (tmp_path / "agent_reviews.json").exists()
+    bucket = WriteBehindStore(path, flush_interval=0).get("writer")
+    assert [entry["score"] for entry in bucket["history"]] == [6, 8]
+    assert bucket["rolling_average"] == 7.0
+    assert second.get_focus_notes("writer") == "改善: 数字を入れる\n改善: 導入を短く"
+def test_interval_flush_coalesces_bursts(tmp_path):
+    store = WriteBehindStore(str(tmp_path / "state.json"), flush_interval=0.05)
+    for index in range(20):
+        store.put(f"k{index}", index)
+    deadline = time.monotonic() + 2
+    while store.dirty and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.flush_count == 1
+    assert len(json.loads((tmp_path / "state.json").read_text(encoding="utf-8"))) == 20
+def test_theme_usage_is_written_behind(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manager = BackgroundThemeManager(themes_file=str(tmp_path / "themes.json"))
+    manager.record_usage("professional_blue")
+    manager.record_usage("professional_blue")
+    manager.record_feedback("professional_blue", positive=True)
+    assert not (tmp_path / "data" / "background_analytics.json").exists()
+    manager.flush_analytics()
+    reloaded = BackgroundThemeManager(themes_file=str(tmp_path / "themes.json"))
+    assert reloaded.themes["professional_blue"].usage_count == 2
+    assert reloaded.themes["professional_blue"].positive_feedback == 1
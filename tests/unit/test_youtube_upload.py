@@ -0,0 +1,110 @@
+import time
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUploadProgress
+from app.config.settings import settings
+from app.resumable_upload import CHUNK_ALIGNMENT
+from app.youtube import YouTubeManager
+pytestmark = pytest.mark.unit
+class _Crash(Exception):
+    pass
+class FakeInsertRequest:
+    """videos().insertのnext_chunk()プロトコルを模倣"""
+    def __init__(self, service, media_body):
+        self.service = service
+        self.size = media_body.size()
+        self.chunk = media_body.chunksize()
+        self.resumable_uri = None
+        self._in_error_state = False
+        self.sent = 0
+    def next_chunk(self, http=None, num_retries=0):
+        sessions = self.service.sessions
+        if self.resumable_uri is None:
+            self.resumable_uri = f"https://upload.example/session/{len(sessions) + 1}"
+            sessions[self.resumable_uri] = 0
+        elif self._in_error_state:
+            self.service.queries += 1
+            self.sent = sessions[self.resumable_uri]
+            self._in_error_state = False
+        if self.service.fail_next:
+            self.service.fail_next -= 1
+            self._in_error_state = True
+            raise HttpError(httplib2.Response({"status": 503}), b"")
+        self.sent += min(self.chunk, self.size - self.sent)
+        sessions[self.resumable_uri] = self.sent
+        if self.sent == self.size:
+            return None, {"id": "video-1"}
+        return MediaUploadProgress(self.sent, self.size), None
+class _TimedCall:
+    def __init__(self, service, name):
+        self.service = service
+        self.name = name
+    def execute(self, http=None):
+        start = time.monotonic()
+        time.sleep(0.2)
+        self.service.calls[self.name] = (start, time.monotonic())
+        return {"id": f"{self.name}-1"}
+class FakeYouTubeService:
+    def __init__(self):
+        self.sessions = {}
+        self.queries = 0
+        self.fail_next = 0
+        self.calls = {}
+    def videos(self):
+        return self
+    def thumbnails(self):
+        return self
+    def captions(self):
+        return self
+    def insert(self, part, body, media_body, sync=None):
+        if part == "snippet" and "videoId" in body.get("snippet", {}):
+            return _TimedCall(self, "caption")
+        return FakeInsertRequest(self, media_body)
+    def set(self, videoId, media_body):
+        return _TimedCall(self, "thumbnail")
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings.upload, "session_store", str(tmp_path / "sessions.json"))
+    monkeypatch.setattr(settings.upload, "chunk_size_mb", 0)
+    return YouTubeManager(service=FakeYouTubeService())
+def _files(tmp_path):
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"\0" * (4 * CHUNK_ALIGNMENT + 10))
+    thumbnail = tmp_path / "thumb.png"
+    thumbnail.write_bytes(b"png")
+    subtitles = tmp_path / "subs.srt"
+    subtitles.write_text("1\n00:00:00,000 --> 00:00:01,000\nこんにちは\n", encoding="utf-8")
+    return str(video), str(thumbnail), str(subtitles)
+@pytest.mark.asyncio
+async def test_chunked_upload_reports_progress_and_runs_post_calls_concurrently(manager, tmp_path, monkeypatch):
+    video, thumbnail, subtitles = _files(tmp_path)
+    waits = []
+    async def fake_sleep(delay):
+        waits.append(delay)
+    monkeypatch.setattr("app.youtube.asyncio.sleep", fake_sleep)
+    manager.service.fail_next = 1
+    progress = []
+    result = await manager.upload_video_async(video, {"title": "テスト"}, thumbnail, subtitles, progress=lambda sent, total: progress.append(sent))
+    assert result["video_id"] == "video-1"
+    assert result["thumbnail_uploaded"] and result["caption_uploaded"]
+    assert progress == [CHUNK_ALIGNMENT, 2 * CHUNK_ALIGNMENT, 3 * CHUNK_ALIGNMENT, 4 * CHUNK_ALIGNMENT, 4 * CHUNK_ALIGNMENT + 10]
+    assert len(waits) == 1 and manager.service.queries == 1
+    (thumb_start, thumb_end), (caption_start, caption_end) = manager.service.calls["thumbnail"], manager.service.calls["caption"]
+    assert thumb_start < caption_end and caption_start < thumb_end
+@pytest.mark.asyncio
+async def test_upload_resumes_from_persisted_session_after_crash(manager, tmp_path):
+    video, _, _ = _files(tmp_path)
+    def crash(sent, total):
+        if sent >= 2 * CHUNK_ALIGNMENT:
+            raise _Crash("killed")
+    failed = await manager.upload_video_async(video, {"title": "テスト"}, progress=crash)
+    assert "killed" in failed["error"]
+    service = manager.service
+    restarted = YouTubeManager(service=service)
+    progress = []
+    result = await restarted.upload_video_async(video, {"title": "テスト"}, progress=lambda sent, total: progress.append(sent))
+    assert result["video_id"] == "video-1"
+    assert len(service.sessions) == 1 and service.queries == 1
+    assert progress[0] == 3 * CHUNK_ALIGNMENT
+    assert restarted.upload_sessions.snapshot() == {}
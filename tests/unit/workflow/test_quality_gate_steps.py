@@ -0,0 +1,85 @@
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from app.config.settings import MediaQAConfig
+from app.models.qa import CheckStatus, MediaCheckResult
+from app.services.media.qa_pipeline import AUDIO_GATE, MediaQAPipeline
+from app.services.media.render_analysis import RenderAnalysisError
+from app.workflow.base import WorkflowContext
+from app.workflow.steps import AudioQualityGateStep, SubtitleQualityGateStep
+def _config(tmp_path, **gating):
+    config = MediaQAConfig(report_dir=str(tmp_path))
+    for key, value in gating.items():
+        setattr(config.gating, key, value)
+    return config
+def test_gate_fails_fast_and_stops_running_checks(tmp_path):
+    pipeline = MediaQAPipeline(_config(tmp_path))
+    finished = []
+    def slow_check(abort):
+        finished.append(abort.wait(timeout=5))
+        return MediaCheckResult(name="slow", status=CheckStatus.PASSED)
+    def failing_check():
+        return MediaCheckResult(name="broken", status=CheckStatus.FAILED, message="bad")
+    pipeline._gate_checks = lambda gate, abort, **inputs: [("slow", lambda: slow_check(abort)), ("broken", failing_check)]
+    started = time.monotonic()
+    report = pipeline.run_gate(AUDIO_GATE, run_id="run-1", mode="daily")
+    elapsed = time.monotonic() - started
+    assert elapsed < 2
+    assert finished == [True]
+    assert report.gate == AUDIO_GATE
+    assert [check.name for check in report.checks] == ["slow", "broken"]
+    assert report.checks[0].status == CheckStatus.SKIPPED
+    assert [check.name for check in report.blocking_failures()] == ["broken"]
+def test_gate_runs_checks_concurrently(tmp_path):
+    pipeline = MediaQAPipeline(_config(tmp_path))
+    barrier = threading.Barrier(2, timeout=5)
+    def check(name):
+        barrier.wait()
+        return MediaCheckResult(name=name, status=CheckStatus.PASSED)
+    pipeline._gate_checks = lambda gate, **inputs: [("a", lambda: check("a")), ("b", lambda: check("b"))]
+    report = pipeline.run_gate(AUDIO_GATE, run_id="run-1", mode="daily")
+    assert [check.status for check in report.checks] == [CheckStatus.PASSED, CheckStatus.PASSED]
+def test_content_analysis_uses_configured_timeout(monkeypatch, tmp_path):
+    config = _config(tmp_path)
+    config.video.content_analysis_timeout_seconds = 42.0
+    video_path = tmp_path / "render.mp4"
+    video_path.write_bytes(b"")
+    created = []
+    class TimingOutAnalyzer:
+        def __init__(self, ffmpeg_path, **kwargs):
+            created.append(kwargs)
+        def probe_duration(self, path):
+            return 10.0
+        def analyze(self, path, **kwargs):
+            raise RenderAnalysisError("ffmpeg analysis exceeded 42s")
+    monkeypatch.setattr("app.services.media.qa_pipeline.RenderAnalyzer", TimingOutAnalyzer)
+    result = MediaQAPipeline(config)._run_content_checks(video_path=str(video_path))
+    assert created[0]["timeout_seconds"] == 42.0
+    assert result.status == CheckStatus.FAILED
+    assert result.detail == "ffmpeg analysis exceeded 42s"
+@pytest.mark.asyncio
+async def test_audio_gate_requests_retry_from_synthesis(monkeypatch, tmp_path):
+    config = _config(tmp_path, enforce=True)
+    monkeypatch.setattr("app.workflow.steps.cfg", SimpleNamespace(media_quality=config))
+    context = WorkflowContext(run_id="run-1", mode="daily")
+    context.set("audio_path", str(tmp_path / "missing.wav"))
+    result = await AudioQualityGateStep().execute(context)
+    assert result.success is False
+    assert context.get("qa_retry_request")["start_step"] == "audio_synthesis"
+    assert context.get("qa_retry_request")["gate"] == AUDIO_GATE
+    assert context.get("qa_passed") is False
+@pytest.mark.asyncio
+async def test_subtitle_gate_merges_into_combined_report(monkeypatch, tmp_path):
+    config = _config(tmp_path, enforce=True)
+    monkeypatch.setattr("app.workflow.steps.cfg", SimpleNamespace(media_quality=config))
+    subtitle_path = tmp_path / "subtitles.srt"
+    subtitle_path.write_text("1\n00:00:00,000 --> 00:00:02,000\nこんにちは\n", encoding="utf-8")
+    context = WorkflowContext(run_id="run-1", mode="daily")
+    context.set("qa_audio_report", {"checks": [{"name": "audio_integrity", "status": "passed"}]})
+    context.set("script_content", "こんにちは")
+    context.set("subtitle_path", str(subtitle_path))
+    result = await SubtitleQualityGateStep().execute(context)
+    assert result.success is True
+    assert [check["name"] for check in context.get("qa_report")["checks"]] == ["audio_integrity", "subtitle_alignment"]
+    assert context.get("qa_passed") is True